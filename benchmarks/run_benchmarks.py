@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+# run_benchmarks.py - 端到端基准测试
+# 用合成的 Atom 列表与 PDF 语料，按 50 / 500 / 5000 篇的规模依次运行
+# get_recent_papers、extract_pdf_text、分析流水线（分类 + 完整分析 / 摘要翻译，对接本地模拟模型服务）、
+# write_to_conclusion 与 format_email_content，把吞吐与延迟写入 JSON，便于在不同提交之间对比。
+#
+#   python benchmarks/run_benchmarks.py
+#   python benchmarks/run_benchmarks.py --sizes 50,500 --latency 0.2 --compare results/benchmarks/benchmark_<旧提交>.json
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SRC_DIR = REPO_ROOT / "src"
+sys.path.insert(0, str(SRC_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import PDF_PROFILES, build_atom_feed, write_pdf_corpus
+
+logger = logging.getLogger("benchmarks")
+
+RESULT_FORMAT = "arxiv_paper_tracker.benchmark/1"
+DEFAULT_SIZES = (50, 500, 5000)
+TARGET_DATE = "2026-04-01"
+STAGES = ("get_recent_papers", "extract_pdf_text", "analysis_prefetch", "analysis", "write_to_conclusion", "format_email_content")
+# 对比时吞吐下降或耗时增加超过该比例视为回退
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _isolate_environment(workdir, base_url):
+    """在导入 config 之前设置：模型请求全部发往模拟服务，状态文件写入临时目录，关闭会访问其他提供商的功能"""
+    os.environ.update(
+        {
+            "AI_PROVIDER": "custom",
+            "AI_MODEL": "mock",
+            "AI_PROVIDER_POOL": "",
+            "CUSTOM_API_BASE": base_url,
+            "CUSTOM_API_KEY": "mock",
+            "AI_HEDGE_ENABLED": "off",
+            "ANALYSIS_CLEANUP_ENABLED": "off",
+            "REPLAY_MODE": "off",
+            "METRICS_HTTP_PORT": "0",
+            "STATE_DIR": str(workdir / "state"),
+        }
+    )
+
+
+def _git_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ============ 模拟模型服务 ============
+
+
+def start_mock_server(port, args, log_path):
+    """在独立进程中启动 mock_llm_server，避免服务端的 CPU 开销计入被测流程"""
+    command = [
+        sys.executable,
+        str(SRC_DIR / "mock_llm_server.py"),
+        "--port", str(port),
+        "--latency", str(args.latency),
+        "--jitter", str(args.jitter),
+        "--rate-limit", str(args.rate_limit),
+        "--malformed", str(args.malformed),
+        "--seed", str(args.seed),
+    ]
+    log_file = open(log_path, "w", encoding="utf-8")
+    process = subprocess.Popen(command, cwd=REPO_ROOT, stdout=log_file, stderr=subprocess.STDOUT)
+    process.log_file = log_file
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/v1/models", timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    stop_mock_server(process)
+    raise RuntimeError(f"模拟模型服务启动失败，详见 {log_path}")
+
+
+def stop_mock_server(process):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    process.log_file.close()
+
+
+def mock_server_stats(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5) as response:
+        return json.loads(response.read())
+
+
+# ============ 计时 ============
+
+
+def stage_result(items, wall_seconds, cpu_seconds, durations=None, **extra):
+    """单个阶段的结果：总耗时、进程 CPU 时间、每秒处理条数，以及逐条延迟的 p50 / p95 / max"""
+    from timeline import summarize_durations
+
+    result = {
+        "items": items,
+        "wall_seconds": round(wall_seconds, 4),
+        "cpu_seconds": round(cpu_seconds, 4),
+        "throughput_per_second": round(items / wall_seconds, 2) if wall_seconds > 0 else None,
+    }
+    if durations is not None:
+        result["latency"] = summarize_durations(durations)
+    result.update(extra)
+    return result
+
+
+def run_repeated(func, repeat):
+    """
+    运行 repeat 次，以第一次的耗时为准（与真实运行一样只执行一次，例如 write_to_conclusion 首次会为重点论文请求摘要翻译）；
+    之后各次命中缓存的耗时中位数记为 warm_wall_seconds
+    """
+    samples = []
+    output = None
+    for _ in range(max(repeat, 1)):
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        output = func()
+        samples.append((time.perf_counter() - wall_started, time.process_time() - cpu_started))
+    wall, cpu = samples[0]
+    extra = {"samples": [round(sample[0], 4) for sample in samples]}
+    if len(samples) > 1:
+        extra["warm_wall_seconds"] = round(statistics.median(sample[0] for sample in samples[1:]), 4)
+    return output, wall, cpu, extra
+
+
+def warm_up_client():
+    """先发一次请求，把 litellm 的导入与连接建立排除在第一个规模的计时之外"""
+    from config import get_ai_client
+
+    started = time.perf_counter()
+    get_ai_client().chat_completion(messages=[{"role": "user", "content": "论文标题: warm-up"}])
+    return round(time.perf_counter() - started, 3)
+
+
+# ============ 各阶段 ============
+
+
+def bench_get_recent_papers(size, start_index, repeat):
+    import crawler
+    from config import CATEGORIES
+    from replay import ReplayedResponse
+
+    feed = build_atom_feed(size, TARGET_DATE, categories=tuple(CATEGORIES) or ("math.AP",), start_index=start_index)
+
+    def fetch():
+        # 只替换网络请求本身，URL 拼接、Atom 解析与时间窗口过滤照常运行
+        response = ReplayedResponse("synthetic", 200, feed, {"Content-Type": "application/atom+xml"})
+        with patch.object(crawler, "http_get", return_value=response):
+            return crawler.get_recent_papers(CATEGORIES, max_results=size, target_date=TARGET_DATE)
+
+    papers, wall, cpu, extra = run_repeated(fetch, repeat)
+    if len(papers) != size:
+        logger.warning(f"合成列表解析出 {len(papers)} 篇论文，预期 {size} 篇")
+    return papers, stage_result(len(papers), wall, cpu, feed_bytes=len(feed), **extra)
+
+
+def bench_extract_pdf_text(size, corpus, max_pages):
+    from analyzer import extract_pdf_text
+
+    durations = []
+    by_profile = {}
+    characters = 0
+    wall_started, cpu_started = time.perf_counter(), time.process_time()
+    for index in range(size):
+        profile, path = corpus[index % len(corpus)]
+        started = time.perf_counter()
+        text = extract_pdf_text(path, max_pages=max_pages)
+        elapsed = time.perf_counter() - started
+        durations.append(elapsed)
+        by_profile.setdefault(profile, []).append(elapsed)
+        characters += len(text)
+    wall, cpu = time.perf_counter() - wall_started, time.process_time() - cpu_started
+
+    from timeline import summarize_durations
+
+    return stage_result(
+        size,
+        wall,
+        cpu,
+        durations,
+        characters=characters,
+        profiles={profile: summarize_durations(values) for profile, values in by_profile.items()},
+    )
+
+
+class _NoSleepClock:
+    """替换 main 模块中的 time：限流用的 sleep 直接返回，其余函数照常"""
+
+    @staticmethod
+    def sleep(seconds):
+        return None
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def bench_analysis(papers, corpus, workers, papers_dir):
+    """
+    用线程池运行 main.process_single_paper_task（分类 + 完整分析 / 摘要翻译）
+
+    只去掉限流用的随机等待，并让 SimplePaper.download_pdf 从合成语料复制 PDF，其余分支与真实运行相同
+    """
+    import main
+    from models import SimplePaper
+
+    sources = {paper.get_short_id(): corpus[index % len(corpus)][1] for index, paper in enumerate(papers)}
+
+    def download_pdf(paper, filename):
+        shutil.copyfile(sources[paper.get_short_id()], filename)
+
+    def process(paper, index):
+        started = time.perf_counter()
+        result = main.process_single_paper_task(paper, index, len(papers))
+        return result, time.perf_counter() - started
+
+    priority_analyses, secondary_analyses, irrelevant_papers = [], [], []
+    durations = []
+    failed = 0
+    with patch.object(main, "time", _NoSleepClock()), patch.object(main, "PAPERS_DIR", Path(papers_dir)), patch.object(
+        SimplePaper, "download_pdf", download_pdf
+    ):
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bench-worker") as executor:
+            futures = [executor.submit(process, paper, index) for index, paper in enumerate(papers, 1)]
+            for future in futures:
+                result, elapsed = future.result()
+                durations.append(elapsed)
+                if not main.record_paper_result(result, priority_analyses, secondary_analyses, irrelevant_papers):
+                    failed += 1
+        wall, cpu = time.perf_counter() - wall_started, time.process_time() - cpu_started
+
+    # 与 main 相同：去掉 pdf_path 后写入报告，PDF 在最后删除
+    for data in priority_analyses:
+        main.delete_pdf(data[2])
+    priority_clean = [(data[0], data[1], data[3] if len(data) > 3 else {}) for data in priority_analyses]
+    analyses = (priority_clean, secondary_analyses, irrelevant_papers)
+    return analyses, stage_result(
+        len(papers),
+        wall,
+        cpu,
+        durations,
+        workers=workers,
+        priority=len(priority_analyses),
+        secondary=len(secondary_analyses),
+        irrelevant=len(irrelevant_papers),
+        failed=failed,
+    )
+
+
+def bench_analysis_prefetch(papers, concurrency):
+    from batch import prefetch_paper_results
+
+    wall_started, cpu_started = time.perf_counter(), time.process_time()
+    prefetched = prefetch_paper_results(papers, concurrency=concurrency)
+    wall, cpu = time.perf_counter() - wall_started, time.process_time() - cpu_started
+    return stage_result(len(papers), wall, cpu, concurrency=concurrency, prefetched=len(prefetched))
+
+
+def _run_meta(analyses):
+    from main import build_run_meta
+
+    total = sum(len(entries) for entries in analyses)
+    return build_run_meta(total, total, partial_run=False)
+
+
+def bench_write_to_conclusion(analyses, size, repeat):
+    from utils import write_to_conclusion
+
+    run_meta = _run_meta(analyses)
+    filename = f"benchmark_{size}.md"
+    path, wall, cpu, extra = run_repeated(lambda: write_to_conclusion(*analyses, filename=filename, run_meta=run_meta), repeat)
+    return stage_result(size, wall, cpu, output_bytes=Path(path).stat().st_size, **extra)
+
+
+def bench_format_email_content(analyses, size, repeat):
+    from emailer import format_email_content
+
+    run_meta = _run_meta(analyses)
+    content, wall, cpu, extra = run_repeated(lambda: format_email_content(*analyses, run_meta=run_meta), repeat)
+    return stage_result(size, wall, cpu, output_bytes=len(content.encode("utf-8")), **extra)
+
+
+# ============ 主流程 ============
+
+
+def run_size(size, start_index, corpus, args, workdir, port):
+    """运行一个规模的全部阶段；每个规模使用独立的缓存目录与论文编号，不会命中上一轮的结果"""
+    import cache
+    import config
+    import utils
+    from timeline import get_timeline, reset_timeline
+
+    cache.CACHE_DIR = workdir / "cache" / str(size)
+    utils.RESULTS_DIR = workdir / "results"
+    config.reset_circuit_breakers()
+    reset_timeline()
+    server_before = mock_server_stats(port)
+
+    stages = {}
+    logger.warning(f"[{size} 篇] get_recent_papers")
+    papers, stages["get_recent_papers"] = bench_get_recent_papers(size, start_index, args.repeat)
+    logger.warning(f"[{size} 篇] extract_pdf_text")
+    stages["extract_pdf_text"] = bench_extract_pdf_text(size, corpus, args.max_pages)
+    if args.async_batch:
+        logger.warning(f"[{size} 篇] 异步预取分类与翻译")
+        stages["analysis_prefetch"] = bench_analysis_prefetch(papers, args.async_concurrency)
+    logger.warning(f"[{size} 篇] 分析流水线（{args.workers} 个线程）")
+    analyses, stages["analysis"] = bench_analysis(papers, corpus, args.workers, workdir / "papers" / str(size))
+    logger.warning(f"[{size} 篇] write_to_conclusion / format_email_content")
+    stages["write_to_conclusion"] = bench_write_to_conclusion(analyses, size, args.repeat)
+    stages["format_email_content"] = bench_format_email_content(analyses, size, args.repeat)
+
+    server_after = mock_server_stats(port)
+    timeline = get_timeline()
+    return {
+        "papers": size,
+        "stages": stages,
+        "timeline": timeline.summary()["stages"],
+        "timeline_dropped_spans": timeline.dropped,
+        "mock_llm": {key: server_after[key] - server_before.get(key, 0) for key in server_after},
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def compare_results(baseline, current, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """
+    按 (规模, 阶段) 对比两份结果的总耗时
+
+    Returns:
+        [{"papers", "stage", "baseline_seconds", "current_seconds", "ratio", "regression"}]
+    """
+    baseline_runs = {run["papers"]: run for run in baseline.get("runs", [])}
+    rows = []
+    for run in current.get("runs", []):
+        previous = baseline_runs.get(run["papers"])
+        if previous is None:
+            continue
+        for stage in STAGES:
+            before = previous["stages"].get(stage, {}).get("wall_seconds")
+            after = run["stages"].get(stage, {}).get("wall_seconds")
+            if not before or after is None:
+                continue
+            ratio = after / before
+            rows.append(
+                {
+                    "papers": run["papers"],
+                    "stage": stage,
+                    "baseline_seconds": before,
+                    "current_seconds": after,
+                    "ratio": round(ratio, 3),
+                    "regression": ratio > 1 + threshold,
+                }
+            )
+    return rows
+
+
+def format_comparison(rows, baseline_commit=None, current_commit=None):
+    lines = [f"对比 {baseline_commit or '基线'} -> {current_commit or '当前'}:"]
+    for row in rows:
+        marker = "  ⚠ 回退" if row["regression"] else ""
+        lines.append(
+            f"  {row['papers']:>5} 篇 {row['stage']:<22} {row['baseline_seconds']:>9.3f}s -> "
+            f"{row['current_seconds']:>9.3f}s  x{row['ratio']:.2f}{marker}"
+        )
+    return "\n".join(lines)
+
+
+def format_summary(result):
+    lines = []
+    for run in result["runs"]:
+        lines.append(f"{run['papers']} 篇论文:")
+        for stage, values in run["stages"].items():
+            latency = values.get("latency") or {}
+            p95 = f", p95 {latency['p95']:.3f}s" if latency.get("p95") is not None else ""
+            lines.append(
+                f"  {stage:<22} {values['wall_seconds']:>9.3f}s  {values['throughput_per_second'] or 0:>10.1f} 条/秒{p95}"
+            )
+    return "\n".join(lines)
+
+
+def _parse_sizes(value):
+    try:
+        sizes = [int(part) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError("规模应为逗号分隔的正整数，例如 50,500,5000")
+    if not sizes or any(size <= 0 for size in sizes):
+        raise argparse.ArgumentTypeError("规模应为逗号分隔的正整数，例如 50,500,5000")
+    return sizes
+
+
+def _parse_pages(value):
+    return None if value.lower() == "all" else int(value)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="arXiv 论文追踪端到端基准测试（合成数据 + 本地模拟模型服务）")
+    parser.add_argument("--sizes", type=_parse_sizes, default=list(DEFAULT_SIZES), help="论文规模，默认 50,500,5000")
+    parser.add_argument("--workers", type=int, default=None, help="分析流水线线程数，默认与 MAX_THREADS 相同")
+    parser.add_argument("--max-pages", type=_parse_pages, default=10, help="每篇 PDF 提取的页数，all 表示全部")
+    parser.add_argument("--pdf-per-profile", type=int, default=2, help="每种 PDF 规格生成的文件数")
+    parser.add_argument("--repeat", type=int, default=3, help="抓取、写报告与邮件格式化阶段的运行次数，第一次之后的记为 warm_wall_seconds")
+    parser.add_argument("--async-batch", action="store_true", help="分析前先用 asyncio 并发预取分类与翻译")
+    parser.add_argument("--async-concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟模型服务的基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.01, help="模拟模型服务的延迟抖动（秒）")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="模拟模型服务返回 429 的概率")
+    parser.add_argument("--malformed", type=float, default=0.0, help="模拟模型服务返回非法 JSON 的概率")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="结果 JSON 路径，默认 results/benchmarks/benchmark_<提交>_<时间>.json")
+    parser.add_argument("--compare", type=Path, default=None, help="与之前的结果 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD, help="对比时判定回退的耗时增幅")
+    parser.add_argument("--workdir", type=Path, default=None, help="缓存、状态与报告的工作目录，默认使用临时目录并在结束后删除")
+    parser.add_argument("--verbose", action="store_true", help="输出被测模块的 INFO 日志")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    keep_workdir = args.workdir is not None
+    workdir = (args.workdir or Path(tempfile.mkdtemp(prefix="arxiv_bench_"))).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}/v1"
+    _isolate_environment(workdir, base_url)
+
+    import config
+
+    workers = args.workers or config.MAX_THREADS
+    args.workers = workers
+    commit = _git_commit()
+    server = start_mock_server(port, args, workdir / "mock_llm_server.log")
+    try:
+        logger.warning(f"生成 PDF 语料: {', '.join(PDF_PROFILES)}，每种 {args.pdf_per_profile} 份")
+        corpus = write_pdf_corpus(workdir / "pdfs", files_per_profile=args.pdf_per_profile, seed=args.seed)
+        warmup_seconds = warm_up_client()
+        runs = []
+        start_index = 1
+        for size in args.sizes:
+            runs.append(run_size(size, start_index, corpus, args, workdir, port))
+            start_index += size
+    finally:
+        stop_mock_server(server)
+        if not keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "format": RESULT_FORMAT,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "warmup_seconds": warmup_seconds,
+        "settings": {
+            "sizes": args.sizes,
+            "workers": workers,
+            "max_pages": args.max_pages,
+            "pdf_profiles": PDF_PROFILES,
+            "pdf_per_profile": args.pdf_per_profile,
+            "repeat": args.repeat,
+            "async_batch": args.async_batch,
+            "async_concurrency": args.async_concurrency if args.async_batch else None,
+            "mock_llm": {"latency": args.latency, "jitter": args.jitter, "rate_limit": args.rate_limit, "malformed": args.malformed},
+            "seed": args.seed,
+        },
+        "runs": runs,
+    }
+
+    output = args.output
+    if output is None:
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = REPO_ROOT / "results" / "benchmarks" / f"benchmark_{commit or 'nogit'}_{timestamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(format_summary(result))
+    print(f"结果已写入: {output}")
+    if args.compare is not None:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare_results(baseline, result, threshold=args.threshold)
+        print(format_comparison(rows, baseline.get("git_commit"), commit))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# synthetic.py - 基准测试用的合成数据
+# 生成 arXiv API 格式的 Atom 列表（N 篇论文）和不同页数、文字密度的 PDF 语料，
+# 同一 seed 总是生成相同的内容，便于在不同提交之间对比
+
+import datetime
+import random
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+# PDF 语料的规格：页数与每页字符数
+PDF_PROFILES = {
+    "short_sparse": {"pages": 6, "chars_per_page": 1200},
+    "typical": {"pages": 25, "chars_per_page": 3000},
+    "long_dense": {"pages": 80, "chars_per_page": 5500},
+}
+
+TITLE_WORDS = (
+    "global", "well-posedness", "regularity", "blow-up", "Navier-Stokes", "Euler", "harmonic", "elliptic",
+    "parabolic", "dispersive", "Schrodinger", "wave", "equations", "estimates", "solutions", "Sobolev",
+    "critical", "nonlinear", "boundary", "free", "problems", "scattering", "stability", "Strichartz",
+    "weighted", "inequalities", "singular", "limits", "vortex", "dynamics", "compressible", "fluids",
+)
+TEXT_WORDS = TITLE_WORDS + (
+    "we", "prove", "that", "the", "solution", "is", "bounded", "in", "for", "all", "time", "under",
+    "assumption", "energy", "method", "and", "a", "priori", "estimate", "implies", "convergence",
+    "of", "sequence", "with", "respect", "to", "norm", "local", "existence", "uniqueness",
+)
+FORMULAS = (
+    "$u_t - \\Delta u = |u|^{p-1} u$",
+    "$\\|u(t)\\|_{H^s} \\le C \\|u_0\\|_{H^s}$",
+    "$s > n/2$",
+    "$\\nabla \\cdot v = 0$",
+    "$L^p(\\mathbb{R}^n)$",
+)
+PDF_FORMULAS = (
+    "u_t - Delta u = |u|^(p-1) u",
+    "||u(t)||_{H^s} <= C ||u_0||_{H^s}",
+    "div v = 0 in R^3 x (0, T)",
+    "E(t) + int_0^t ||grad u||^2 ds <= E(0)",
+)
+AUTHOR_NAMES = ("Alice Chen", "Bob Martin", "Carla Rossi", "Deng Wei", "Eva Novak", "Farid Haddad", "Grace Kim")
+DEFAULT_CATEGORIES = ("math.AP", "math.FA", "math.CA")
+
+
+def submission_window(target_date):
+    """与 crawler.parse_date_arg 相同的单日窗口：前一天 18:00 到当天 18:00（UTC）"""
+    day = datetime.datetime.strptime(target_date.replace("-", ""), "%Y%m%d").replace(tzinfo=datetime.timezone.utc)
+    end_time = day.replace(hour=18)
+    return end_time - datetime.timedelta(days=1), end_time
+
+
+def _words(rng, count, vocabulary=TEXT_WORDS):
+    return " ".join(rng.choice(vocabulary) for _ in range(count))
+
+
+def _abstract(rng):
+    sentences = []
+    for _ in range(rng.randint(4, 8)):
+        sentence = _words(rng, rng.randint(10, 22)).capitalize()
+        if rng.random() < 0.5:
+            sentence += f" {rng.choice(FORMULAS)}"
+        sentences.append(sentence + ".")
+    return " ".join(sentences)
+
+
+def build_atom_feed(count, target_date, categories=DEFAULT_CATEGORIES, start_index=1, seed=0):
+    """
+    生成 N 篇论文的 arXiv Atom 列表，提交时间均匀分布在 target_date 的检索窗口内
+
+    Args:
+        count: 论文数量
+        target_date: 与 get_recent_papers 的 target_date 相同的单日日期
+        start_index: 第一篇论文的编号，不同规模使用不同区间，避免命中上一轮的缓存
+    """
+    rng = random.Random(f"atom:{seed}:{start_index}:{count}")
+    window_start, _ = submission_window(target_date)
+    yymm = window_start.strftime("%y%m")
+    step = 86400 / max(count, 1)
+    entries = []
+    for offset in range(count):
+        index = start_index + offset
+        published = (window_start + datetime.timedelta(seconds=int(offset * step) + 1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        title = _words(rng, rng.randint(5, 12), TITLE_WORDS).capitalize()
+        paper_categories = [categories[0]] + rng.sample(list(categories[1:]), k=rng.randint(0, len(categories) - 1))
+        authors = "".join(
+            f"    <author><name>{escape(name)}</name></author>\n"
+            for name in rng.sample(AUTHOR_NAMES, k=rng.randint(1, 4))
+        )
+        tags = "".join(
+            f'    <category term="{escape(category)}" scheme="http://arxiv.org/schemas/atom"/>\n'
+            for category in paper_categories
+        )
+        entries.append(
+            "  <entry>\n"
+            f"    <id>http://arxiv.org/abs/{yymm}.{index:05d}v1</id>\n"
+            f"    <updated>{published}</updated>\n"
+            f"    <published>{published}</published>\n"
+            f"    <title>{escape(title)}</title>\n"
+            f"    <summary>{escape(_abstract(rng))}</summary>\n"
+            f"{authors}"
+            f"    <arxiv:comment>{rng.randint(12, 80)} pages</arxiv:comment>\n"
+            f'    <arxiv:primary_category term="{escape(categories[0])}" scheme="http://arxiv.org/schemas/atom"/>\n'
+            f"{tags}"
+            "  </entry>\n"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">\n'
+        f"  <title>arXiv Query: synthetic</title>\n"
+        f"{''.join(entries)}"
+        "</feed>\n"
+    ).encode("utf-8")
+
+
+def _page_lines(rng, chars_per_page, line_chars=95):
+    lines = []
+    remaining = chars_per_page
+    while remaining > 0:
+        if rng.random() < 0.1:
+            line = f"    {rng.choice(PDF_FORMULAS)}    ({rng.randint(1, 99)}.{rng.randint(1, 9)})"
+        else:
+            line = _words(rng, 16)
+            while len(line) < line_chars - 10:
+                line += " " + rng.choice(TEXT_WORDS)
+        lines.append(line[:line_chars])
+        remaining -= len(lines[-1])
+    return lines
+
+
+def write_pdf(path, pages, chars_per_page, seed=0):
+    """写出一份 pages 页、每页约 chars_per_page 个字符的 PDF"""
+    import fitz
+
+    rng = random.Random(f"pdf:{seed}:{pages}:{chars_per_page}")
+    document = fitz.open()
+    for page_number in range(1, pages + 1):
+        page = document.new_page(width=595, height=842)
+        lines = _page_lines(rng, chars_per_page)
+        # 行数多时缩小字号，保证整页放得下
+        font_size = 9 if len(lines) <= 60 else 7
+        y = 60
+        if page_number == 1:
+            page.insert_text((56, y), _words(rng, 8, TITLE_WORDS).title(), fontsize=14)
+            y += 24
+        for line in lines:
+            page.insert_text((56, y), line, fontsize=font_size)
+            y += font_size + 3
+        page.insert_text((290, 820), str(page_number), fontsize=8)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    document.save(str(path))
+    document.close()
+    return path
+
+
+def write_pdf_corpus(directory, profiles=PDF_PROFILES, files_per_profile=3, seed=0):
+    """
+    按 profiles 各写出 files_per_profile 份 PDF
+
+    Returns:
+        [(profile_name, Path)]，按规格交替排列，论文按序号循环取用时各规格均匀分布
+    """
+    directory = Path(directory)
+    corpus = {name: [] for name in profiles}
+    for copy in range(files_per_profile):
+        for name, spec in profiles.items():
+            path = directory / f"{name}_{copy + 1}.pdf"
+            write_pdf(path, spec["pages"], spec["chars_per_page"], seed=f"{seed}:{copy}")
+            corpus[name].append(path)
+    return [(name, corpus[name][copy]) for copy in range(files_per_profile) for name in profiles]
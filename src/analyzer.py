@@ -1,20 +1,11 @@
 # analyzer.py - 分析论文模块
 
+import functools
 import logging
 import re
+from concurrent.futures import FIRST_COMPLETED, wait
 
-try:
-    import fitz
-except Exception:
-    fitz = None
-
-import pdfplumber
-try:
-    import tiktoken
-except Exception:
-    tiktoken = None
-
-from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from pydantic import BaseModel, ConfigDict, Field, create_model, field_validator, model_validator
 
 from cache import (
     build_analysis_cache_key,
@@ -25,12 +16,37 @@ from cache import (
 )
 from config import (
     ANALYSIS_CLEANUP_THINKING_MODE,
+    ANALYSIS_LOCAL_REPAIR_ENABLED,
     PRIORITY_TOPICS,
     SECONDARY_TOPICS,
+    SPECULATIVE_FALLBACK_DELAY_SECONDS,
+    SPECULATIVE_FALLBACK_ENABLED,
+    SPECULATIVE_FALLBACK_MAX_SUCCESS_RATE,
+    SPECULATIVE_FALLBACK_MIN_SAMPLES,
     get_ai_client,
     get_analysis_cleanup_client,
     get_analysis_cleanup_request_config,
+    get_shared_executor,
+)
+from lazy import LazyModule, is_available
+from repair import (
+    CONTROL_CHAR_PATTERN,
+    AnalysisRepairEngine,
+    RepairReport,
+    find_display_math_escapes,
+    format_repair_rules,
+    has_unbalanced_inline_math,
+    has_unbalanced_math_braces,
+    normalize_block_text,
 )
+from resilience import CancelToken, RequestCancelledError, is_circuit_open_error
+from state import get_structured_success_rate, record_structured_outcome
+from timeline import timed
+from tokens import estimate_message_tokens
+
+# PDF 库只在真正提取文本时导入
+fitz = LazyModule("fitz")
+pdfplumber = LazyModule("pdfplumber")
 
 logger = logging.getLogger(__name__)
 
@@ -167,9 +183,22 @@ ANALYSIS_CLEANUP_REQUIREMENTS = """
 """.strip()
 
 
+_HEADING_PREFIX_PATTERN = re.compile(r"^[#\s>*-]+")
+_HEADING_NUMBER_PATTERN = re.compile(r"^\d+\s*[.\、]\s*")
+_SECTION_ALIAS_TO_CANONICAL = {
+    alias: canonical for canonical, aliases in reversed(SECTION_SPECS) for alias in reversed(aliases)
+}
+# 所有别名编译成一个交替正则，顺序与 SECTION_SPECS 一致，匹配优先级与逐个比较别名时相同
+_SECTION_HEADING_PATTERN = re.compile(
+    "(?P<alias>"
+    + "|".join(re.escape(alias) for _, aliases in SECTION_SPECS for alias in aliases)
+    + ")(?:$|(?=[ :：（(]))"
+)
+
+
 def _clean_heading_candidate(line: str):
-    candidate = re.sub(r"^[#\s>*-]+", "", line)
-    candidate = re.sub(r"^\d+\s*[.\、]\s*", "", candidate)
+    candidate = _HEADING_PREFIX_PATTERN.sub("", line)
+    candidate = _HEADING_NUMBER_PATTERN.sub("", candidate)
     candidate = candidate.replace("**", "").replace("__", "").strip()
     return candidate
 
@@ -178,21 +207,14 @@ def _match_section_heading(line: str):
     candidate = _clean_heading_candidate(line)
     if not candidate:
         return None, ""
-    for canonical, aliases in SECTION_SPECS:
-        for alias in aliases:
-            if candidate == alias:
-                return canonical, ""
-            if candidate.startswith(alias):
-                tail = candidate[len(alias):]
-                if not tail:
-                    return canonical, ""
-                if tail[0] in " :：（(":
-                    return canonical, tail.lstrip(" :：").strip()
-    return None, ""
+    match = _SECTION_HEADING_PATTERN.match(candidate)
+    if match is None:
+        return None, ""
+    tail = candidate[match.end():]
+    return _SECTION_ALIAS_TO_CANONICAL[match.group("alias")], tail.lstrip(" :：").strip()
 
 
-def extract_analysis_sections(raw_text: str):
-    text = (raw_text or "").replace("\r\n", "\n")
+def _parse_analysis_sections(text: str):
     lines = text.split("\n")
     headings = []
     seen = set()
@@ -203,6 +225,8 @@ def extract_analysis_sections(raw_text: str):
             continue
         seen.add(canonical)
         headings.append((idx, canonical, inline_content))
+        if len(seen) == len(SECTION_SPECS):
+            break
 
     sections = {canonical: "" for canonical, _ in SECTION_SPECS}
     for index, (line_idx, canonical, inline_content) in enumerate(headings):
@@ -216,8 +240,64 @@ def extract_analysis_sections(raw_text: str):
     return sections
 
 
+class ParsedAnalysis:
+    """
+    一篇分析 Markdown 的解析结果：标题、四个 section 与渲染后的正文
+
+    通过 parse_analysis 获取，同一份文本只解析一次；邮件、汇总文件与检查点都直接复用。
+    """
+
+    __slots__ = ("title", "sections", "_body")
+
+    def __init__(self, raw_text: str):
+        text = (raw_text or "").replace("\r\n", "\n")
+        self.title = _find_analysis_title(text)
+        self.sections = _parse_analysis_sections(text)
+        self._body = None
+
+    def title_or(self, fallback: str):
+        return self.title or fallback
+
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = _render_sections_body(self.sections)
+        return self._body
+
+
+@functools.lru_cache(maxsize=512)
+@timed("analysis_parse")
+def parse_analysis(raw_text: str) -> ParsedAnalysis:
+    """解析分析文本并按内容缓存；返回的对象应视为只读"""
+    return ParsedAnalysis(raw_text)
+
+
+def extract_analysis_sections(raw_text: str):
+    return dict(parse_analysis(raw_text).sections)
+
+
+_CHINESE_TITLE_PATTERN = re.compile(r"\*{0,2}中文标题\*{0,2}\s*[:：]\s*(.+)")
+_TITLE_SKIP_PREFIXES = (
+    "## ",
+    "### ",
+    "**作者**",
+    "**类别**",
+    "**摘要**",
+    "论文标题:",
+    "作者:",
+    "类别:",
+    "发布时间:",
+    "摘要:",
+    "论文PDF内容:",
+)
+
+
 def extract_analysis_title(raw_text: str, fallback: str):
-    text = (raw_text or "").replace("\r\n", "\n")
+    return parse_analysis(raw_text).title_or(fallback)
+
+
+def _find_analysis_title(text: str):
+    """按一级标题、“中文标题:” 行、“## 详细分析”的上一行的顺序查找标题，找不到时返回空字符串"""
     lines = text.split("\n")
     for line in lines:
         stripped = line.strip()
@@ -226,46 +306,29 @@ def extract_analysis_title(raw_text: str, fallback: str):
             if title:
                 return title
 
-    match = re.search(r"\*{0,2}中文标题\*{0,2}\s*[:：]\s*(.+)", text)
+    match = _CHINESE_TITLE_PATTERN.search(text)
     if match:
         title = match.group(1).strip()
         if title:
             return title
 
-    for idx, line in enumerate(lines):
+    previous = None
+    for line in lines:
         stripped = line.strip()
         if not stripped:
             continue
-        if stripped.startswith(
-            (
-                "## ",
-                "### ",
-                "**作者**",
-                "**类别**",
-                "**摘要**",
-                "论文标题:",
-                "作者:",
-                "类别:",
-                "发布时间:",
-                "摘要:",
-                "论文PDF内容:",
-            )
-        ):
-            continue
-        next_nonempty = ""
-        for next_line in lines[idx + 1:]:
-            next_nonempty = next_line.strip()
-            if next_nonempty:
-                break
-        if next_nonempty.startswith("## 详细分析"):
-            return stripped.replace("**", "").strip()
+        if stripped.startswith("## 详细分析") and previous and not previous.startswith(_TITLE_SKIP_PREFIXES):
+            return previous.replace("**", "").strip()
+        previous = stripped
 
-    return fallback
+    return ""
 
 
 def render_analysis_body(raw_text: str):
-    sections = extract_analysis_sections(raw_text)
+    return parse_analysis(raw_text).body
+
 
+def _render_sections_body(sections):
     def section_or_placeholder(key: str):
         content = normalize_analysis_block_text(sections.get(key) or "")
         return content if content else "（模型未给出相关内容）"
@@ -287,9 +350,7 @@ def normalize_analysis_markdown(raw_text: str, zh_title: str):
 
 
 def normalize_analysis_block_text(text: str):
-    normalized = (text or "").replace("\r\n", "\n").replace("\r", "\n")
-    normalized = re.sub(r"\n{3,}", "\n\n", normalized)
-    return normalized.strip()
+    return normalize_block_text(text)
 
 
 def validate_analysis_markdown(markdown_text: str):
@@ -312,11 +373,10 @@ def validate_analysis_markdown(markdown_text: str):
         if count != 1:
             issues.append(f"章节标题异常: {section_title} (出现 {count} 次)")
 
-    for bad_literal in ("$$\\n", "$$\\t", "$$\\r"):
-        if bad_literal in text:
-            issues.append(f"存在非法块公式转义: {bad_literal}")
+    for bad_literal in find_display_math_escapes(text):
+        issues.append(f"存在非法块公式转义: {bad_literal}")
 
-    if re.search(r"[\x00-\x08\x0b\x0c\x0e-\x1f]", text):
+    if CONTROL_CHAR_PATTERN.search(text):
         issues.append("存在未清理的控制字符")
 
     return issues
@@ -349,9 +409,10 @@ def _merge_usage(primary_usage, secondary_usage):
 
 
 def _structured_analysis_from_markdown(raw_text: str, fallback_title: str):
-    sections = extract_analysis_sections(raw_text)
+    parsed = parse_analysis(raw_text)
+    sections = parsed.sections
     return StructuredPaperAnalysis(
-        chinese_title=extract_analysis_title(raw_text, fallback_title),
+        chinese_title=parsed.title_or(fallback_title),
         research_background=normalize_analysis_block_text(sections.get("研究对象和背景") or "（模型未给出相关内容）"),
         main_results=normalize_analysis_block_text(sections.get("主要定理或主要结果") or "（模型未给出相关内容）"),
         methods_and_tools=normalize_analysis_block_text(sections.get("研究方法、关键技术和核心工具") or "（模型未给出相关内容）"),
@@ -383,23 +444,32 @@ def _build_analysis_cleanup_messages(
     title=None,
     source_name="analysis",
     validation_feedback="",
+    field_names=None,
 ):
+    field_names = tuple(field_names or ANALYSIS_BLOCK_FIELDS)
     feedback_block = ""
     if validation_feedback:
         feedback_block = f"上一次输出未通过格式校验, 请重点修复以下问题并重新给出完整 blocks:\n{validation_feedback}\n\n"
+    partial_block = ""
+    if field_names != ANALYSIS_BLOCK_FIELDS:
+        partial_block = (
+            "本次只提交了本地检查未通过的 block, 其余 block 已经合格. "
+            f"请只返回以下字段: {', '.join(field_names)}\n\n"
+        )
 
+    block_inputs = "\n\n".join(
+        f"[{field_name}]\n{normalize_analysis_block_text(getattr(analysis_blocks, field_name))}"
+        for field_name in field_names
+    )
     prompt = (
         "请严格按照给定的结构化 schema 返回清洗后的分析 blocks. \n\n"
         f"{ANALYSIS_CLEANUP_REQUIREMENTS}\n\n"
+        f"{partial_block}"
         f"{feedback_block}"
         "论文元数据:\n"
         f"{_build_analysis_cleanup_metadata(paper=paper, title=title, source_name=source_name)}\n\n"
         "当前 block 输入:\n"
-        f"[chinese_title]\n{analysis_blocks.chinese_title}\n\n"
-        f"[research_background]\n{normalize_analysis_block_text(analysis_blocks.research_background)}\n\n"
-        f"[main_results]\n{normalize_analysis_block_text(analysis_blocks.main_results)}\n\n"
-        f"[methods_and_tools]\n{normalize_analysis_block_text(analysis_blocks.methods_and_tools)}\n\n"
-        f"[comparison_with_previous_work]\n{normalize_analysis_block_text(analysis_blocks.comparison_with_previous_work)}\n"
+        f"{block_inputs}\n"
     )
     return [
         {"role": "system", "content": "你是一位偏微分方程与分析理论方向的学术文本清洗助手. 请严格遵守返回 schema, 只做清洗和整理, 不重新分析论文. "},
@@ -407,6 +477,82 @@ def _build_analysis_cleanup_messages(
     ]
 
 
+ANALYSIS_BLOCK_FIELDS = tuple(StructuredPaperAnalysis.model_fields)
+
+_REPAIR_ENGINE = AnalysisRepairEngine(heading_matcher=lambda line: _match_section_heading(line))
+
+
+def _repair_analysis_blocks(analysis_blocks: StructuredPaperAnalysis):
+    """对全部 block 做本地确定性修复，返回 (新的 blocks, RepairReport)"""
+    if not ANALYSIS_LOCAL_REPAIR_ENABLED:
+        return analysis_blocks, RepairReport()
+    return _REPAIR_ENGINE.repair_blocks(analysis_blocks)
+
+
+def _analysis_block_issues(text: str):
+    """本地修复后仍然存在的问题，只能交给 cleanup 模型处理"""
+    issues = []
+    for bad_literal in find_display_math_escapes(text):
+        issues.append(f"存在非法块公式转义: {bad_literal}")
+    if CONTROL_CHAR_PATTERN.search(text):
+        issues.append("存在未清理的控制字符")
+    if text.count("$$") % 2:
+        issues.append("块公式分隔符 $$ 未配对")
+    elif has_unbalanced_inline_math(text):
+        issues.append("行内公式分隔符 $ 未配对")
+    if has_unbalanced_math_braces(text):
+        issues.append("公式中的花括号未配对")
+    if any(line.lstrip().startswith("#") and _match_section_heading(line)[0] for line in text.split("\n")):
+        issues.append("字段中混入了主章节标题")
+    return issues
+
+
+def _find_defective_blocks(analysis_blocks: StructuredPaperAnalysis):
+    """返回 {字段名: [问题]}；整篇校验失败但无法定位到具体 block 时，所有 block 都视为有问题"""
+    defects = {}
+    for field_name in ANALYSIS_BLOCK_FIELDS:
+        issues = _analysis_block_issues(getattr(analysis_blocks, field_name))
+        if issues:
+            defects[field_name] = issues
+    if not defects:
+        document_issues = validate_analysis_markdown(render_structured_analysis_markdown(analysis_blocks))
+        if document_issues:
+            defects = {field_name: document_issues for field_name in ANALYSIS_BLOCK_FIELDS}
+    return defects
+
+
+@functools.lru_cache(maxsize=None)
+def _cleanup_patch_model(field_names: tuple):
+    """只包含待修复字段的结构化模型，字段定义沿用 StructuredPaperAnalysis"""
+    if field_names == ANALYSIS_BLOCK_FIELDS:
+        return StructuredPaperAnalysis
+    fields = {field_name: (str, StructuredPaperAnalysis.model_fields[field_name]) for field_name in field_names}
+    return create_model(
+        "StructuredPaperAnalysisPatch",
+        __config__=ConfigDict(extra="forbid", str_strip_whitespace=True),
+        **fields,
+    )
+
+
+def _merge_cleanup_patch(analysis_blocks: StructuredPaperAnalysis, cleaned_patch, field_names):
+    updates = {}
+    for field_name in field_names:
+        value = str(getattr(cleaned_patch, field_name, "") or "").replace("\r\n", "\n").strip()
+        if value:
+            updates[field_name] = " ".join(value.split()) if field_name == "chinese_title" else value
+    return analysis_blocks.model_copy(update=updates)
+
+
+def _record_local_repairs(cleanup_meta, repair_report: RepairReport):
+    cleanup_meta["cleanup_local_repairs"] = repair_report.total
+    cleanup_meta["local_repair_rules"] = repair_report.to_dict()
+    if repair_report:
+        logger.info(
+            "本地修复完成: %s, 耗时 %.2f ms", format_repair_rules(repair_report.counts), repair_report.elapsed_ms
+        )
+
+
+@timed("analysis_cleanup")
 def _apply_analysis_cleanup(analysis_blocks: StructuredPaperAnalysis, paper=None, title=None, source_name="analysis"):
     cleanup_request = get_analysis_cleanup_request_config()
     cleanup_meta = dict(cleanup_request)
@@ -414,25 +560,45 @@ def _apply_analysis_cleanup(analysis_blocks: StructuredPaperAnalysis, paper=None
     cleanup_meta["cleanup_applied"] = False
     cleanup_meta["cleanup_structured_validated"] = False
     cleanup_meta["cleanup_validation_error"] = ""
+
+    # 先做本地确定性修复；不论是否开启 cleanup 模型，机械性的格式问题都在这里解决
+    current_blocks, repair_report = _repair_analysis_blocks(analysis_blocks)
+    _record_local_repairs(cleanup_meta, repair_report)
+    repaired_blocks = current_blocks
     if not cleanup_request.get("cleanup_requested") or get_analysis_cleanup_client() is None:
-        return analysis_blocks, {}, cleanup_meta
+        return current_blocks, {}, cleanup_meta
+
+    # 已经合格的输出不再调用 cleanup 模型
+    defects = _find_defective_blocks(current_blocks)
+    if not defects:
+        logger.info("分析 blocks 本地检查通过（本地修复 %s 处），跳过 cleanup 模型调用", repair_report.total)
+        cleanup_meta.update(
+            {
+                "cleanup_skipped": True,
+                "cleanup_structured_validated": True,
+                "cleanup_error": "",
+            }
+        )
+        return current_blocks, {}, cleanup_meta
 
     cleanup_meta["cleanup_attempted"] = True
+    cleanup_meta["cleanup_blocks"] = list(defects)
     total_cleanup_usage = {}
-    current_blocks = analysis_blocks
     validation_feedback = ""
 
     for attempt in range(1, CLEANUP_MAX_ATTEMPTS + 1):
+        field_names = tuple(defects)
         try:
-            cleaned_blocks, cleanup_usage, cleanup_state = get_analysis_cleanup_client().structured_chat_completion_with_usage(
+            cleaned_patch, cleanup_usage, cleanup_state = get_analysis_cleanup_client().structured_chat_completion_with_usage(
                 messages=_build_analysis_cleanup_messages(
                     current_blocks,
                     paper=paper,
                     title=title,
                     source_name=source_name,
                     validation_feedback=validation_feedback,
+                    field_names=field_names,
                 ),
-                response_model=StructuredPaperAnalysis,
+                response_model=_cleanup_patch_model(field_names),
                 thinking_mode=ANALYSIS_CLEANUP_THINKING_MODE,
                 return_response_state=True,
             )
@@ -450,9 +616,11 @@ def _apply_analysis_cleanup(analysis_blocks: StructuredPaperAnalysis, paper=None
                 }
             )
 
-            rendered = render_structured_analysis_markdown(cleaned_blocks)
-            validation_issues = validate_analysis_markdown(rendered)
-            if not validation_issues:
+            current_blocks = _merge_cleanup_patch(current_blocks, cleaned_patch, field_names)
+            current_blocks, patch_report = _repair_analysis_blocks(current_blocks)
+            _record_local_repairs(cleanup_meta, RepairReport().merge(repair_report).merge(patch_report))
+            defects = _find_defective_blocks(current_blocks)
+            if not defects:
                 cleanup_meta.update(
                     {
                         "cleanup_applied": True,
@@ -461,8 +629,9 @@ def _apply_analysis_cleanup(analysis_blocks: StructuredPaperAnalysis, paper=None
                         "cleanup_validation_error": "",
                     }
                 )
-                return cleaned_blocks, total_cleanup_usage, cleanup_meta
+                return current_blocks, total_cleanup_usage, cleanup_meta
 
+            validation_issues = [f"[{field_name}] {issue}" for field_name, issues in defects.items() for issue in issues]
             cleanup_meta["cleanup_validation_error"] = "; ".join(validation_issues)
             validation_feedback = "\n".join([f"- {issue}" for issue in validation_issues])
             logger.warning(
@@ -473,7 +642,6 @@ def _apply_analysis_cleanup(analysis_blocks: StructuredPaperAnalysis, paper=None
                 cleanup_meta.get("cleanup_effective_model"),
                 cleanup_meta["cleanup_validation_error"],
             )
-            current_blocks = cleaned_blocks
         except Exception as e:
             cleanup_meta["cleanup_error"] = str(e)
             logger.warning(
@@ -482,16 +650,19 @@ def _apply_analysis_cleanup(analysis_blocks: StructuredPaperAnalysis, paper=None
                 cleanup_meta.get("cleanup_effective_model"),
                 str(e),
             )
-            return analysis_blocks, total_cleanup_usage, cleanup_meta
+            _record_local_repairs(cleanup_meta, repair_report)
+            return repaired_blocks, total_cleanup_usage, cleanup_meta
 
     cleanup_meta["cleanup_error"] = cleanup_meta["cleanup_validation_error"] or "cleanup 输出未通过校验"
-    return analysis_blocks, total_cleanup_usage, cleanup_meta
+    _record_local_repairs(cleanup_meta, repair_report)
+    return repaired_blocks, total_cleanup_usage, cleanup_meta
 
 
+@timed("pdf_extract")
 def extract_pdf_text(pdf_path, max_pages=10):
     pymupdf_error = None
 
-    if fitz is not None:
+    if is_available(fitz):
         try:
             text_parts = []
             with fitz.open(pdf_path) as pdf:
@@ -540,7 +711,8 @@ def extract_pdf_text(pdf_path, max_pages=10):
         return f"PDF文本提取失败: {error_message}"
 
 
-def _build_structured_analysis_messages(pdf_content, paper=None, title=None):
+def build_analysis_messages(pdf_content, paper=None, title=None):
+    """构造完整分析请求的消息，运行时与 planner 的 token 预估共用"""
     if paper is not None:
         author_names = [author.name for author in paper.authors]
         paper_context = (
@@ -613,63 +785,6 @@ def _build_fallback_analysis_messages(pdf_content, paper=None, title=None):
     ]
 
 
-def _get_token_encoder(model_name=None):
-    if tiktoken is None:
-        return None
-
-    candidates = []
-    normalized_model = str(model_name or "").strip()
-    if normalized_model:
-        candidates.append(normalized_model)
-        if "/" in normalized_model:
-            candidates.append(normalized_model.rsplit("/", 1)[-1])
-
-    for candidate in candidates:
-        try:
-            return tiktoken.encoding_for_model(candidate)
-        except Exception:
-            continue
-
-    for encoding_name in ("o200k_base", "cl100k_base"):
-        try:
-            return tiktoken.get_encoding(encoding_name)
-        except Exception:
-            continue
-    return None
-
-
-def _estimate_text_tokens(text, model_name=None):
-    content = str(text or "")
-    if not content:
-        return 0
-
-    encoder = _get_token_encoder(model_name=model_name)
-    if encoder is not None:
-        try:
-            return len(encoder.encode(content))
-        except Exception:
-            pass
-
-    return max(1, len(content) // 4)
-
-
-def _estimate_message_tokens(messages, model_name=None):
-    total = 0
-    for message in messages or []:
-        role = ""
-        content = ""
-        if isinstance(message, dict):
-            role = str(message.get("role") or "")
-            content = str(message.get("content") or "")
-        else:
-            role = str(getattr(message, "role", "") or "")
-            content = str(getattr(message, "content", "") or "")
-        total += _estimate_text_tokens(role, model_name=model_name)
-        total += _estimate_text_tokens(content, model_name=model_name)
-        total += 4
-    return total
-
-
 def _count_extracted_pdf_pages(text):
     if not text:
         return 0
@@ -685,6 +800,8 @@ def _finalize_analysis_meta(response_state, structured_validated, structured_fal
     meta.setdefault("estimated_prompt_tokens", None)
     meta.setdefault("pdf_text_length", None)
     meta.setdefault("pdf_text_pages", None)
+    meta.setdefault("served_provider", meta.get("provider") or "")
+    meta.setdefault("served_model", meta.get("effective_model") or "")
     meta.setdefault("cleanup_requested", False)
     meta.setdefault("cleanup_attempted", False)
     meta.setdefault("cleanup_applied", False)
@@ -727,40 +844,29 @@ def _prepare_cached_analysis(request_state, cached_payload):
     return analysis_text, {}, meta
 
 
-def _build_classification_messages(paper, abstract):
-    author_names = [author.name for author in paper.authors]
-    prompt = (
-        "请严格按照给定的结构化 schema 返回分类结果. \n\n"
-        f"{CLASSIFICATION_CONTENT_REQUIREMENTS}\n\n"
-        "你需要判断论文与我关注主题的相关性, 并返回：\n"
-        "1. `priority`: 只能是 0、1、2. 0 表示不相关, 1 表示重点关注, 2 表示了解领域. \n"
-        "2. `reason`: 给出简短原因. priority 为 1 或 2 时尽量控制在 20 字左右. \n\n"
-        f"论文标题: {paper.title}\n"
-        f"作者: {', '.join(author_names)}\n"
-        f"摘要: {abstract}\n"
-        f"类别: {', '.join(paper.categories)}\n\n"
-        "我关注以下研究主题：\n\n"
-        "重点关注领域（优先级1）：\n"
-        f"{chr(10).join([f'- {topic}' for topic in PRIORITY_TOPICS])}\n\n"
-        "了解领域（优先级2）：\n"
-        f"{chr(10).join([f'- {topic}' for topic in SECONDARY_TOPICS])}\n"
-    )
-    return [
-        {"role": "system", "content": "你是一位偏微分方程与分析理论方向的学术论文分类专家. 请严格遵守返回 schema. "},
-        {"role": "user", "content": prompt},
-    ]
+# 分类提示词中不随论文变化的部分（说明、主题列表、回答格式）放在最前面，论文内容放在最后，
+# 各篇论文的请求因此共享逐字节相同的前缀，deepseek/qwen/openai 的自动前缀缓存可以复用
+_TOPIC_LIST_PROMPT = (
+    "我关注以下研究主题：\n\n"
+    "重点关注领域（优先级1）：\n"
+    f"{chr(10).join([f'- {topic}' for topic in PRIORITY_TOPICS])}\n\n"
+    "了解领域（优先级2）：\n"
+    f"{chr(10).join([f'- {topic}' for topic in SECONDARY_TOPICS])}\n"
+)
 
+CLASSIFICATION_PROMPT_PREFIX = (
+    "请严格按照给定的结构化 schema 返回分类结果. \n\n"
+    f"{CLASSIFICATION_CONTENT_REQUIREMENTS}\n\n"
+    f"{_TOPIC_LIST_PROMPT}\n"
+    "你需要判断下面这篇论文与上述主题的相关性, 并返回：\n"
+    "1. `priority`: 只能是 0、1、2. 0 表示不相关, 1 表示重点关注, 2 表示了解领域. \n"
+    "2. `reason`: 给出简短原因. priority 为 1 或 2 时尽量控制在 20 字左右. \n\n"
+    "待分类论文：\n"
+)
 
-def _build_classification_fallback_prompt(paper, abstract):
-    author_names = [author.name for author in paper.authors]
-    return f"""
+CLASSIFICATION_FALLBACK_PROMPT_PREFIX = f"""
         {CLASSIFICATION_CONTENT_REQUIREMENTS}
 
-        论文标题: {paper.title}
-        作者: {', '.join(author_names)}
-        摘要: {abstract}
-        类别: {', '.join(paper.categories)}
-
         我关注以下研究主题：
 
         重点关注领域（优先级1）：
@@ -769,7 +875,7 @@ def _build_classification_fallback_prompt(paper, abstract):
         了解领域（优先级2）：
         {chr(10).join([f"- {topic}" for topic in SECONDARY_TOPICS])}
 
-        请判断这篇论文是否与上述主题相关, 并指定优先级. 
+        请判断下面这篇论文是否与上述主题相关, 并指定优先级. 
 
         请只回答以下格式之一：
         优先级1 - 简述原因（不超过20字）
@@ -780,7 +886,31 @@ def _build_classification_fallback_prompt(paper, abstract):
         优先级1 - 研究了Navier-Stokes方程的存在性
         优先级2 - 涉及椭圆方程的正则性理论
         不相关
-        """
+
+        待分类论文：
+"""
+
+
+def _format_classification_paper(paper, abstract):
+    author_names = [author.name for author in paper.authors]
+    return (
+        f"论文标题: {paper.title}\n"
+        f"作者: {', '.join(author_names)}\n"
+        f"摘要: {abstract}\n"
+        f"类别: {', '.join(paper.categories)}\n"
+    )
+
+
+def build_classification_messages(paper, abstract):
+    """构造主题分类请求的消息，运行时与 planner 的 token 预估共用"""
+    return [
+        {"role": "system", "content": "你是一位偏微分方程与分析理论方向的学术论文分类专家. 请严格遵守返回 schema. "},
+        {"role": "user", "content": CLASSIFICATION_PROMPT_PREFIX + _format_classification_paper(paper, abstract)},
+    ]
+
+
+def _build_classification_fallback_prompt(paper, abstract):
+    return CLASSIFICATION_FALLBACK_PROMPT_PREFIX + _format_classification_paper(paper, abstract)
 
 
 def _parse_legacy_classification_result(result: str):
@@ -792,14 +922,38 @@ def _parse_legacy_classification_result(result: str):
     return 0, "不符合主题要求"
 
 
-def check_topic_relevance(paper):
-    arxiv_id = paper.get_short_id()
+def _build_classification_fallback_messages(paper, abstract):
+    return [
+        {"role": "system", "content": "你是一位偏微分方程与分析理论方向的学术论文分类专家. 请严格按照要求的格式回答. "},
+        {"role": "user", "content": _build_classification_fallback_prompt(paper, abstract)},
+    ]
+
 
-    cached = get_cached_classification(arxiv_id)
+def _get_cached_topic_relevance(paper):
+    cached = get_cached_classification(paper.get_short_id())
     if cached is not None:
         priority, reason = cached
         logger.info("[缓存命中] 分类结果: %s -> 优先级%s", paper.title, priority)
-        return priority, reason
+    return cached
+
+
+def _finish_topic_relevance(paper, priority, reason):
+    if priority == 1:
+        logger.info("论文符合重点关注主题: %s - %s", paper.title, reason)
+    elif priority == 2:
+        logger.info("论文符合了解主题: %s - %s", paper.title, reason)
+    else:
+        logger.info("论文不符合主题要求, 跳过: %s", paper.title)
+        reason = reason or "不符合主题要求"
+
+    cache_classification(paper.get_short_id(), priority, reason)
+    return priority, reason
+
+
+def check_topic_relevance(paper):
+    cached = _get_cached_topic_relevance(paper)
+    if cached is not None:
+        return cached
 
     try:
         abstract = paper.summary if hasattr(paper, "summary") else "无摘要"
@@ -807,7 +961,7 @@ def check_topic_relevance(paper):
         logger.info("正在检查主题相关性: %s", paper.title)
         try:
             structured, _ = get_ai_client().structured_chat_completion_with_usage(
-                messages=_build_classification_messages(paper, abstract),
+                messages=build_classification_messages(paper, abstract),
                 response_model=StructuredTopicClassification,
                 json_schema_prompt=True,
             )
@@ -815,31 +969,204 @@ def check_topic_relevance(paper):
             reason = structured.reason
             logger.info("主题相关性检查结果(结构化): priority=%s, reason=%s", priority, reason)
         except Exception as structured_error:
+            if is_circuit_open_error(structured_error):
+                raise
             logger.warning("结构化分类失败, 将回退到普通文本模式: %s", str(structured_error))
             result = get_ai_client().chat_completion(
-                messages=[
-                    {"role": "system", "content": "你是一位偏微分方程与分析理论方向的学术论文分类专家. 请严格按照要求的格式回答. "},
-                    {"role": "user", "content": _build_classification_fallback_prompt(paper, abstract)},
-                ]
+                messages=_build_classification_fallback_messages(paper, abstract)
             )
             priority, reason = _parse_legacy_classification_result(result)
             logger.info("主题相关性检查结果(回退): priority=%s, reason=%s", priority, reason)
 
-        if priority == 1:
-            logger.info("论文符合重点关注主题: %s - %s", paper.title, reason)
-        elif priority == 2:
-            logger.info("论文符合了解主题: %s - %s", paper.title, reason)
-        else:
-            logger.info("论文不符合主题要求, 跳过: %s", paper.title)
-            reason = reason or "不符合主题要求"
+        return _finish_topic_relevance(paper, priority, reason)
+    except Exception as e:
+        logger.error("检查主题相关性失败 %s: %s", paper.title, str(e))
+        return 2, f"检查出错, 默认处理: {str(e)}"
+
+
+async def acheck_topic_relevance(paper):
+    """check_topic_relevance 的异步版本，供 batch 模块并发调用"""
+    cached = _get_cached_topic_relevance(paper)
+    if cached is not None:
+        return cached
+
+    try:
+        abstract = paper.summary if hasattr(paper, "summary") else "无摘要"
 
-        cache_classification(arxiv_id, priority, reason)
-        return priority, reason
+        logger.info("正在检查主题相关性: %s", paper.title)
+        try:
+            structured, _ = await get_ai_client().astructured_chat_completion_with_usage(
+                messages=build_classification_messages(paper, abstract),
+                response_model=StructuredTopicClassification,
+                json_schema_prompt=True,
+            )
+            priority = structured.priority
+            reason = structured.reason
+            logger.info("主题相关性检查结果(结构化): priority=%s, reason=%s", priority, reason)
+        except Exception as structured_error:
+            if is_circuit_open_error(structured_error):
+                raise
+            logger.warning("结构化分类失败, 将回退到普通文本模式: %s", str(structured_error))
+            result = await get_ai_client().achat_completion(
+                messages=_build_classification_fallback_messages(paper, abstract)
+            )
+            priority, reason = _parse_legacy_classification_result(result)
+            logger.info("主题相关性检查结果(回退): priority=%s, reason=%s", priority, reason)
+
+        return _finish_topic_relevance(paper, priority, reason)
     except Exception as e:
         logger.error("检查主题相关性失败 %s: %s", paper.title, str(e))
         return 2, f"检查出错, 默认处理: {str(e)}"
 
 
+class SpeculativeAnalysisError(Exception):
+    """推测执行中结构化分析与文本回退都失败"""
+
+
+def _structured_analysis_attempt(structured_messages, thinking_mode, request_state, **request_kwargs):
+    """
+    发起结构化分析，并把成败记入按提供商/模型统计的结构化成功率
+
+    request_kwargs（cancel_event、hedge）原样传给 AI 客户端；被取消的请求不计入成功率
+    """
+    provider, model = request_state.get("provider"), request_state.get("effective_model")
+    try:
+        structured_result, usage, response_state = get_ai_client().structured_chat_completion_with_usage(
+            messages=structured_messages,
+            response_model=StructuredPaperAnalysis,
+            thinking_mode=thinking_mode,
+            return_response_state=True,
+            **request_kwargs,
+        )
+    except Exception as e:
+        if not is_circuit_open_error(e) and not isinstance(e, RequestCancelledError):
+            record_structured_outcome(provider, model, success=False)
+        raise
+    record_structured_outcome(provider, model, success=True)
+    analysis_meta = _finalize_analysis_meta(
+        {**response_state, **request_state},
+        structured_validated=True,
+        structured_fallback=False,
+    )
+    return structured_result, render_structured_analysis_markdown(structured_result), usage, analysis_meta
+
+
+def _fallback_analysis_attempt(
+    pdf_content, request_state, paper=None, title=None, fallback_title=None, structured_error="", **request_kwargs
+):
+    """普通文本模式分析，返回与结构化分析相同的 (blocks, markdown, usage, meta)"""
+    if paper is not None:
+        fallback_messages = _build_fallback_analysis_messages(pdf_content, paper=paper)
+    else:
+        fallback_messages = _build_fallback_analysis_messages(pdf_content, title=title)
+    analysis, usage, response_state = get_ai_client().chat_completion_with_usage(
+        messages=fallback_messages,
+        thinking_mode=False,
+        return_response_state=True,
+        **request_kwargs,
+    )
+    normalized = normalize_analysis_markdown(analysis, extract_analysis_title(analysis, fallback_title))
+    analysis_meta = _finalize_analysis_meta(
+        {
+            **response_state,
+            **request_state,
+            "thinking_requested": False,
+            "thinking_applied": False,
+            "thinking_budget": None,
+            "thinking_effort": None,
+            "structured_output_mode": "prompt_fallback",
+        },
+        structured_validated=False,
+        structured_fallback=True,
+        structured_error=structured_error,
+    )
+    return _structured_analysis_from_markdown(normalized, fallback_title), normalized, usage, analysis_meta
+
+
+def _should_speculate(request_state):
+    """只对历史结构化成功率偏低且样本足够的提供商/模型启用推测式回退"""
+    if not SPECULATIVE_FALLBACK_ENABLED:
+        return False
+    success_rate, samples = get_structured_success_rate(request_state.get("provider"), request_state.get("effective_model"))
+    return (
+        success_rate is not None
+        and samples >= SPECULATIVE_FALLBACK_MIN_SAMPLES
+        and success_rate < SPECULATIVE_FALLBACK_MAX_SUCCESS_RATE
+    )
+
+
+def _run_speculative_analysis(structured_messages, thinking_mode, request_state, run_fallback, delay=None):
+    """
+    结构化分析超过 delay 秒仍未完成时并行启动文本回退，取先成功的结果
+
+    delay 内结构化分析失败时直接抛出原异常，由调用方按普通流程回退；
+    两路都失败时抛出 SpeculativeAnalysisError。
+
+    两路都在共享线程池中执行且不再发对冲请求，每篇论文同时在途的请求不超过两个。
+    同步 HTTP 请求无法中断，落败一方通过 CancelToken 在当前请求结束后停止重试，其结果被丢弃
+    """
+    delay = SPECULATIVE_FALLBACK_DELAY_SECONDS if delay is None else delay
+    executor = get_shared_executor()
+    cancel_tokens = {"structured": CancelToken(), "fallback": CancelToken()}
+    structured_future = executor.submit(
+        _structured_analysis_attempt,
+        structured_messages,
+        thinking_mode,
+        request_state,
+        cancel_event=cancel_tokens["structured"],
+        hedge=False,
+    )
+    done, _ = wait([structured_future], timeout=delay)
+    if done:
+        return structured_future.result()
+
+    logger.info("结构化分析 %.0fs 内未完成，并行启动文本回退", delay)
+    fallback_future = executor.submit(
+        run_fallback,
+        f"推测执行: 结构化分析 {delay:.0f}s 内未完成",
+        cancel_event=cancel_tokens["fallback"],
+        hedge=False,
+    )
+    pending = {structured_future: "structured", fallback_future: "fallback"}
+    errors = {}
+    while pending:
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            kind = pending.pop(future)
+            try:
+                analysis_blocks, normalized, usage, analysis_meta = future.result()
+            except Exception as e:
+                errors[kind] = e
+                continue
+            for loser, loser_kind in pending.items():
+                cancel_tokens[loser_kind].set()
+                loser.cancel()
+            analysis_meta["speculative_fallback"] = True
+            analysis_meta["speculative_winner"] = kind
+            logger.info("推测执行完成，采用%s结果", "结构化" if kind == "structured" else "文本回退")
+            return analysis_blocks, normalized, usage, analysis_meta
+
+    if any(is_circuit_open_error(error) for error in errors.values()):
+        raise errors.get("structured") or errors["fallback"]
+    raise SpeculativeAnalysisError(
+        f"结构化分析失败: {errors.get('structured')}; 文本回退失败: {errors.get('fallback')}"
+    ) from errors.get("fallback")
+
+
+def build_analysis_request_state(thinking_mode=None):
+    """完整分析的请求配置，同时决定分析缓存的 key；只读取本地配置，不发起请求"""
+    return {
+        **get_ai_client().get_analysis_request_config(thinking_mode=thinking_mode),
+        **get_analysis_cleanup_request_config(),
+        "analysis_schema_version": ANALYSIS_SCHEMA_VERSION,
+        "local_repair_enabled": ANALYSIS_LOCAL_REPAIR_ENABLED,
+    }
+
+
+def has_cached_analysis(cache_id, thinking_mode=None):
+    return get_cached_analysis(build_analysis_cache_key(cache_id, build_analysis_request_state(thinking_mode))) is not None
+
+
 def _run_analysis_pipeline(
     pdf_path,
     cache_id,
@@ -852,16 +1179,11 @@ def _run_analysis_pipeline(
     include_prompt_estimate=False,
     source_name="analysis",
 ):
-    request_state = {
-        **get_ai_client().get_analysis_request_config(thinking_mode=thinking_mode),
-        **get_analysis_cleanup_request_config(),
-        "analysis_schema_version": ANALYSIS_SCHEMA_VERSION,
-    }
-    cache_key = build_analysis_cache_key(cache_id, request_state)
+    request_state = build_analysis_request_state(thinking_mode=thinking_mode)
     effective_model = request_state.get("effective_model")
 
     if use_cache:
-        cached = get_cached_analysis(cache_key)
+        cached = get_cached_analysis(build_analysis_cache_key(cache_id, request_state))
         if cached is not None:
             logger.info("[缓存命中] 分析结果: %s", display_name)
             return _prepare_cached_analysis(request_state, cached)
@@ -871,62 +1193,47 @@ def _run_analysis_pipeline(
 
         fallback_title = title
         if paper is not None:
-            structured_messages = _build_structured_analysis_messages(pdf_content, paper=paper)
+            structured_messages = build_analysis_messages(pdf_content, paper=paper)
             fallback_title = paper.title
         else:
             if not title:
                 title = Path(pdf_path).stem.replace("_", " ").replace("-", " ")
                 fallback_title = title
-            structured_messages = _build_structured_analysis_messages(pdf_content, title=title)
+            structured_messages = build_analysis_messages(pdf_content, title=title)
 
         estimated_prompt_tokens = None
         if include_prompt_estimate:
-            estimated_prompt_tokens = _estimate_message_tokens(structured_messages, model_name=effective_model)
+            estimated_prompt_tokens = estimate_message_tokens(structured_messages, model_name=effective_model)
         effective_thinking = request_state.get("thinking_applied")
         mode_str = " (深度思考模式)" if effective_thinking else ""
         logger.info("正在分析%s: %s", mode_str, display_name)
 
-        try:
-            structured_result, usage, response_state = get_ai_client().structured_chat_completion_with_usage(
-                messages=structured_messages,
-                response_model=StructuredPaperAnalysis,
-                thinking_mode=thinking_mode,
-                return_response_state=True,
+        def run_fallback(structured_error="", **request_kwargs):
+            return _fallback_analysis_attempt(
+                pdf_content,
+                request_state,
+                paper=paper,
+                title=title,
+                fallback_title=fallback_title,
+                structured_error=structured_error,
+                **request_kwargs,
             )
-            analysis_meta = _finalize_analysis_meta(
-                {**response_state, **request_state},
-                structured_validated=True,
-                structured_fallback=False,
-            )
-            analysis_blocks = structured_result
-            normalized = render_structured_analysis_markdown(analysis_blocks)
+
+        try:
+            if _should_speculate(request_state):
+                analysis_blocks, normalized, usage, analysis_meta = _run_speculative_analysis(
+                    structured_messages, thinking_mode, request_state, run_fallback
+                )
+            else:
+                analysis_blocks, normalized, usage, analysis_meta = _structured_analysis_attempt(
+                    structured_messages, thinking_mode, request_state
+                )
         except Exception as structured_error:
+            if is_circuit_open_error(structured_error) or isinstance(structured_error, SpeculativeAnalysisError):
+                # 提供商已熔断时文本回退同样会快速失败；推测执行已经跑过回退，都直接交给外层处理
+                raise
             logger.warning("结构化分析失败, 将回退到普通文本模式: %s", str(structured_error))
-            if paper is not None:
-                fallback_messages = _build_fallback_analysis_messages(pdf_content, paper=paper)
-            else:
-                fallback_messages = _build_fallback_analysis_messages(pdf_content, title=title)
-            analysis, usage, response_state = get_ai_client().chat_completion_with_usage(
-                messages=fallback_messages,
-                thinking_mode=False,
-                return_response_state=True,
-            )
-            normalized = normalize_analysis_markdown(analysis, extract_analysis_title(analysis, fallback_title))
-            analysis_meta = _finalize_analysis_meta(
-                {
-                    **response_state,
-                    **request_state,
-                    "thinking_requested": False,
-                    "thinking_applied": False,
-                    "thinking_budget": None,
-                    "thinking_effort": None,
-                    "structured_output_mode": "prompt_fallback",
-                },
-                structured_validated=False,
-                structured_fallback=True,
-                structured_error=str(structured_error),
-            )
-            analysis_blocks = _structured_analysis_from_markdown(normalized, fallback_title)
+            analysis_blocks, normalized, usage, analysis_meta = run_fallback(str(structured_error))
 
         cleaned_blocks, cleanup_usage, cleanup_meta = _apply_analysis_cleanup(
             analysis_blocks,
@@ -934,7 +1241,7 @@ def _run_analysis_pipeline(
             title=title,
             source_name=source_name,
         )
-        if cleanup_meta.get("cleanup_applied"):
+        if cleanup_meta.get("cleanup_applied") or cleanup_meta.get("cleanup_local_repairs"):
             normalized = render_structured_analysis_markdown(cleaned_blocks)
         usage = _merge_usage(usage, cleanup_usage)
         analysis_meta.update(cleanup_meta)
@@ -945,9 +1252,11 @@ def _run_analysis_pipeline(
 
         logger.info("分析完成: %s", display_name)
         logger.info(
-            "分析请求配置: provider=%s, model=%s, thinking=%s, fallback=%s, reasoning=%s, structured=%s, cleanup=%s",
+            "分析请求配置: provider=%s, model=%s, served=%s/%s, thinking=%s, fallback=%s, reasoning=%s, structured=%s, cleanup=%s",
             analysis_meta.get("provider"),
             analysis_meta.get("effective_model"),
+            analysis_meta.get("served_provider"),
+            analysis_meta.get("served_model"),
             analysis_meta.get("thinking_applied"),
             analysis_meta.get("fallback_used"),
             analysis_meta.get("reasoning_content_present"),
@@ -956,8 +1265,9 @@ def _run_analysis_pipeline(
         )
         if usage:
             logger.info(
-                "Token用量: 输入=%s, 输出=%s, 总计=%s",
+                "Token用量: 输入=%s (缓存命中=%s), 输出=%s, 总计=%s",
                 usage.get("prompt_tokens", 0),
+                usage.get("cached_prompt_tokens", 0),
                 usage.get("completion_tokens", 0),
                 usage.get("total_tokens", 0),
             )
@@ -968,7 +1278,8 @@ def _run_analysis_pipeline(
         return normalized, usage, analysis_meta
     except Exception as e:
         logger.error("分析失败 %s (%s): %s", display_name, effective_model, str(e))
-        return f"**分析出错**: {str(e)}", {}, {}
+        error_meta = {"circuit_open": True} if is_circuit_open_error(e) else {}
+        return f"**分析出错**: {str(e)}", {}, error_meta
 
 
 def analyze_paper(pdf_path, paper, max_pages=10, use_cache=True, thinking_mode=None, include_prompt_estimate=False):
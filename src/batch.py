@@ -0,0 +1,123 @@
+# batch.py - 异步批量请求模块
+# 分类与翻译请求几乎全部时间都在等待 HTTP 响应，用 asyncio 在单线程内并发发起，
+# 通过信号量控制同时在途的请求数，不需要为每个请求占用一个线程
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+from analyzer import acheck_topic_relevance
+from config import ASYNC_CONCURRENCY
+from timeline import get_timeline, span
+from translator import atranslate_abstract
+
+logger = logging.getLogger(__name__)
+
+
+async def _cancel_when(should_abort: Callable[[], bool], tasks: List[asyncio.Future], poll_seconds: float):
+    while not should_abort():
+        await asyncio.sleep(poll_seconds)
+    for task in tasks:
+        task.cancel()
+
+
+async def gather_bounded(
+    items: Iterable,
+    worker: Callable[..., Awaitable],
+    concurrency: int = ASYNC_CONCURRENCY,
+    should_stop: Optional[Callable[[], bool]] = None,
+    should_abort: Optional[Callable[[], bool]] = None,
+    poll_seconds: float = 0.1,
+) -> List:
+    """
+    并发执行 worker(item)，同时在途的协程不超过 concurrency 个
+
+    Args:
+        should_stop: 返回 True 后不再启动新的 worker，已在途的照常完成
+        should_abort: 返回 True 后取消全部在途的 worker
+
+    Returns:
+        与 items 顺序一致的结果列表，执行失败、未启动或被取消的条目为 None
+    """
+    items = list(items)
+    semaphore = asyncio.Semaphore(max(int(concurrency or 1), 1))
+    skipped = 0
+
+    async def run_one(item):
+        nonlocal skipped
+        queued_at = time.monotonic()
+        async with semaphore:
+            # 等待信号量的时间记为排队时间
+            get_timeline().record("async_queue", queued_at, time.monotonic() - queued_at)
+            if should_stop is not None and should_stop():
+                skipped += 1
+                return None
+            with span("async_task"):
+                return await worker(item)
+
+    tasks = [asyncio.ensure_future(run_one(item)) for item in items]
+    watcher = None
+    if should_abort is not None:
+        watcher = asyncio.ensure_future(_cancel_when(should_abort, tasks, poll_seconds))
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+
+    normalized = []
+    for item, result in zip(items, results):
+        if isinstance(result, asyncio.CancelledError):
+            skipped += 1
+            normalized.append(None)
+        elif isinstance(result, BaseException):
+            logger.error(f"异步批量任务失败 {getattr(item, 'title', item)}: {str(result)}")
+            normalized.append(None)
+        else:
+            normalized.append(result)
+    if skipped:
+        logger.warning(f"异步批量任务被中止，{skipped} 个任务未执行或已取消")
+    return normalized
+
+
+def run_async_batch(items: Iterable, worker: Callable[..., Awaitable], concurrency: int = ASYNC_CONCURRENCY, **kwargs) -> List:
+    """在新的事件循环中运行 gather_bounded，供同步代码调用"""
+    return asyncio.run(gather_bounded(items, worker, concurrency=concurrency, **kwargs))
+
+
+async def _classify_and_translate(paper):
+    """先分类，再按优先级完成对应的翻译；结果写入缓存，后续线程池处理时直接命中"""
+    priority, reason = await acheck_topic_relevance(paper)
+    if priority == 2:
+        await atranslate_abstract(paper)
+    elif priority == 0:
+        await atranslate_abstract(paper, translate_title_only=True)
+    return priority, reason
+
+
+def prefetch_paper_results(papers: Iterable, concurrency: Optional[int] = None, shutdown=None) -> dict:
+    """
+    并发预取全部论文的分类与翻译结果
+
+    重点论文（优先级1）的完整分析仍由线程池负责，这里只处理轻量请求。
+    传入 main.GracefulShutdown 时，收到终止信号后不再发起新的预取，宽限期结束时取消在途请求。
+
+    Returns:
+        {arxiv_id: (priority, reason)}，失败的论文不在其中
+    """
+    papers = list(papers)
+    concurrency = concurrency or ASYNC_CONCURRENCY
+    logger.info(f"异步预取 {len(papers)} 篇论文的分类与翻译结果，并发数 {concurrency}")
+
+    stop_kwargs = {}
+    if shutdown is not None:
+        stop_kwargs = {"should_stop": lambda: shutdown.requested, "should_abort": shutdown.grace_expired}
+    results = run_async_batch(papers, _classify_and_translate, concurrency=concurrency, **stop_kwargs)
+    prefetched = {
+        paper.get_short_id(): result
+        for paper, result in zip(papers, results)
+        if result is not None
+    }
+    logger.info(f"异步预取完成: {len(prefetched)}/{len(papers)} 篇")
+    return prefetched
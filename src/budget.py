@@ -0,0 +1,198 @@
+# budget.py - 运行用量与预算模块
+# 累计本次运行的 token、费用与提示词前缀缓存命中，按预算消耗比例逐级降级；
+# 预算、单价等配置由 config 在创建全局实例时传入，本模块不读取环境变量
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PromptCacheStats:
+    """累计本次运行的输入 token 与提供商前缀缓存命中的 token，衡量提示词缓存的节省效果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+
+    def record(self, usage):
+        if not usage:
+            return
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+            self.cached_prompt_tokens += int(usage.get("cached_prompt_tokens") or 0)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_prompt_tokens": self.cached_prompt_tokens,
+                "hit_rate": round(self.cached_prompt_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+            }
+
+
+# 预算降级的顺序：关闭深度思考 -> 关闭 cleanup -> 减少 PDF 页数 -> 重点论文只翻译摘要
+BUDGET_DEGRADATION_STEPS = (
+    ("disable_thinking", "关闭深度思考"),
+    ("disable_cleanup", "关闭 cleanup"),
+    ("reduce_pages", "减少 PDF 提取页数"),
+    ("abstract_only", "重点论文改为摘要翻译"),
+)
+
+
+class BudgetGovernor:
+    """
+    实时累计本次运行的 token 与费用，按预算消耗比例逐级降级
+
+    消耗比例取 token、费用、耗时三者中最高的一项；每越过一个阈值启用下一级降级，
+    降级只进不退，每一级的触发时刻都记录下来写入 run_meta 与报告头部。
+    """
+
+    def __init__(
+        self,
+        token_budget=0,
+        cost_budget=0.0,
+        time_budget_seconds=0.0,
+        thresholds=(0.5, 0.7, 0.85, 0.95),
+        input_price_per_mtok=0.0,
+        output_price_per_mtok=0.0,
+        reduced_max_pages=5,
+    ):
+        self.token_budget = token_budget
+        self.cost_budget = cost_budget
+        self.time_budget_seconds = time_budget_seconds
+        self.thresholds = list(thresholds)[:len(BUDGET_DEGRADATION_STEPS)]
+        self.input_price_per_mtok = input_price_per_mtok
+        self.output_price_per_mtok = output_price_per_mtok
+        self.reduced_max_pages = reduced_max_pages
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started_at = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.level = 0
+        self.degradations = []
+        self.downgraded_papers = 0
+
+    @property
+    def enabled(self):
+        return bool(self.token_budget or self.cost_budget or self.time_budget_seconds) and bool(self.thresholds)
+
+    def start(self, now=None):
+        with self._lock:
+            self.started_at = time.monotonic() if now is None else now
+
+    def elapsed_seconds(self, now=None):
+        if self.started_at is None:
+            return 0.0
+        return max((time.monotonic() if now is None else now) - self.started_at, 0.0)
+
+    def record(self, usage):
+        if not usage:
+            return
+        prompt_tokens = int(usage.get("prompt_tokens") or 0)
+        completion_tokens = int(usage.get("completion_tokens") or 0)
+        if not completion_tokens and usage.get("total_tokens"):
+            completion_tokens = max(int(usage.get("total_tokens") or 0) - prompt_tokens, 0)
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cost += (
+                prompt_tokens * self.input_price_per_mtok + completion_tokens * self.output_price_per_mtok
+            ) / 1_000_000
+        self._update_level()
+
+    def consumed_fraction(self, now=None):
+        fractions = [0.0]
+        if self.token_budget:
+            fractions.append((self.prompt_tokens + self.completion_tokens) / self.token_budget)
+        if self.cost_budget:
+            fractions.append(self.cost / self.cost_budget)
+        if self.time_budget_seconds and self.started_at is not None:
+            fractions.append(self.elapsed_seconds(now) / self.time_budget_seconds)
+        return max(fractions)
+
+    def _update_level(self, now=None):
+        if not self.enabled:
+            return 0
+        fraction = self.consumed_fraction(now)
+        with self._lock:
+            while self.level < len(self.thresholds) and fraction >= self.thresholds[self.level]:
+                action, label = BUDGET_DEGRADATION_STEPS[self.level]
+                self.level += 1
+                event = {
+                    "action": action,
+                    "threshold": self.thresholds[self.level - 1],
+                    "consumed": round(fraction, 4),
+                    "tokens": self.prompt_tokens + self.completion_tokens,
+                    "cost": round(self.cost, 6),
+                    "elapsed_seconds": round(self.elapsed_seconds(now), 1),
+                }
+                self.degradations.append(event)
+                logger.warning(
+                    "预算已消耗 %.0f%%，降级: %s (tokens=%s, cost=%.4f, elapsed=%.0fs)",
+                    fraction * 100,
+                    label,
+                    event["tokens"],
+                    event["cost"],
+                    event["elapsed_seconds"],
+                )
+            return self.level
+
+    def is_active(self, action):
+        level = self._update_level()
+        for index, (step, _) in enumerate(BUDGET_DEGRADATION_STEPS):
+            if step == action:
+                return level > index
+        return False
+
+    def effective_thinking_mode(self, thinking_mode):
+        return False if self.is_active("disable_thinking") else thinking_mode
+
+    def effective_max_pages(self, max_pages):
+        if not self.is_active("reduce_pages"):
+            return max_pages
+        return self.reduced_max_pages if max_pages is None else min(max_pages, self.reduced_max_pages)
+
+    def record_downgraded_paper(self):
+        with self._lock:
+            self.downgraded_papers += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "cost_budget": self.cost_budget,
+                "time_budget_seconds": self.time_budget_seconds,
+                "tokens": self.prompt_tokens + self.completion_tokens,
+                "cost": round(self.cost, 6),
+                "elapsed_seconds": round(self.elapsed_seconds(), 1),
+                "consumed": round(self.consumed_fraction(), 4),
+                "level": self.level,
+                "degradations": [dict(event) for event in self.degradations],
+                "downgraded_papers": self.downgraded_papers,
+            }
+
+
+def format_budget_degradations(budget):
+    """把预算快照中的降级记录格式化为一行，如 "关闭深度思考 (50%) → 关闭 cleanup (70%)" """
+    labels = dict(BUDGET_DEGRADATION_STEPS)
+    parts = [
+        f"{labels.get(event['action'], event['action'])} ({event['consumed']:.0%})"
+        for event in (budget or {}).get("degradations", [])
+    ]
+    text = " → ".join(parts)
+    if (budget or {}).get("downgraded_papers"):
+        text += f"，{budget['downgraded_papers']} 篇重点论文改为摘要翻译"
+    return text
@@ -4,6 +4,7 @@
 import json
 import hashlib
 import logging
+import threading
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Any
@@ -22,6 +23,28 @@ CACHE_EXPIRY_HOURS = {
 }
 
 
+# 本次运行中各类缓存的命中/未命中次数，供运行指标导出
+_lookup_stats = {}
+_lookup_lock = threading.Lock()
+
+
+def _record_lookup(cache_type: str, hit: bool):
+    with _lookup_lock:
+        stats = _lookup_stats.setdefault(cache_type, {"hits": 0, "misses": 0})
+        stats["hits" if hit else "misses"] += 1
+
+
+def get_cache_lookup_stats() -> dict:
+    """返回 {cache_type: {"hits": n, "misses": n}}"""
+    with _lookup_lock:
+        return {cache_type: dict(stats) for cache_type, stats in _lookup_stats.items()}
+
+
+def reset_cache_lookup_stats():
+    with _lookup_lock:
+        _lookup_stats.clear()
+
+
 def _ensure_cache_dir():
     """确保缓存目录存在"""
     CACHE_DIR.mkdir(parents=True, exist_ok=True)
@@ -66,6 +89,7 @@ def get_cache(cache_type: str, key: str) -> Optional[Any]:
     cache_path = _get_cache_path(cache_type, key)
     
     if not cache_path.exists():
+        _record_lookup(cache_type, hit=False)
         return None
     
     try:
@@ -74,13 +98,16 @@ def get_cache(cache_type: str, key: str) -> Optional[Any]:
         
         if _is_cache_valid(cache_data, cache_type):
             logger.debug(f"缓存命中: {cache_type}/{key}")
+            _record_lookup(cache_type, hit=True)
             return cache_data.get("data")
         else:
             logger.debug(f"缓存过期: {cache_type}/{key}")
+            _record_lookup(cache_type, hit=False)
             return None
             
     except (json.JSONDecodeError, KeyError) as e:
         logger.warning(f"缓存读取失败: {cache_path}, 错误: {e}")
+        _record_lookup(cache_type, hit=False)
         return None
 
 
@@ -229,12 +256,13 @@ def build_analysis_cache_key(base_key: str, request_state: Optional[dict] = None
     cleanup_budget = state.get("cleanup_budget") if cleanup_enabled else None
     cleanup_effort = state.get("cleanup_effort") if cleanup_enabled else ""
     cleanup_budget_part = "" if cleanup_budget is None else str(cleanup_budget)
+    local_repair = "on" if state.get("local_repair_enabled") else "off"
     return (
         f"{base_key}|{provider}|{model}|thinking={thinking_applied}|budget={budget_part}|"
         f"effort={effort}|schema={schema_version}|structured={structured_mode}|"
         f"cleanup={cleanup_state}|cleanup_provider={cleanup_provider or 'none'}|"
         f"cleanup_model={cleanup_model or 'none'}|cleanup_thinking={cleanup_thinking}|"
-        f"cleanup_budget={cleanup_budget_part}|cleanup_effort={cleanup_effort}"
+        f"cleanup_budget={cleanup_budget_part}|cleanup_effort={cleanup_effort}|local_repair={local_repair}"
     )
 
 
@@ -1,15 +1,50 @@
 # config.py - 配置文件
 
 import ast
+import asyncio
+import functools
 import json
 import logging
 import os
+import random
 import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
-import instructor
 from dotenv import load_dotenv
-from litellm import completion
+
+# 以下运行时组件在各自的模块中，这里导入的名称同时保留 config.X 的访问方式
+from budget import BUDGET_DEGRADATION_STEPS, BudgetGovernor, PromptCacheStats, format_budget_degradations
+from lazy import LazyModule
+from resilience import (
+    CancelToken,
+    CircuitBreaker,
+    CircuitOpenError,
+    HedgeStats,
+    LatencyTracker,
+    RequestCancelledError,
+    get_circuit_breaker_stats,
+    is_circuit_open_error,
+    reset_circuit_breakers,
+    root_cause,
+)
+from resilience import get_circuit_breaker as _get_shared_circuit_breaker
+from streaming import (
+    StreamedResponse,
+    StreamStalledError,
+    aconsume_stream,
+    coerce_text_block,
+    consume_stream,
+    read_attr_or_key,
+    stream_kwargs,
+)
+from timeline import network_bound, network_wait, record_ai_attempt, record_ai_usage, timed, timed_ai_call
+
+# litellm 和 instructor 导入耗时数秒，只在真正发起 AI 请求时加载
+litellm = LazyModule("litellm")
+instructor = LazyModule("instructor")
 
 load_dotenv()
 
@@ -52,6 +87,55 @@ def _get_bool_env(name, default="off"):
     return result
 
 
+def _parse_thresholds(raw_value):
+    """解析逗号分隔的比例阈值，返回升序列表"""
+    thresholds = []
+    for part in str(raw_value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            thresholds.append(min(max(float(part), 0.0), 1.0))
+        except ValueError:
+            logger.warning(f"忽略无法解析的预算阈值: {part}")
+    return sorted(thresholds)
+
+
+_REPLAY_MODES = ("off", "record", "replay")
+
+
+def _parse_replay_mode(raw_value):
+    mode = str(raw_value or "off").strip().lower() or "off"
+    if mode not in _REPLAY_MODES:
+        logger.warning(f"REPLAY_MODE 的值 '{raw_value}' 无效 (支持: {'/'.join(_REPLAY_MODES)})，将不启用录制/回放")
+        return "off"
+    return mode
+
+
+def _parse_latency_spec(raw_value):
+    """
+    解析回放延迟配置
+
+    Returns:
+        ("recorded",) 按录制时的耗时；("off",) 不等待；("fixed", 秒)；("lognormal", 中位数秒, sigma)
+    """
+    spec = str(raw_value or "recorded").strip().lower() or "recorded"
+    kind, _, params = spec.partition(":")
+    try:
+        if kind in ("recorded", "off") and not params:
+            return (kind,)
+        if kind == "fixed":
+            return ("fixed", max(float(params), 0.0))
+        if kind == "lognormal":
+            median, sigma = (float(part) for part in params.split(","))
+            if median > 0 and sigma >= 0:
+                return ("lognormal", median, sigma)
+    except ValueError:
+        pass
+    logger.warning(f"无法解析的回放延迟配置: {raw_value}，将按录制时的耗时回放")
+    return ("recorded",)
+
+
 def _get_optional_bool_env(name):
     value = os.getenv(name)
     if value in (None, ""):
@@ -75,6 +159,23 @@ CUSTOM_API_BASE = os.getenv("CUSTOM_API_BASE")
 CUSTOM_API_KEY = os.getenv("CUSTOM_API_KEY")
 AI_PROVIDER = os.getenv("AI_PROVIDER", "qwen")
 AI_MODEL = os.getenv("AI_MODEL", "qwen-turbo")
+# 多提供商负载均衡池，格式: provider:model[:weight],...；第一项作为缓存键与请求配置的基准
+AI_PROVIDER_POOL = os.getenv("AI_PROVIDER_POOL", "").strip()
+AI_POOL_FAILOVER_THRESHOLD = max(int(os.getenv("AI_POOL_FAILOVER_THRESHOLD", "3")), 1)
+AI_POOL_COOLDOWN_SECONDS = max(float(os.getenv("AI_POOL_COOLDOWN_SECONDS", "120")), 0.0)
+# 熔断器：同一提供商/模型连续失败 N 次后在冷却期内快速失败，冷却结束后放行一个探测请求
+AI_CIRCUIT_BREAKER_ENABLED = _get_bool_env("AI_CIRCUIT_BREAKER_ENABLED", "on")
+AI_CIRCUIT_FAILURE_THRESHOLD = max(int(os.getenv("AI_CIRCUIT_FAILURE_THRESHOLD", "5")), 1)
+AI_CIRCUIT_COOLDOWN_SECONDS = max(float(os.getenv("AI_CIRCUIT_COOLDOWN_SECONDS", "60")), 0.0)
+# 对冲请求：调用超过近期同类请求延迟的 AI_HEDGE_PERCENTILE 分位数仍未返回时再发一份
+AI_HEDGE_ENABLED = _get_bool_env("AI_HEDGE_ENABLED", "off")
+AI_HEDGE_PERCENTILE = min(max(float(os.getenv("AI_HEDGE_PERCENTILE", "95")), 50.0), 99.9)
+AI_HEDGE_MIN_SAMPLES = max(int(os.getenv("AI_HEDGE_MIN_SAMPLES", "10")), 1)
+AI_HEDGE_MIN_DELAY_SECONDS = max(float(os.getenv("AI_HEDGE_MIN_DELAY_SECONDS", "5")), 0.0)
+AI_HEDGE_WINDOW = max(int(os.getenv("AI_HEDGE_WINDOW", "50")), 1)
+# 对冲请求发往的备用提供商/模型，不配置时发往同一提供商
+AI_HEDGE_PROVIDER = os.getenv("AI_HEDGE_PROVIDER", "").strip()
+AI_HEDGE_MODEL = os.getenv("AI_HEDGE_MODEL", "").strip()
 ANALYSIS_THINKING_MODE = _get_optional_bool_env("ANALYSIS_THINKING_MODE")
 ANALYSIS_THINKING_MODEL = os.getenv("ANALYSIS_THINKING_MODEL")
 ANALYSIS_THINKING_BUDGET = _get_optional_int("ANALYSIS_THINKING_BUDGET")
@@ -83,8 +184,49 @@ ANALYSIS_CLEANUP_ENABLED = _get_bool_env("ANALYSIS_CLEANUP_ENABLED", "off")
 ANALYSIS_CLEANUP_PROVIDER = os.getenv("ANALYSIS_CLEANUP_PROVIDER") or AI_PROVIDER
 ANALYSIS_CLEANUP_MODEL = os.getenv("ANALYSIS_CLEANUP_MODEL") or AI_MODEL
 ANALYSIS_CLEANUP_THINKING_MODE = _get_bool_env("ANALYSIS_CLEANUP_THINKING_MODE", "off")
+# 本地确定性修复：转义、控制字符、公式分隔符、重复标题，不需要调用模型
+ANALYSIS_LOCAL_REPAIR_ENABLED = _get_bool_env("ANALYSIS_LOCAL_REPAIR_ENABLED", "on")
 AI_REQUEST_TIMEOUT = int(os.getenv("AI_REQUEST_TIMEOUT", "120"))
+# 主模型每百万 token 的价格（美元），用于 --plan 估算费用；为 0 时不估算费用
+AI_INPUT_PRICE_PER_MTOK = max(float(os.getenv("AI_INPUT_PRICE_PER_MTOK", "0") or 0), 0.0)
+AI_OUTPUT_PRICE_PER_MTOK = max(float(os.getenv("AI_OUTPUT_PRICE_PER_MTOK", "0") or 0), 0.0)
+# 单次运行的 token / 费用 / 时间预算，0 表示不限；消耗达到各阈值后依次降级
+RUN_TOKEN_BUDGET = max(int(os.getenv("RUN_TOKEN_BUDGET", "0") or 0), 0)
+RUN_COST_BUDGET = max(float(os.getenv("RUN_COST_BUDGET", "0") or 0), 0.0)
+RUN_TIME_BUDGET_MINUTES = max(float(os.getenv("RUN_TIME_BUDGET_MINUTES", "0") or 0), 0.0)
+BUDGET_DEGRADE_THRESHOLDS = _parse_thresholds(os.getenv("BUDGET_DEGRADE_THRESHOLDS", "0.5,0.7,0.85,0.95"))
+BUDGET_REDUCED_MAX_PAGES = max(int(os.getenv("BUDGET_REDUCED_MAX_PAGES", "5")), 1)
+# 批量运行的截止时间（从程序启动起算，0 表示不限），截止前预留多少秒写最终报告
+RUN_DEADLINE_MINUTES = max(float(os.getenv("RUN_DEADLINE_MINUTES", "0") or 0), 0.0)
+DEADLINE_FLUSH_MARGIN_SECONDS = max(int(os.getenv("DEADLINE_FLUSH_MARGIN_SECONDS", "120")), 0)
+# 收到 SIGTERM / SIGINT 后等待进行中任务的最长秒数，以及中断时是否仍发送邮件
+SHUTDOWN_GRACE_SECONDS = max(float(os.getenv("SHUTDOWN_GRACE_SECONDS", "30") or 0), 0.0)
+SHUTDOWN_SEND_EMAIL = _get_bool_env("SHUTDOWN_SEND_EMAIL", "on")
+# 运行结束时在报告旁写出 JSON 时间线（各阶段耗时与 p50/p95/max）
+RUN_TIMELINE_ENABLED = _get_bool_env("RUN_TIMELINE_ENABLED", "on")
+# OpenMetrics 指标：运行结束时写出的文本文件路径（留空不写），以及运行期间提供 /metrics 的本地端口（0 表示不启用）
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "").strip()
+METRICS_HTTP_PORT = max(int(os.getenv("METRICS_HTTP_PORT", "0") or 0), 0)
+METRICS_HTTP_HOST = os.getenv("METRICS_HTTP_HOST", "127.0.0.1").strip() or "127.0.0.1"
+# 录制/回放：record 把模型响应、arXiv 响应与 PDF 按请求哈希存入 REPLAY_DIR，replay 从中读取且不访问网络
+REPLAY_MODE = _parse_replay_mode(os.getenv("REPLAY_MODE", "off"))
+REPLAY_DIR = Path(os.getenv("REPLAY_DIR", "./fixtures/replay"))
+# 回放延迟：recorded / off / fixed:<秒> / lognormal:<中位数秒>,<sigma>，再乘以 REPLAY_LATENCY_SCALE
+REPLAY_LATENCY = _parse_latency_spec(os.getenv("REPLAY_LATENCY", "recorded"))
+REPLAY_LATENCY_SCALE = max(float(os.getenv("REPLAY_LATENCY_SCALE", "1") or 1), 0.0)
+REPLAY_SEED = int(os.getenv("REPLAY_SEED", "0") or 0)
+# 流式响应：边接收边拼接，结构化 JSON 一完整就停止读取；两个数据块之间超过 AI_STREAM_IDLE_TIMEOUT 秒视为卡住
+AI_STREAMING_ENABLED = _get_bool_env("AI_STREAMING_ENABLED", "off")
+AI_STREAM_IDLE_TIMEOUT = max(float(os.getenv("AI_STREAM_IDLE_TIMEOUT", "30")), 0.1)
+# 推测式回退：历史结构化成功率偏低的提供商/模型，结构化分析超过一定时间未完成时并行启动文本回退
+SPECULATIVE_FALLBACK_ENABLED = _get_bool_env("SPECULATIVE_FALLBACK_ENABLED", "off")
+SPECULATIVE_FALLBACK_DELAY_SECONDS = max(float(os.getenv("SPECULATIVE_FALLBACK_DELAY_SECONDS", "30")), 0.0)
+SPECULATIVE_FALLBACK_MAX_SUCCESS_RATE = min(max(float(os.getenv("SPECULATIVE_FALLBACK_MAX_SUCCESS_RATE", "0.8")), 0.0), 1.0)
+SPECULATIVE_FALLBACK_MIN_SAMPLES = max(int(os.getenv("SPECULATIVE_FALLBACK_MIN_SAMPLES", "5")), 1)
+STRUCTURED_STATS_WINDOW = max(int(os.getenv("STRUCTURED_STATS_WINDOW", "50")), 1)
 STRUCTURED_MAX_RETRIES = int(os.getenv("STRUCTURED_MAX_RETRIES", "1"))
+AI_MAX_RETRIES = 3
+AI_BACKOFF_FACTOR = 2
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USERNAME = os.getenv("SMTP_USERNAME")
@@ -94,6 +236,7 @@ EMAIL_TO = [email.strip() for email in os.getenv("EMAIL_TO", "").split(",") if e
 
 PAPERS_DIR = Path("./papers")
 RESULTS_DIR = Path("./results")
+STATE_DIR = Path(os.getenv("STATE_DIR", "./state"))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_DIR = Path(os.getenv("LOG_DIR", "./logs"))
 LOG_FILE = os.getenv("LOG_FILE", "arxiv_tracker.log")
@@ -103,6 +246,11 @@ LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
 CATEGORIES = [cat.strip() for cat in os.getenv("ARXIV_CATEGORIES", "math.AP").split(",") if cat.strip()]
 MAX_PAPERS = int(os.getenv("MAX_PAPERS", "50"))
 SEARCH_DAYS = int(os.getenv("SEARCH_DAYS", "3"))
+CRAWL_WATERMARK_ENABLED = _get_bool_env("CRAWL_WATERMARK_ENABLED", "on")
+CRAWL_WATERMARK_OVERLAP_HOURS = int(os.getenv("CRAWL_WATERMARK_OVERLAP_HOURS", "6"))
+PROCESSED_INDEX_ENABLED = _get_bool_env("PROCESSED_INDEX_ENABLED", "on")
+PROCESSED_INDEX_RETENTION_DAYS = int(os.getenv("PROCESSED_INDEX_RETENTION_DAYS", "90"))
+REPROCESS_NEW_VERSIONS = _get_bool_env("REPROCESS_NEW_VERSIONS", "on")
 
 default_priority_topics = [
     "流体力学中偏微分方程的数学理论",
@@ -128,13 +276,17 @@ SECONDARY_TOPICS = os.getenv("SECONDARY_TOPICS", "|".join(default_secondary_topi
 PRIORITY_ANALYSIS_DELAY = int(os.getenv("PRIORITY_ANALYSIS_DELAY", "3"))
 SECONDARY_ANALYSIS_DELAY = int(os.getenv("SECONDARY_ANALYSIS_DELAY", "2"))
 MAX_THREADS = int(os.getenv("MAX_THREADS", "5"))
+# 异步批量预取：在线程池处理前用 asyncio 并发完成全部分类与翻译请求
+ASYNC_BATCH_ENABLED = _get_bool_env("ASYNC_BATCH_ENABLED", "off")
+ASYNC_CONCURRENCY = max(int(os.getenv("ASYNC_CONCURRENCY", "32")), 1)
 
 EMAIL_SUBJECT_PREFIX = os.getenv("EMAIL_SUBJECT_PREFIX", "ArXiv论文分析报告")
 
+# 值为 instructor.Mode 的成员名，使用时再解析，避免导入配置时加载 instructor
 STRUCTURED_MODE_MAP = {
-    "json": instructor.Mode.JSON,
-    "tools": instructor.Mode.TOOLS,
-    "tools_strict": instructor.Mode.TOOLS_STRICT,
+    "json": "JSON",
+    "tools": "TOOLS",
+    "tools_strict": "TOOLS_STRICT",
 }
 
 PROVIDER_CONFIG = {
@@ -226,33 +378,92 @@ PROVIDER_API_KEY_HINTS = {
 }
 
 
-def _read_attr_or_key(obj, name, default=None):
-    if obj is None:
-        return default
-    if isinstance(obj, dict):
-        return obj.get(name, default)
-    return getattr(obj, name, default)
+# instructor 客户端只依赖 completion 函数和结构化模式, 按 (completion_fn, structured_mode) 复用
+_structured_client_registry = {}
+_structured_client_lock = threading.Lock()
 
 
-def _coerce_text_block(value):
-    if value is None:
-        return ""
-    if isinstance(value, str):
-        return value
-    if isinstance(value, list):
-        parts = []
-        for item in value:
-            text = _read_attr_or_key(item, "text")
-            if text:
-                parts.append(str(text))
-                continue
-            content = _read_attr_or_key(item, "content")
-            if content:
-                parts.append(str(content))
-                continue
-            parts.append(str(item))
-        return "\n".join(part for part in parts if part).strip()
-    return str(value)
+@functools.lru_cache(maxsize=None)
+def _structured_json_instruction(response_model):
+    """按 response_model 缓存 schema 提示, 避免每次请求都重新生成 JSON schema"""
+    schema_text = json.dumps(response_model.model_json_schema(), ensure_ascii=False)
+    return (
+        "你必须只返回一个可被 JSON.parse 解析的 JSON object, 不要使用 Markdown 代码块, 不要添加解释文字。"
+        "JSON 必须严格符合以下 schema, 不得省略必需字段, 不得添加 schema 外字段。\n\n"
+        f"{schema_text}"
+    )
+
+
+class ReplayMissError(LookupError):
+    """REPLAY_MODE=replay 时找不到对应请求的录制结果；重试也不会出现，不再等待退避"""
+
+
+def get_circuit_breaker(provider, model):
+    """按 AI_CIRCUIT_FAILURE_THRESHOLD / AI_CIRCUIT_COOLDOWN_SECONDS 获取提供商/模型的共享熔断器"""
+    return _get_shared_circuit_breaker(
+        provider,
+        model,
+        failure_threshold=AI_CIRCUIT_FAILURE_THRESHOLD,
+        cooldown_seconds=AI_CIRCUIT_COOLDOWN_SECONDS,
+    )
+
+
+_latency_tracker = LatencyTracker(window=AI_HEDGE_WINDOW)
+_prompt_cache_stats = PromptCacheStats()
+_budget_governor = BudgetGovernor(
+    token_budget=RUN_TOKEN_BUDGET,
+    cost_budget=RUN_COST_BUDGET,
+    time_budget_seconds=RUN_TIME_BUDGET_MINUTES * 60,
+    thresholds=BUDGET_DEGRADE_THRESHOLDS,
+    input_price_per_mtok=AI_INPUT_PRICE_PER_MTOK,
+    output_price_per_mtok=AI_OUTPUT_PRICE_PER_MTOK,
+    reduced_max_pages=BUDGET_REDUCED_MAX_PAGES,
+)
+_hedge_stats = HedgeStats()
+_shared_executor = None
+_hedge_client_instance = None
+_hedge_lock = threading.Lock()
+
+
+def get_shared_executor():
+    """
+    对冲请求与推测式回退共用的线程池
+
+    提交的都是直接发起请求的任务，不会在池内等待池内的其他任务。每个分析线程同时最多占用两个
+    （对冲的两份副本或推测执行的两路），收到取消信号的落败方在当前请求结束前还会再占用两个
+    """
+    global _shared_executor
+    with _hedge_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(max_workers=MAX_THREADS * 4 + 2, thread_name_prefix="ai-request")
+        return _shared_executor
+
+
+def get_hedge_client():
+    """获取对冲请求使用的备用客户端，未配置或初始化失败时返回 None（使用原客户端）"""
+    global _hedge_client_instance
+    if not AI_HEDGE_PROVIDER:
+        return None
+    with _hedge_lock:
+        if _hedge_client_instance is None:
+            try:
+                _hedge_client_instance = AIClient(AI_HEDGE_PROVIDER, AI_HEDGE_MODEL or None)
+            except Exception as e:
+                logger.warning("对冲请求备用客户端初始化失败，将使用原提供商: %s", str(e))
+                _hedge_client_instance = False
+        return _hedge_client_instance or None
+
+
+def get_hedge_stats():
+    return _hedge_stats.snapshot()
+
+
+def get_prompt_cache_stats():
+    return _prompt_cache_stats.snapshot()
+
+
+def get_budget_governor():
+    return _budget_governor
 
 
 class AIClient:
@@ -267,9 +478,16 @@ class AIClient:
             raise ValueError(f"不支持的AI提供商: {self.provider}")
 
         self.provider_config = PROVIDER_CONFIG[self.provider]
-        self._validate_provider_credentials()
+        if REPLAY_MODE != "replay":
+            # 回放模式不访问提供商，不要求配置 API key
+            self._validate_provider_credentials()
         self.thinking_support = self.provider_config["thinking_support"]
-        self.completion_fn = completion
+        self.completion_fn = litellm.completion
+        self.acompletion_fn = litellm.acompletion
+        if REPLAY_MODE != "off":
+            from replay import wrap_completion_fns
+
+            self.completion_fn, self.acompletion_fn = wrap_completion_fns(self.completion_fn, self.acompletion_fn)
 
     def _looks_like_prefixed_route_model(self, model_name):
         normalized = str(model_name or "").strip().lower()
@@ -441,13 +659,7 @@ class AIClient:
         return create_kwargs
 
     def _build_structured_json_messages(self, messages, response_model):
-        schema = response_model.model_json_schema()
-        schema_text = json.dumps(schema, ensure_ascii=False)
-        instruction = (
-            "你必须只返回一个可被 JSON.parse 解析的 JSON object, 不要使用 Markdown 代码块, 不要添加解释文字。"
-            "JSON 必须严格符合以下 schema, 不得省略必需字段, 不得添加 schema 外字段。\n\n"
-            f"{schema_text}"
-        )
+        instruction = _structured_json_instruction(response_model)
         structured_messages = list(messages)
         if structured_messages and structured_messages[0].get("role") == "system":
             structured_messages[0] = {
@@ -486,34 +698,40 @@ class AIClient:
     def _usage_to_dict(self, usage):
         if not usage:
             return {}
-        prompt_tokens = _read_attr_or_key(usage, "prompt_tokens", 0) or 0
-        completion_tokens = _read_attr_or_key(usage, "completion_tokens", 0) or 0
-        total_tokens = _read_attr_or_key(usage, "total_tokens", 0) or 0
+        prompt_tokens = read_attr_or_key(usage, "prompt_tokens", 0) or 0
+        completion_tokens = read_attr_or_key(usage, "completion_tokens", 0) or 0
+        total_tokens = read_attr_or_key(usage, "total_tokens", 0) or 0
         usage_dict = {
             "prompt_tokens": prompt_tokens,
             "completion_tokens": completion_tokens,
             "total_tokens": total_tokens,
         }
-        reasoning_tokens = _read_attr_or_key(_read_attr_or_key(usage, "completion_tokens_details"), "reasoning_tokens")
+        reasoning_tokens = read_attr_or_key(read_attr_or_key(usage, "completion_tokens_details"), "reasoning_tokens")
         if reasoning_tokens is not None:
             usage_dict["reasoning_tokens"] = reasoning_tokens
+        # 提供商前缀缓存命中的输入 token：OpenAI/Qwen 在 prompt_tokens_details 中，DeepSeek 单独返回
+        cached_prompt_tokens = read_attr_or_key(read_attr_or_key(usage, "prompt_tokens_details"), "cached_tokens")
+        if cached_prompt_tokens is None:
+            cached_prompt_tokens = read_attr_or_key(usage, "prompt_cache_hit_tokens")
+        if cached_prompt_tokens is not None:
+            usage_dict["cached_prompt_tokens"] = cached_prompt_tokens
         return usage_dict
 
     def _extract_reasoning_content(self, response):
-        choices = _read_attr_or_key(response, "choices", []) or []
+        choices = read_attr_or_key(response, "choices", []) or []
         if not choices:
             return ""
-        message = _read_attr_or_key(choices[0], "message")
-        reasoning_content = _read_attr_or_key(message, "reasoning_content")
-        return _coerce_text_block(reasoning_content).strip()
+        message = read_attr_or_key(choices[0], "message")
+        reasoning_content = read_attr_or_key(message, "reasoning_content")
+        return coerce_text_block(reasoning_content).strip()
 
     def _extract_content_and_usage(self, response):
-        choices = _read_attr_or_key(response, "choices", []) or []
+        choices = read_attr_or_key(response, "choices", []) or []
         if not choices:
             return "", {}
-        message = _read_attr_or_key(choices[0], "message")
-        content = _coerce_text_block(_read_attr_or_key(message, "content")).strip()
-        usage = self._usage_to_dict(_read_attr_or_key(response, "usage"))
+        message = read_attr_or_key(choices[0], "message")
+        content = coerce_text_block(read_attr_or_key(message, "content")).strip()
+        usage = self._usage_to_dict(read_attr_or_key(response, "usage"))
         return content, usage
 
     def _normalize_json_candidate(self, text):
@@ -531,13 +749,14 @@ class AIClient:
             return match.group(1).strip()
         return ""
 
+    @timed("structured_parse")
     def _parse_structured_response(self, response_model, response):
-        choices = _read_attr_or_key(response, "choices", []) or []
+        choices = read_attr_or_key(response, "choices", []) or []
         if not choices:
             raise ValueError("结构化响应为空")
-        message = _read_attr_or_key(choices[0], "message")
-        content = _coerce_text_block(_read_attr_or_key(message, "content")).strip()
-        reasoning_content = _coerce_text_block(_read_attr_or_key(message, "reasoning_content")).strip()
+        message = read_attr_or_key(choices[0], "message")
+        content = coerce_text_block(read_attr_or_key(message, "content")).strip()
+        reasoning_content = coerce_text_block(read_attr_or_key(message, "reasoning_content")).strip()
         candidates = []
         normalized_content = self._normalize_json_candidate(content)
         if normalized_content:
@@ -577,6 +796,8 @@ class AIClient:
             "reasoning_content_present": bool(reasoning_content_present),
             "reasoning_content_length": 0,
             "structured_output_mode": request_config.get("structured_mode"),
+            "served_provider": self.provider,
+            "served_model": request_config["effective_model"],
         }
 
     def _extract_structured_candidate_from_error_message(self, error_message):
@@ -627,7 +848,7 @@ class AIClient:
     ):
         response = self.completion_fn(**create_kwargs)
         result = self._parse_structured_response(response_model, response)
-        usage = self._usage_to_dict(_read_attr_or_key(response, "usage"))
+        usage = self._usage_to_dict(read_attr_or_key(response, "usage"))
         response_state = self._build_response_state(
             request_config,
             response,
@@ -638,7 +859,7 @@ class AIClient:
 
     def _build_response_state(self, request_config, response, fallback_used=False, fallback_reason=None):
         reasoning_content = self._extract_reasoning_content(response)
-        returned_model = _read_attr_or_key(response, "model")
+        returned_model = read_attr_or_key(response, "model")
         return {
             "provider": request_config["provider"],
             "effective_model": returned_model or request_config["effective_model"],
@@ -651,27 +872,55 @@ class AIClient:
             "reasoning_content_present": bool(reasoning_content),
             "reasoning_content_length": len(reasoning_content),
             "structured_output_mode": request_config.get("structured_mode"),
+            "served_provider": self.provider,
+            "served_model": returned_model or request_config["effective_model"],
+            **self._stream_metrics(response),
         }
 
+    def _stream_metrics(self, response):
+        stream_metrics = read_attr_or_key(response, "stream_metrics")
+        return dict(stream_metrics) if isinstance(stream_metrics, dict) else {}
+
+    def _call_completion(self, create_kwargs, response_model=None):
+        """发起一次 completion 调用；开启流式时边接收边拼接，结果结构与非流式响应一致"""
+        with network_wait():
+            if not AI_STREAMING_ENABLED:
+                return self.completion_fn(**create_kwargs)
+            response = consume_stream(
+                self.completion_fn(**stream_kwargs(create_kwargs)),
+                AI_REQUEST_TIMEOUT,
+                AI_STREAM_IDLE_TIMEOUT,
+                response_model,
+            )
+        return response.fill_estimated_usage(create_kwargs)
+
     def _get_structured_client(self, request_config):
         structured_mode = request_config.get("structured_mode", "json")
-        mode = STRUCTURED_MODE_MAP.get(structured_mode, instructor.Mode.JSON)
-        return instructor.from_litellm(self.completion_fn, mode=mode)
+        registry_key = (self.completion_fn, structured_mode)
+        with _structured_client_lock:
+            structured_client = _structured_client_registry.get(registry_key)
+            if structured_client is None:
+                mode = getattr(instructor.Mode, STRUCTURED_MODE_MAP.get(structured_mode, "JSON"))
+                structured_client = instructor.from_litellm(network_bound(self.completion_fn), mode=mode)
+                _structured_client_registry[registry_key] = structured_client
+        return structured_client
 
     def _do_structured_completion(self, messages, response_model, request_config, base_kwargs, json_schema_prompt=False):
+        # 只有调用方选择 schema 提示 + JSON 解析时才走流式读取；其余结构化请求仍交给 instructor（非流式），
+        # 保留它的结构化模式与校验重试
         if json_schema_prompt:
             structured_messages = self._build_structured_json_messages(messages, response_model)
             create_kwargs = self._create_kwargs(structured_messages, request_config, base_kwargs)
             create_kwargs["response_format"] = {"type": "json_object"}
             try:
-                response = self.completion_fn(**create_kwargs)
+                response = self._call_completion(create_kwargs, response_model)
             except Exception as e:
                 if not self._is_response_format_unsupported_error(str(e)):
                     raise
                 create_kwargs.pop("response_format", None)
-                response = self.completion_fn(**create_kwargs)
+                response = self._call_completion(create_kwargs, response_model)
             result = self._parse_structured_response(response_model, response)
-            usage = self._usage_to_dict(_read_attr_or_key(response, "usage"))
+            usage = self._usage_to_dict(read_attr_or_key(response, "usage"))
             return result, usage, response, "json_schema_prompt"
 
         create_kwargs = self._create_kwargs(messages, request_config, base_kwargs)
@@ -681,17 +930,10 @@ class AIClient:
             max_retries=STRUCTURED_MAX_RETRIES,
             **create_kwargs,
         )
-        usage = self._usage_to_dict(_read_attr_or_key(raw_response, "usage"))
+        usage = self._usage_to_dict(read_attr_or_key(raw_response, "usage"))
         return result, usage, raw_response, None
 
-    def _do_chat_completion(self, messages, thinking_mode=False, response_model=None, structured=False, **kwargs):
-        import random
-        import time
-
-        max_retries = 3
-        backoff_factor = 2
-        base_kwargs = dict(kwargs)
-        json_schema_prompt = bool(base_kwargs.pop("json_schema_prompt", False))
+    def _build_request_sequence(self, thinking_mode):
         requested_config = self.get_analysis_request_config(thinking_mode=thinking_mode)
 
         if thinking_mode and not requested_config["thinking_applied"]:
@@ -700,12 +942,157 @@ class AIClient:
         request_sequence = [requested_config]
         if requested_config["thinking_applied"]:
             request_sequence.append(self.get_analysis_request_config(thinking_mode=False))
+        return request_sequence
+
+    def _handle_attempt_error(
+        self,
+        error,
+        index,
+        attempt,
+        request_config,
+        structured,
+        response_model,
+        fallback_reason,
+        breaker=None,
+    ):
+        """
+        判断一次失败调用之后的处理方式，同步与异步调用共用
+
+        Returns:
+            ("recovered", (result, usage, response_state))：已从异常信息恢复结构化结果
+            ("fallback", reason)：思考模式不受支持，切换到下一个请求配置
+            ("retry", wait_time)：等待 wait_time 秒后重试
+        重试次数耗尽或熔断器已打开时直接抛出异常
+        """
+        error_msg = str(error).lower()
+        is_rate_limit = any(keyword in error_msg for keyword in ["rate limit", "too many requests", "429"])
+        is_thinking_fallback = (
+            index == 0
+            and request_config["thinking_applied"]
+            and self._is_thinking_unsupported_error(str(error))
+        )
+
+        if structured and response_model is not None and not is_rate_limit and not is_thinking_fallback:
+            try:
+                recovered = self._recover_structured_result_from_error_message(
+                    response_model,
+                    request_config,
+                    str(error),
+                    fallback_used=index > 0,
+                    fallback_reason=fallback_reason,
+                )
+                logger.warning(
+                    "结构化解析失败后，已从异常信息恢复 JSON 结果: provider=%s, model=%s, error=%s",
+                    self.provider,
+                    request_config["effective_model"],
+                    str(error),
+                )
+                return "recovered", recovered
+            except Exception:
+                pass
+
+        if is_thinking_fallback:
+            logger.warning(
+                "提供商 %s/%s 不支持当前思考模式配置，将回退到普通模式: %s",
+                self.provider,
+                request_config["effective_model"],
+                str(error),
+            )
+            return "fallback", str(error)
+
+        if isinstance(error, ReplayMissError):
+            raise error
+
+        if breaker is not None and breaker.is_open():
+            # 熔断器已打开，后续重试注定快速失败，不再等待退避
+            raise CircuitOpenError(f"{breaker.name} 已熔断，放弃重试: {str(error)}") from error
+
+        if attempt < AI_MAX_RETRIES - 1:
+            wait_time = (AI_BACKOFF_FACTOR ** attempt) + random.uniform(0, 1)
+            if is_rate_limit:
+                wait_time += 5
+            logger.warning(
+                "AI API调用失败 (尝试 %s/%s): %s。将在 %.1fs 后重试...",
+                attempt + 1,
+                AI_MAX_RETRIES,
+                str(error),
+                wait_time,
+            )
+            return "retry", wait_time
+        raise Exception(f"AI API调用在 {AI_MAX_RETRIES} 次尝试后仍然失败 ({self.provider}): {str(error)}") from error
+
+    def _get_circuit_breaker(self, request_config):
+        if not AI_CIRCUIT_BREAKER_ENABLED:
+            return None
+        return get_circuit_breaker(request_config["provider"], request_config["effective_model"])
+
+    def _is_provider_failure(self, error):
+        """区分提供商不可用与请求/输出本身的问题，只有前者计入熔断"""
+        if isinstance(error, (ValueError, json.JSONDecodeError)):
+            # pydantic ValidationError 等结构化解析错误：提供商已正常响应
+            return False
+        if isinstance(error, RequestCancelledError):
+            # 调用方主动取消，换成员或计入熔断都没有意义
+            return False
+        if type(error).__name__ in ("InstructorRetryException", "IncompleteOutputException"):
+            return False
+        status_code = getattr(error, "status_code", None)
+        if isinstance(status_code, int) and 400 <= status_code < 500 and status_code not in (408, 429):
+            return False
+        return not self._is_thinking_unsupported_error(str(error))
+
+    def _record_circuit_outcome(self, breaker, error=None):
+        if breaker is None:
+            return
+        if error is not None and self._is_provider_failure(error):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def _finish_structured_attempt(self, request_config, result, usage, raw_response, structured_mode_override, index, fallback_reason):
+        response_state = self._build_response_state(
+            request_config,
+            raw_response,
+            fallback_used=index > 0,
+            fallback_reason=fallback_reason,
+        )
+        if structured_mode_override:
+            response_state["structured_output_mode"] = structured_mode_override
+        _prompt_cache_stats.record(usage)
+        _budget_governor.record(usage)
+        record_ai_usage(usage, model=request_config.get("effective_model"))
+        return result, usage, response_state
+
+    def _finish_chat_attempt(self, request_config, response, index, fallback_reason):
+        content, usage = self._extract_content_and_usage(response)
+        response_state = self._build_response_state(
+            request_config,
+            response,
+            fallback_used=index > 0,
+            fallback_reason=fallback_reason,
+        )
+        _prompt_cache_stats.record(usage)
+        _budget_governor.record(usage)
+        record_ai_usage(usage, model=request_config.get("effective_model"))
+        return content, usage, response_state
+
+    @timed_ai_call
+    def _run_chat_completion(
+        self, messages, thinking_mode=False, response_model=None, structured=False, cancel_event=None, **kwargs
+    ):
+        base_kwargs = dict(kwargs)
+        json_schema_prompt = bool(base_kwargs.pop("json_schema_prompt", False))
 
         fallback_reason = ""
-        for index, request_config in enumerate(request_sequence):
-            for attempt in range(max_retries):
+        for index, request_config in enumerate(self._build_request_sequence(thinking_mode)):
+            breaker = self._get_circuit_breaker(request_config)
+            for attempt in range(AI_MAX_RETRIES):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RequestCancelledError(f"{self.provider}/{self.model} 的请求已取消")
+                if breaker is not None:
+                    breaker.before_call()
+                attempt_started = time.monotonic()
                 try:
-                    create_kwargs = self._create_kwargs(messages, request_config, base_kwargs)
                     if structured:
                         result, usage, raw_response, structured_mode_override = self._do_structured_completion(
                             messages,
@@ -714,77 +1101,336 @@ class AIClient:
                             base_kwargs,
                             json_schema_prompt=json_schema_prompt,
                         )
-                        response_state = self._build_response_state(
-                            request_config,
-                            raw_response,
-                            fallback_used=index > 0,
-                            fallback_reason=fallback_reason,
+                        outcome = self._finish_structured_attempt(
+                            request_config, result, usage, raw_response, structured_mode_override, index, fallback_reason
                         )
-                        if structured_mode_override:
-                            response_state["structured_output_mode"] = structured_mode_override
-                        return result, usage, response_state
-
-                    response = self.completion_fn(**create_kwargs)
-                    content, usage = self._extract_content_and_usage(response)
-                    response_state = self._build_response_state(
-                        request_config,
-                        response,
-                        fallback_used=index > 0,
-                        fallback_reason=fallback_reason,
-                    )
-                    return content, usage, response_state
+                    else:
+                        response = self._call_completion(self._create_kwargs(messages, request_config, base_kwargs))
+                        outcome = self._finish_chat_attempt(request_config, response, index, fallback_reason)
                 except Exception as e:
-                    error_msg = str(e).lower()
-                    is_rate_limit = any(keyword in error_msg for keyword in ["rate limit", "too many requests", "429"])
-                    is_thinking_fallback = (
-                        index == 0
-                        and request_config["thinking_applied"]
-                        and self._is_thinking_unsupported_error(str(e))
+                    record_ai_attempt(attempt_started, ok=False)
+                    self._record_circuit_outcome(breaker, e)
+                    action, value = self._handle_attempt_error(
+                        e, index, attempt, request_config, structured, response_model, fallback_reason, breaker=breaker
                     )
-
-                    if structured and response_model is not None and not is_rate_limit and not is_thinking_fallback:
-                        try:
-                            recovered_result, recovered_usage, recovered_state = self._recover_structured_result_from_error_message(
-                                response_model,
-                                request_config,
-                                str(e),
-                                fallback_used=index > 0,
-                                fallback_reason=fallback_reason,
-                            )
-                            logger.warning(
-                                "结构化解析失败后，已从异常信息恢复 JSON 结果: provider=%s, model=%s, error=%s",
-                                self.provider,
-                                request_config["effective_model"],
-                                str(e),
-                            )
-                            return recovered_result, recovered_usage, recovered_state
-                        except Exception:
-                            pass
-
-                    if is_thinking_fallback:
-                        fallback_reason = str(e)
-                        logger.warning(
-                            "提供商 %s/%s 不支持当前思考模式配置，将回退到普通模式: %s",
-                            self.provider,
-                            request_config["effective_model"],
-                            str(e),
-                        )
+                    if action == "recovered":
+                        return value
+                    if action == "fallback":
+                        fallback_reason = value
                         break
+                    if cancel_event is None:
+                        time.sleep(value)
+                    else:
+                        # 退避期间收到取消信号时立即醒来，由下一轮循环开头抛出 RequestCancelledError
+                        cancel_event.wait(value)
+                else:
+                    record_ai_attempt(attempt_started)
+                    self._record_circuit_outcome(breaker)
+                    return outcome
+
+    # ============ 对冲请求 ============
+    # 调用超过近期同类请求延迟的某个分位数仍未返回时，向同一或备用提供商再发一份，取先返回的结果
+
+    def _latency_key(self, thinking_mode, response_model, structured):
+        kind = getattr(response_model, "__name__", "structured") if structured else "chat"
+        return (self.provider, self.model, bool(thinking_mode), kind)
+
+    def _hedge_delay(self, tracker, latency_key):
+        return tracker.hedge_delay(
+            latency_key,
+            percentile=AI_HEDGE_PERCENTILE,
+            min_samples=AI_HEDGE_MIN_SAMPLES,
+            min_delay=AI_HEDGE_MIN_DELAY_SECONDS,
+        )
+
+    def _hedge_target(self):
+        return get_hedge_client() or self
+
+    def _submit_hedge_copy(self, executor, client, tracker, latency_key, cancel_event, messages, call_kwargs):
+        """
+        提交一份请求，成功返回时按这份请求自身的耗时记录延迟
+
+        落败的一方在后台结束后同样计入，否则慢请求总被对冲请求取代，延迟分位数只剩较快的样本
+        """
+        submitted = time.monotonic()
+        future = executor.submit(client._run_chat_completion, messages, cancel_event=cancel_event, **call_kwargs)
 
-                    if attempt < max_retries - 1:
-                        wait_time = (backoff_factor ** attempt) + random.uniform(0, 1)
-                        if is_rate_limit:
-                            wait_time += 5
-                        logger.warning(
-                            "AI API调用失败 (尝试 %s/%s): %s。将在 %.1fs 后重试...",
-                            attempt + 1,
-                            max_retries,
-                            str(e),
-                            wait_time,
+        def record_latency(done):
+            if not done.cancelled() and done.exception() is None:
+                tracker.record(latency_key, time.monotonic() - submitted)
+
+        future.add_done_callback(record_latency)
+        return future
+
+    def _do_chat_completion(
+        self, messages, thinking_mode=False, response_model=None, structured=False, cancel_event=None, hedge=True, **kwargs
+    ):
+        """
+        Args:
+            cancel_event: 调用方的取消信号（CancelToken / threading.Event），设置后不再发起新的尝试
+            hedge: 为 False 时不发对冲请求，供已经并行发起多路请求的调用方限制在途请求数
+        """
+        latency_key = self._latency_key(thinking_mode, response_model, structured)
+        tracker = _latency_tracker
+        hedge_delay = self._hedge_delay(tracker, latency_key) if AI_HEDGE_ENABLED and hedge else None
+        started = time.monotonic()
+        call_kwargs = dict(kwargs, thinking_mode=thinking_mode, response_model=response_model, structured=structured)
+
+        if hedge_delay is None:
+            result = self._run_chat_completion(messages, cancel_event=cancel_event, **call_kwargs)
+            tracker.record(latency_key, time.monotonic() - started)
+            _hedge_stats.record_call(hedged=False)
+            return result
+
+        executor = get_shared_executor()
+        cancel_events = {False: CancelToken(cancel_event), True: CancelToken(cancel_event)}
+        primary = self._submit_hedge_copy(executor, self, tracker, latency_key, cancel_events[False], messages, call_kwargs)
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done:
+            result = primary.result()
+            _hedge_stats.record_call(hedged=False)
+            return result
+
+        target = self._hedge_target()
+        logger.info(
+            "请求超过 %.1fs 仍未返回，向 %s/%s 发出对冲请求",
+            hedge_delay,
+            target.provider,
+            target.model,
+        )
+        hedge = self._submit_hedge_copy(
+            executor,
+            target,
+            tracker,
+            target._latency_key(thinking_mode, response_model, structured),
+            cancel_events[True],
+            messages,
+            call_kwargs,
+        )
+        futures = {primary: False, hedge: True}
+        first_error = None
+        while futures:
+            done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            for future in done:
+                is_hedge = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    first_error = first_error or e
+                    continue
+                # 同步 HTTP 请求无法中断：落败的一方完成当前这次请求后不再重试，排队中的直接取消
+                for loser, loser_is_hedge in futures.items():
+                    cancel_events[loser_is_hedge].set()
+                    loser.cancel()
+                _hedge_stats.record_call(hedged=True, hedge_won=is_hedge)
+                return self._tag_hedged_result(result, is_hedge)
+        _hedge_stats.record_call(hedged=True, hedge_won=False)
+        raise first_error
+
+    def _tag_hedged_result(self, result, hedge_won):
+        content, usage, response_state = result
+        response_state = {**(response_state or {}), "hedged": True, "hedge_won": bool(hedge_won)}
+        return content, usage, response_state
+
+    # ============ 异步接口 ============
+    # 与同步接口共用请求配置、错误分类与结果组装，只把网络调用和等待换成 await
+
+    async def _acall_completion(self, **create_kwargs):
+        acompletion_fn = getattr(self, "acompletion_fn", None)
+        if acompletion_fn is None:
+            # 没有异步 completion 函数时（如测试替身）放到线程里执行同步函数
+            return await asyncio.to_thread(self.completion_fn, **create_kwargs)
+        return await acompletion_fn(**create_kwargs)
+
+    async def _acall_streaming_completion(self, create_kwargs, response_model=None):
+        if not AI_STREAMING_ENABLED:
+            return await self._acall_completion(**create_kwargs)
+        stream = await self._acall_completion(**stream_kwargs(create_kwargs))
+        response = await aconsume_stream(stream, AI_REQUEST_TIMEOUT, AI_STREAM_IDLE_TIMEOUT, response_model)
+        return response.fill_estimated_usage(create_kwargs)
+
+    def _get_async_structured_client(self, request_config):
+        acompletion_fn = getattr(self, "acompletion_fn", None)
+        if acompletion_fn is None:
+            return None
+        structured_mode = request_config.get("structured_mode", "json")
+        registry_key = (acompletion_fn, structured_mode)
+        with _structured_client_lock:
+            structured_client = _structured_client_registry.get(registry_key)
+            if structured_client is None:
+                mode = getattr(instructor.Mode, STRUCTURED_MODE_MAP.get(structured_mode, "JSON"))
+                structured_client = instructor.from_litellm(acompletion_fn, mode=mode)
+                _structured_client_registry[registry_key] = structured_client
+        return structured_client
+
+    async def _ado_structured_completion(self, messages, response_model, request_config, base_kwargs, json_schema_prompt=False):
+        if json_schema_prompt:
+            structured_messages = self._build_structured_json_messages(messages, response_model)
+            create_kwargs = self._create_kwargs(structured_messages, request_config, base_kwargs)
+            create_kwargs["response_format"] = {"type": "json_object"}
+            try:
+                response = await self._acall_streaming_completion(create_kwargs, response_model)
+            except Exception as e:
+                if not self._is_response_format_unsupported_error(str(e)):
+                    raise
+                create_kwargs.pop("response_format", None)
+                response = await self._acall_streaming_completion(create_kwargs, response_model)
+            result = self._parse_structured_response(response_model, response)
+            usage = self._usage_to_dict(read_attr_or_key(response, "usage"))
+            return result, usage, response, "json_schema_prompt"
+
+        structured_client = self._get_async_structured_client(request_config)
+        if structured_client is None:
+            return await asyncio.to_thread(
+                self._do_structured_completion, messages, response_model, request_config, base_kwargs
+            )
+        create_kwargs = self._create_kwargs(messages, request_config, base_kwargs)
+        result, raw_response = await structured_client.create_with_completion(
+            response_model=response_model,
+            max_retries=STRUCTURED_MAX_RETRIES,
+            **create_kwargs,
+        )
+        usage = self._usage_to_dict(read_attr_or_key(raw_response, "usage"))
+        return result, usage, raw_response, None
+
+    @timed_ai_call
+    async def _arun_chat_completion(
+        self, messages, thinking_mode=False, response_model=None, structured=False, cancel_event=None, **kwargs
+    ):
+        base_kwargs = dict(kwargs)
+        json_schema_prompt = bool(base_kwargs.pop("json_schema_prompt", False))
+
+        fallback_reason = ""
+        for index, request_config in enumerate(self._build_request_sequence(thinking_mode)):
+            breaker = self._get_circuit_breaker(request_config)
+            for attempt in range(AI_MAX_RETRIES):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise RequestCancelledError(f"{self.provider}/{self.model} 的请求已取消")
+                if breaker is not None:
+                    breaker.before_call()
+                attempt_started = time.monotonic()
+                try:
+                    if structured:
+                        result, usage, raw_response, structured_mode_override = await self._ado_structured_completion(
+                            messages,
+                            response_model,
+                            request_config,
+                            base_kwargs,
+                            json_schema_prompt=json_schema_prompt,
+                        )
+                        outcome = self._finish_structured_attempt(
+                            request_config, result, usage, raw_response, structured_mode_override, index, fallback_reason
                         )
-                        time.sleep(wait_time)
                     else:
-                        raise Exception(f"AI API调用在 {max_retries} 次尝试后仍然失败 ({self.provider}): {str(e)}")
+                        response = await self._acall_streaming_completion(
+                            self._create_kwargs(messages, request_config, base_kwargs)
+                        )
+                        outcome = self._finish_chat_attempt(request_config, response, index, fallback_reason)
+                except Exception as e:
+                    record_ai_attempt(attempt_started, ok=False)
+                    self._record_circuit_outcome(breaker, e)
+                    action, value = self._handle_attempt_error(
+                        e, index, attempt, request_config, structured, response_model, fallback_reason, breaker=breaker
+                    )
+                    if action == "recovered":
+                        return value
+                    if action == "fallback":
+                        fallback_reason = value
+                        break
+                    await asyncio.sleep(value)
+                else:
+                    record_ai_attempt(attempt_started)
+                    self._record_circuit_outcome(breaker)
+                    return outcome
+
+    async def _ado_chat_completion(
+        self, messages, thinking_mode=False, response_model=None, structured=False, hedge=True, **kwargs
+    ):
+        latency_key = self._latency_key(thinking_mode, response_model, structured)
+        tracker = _latency_tracker
+        hedge_delay = self._hedge_delay(tracker, latency_key) if AI_HEDGE_ENABLED and hedge else None
+        started = time.monotonic()
+        call_kwargs = dict(kwargs, thinking_mode=thinking_mode, response_model=response_model, structured=structured)
+
+        if hedge_delay is None:
+            result = await self._arun_chat_completion(messages, **call_kwargs)
+            tracker.record(latency_key, time.monotonic() - started)
+            _hedge_stats.record_call(hedged=False)
+            return result
+
+        primary = asyncio.ensure_future(self._arun_chat_completion(messages, **call_kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            result = primary.result()
+            tracker.record(latency_key, time.monotonic() - started)
+            _hedge_stats.record_call(hedged=False)
+            return result
+
+        target = self._hedge_target()
+        logger.info(
+            "请求超过 %.1fs 仍未返回，向 %s/%s 发出对冲请求",
+            hedge_delay,
+            target.provider,
+            target.model,
+        )
+        hedge_started = time.monotonic()
+        hedge = asyncio.ensure_future(target._arun_chat_completion(messages, **call_kwargs))
+        # 每份请求的 (是否对冲, 延迟键, 发出时间)
+        tasks = {
+            primary: (False, latency_key, started),
+            hedge: (True, target._latency_key(thinking_mode, response_model, structured), hedge_started),
+        }
+        first_error = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(set(tasks), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    is_hedge, task_key, task_started = tasks.pop(task)
+                    if task.exception() is not None:
+                        first_error = first_error or task.exception()
+                        continue
+                    tracker.record(task_key, time.monotonic() - task_started)
+                    # 落败的一方会被取消，按已等待的时间（实际耗时的下界）计入，避免分位数只剩较快的样本
+                    for _, loser_key, loser_started in tasks.values():
+                        tracker.record(loser_key, time.monotonic() - loser_started)
+                    _hedge_stats.record_call(hedged=True, hedge_won=is_hedge)
+                    return self._tag_hedged_result(task.result(), is_hedge)
+        finally:
+            for task in tasks:
+                task.cancel()
+        _hedge_stats.record_call(hedged=True, hedge_won=False)
+        raise first_error
+
+    async def achat_completion(self, messages, thinking_mode=False, **kwargs):
+        content, _, _ = await self._ado_chat_completion(messages, thinking_mode=thinking_mode, **kwargs)
+        return content
+
+    async def achat_completion_with_usage(self, messages, thinking_mode=False, return_response_state=False, **kwargs):
+        content, usage, response_state = await self._ado_chat_completion(messages, thinking_mode=thinking_mode, **kwargs)
+        if return_response_state:
+            return content, usage, response_state
+        return content, usage
+
+    async def astructured_chat_completion_with_usage(
+        self,
+        messages,
+        response_model,
+        thinking_mode=False,
+        return_response_state=False,
+        json_schema_prompt=False,
+        **kwargs,
+    ):
+        result, usage, response_state = await self._ado_chat_completion(
+            messages,
+            thinking_mode=thinking_mode,
+            response_model=response_model,
+            structured=True,
+            json_schema_prompt=json_schema_prompt,
+            **kwargs,
+        )
+        if return_response_state:
+            return result, usage, response_state
+        return result, usage
 
 
 _ai_client_instance = None
@@ -795,7 +1441,13 @@ def get_ai_client():
     """获取或创建主 AI 客户端 (lazy init)"""
     global _ai_client_instance
     if _ai_client_instance is None:
-        _ai_client_instance = AIClient(AI_PROVIDER, AI_MODEL)
+        if AI_PROVIDER_POOL:
+            # provider_pool 依赖 AIClient，在这里导入以免循环导入
+            from provider_pool import ProviderPool
+
+            _ai_client_instance = ProviderPool.from_spec(AI_PROVIDER_POOL)
+        else:
+            _ai_client_instance = AIClient(AI_PROVIDER, AI_MODEL)
     return _ai_client_instance
 
 
@@ -811,7 +1463,7 @@ def get_analysis_cleanup_client():
 
 
 def get_analysis_cleanup_request_config():
-    cleanup_client = get_analysis_cleanup_client()
+    cleanup_client = None if _budget_governor.is_active("disable_cleanup") else get_analysis_cleanup_client()
     config = {
         "cleanup_requested": cleanup_client is not None,
         "cleanup_attempted": False,
@@ -841,3 +1493,12 @@ def get_analysis_cleanup_request_config():
         }
     )
     return config
+
+
+def __getattr__(name):
+    """ProviderPool 等已移至 provider_pool 模块，保留 config.ProviderPool 的访问方式"""
+    if name in ("ProviderPool", "ProviderStats", "parse_provider_pool_spec"):
+        import provider_pool
+
+        return getattr(provider_pool, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
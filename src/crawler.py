@@ -8,8 +8,11 @@ from typing import Optional, Tuple
 
 import requests
 
-from config import SEARCH_DAYS, MAX_PAPERS
+from config import CRAWL_WATERMARK_ENABLED, CRAWL_WATERMARK_OVERLAP_HOURS, SEARCH_DAYS, MAX_PAPERS
 from models import SimplePaper
+from replay import http_get
+from state import get_crawl_watermark, get_seen_paper_ids
+from timeline import timed
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +33,7 @@ def _fetch_arxiv_response(url: str, max_retries: int = 4, timeout: int = 30):
 
     for attempt in range(1, max_retries + 1):
         try:
-            response = requests.get(url, timeout=timeout)
+            response = http_get("arxiv", url, timeout=timeout)
             if response.status_code == 200:
                 return response
 
@@ -100,6 +103,34 @@ def _format_arxiv_datetime(dt: datetime.datetime) -> str:
     return dt.astimezone(datetime.timezone.utc).strftime('%Y%m%d%H%M')
 
 
+def _utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _weekday_window(today: datetime.datetime) -> Tuple[datetime.datetime, datetime.datetime]:
+    """按星期规则计算检索区间（没有水位线时使用）"""
+    weekday = today.weekday()  # 0=周一, 1=周二, ..., 6=周日
+
+    if weekday == 0:  # 周一：检索上周四18:00 ~ 上周五18:00（UTC）
+        start_time = (today - datetime.timedelta(days=4)).replace(hour=18, minute=0, second=0, microsecond=0)
+        end_time = (today - datetime.timedelta(days=3)).replace(hour=18, minute=0, second=0, microsecond=0)
+    elif weekday == 1:  # 周二：检索上周五18:00 ~ 本周一18:00（UTC）
+        start_time = (today - datetime.timedelta(days=4)).replace(hour=18, minute=0, second=0, microsecond=0)
+        end_time = (today - datetime.timedelta(days=1)).replace(hour=18, minute=0, second=0, microsecond=0)
+    elif weekday in (2, 3, 4):  # 周三~周五：检索前天18:00 ~ 昨天18:00（UTC）
+        start_time = (today - datetime.timedelta(days=2)).replace(hour=18, minute=0, second=0, microsecond=0)
+        end_time = (today - datetime.timedelta(days=1)).replace(hour=18, minute=0, second=0, microsecond=0)
+    else:  # 兜底
+        start_time = (today - datetime.timedelta(days=SEARCH_DAYS)).replace(hour=18, minute=0, second=0, microsecond=0)
+        end_time = today.replace(hour=18, minute=0, second=0, microsecond=0)
+
+    # 根据 SEARCH_DAYS 扩展时间区间宽度（SEARCH_DAYS=1表示基础区间，=2表示向前扩展1天，以此类推）
+    if SEARCH_DAYS > 1:
+        start_time = start_time - datetime.timedelta(days=SEARCH_DAYS - 1)
+    return start_time, end_time
+
+
+@timed("arxiv_fetch")
 def get_recent_papers(categories, max_results=MAX_PAPERS, target_date: Optional[str] = None):
     """
     获取最近几天内发布或更新的指定类别的论文（基于最后更新日期）
@@ -108,9 +139,11 @@ def get_recent_papers(categories, max_results=MAX_PAPERS, target_date: Optional[
         categories: arXiv 类别列表
         max_results: 最大返回数量
         target_date: 指定日期，格式 "20251225" 或 "20251220:20251225" (也支持 "2025-12-25" 格式)
-                    如果为 None，则按当前日期和星期自动计算
+                    如果为 None，则优先从持久化水位线增量抓取，没有水位线时按当前日期和星期自动计算
     """
-    today = datetime.datetime.now(datetime.timezone.utc)
+    today = _utc_now()
+    incremental = False
+    seen_ids = set()
     
     # 如果指定了日期，直接使用
     if target_date:
@@ -121,37 +154,25 @@ def get_recent_papers(categories, max_results=MAX_PAPERS, target_date: Optional[
             logger.error(f"日期格式错误: {target_date}，应为 YYYYMMDD 或 YYYYMMDD:YYYYMMDD (也支持 YYYY-MM-DD 格式)")
             return []
     else:
-        # 原有的按星期自动计算逻辑
-        weekday = today.weekday()  # 0=周一, 1=周二, ..., 6=周日
-
-        # 按星期逻辑确定检索区间
-        if weekday == 0:  # 周一：检索上周四18:00 ~ 上周五18:00（UTC）
-            start_time = (today - datetime.timedelta(days=4)).replace(hour=18, minute=0, second=0, microsecond=0)
-            end_time = (today - datetime.timedelta(days=3)).replace(hour=18, minute=0, second=0, microsecond=0)
-        elif weekday == 1:  # 周二：检索上周五18:00 ~ 本周一18:00（UTC）
-            start_time = (today - datetime.timedelta(days=4)).replace(hour=18, minute=0, second=0, microsecond=0)
-            end_time = (today - datetime.timedelta(days=1)).replace(hour=18, minute=0, second=0, microsecond=0)
-        elif weekday == 2:  # 周三：检索本周一18:00 ~ 本周二18:00（UTC）
-            start_time = (today - datetime.timedelta(days=2)).replace(hour=18, minute=0, second=0, microsecond=0)
-            end_time = (today - datetime.timedelta(days=1)).replace(hour=18, minute=0, second=0, microsecond=0)
-        elif weekday == 3:  # 周四：检索本周二18:00 ~ 本周三18:00（UTC）
-            start_time = (today - datetime.timedelta(days=2)).replace(hour=18, minute=0, second=0, microsecond=0)
-            end_time = (today - datetime.timedelta(days=1)).replace(hour=18, minute=0, second=0, microsecond=0)
-        elif weekday == 4:  # 周五：检索本周三18:00 ~ 本周四18:00（UTC）
-            start_time = (today - datetime.timedelta(days=2)).replace(hour=18, minute=0, second=0, microsecond=0)
-            end_time = (today - datetime.timedelta(days=1)).replace(hour=18, minute=0, second=0, microsecond=0)
-        elif weekday == 5 or weekday == 6:  # 周六、周日：跳过检索
+        weekday = today.weekday()
+        if weekday == 5 or weekday == 6:  # 周六、周日：跳过检索
             logger.info(f"今天是周{weekday+1}，跳过论文检索")
             return []
-        else:  # 兜底
-            start_time = (today - datetime.timedelta(days=SEARCH_DAYS)).replace(hour=18, minute=0, second=0, microsecond=0)
-            end_time = today.replace(hour=18, minute=0, second=0, microsecond=0)
-
-        # 根据 SEARCH_DAYS 扩展时间区间宽度（SEARCH_DAYS=1表示基础区间，=2表示向前扩展1天，以此类推）
-        if SEARCH_DAYS > 1:
-            start_time = start_time - datetime.timedelta(days=SEARCH_DAYS - 1)
 
-        logger.info(f"今天是周{weekday+1}, 搜索区间: {start_time.strftime('%Y-%m-%d %H:%M')} ~ {end_time.strftime('%Y-%m-%d %H:%M')}")
+        watermark = get_crawl_watermark() if CRAWL_WATERMARK_ENABLED else None
+        if watermark is not None:
+            # 增量模式：只列出水位线之后的论文，并回看一小段重叠区间以覆盖延迟公布的论文
+            incremental = True
+            seen_ids = get_seen_paper_ids()
+            start_time = watermark - datetime.timedelta(hours=CRAWL_WATERMARK_OVERLAP_HOURS)
+            end_time = today
+            logger.info(
+                f"增量抓取: 水位线 {watermark.strftime('%Y-%m-%d %H:%M')}, 重叠 {CRAWL_WATERMARK_OVERLAP_HOURS} 小时, "
+                f"搜索区间: {start_time.strftime('%Y-%m-%d %H:%M')} ~ {end_time.strftime('%Y-%m-%d %H:%M')}"
+            )
+        else:
+            start_time, end_time = _weekday_window(today)
+            logger.info(f"今天是周{weekday+1}, 搜索区间: {start_time.strftime('%Y-%m-%d %H:%M')} ~ {end_time.strftime('%Y-%m-%d %H:%M')}")
     
     # arXiv API URL - 按最后更新日期排序（包括新发布和更新的论文）
     category_query = " OR ".join([f"cat:{cat}" for cat in categories])
@@ -160,6 +181,9 @@ def get_recent_papers(categories, max_results=MAX_PAPERS, target_date: Optional[
     end_date = _format_arxiv_datetime(end_time)
         # 使用submittedDate参数，格式为YYYYMMDDHHMM
     url = f"https://export.arxiv.org/api/query?search_query=({category_query}) AND submittedDate:[{start_date} TO {end_date}]&sortBy=submittedDate&max_results={max_results}"
+    if incremental:
+        # 升序返回：结果被 max_results 截断时保留最早的论文，剩余部分在下次运行时从水位线继续
+        url += "&sortOrder=ascending"
 
     logger.info(f"API请求URL: {url}")
     logger.info(f"最大论文数: {max_results}")
@@ -174,6 +198,7 @@ def get_recent_papers(categories, max_results=MAX_PAPERS, target_date: Optional[
     logger.info(f"API返回的总条目数: {len(feed.entries)}")
 
     papers = []
+    skipped_seen = 0
     for entry in feed.entries:
         try:
             submit_date = datetime.datetime.strptime(entry.published, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=datetime.timezone.utc)
@@ -182,7 +207,13 @@ def get_recent_papers(categories, max_results=MAX_PAPERS, target_date: Optional[
             logger.warning(f"跳过日期格式异常的论文 {entry.get('id', '?')}: published={entry.published!r}, 错误: {e}")
             continue
         if start_time <= submit_date < end_time:
-            papers.append(SimplePaper(entry))
+            paper = SimplePaper(entry)
+            if paper.get_short_id() in seen_ids:
+                skipped_seen += 1
+                continue
+            papers.append(paper)
 
+    if skipped_seen:
+        logger.info(f"跳过重叠区间内已处理的论文 {skipped_seen} 篇")
     logger.info(f"找到{len(papers)}篇符合条件的论文")
     return papers
@@ -7,9 +7,8 @@ import re
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from jinja2 import Template
 
-from analyzer import extract_analysis_title, render_analysis_body
+from analyzer import parse_analysis
 
 
 def _esc(text):
@@ -19,11 +18,13 @@ from config import (
     SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, 
     EMAIL_FROM, EMAIL_TO, EMAIL_SUBJECT_PREFIX, RESULTS_DIR
 )
+from budget import format_budget_degradations
+from timeline import timed
 
 logger = logging.getLogger(__name__)
 
 def _extract_translation_title(text: str) -> str:
-    return extract_analysis_title(text, "").strip()
+    return parse_analysis(text).title
 
 
 def _split_priority_entry(entry):
@@ -45,6 +46,7 @@ def _format_analysis_audit_comment(analysis_meta):
     ]
     return "<!-- analysis_audit\n" + "\n".join(lines) + "\n-->\n\n"
 
+@timed("email_format")
 def format_email_content(priority_analyses, secondary_analyses, irrelevant_papers=None, run_meta=None):
     """格式化邮件内容，包含三种类型的论文"""
     today = datetime.datetime.now().strftime('%Y-%m-%d')
@@ -60,6 +62,10 @@ def format_email_content(priority_analyses, secondary_analyses, irrelevant_paper
             content += f"**已完成论文数量**: {run_meta.get('completed_papers')} 篇\n"
         if run_meta.get("skipped_papers") is not None:
             content += f"**未完成论文数量**: {run_meta.get('skipped_papers')} 篇\n"
+        if run_meta.get("already_reported_papers"):
+            content += f"**往期已报告论文数量**: {run_meta.get('already_reported_papers')} 篇\n"
+        if (run_meta.get("budget") or {}).get("degradations"):
+            content += f"**预算降级**: {format_budget_degradations(run_meta['budget'])}\n"
         content += "\n"
     content += f"**重点关注论文**: {len(priority_analyses)} 篇\n"
     content += f"**了解领域论文**: {len(secondary_analyses)} 篇\n"
@@ -73,8 +79,9 @@ def format_email_content(priority_analyses, secondary_analyses, irrelevant_paper
         for i, entry in enumerate(priority_analyses, 1):
             paper, analysis, analysis_meta = _split_priority_entry(entry)
             author_names = [_esc(author.name) for author in paper.authors]
-            chinese_title = extract_analysis_title(analysis, paper.title)
-            analysis_body = render_analysis_body(analysis)
+            parsed_analysis = parse_analysis(analysis)
+            chinese_title = parsed_analysis.title_or(paper.title)
+            analysis_body = parsed_analysis.body
             esc_title = _esc(paper.title)
 
             content += f"#### {i}. {_esc(chinese_title) if chinese_title else esc_title}\n"
@@ -129,6 +136,7 @@ def format_email_content(priority_analyses, secondary_analyses, irrelevant_paper
     
     return content
 
+@timed("email_send")
 def send_email(content, attachment_path=None):
     """发送邮件，支持QQ邮箱，改进错误处理，优化字体样式，支持附件"""
     if not all([SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, EMAIL_FROM]) or not EMAIL_TO:
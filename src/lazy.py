@@ -0,0 +1,62 @@
+# lazy.py - 重量级依赖延迟导入模块
+# litellm / instructor / PyMuPDF / pdfplumber / tiktoken 导入耗时较长，
+# 只在第一次真正使用时才导入，保证 --cache-stats、--clear-cache 等命令快速启动
+
+import importlib
+import threading
+
+_import_lock = threading.Lock()
+
+
+class LazyModule:
+    """模块代理：首次访问属性时才执行 import，之后的读写都转发给真实模块"""
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_lazy_name", name)
+        object.__setattr__(self, "_lazy_module", None)
+        object.__setattr__(self, "_lazy_error", None)
+
+    def _load(self):
+        module = object.__getattribute__(self, "_lazy_module")
+        if module is not None:
+            return module
+        with _import_lock:
+            module = object.__getattribute__(self, "_lazy_module")
+            if module is None:
+                try:
+                    module = importlib.import_module(object.__getattribute__(self, "_lazy_name"))
+                except Exception as e:
+                    object.__setattr__(self, "_lazy_error", e)
+                    raise
+                object.__setattr__(self, "_lazy_module", module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        # 允许 unittest.mock.patch.object 直接替换真实模块上的属性
+        setattr(self._load(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._load(), attr)
+
+    def __repr__(self):
+        name = object.__getattribute__(self, "_lazy_name")
+        loaded = object.__getattribute__(self, "_lazy_module") is not None
+        return f"<LazyModule {name} ({'已加载' if loaded else '未加载'})>"
+
+
+def is_available(module) -> bool:
+    """判断依赖是否可用：None 表示不可用，LazyModule 会尝试导入，其他对象（如测试替身）视为可用"""
+    if module is None:
+        return False
+    if not isinstance(module, LazyModule):
+        return True
+    if object.__getattribute__(module, "_lazy_error") is not None:
+        return False
+    try:
+        module._load()
+        return True
+    except Exception:
+        return False
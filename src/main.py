@@ -4,27 +4,44 @@
 import argparse
 import datetime
 import logging
+import os
 import random
+import signal
 import sys
+import threading
 import time
 from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from logging.handlers import RotatingFileHandler
+from pathlib import Path
 
 from config import (
     CATEGORIES, MAX_PAPERS, PAPERS_DIR,
     PRIORITY_ANALYSIS_DELAY, SECONDARY_ANALYSIS_DELAY,
     PRIORITY_TOPICS, SECONDARY_TOPICS, MAX_THREADS,
-    LOG_LEVEL, LOG_DIR, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT
+    LOG_LEVEL, LOG_DIR, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT,
+    CRAWL_WATERMARK_ENABLED, PROCESSED_INDEX_ENABLED, REPROCESS_NEW_VERSIONS,
+    ASYNC_BATCH_ENABLED, ASYNC_CONCURRENCY, AI_HEDGE_ENABLED, get_hedge_stats,
+    get_prompt_cache_stats, get_budget_governor,
+    RUN_DEADLINE_MINUTES, DEADLINE_FLUSH_MARGIN_SECONDS,
+    SHUTDOWN_GRACE_SECONDS, SHUTDOWN_SEND_EMAIL, RUN_TIMELINE_ENABLED,
+    METRICS_TEXTFILE, METRICS_HTTP_PORT, METRICS_HTTP_HOST, RESULTS_DIR, REPLAY_MODE
 )
+from budget import format_budget_degradations
+from cache import reset_cache_lookup_stats
 from crawler import get_recent_papers
+from state import flush_structured_stats, flush_task_latencies, partition_processed_papers, record_crawled_papers, record_processed_papers
 from analyzer import (
     check_topic_relevance, analyze_paper
 )
-from translator import translate_abstract_with_deepseek
+from translator import is_degraded_translation, translate_abstract_with_deepseek
 from emailer import send_email, format_email_content
+from metrics import get_run_metrics_state, start_metrics_server, stop_metrics_server, write_metrics_textfile
+from profiling import parse_profile_stages, profile_task, start_profiler, stop_profiler, top_functions
+from replay import get_replay_stats, http_get
+from scheduler import DeadlineScheduler, analysis_stage, record_task_result
+from timeline import format_timeline_summary, get_timeline, reset_timeline, timed
 from utils import write_to_conclusion, delete_pdf, download_paper, write_pdf_analysis
 
-import requests
 from models import SimplePaper
 logger = logging.getLogger(__name__)
 
@@ -48,8 +65,18 @@ def configure_logging():
         handlers=handlers
     )
 
+@timed("paper_task")
 def process_single_paper_task(paper, index, total, thinking_mode=None):
     """处理单篇论文的任务函数，用于多线程"""
+    started = time.monotonic()
+
+    def translate(stage, translate_title_only=False):
+        translation, translation_state = translate_abstract_with_deepseek(
+            paper, translate_title_only=translate_title_only, return_state=True
+        )
+        record_task_result(stage, time.monotonic() - started, translation_state)
+        return translation
+
     try:
         time.sleep(random.uniform(0, 2))
         
@@ -59,36 +86,50 @@ def process_single_paper_task(paper, index, total, thinking_mode=None):
         
         if priority == 1:
             logger.info(f"重点关注论文: {paper.title} ({reason})")
-            
+
+            governor = get_budget_governor()
+            if governor.is_active("abstract_only"):
+                # 预算即将耗尽，重点论文不再下载 PDF，只翻译摘要
+                logger.warning(f"预算即将耗尽，重点论文改为摘要翻译: {paper.title}")
+                governor.record_downgraded_paper()
+                time.sleep(SECONDARY_ANALYSIS_DELAY)
+                return 2, (paper, translate("abstract_translation"))
+
             pdf_path = download_paper(paper, PAPERS_DIR)
             if pdf_path:
                 time.sleep(PRIORITY_ANALYSIS_DELAY)
+                analysis_thinking = governor.effective_thinking_mode(thinking_mode)
                 analysis, _, analysis_meta = analyze_paper(
                     pdf_path,
                     paper,
-                    thinking_mode=thinking_mode,
+                    max_pages=governor.effective_max_pages(10),
+                    thinking_mode=analysis_thinking,
                     include_prompt_estimate=True,
                 )
+                if analysis_meta.get("circuit_open"):
+                    # 提供商熔断时不再等待完整分析，降级为摘要翻译（熔断期间为英文原文）
+                    logger.warning(f"AI 提供商已熔断，重点论文降级处理: {paper.title}")
+                    delete_pdf(pdf_path)
+                    return 2, (paper, translate("abstract_translation"))
+                if not (isinstance(analysis, str) and analysis.startswith("**分析出错**:")):
+                    record_task_result(analysis_stage(analysis_thinking), time.monotonic() - started, analysis_meta)
                 return 1, (paper, analysis, pdf_path, analysis_meta)
             else:
                 logger.warning(f"PDF下载失败，降级处理: {paper.title}")
                 time.sleep(SECONDARY_ANALYSIS_DELAY)
-                translation = translate_abstract_with_deepseek(paper)
-                return 2, (paper, translation)
+                return 2, (paper, translate("abstract_translation"))
                 
         elif priority == 2:
             logger.info(f"了解领域论文: {paper.title} ({reason})")
             
             time.sleep(SECONDARY_ANALYSIS_DELAY)
-            translation = translate_abstract_with_deepseek(paper)
-            return 2, (paper, translation)
+            return 2, (paper, translate("abstract_translation"))
             
         else:
             logger.info(f"不相关论文: {paper.title}")
             
             time.sleep(SECONDARY_ANALYSIS_DELAY)
-            title_translation = translate_abstract_with_deepseek(paper, translate_title_only=True)
-            return 0, (paper, reason, title_translation)
+            return 0, (paper, reason, translate("title_translation", translate_title_only=True))
     except Exception as e:
         logger.error(f"处理论文出错 {paper.title}: {str(e)}")
         return -1, None
@@ -106,30 +147,87 @@ def record_paper_result(result, priority_analyses, secondary_analyses, irrelevan
         priority_analyses.append(data)
         return True
     elif p_type == 2:
+        # 熔断降级的结果照常写入报告，但不计入完成，下次运行会重新处理
         secondary_analyses.append(data)
-        return True
+        return not is_degraded_translation(data[1])
     elif p_type == 0:
         irrelevant_papers.append(data)
-        return True
+        return not is_degraded_translation(data[2])
     return False
 
 
-def build_run_meta(total_papers, completed_papers, partial_run):
+def _iter_completed_entries(priority_analyses, secondary_analyses, irrelevant_papers):
+    """按 (paper, priority, reason) 遍历真正完成的论文，跳过熔断降级的结果"""
+    for data in priority_analyses:
+        yield data[0], 1, ""
+    for data in secondary_analyses:
+        if not is_degraded_translation(data[1]):
+            yield data[0], 2, ""
+    for paper, reason, title_translation in irrelevant_papers:
+        if not is_degraded_translation(title_translation):
+            yield paper, 0, reason
+
+
+def collect_completed_paper_ids(priority_analyses, secondary_analyses, irrelevant_papers):
     return {
+        paper.get_short_id()
+        for paper, _, _ in _iter_completed_entries(priority_analyses, secondary_analyses, irrelevant_papers)
+    }
+
+
+def collect_processed_entries(priority_analyses, secondary_analyses, irrelevant_papers):
+    """整理写入已处理索引的 (paper, priority, reason) 记录"""
+    return list(_iter_completed_entries(priority_analyses, secondary_analyses, irrelevant_papers))
+
+
+def record_crawl_progress(papers, completed_ids=None, advance_watermark=True):
+    """记录本次处理过的论文并推进抓取水位线；失败只记日志，不影响已写出的报告"""
+    try:
+        record_crawled_papers(papers, completed_ids=completed_ids, advance_watermark=advance_watermark)
+    except Exception as e:
+        logger.error(f"更新抓取水位线失败: {str(e)}")
+
+
+def build_run_meta(total_papers, completed_papers, partial_run, already_reported_papers=0):
+    run_meta = {
         "total_papers": total_papers,
         "completed_papers": completed_papers,
         "skipped_papers": max(total_papers - completed_papers, 0),
         "partial_run": partial_run,
+        "already_reported_papers": already_reported_papers,
     }
-
-
-def write_batch_checkpoint(priority_analyses, secondary_analyses, irrelevant_papers, total_papers, partial_run=True):
+    governor = get_budget_governor()
+    if governor.enabled:
+        run_meta["budget"] = governor.snapshot()
+    return run_meta
+
+
+def update_run_metrics(run_meta, priority_analyses, secondary_analyses, irrelevant_papers):
+    """把当前进度同步给指标导出：各类结果数量、真正完成的数量与完整分析的 analysis_meta"""
+    classified = {1: len(priority_analyses), 2: len(secondary_analyses), 0: len(irrelevant_papers)}
+    analyzed = {1: 0, 2: 0, 0: 0}
+    for _, priority, _ in _iter_completed_entries(priority_analyses, secondary_analyses, irrelevant_papers):
+        analyzed[priority] += 1
+    analysis_metas = [data[3] for data in priority_analyses if len(data) > 3]
+    get_run_metrics_state().update(run_meta, classified=classified, analyzed=analyzed, analysis_metas=analysis_metas)
+
+
+def write_batch_checkpoint(
+    priority_analyses,
+    secondary_analyses,
+    irrelevant_papers,
+    total_papers,
+    completed_papers,
+    partial_run=True,
+    already_reported_papers=0,
+):
+    # completed_papers 由主循环按 record_paper_result 计数传入，熔断降级与分析出错的结果不计入完成
     priority_analyses_clean = [
         (data[0], data[1], data[3] if len(data) > 3 else {})
         for data in priority_analyses
     ]
-    completed_papers = len(priority_analyses) + len(secondary_analyses) + len(irrelevant_papers)
-    run_meta = build_run_meta(total_papers, completed_papers, partial_run)
+    run_meta = build_run_meta(total_papers, completed_papers, partial_run, already_reported_papers)
+    update_run_metrics(run_meta, priority_analyses, secondary_analyses, irrelevant_papers)
     return write_to_conclusion(
         priority_analyses_clean,
         secondary_analyses,
@@ -138,7 +236,122 @@ def write_batch_checkpoint(priority_analyses, secondary_analyses, irrelevant_pap
         run_meta=run_meta,
     )
 
+def write_run_timeline(result_file):
+    """在报告旁写出本次运行的时间线 JSON（<报告名>_timeline.json），并在日志中输出各阶段耗时"""
+    result_path = Path(result_file)
+    timeline = get_timeline()
+    timeline_path = timeline.write(result_path.with_name(f"{result_path.stem}_timeline.json"))
+    for line in format_timeline_summary(timeline.summary()):
+        logger.info(f"阶段耗时 - {line}")
+    logger.info(f"运行时间线已保存至 {timeline_path}")
+    return timeline_path
+
+
+# 等待线程池结果时的轮询间隔，保证收到信号后能及时响应
+SHUTDOWN_POLL_SECONDS = 1.0
+
+
+class GracefulShutdown:
+    """
+    批量模式的 SIGTERM / SIGINT 处理
+
+    第一次收到信号时只做标记：主循环停止提交新论文，最多再等待 grace_seconds 秒，
+    随后照常写出标记为部分完成的最终报告；宽限期内再次收到信号则立即结束等待。
+    """
+
+    SIGNALS = ("SIGTERM", "SIGINT")
+
+    def __init__(self, grace_seconds=None):
+        self.grace_seconds = SHUTDOWN_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        self.signum = None
+        self.requested_at = None
+        self.forced = False
+        self._previous_handlers = {}
+
+    @property
+    def requested(self):
+        return self.signum is not None
+
+    @property
+    def exit_code(self):
+        return 128 + self.signum if self.requested else None
+
+    def install(self):
+        # signal.signal 只能在主线程调用
+        if threading.current_thread() is not threading.main_thread():
+            return self
+        for name in self.SIGNALS:
+            signum = getattr(signal, name, None)
+            if signum is None or signum in self._previous_handlers:
+                continue
+            try:
+                self._previous_handlers[signum] = signal.signal(signum, self.handle)
+            except (OSError, ValueError) as e:
+                logger.debug(f"无法注册信号处理 {name}: {str(e)}")
+        return self
+
+    def restore(self):
+        for signum, handler in self._previous_handlers.items():
+            try:
+                signal.signal(signum, handler)
+            except (OSError, ValueError):
+                pass
+        self._previous_handlers = {}
+
+    def handle(self, signum, frame=None):
+        if self.requested:
+            self.forced = True
+            logger.warning("再次收到终止信号，不再等待进行中的任务")
+            return
+        self.signum = signum
+        self.requested_at = time.monotonic()
+        logger.warning(
+            f"收到终止信号 {signal.Signals(signum).name}，停止提交新论文，"
+            f"最多等待 {self.grace_seconds:.0f} 秒后写出最终报告"
+        )
+
+    def seconds_until_grace_end(self, now=None):
+        if not self.requested:
+            return None
+        if self.forced:
+            return 0.0
+        return self.requested_at + self.grace_seconds - (time.monotonic() if now is None else now)
+
+    def grace_expired(self, now=None):
+        return self.requested and self.seconds_until_grace_end(now) <= 0
+
+
 def main():
+    """
+    程序入口
+
+    Returns:
+        批量模式被 SIGTERM / SIGINT 中断时返回退出码 128 + signum；
+        到达截止时间、放弃了进行中的任务时返回 0；否则返回 None。
+        返回值不为 None 时仍有请求线程在后台运行，脚本入口据此直接退出
+    """
+    shutdown = GracefulShutdown()
+    try:
+        exit_code = run(shutdown)
+    finally:
+        shutdown.restore()
+        stop_metrics_server()
+        # 结构化成功率与任务耗时在运行期间只记在内存里，结束时（包括截止时间与终止信号的提前退出）统一写入一次
+        if REPLAY_MODE != "replay":
+            try:
+                flush_structured_stats()
+            except Exception as e:
+                logger.error(f"保存结构化分析统计失败: {str(e)}")
+            try:
+                flush_task_latencies()
+            except Exception as e:
+                logger.error(f"保存任务耗时统计失败: {str(e)}")
+    return shutdown.exit_code if shutdown.requested else exit_code
+
+
+def run(shutdown):
+    # 截止时间从程序启动起算，CI 的超时同样包含抓取与预取的耗时
+    main_started_at = time.monotonic()
     configure_logging()
     parser = argparse.ArgumentParser(
         description="ArXiv 论文追踪与分析器",
@@ -162,6 +375,18 @@ def main():
     python src/main.py --pdf ./papers/some_paper.pdf
     python src/main.py --pdf ./paper.pdf -p 20
   
+  预估本批次的 token、费用与耗时（不调用模型）:
+    python src/main.py --plan
+    python src/main.py --date 20251225 --plan --thinking
+  
+  忽略已处理论文索引，重新处理往期报告中的论文:
+    python src/main.py --date 20251225 --force-reprocess
+  
+  CPU 性能剖析（结果写入 results/profile_*.prof 与 *.speedscope.json）:
+    python src/main.py --profile
+    python src/main.py --arxiv 2401.12345 --profile pdf_extract,analysis_parse
+    python src/main.py --date 20251225 --profile --profile-cpu
+  
   缓存管理:
     python src/main.py --cache-stats
     python src/main.py --clear-cache
@@ -172,6 +397,10 @@ def main():
     # 批量模式参数
     parser.add_argument('--date', type=str, 
                        help='指定抓取日期，格式: YYYYMMDD 或 YYYYMMDD:YYYYMMDD（日期范围），也支持 YYYY-MM-DD')
+    parser.add_argument('--force-reprocess', action='store_true',
+                       help='忽略已处理论文索引，重新分析已出现在往期报告中的论文')
+    parser.add_argument('--plan', action='store_true',
+                       help='只抓取论文列表并预估各阶段 token、费用与耗时，不调用任何模型')
     
     # 单论文分析参数
     parser.add_argument('--arxiv', type=str, 
@@ -206,9 +435,54 @@ def main():
         help='显式关闭完整分析的深度思考模式',
     )
     parser.set_defaults(thinking=None)
+
+    # 性能剖析
+    parser.add_argument('--profile', type=str, nargs='?', const='all', metavar='STAGES',
+                       help='用 cProfile 剖析本次运行：all（默认）或逗号分隔的阶段名，如 pdf_extract,analysis_parse,report_write')
+    parser.add_argument('--profile-cpu', action='store_true',
+                       help='剖析时跳过等待网络的时间（模型请求、PDF 下载、arXiv 抓取、发邮件），只统计本地 CPU 开销；未指定 --profile 时剖析整次运行')
     
     args = parser.parse_args()
 
+    profiler = None
+    if args.profile or args.profile_cpu:
+        try:
+            stages = parse_profile_stages(args.profile)
+        except ValueError as e:
+            parser.error(str(e))
+        profiler = start_profiler(stages=stages, cpu_only=args.profile_cpu)
+        logger.info(
+            f"已开启性能剖析: {'整次运行' if stages is None else ', '.join(stages)}"
+            f"{'（跳过网络等待）' if args.profile_cpu else ''}"
+        )
+    try:
+        return execute(args, shutdown, main_started_at)
+    finally:
+        if profiler is not None:
+            stop_profiler()
+            try:
+                write_run_profile(profiler)
+            except Exception as e:
+                logger.error(f"写入性能剖析结果失败: {str(e)}")
+
+
+def write_run_profile(profiler, prefix=None):
+    """写出各线程与合并后的 .prof 以及 speedscope 文件，并在日志中列出自身耗时最多的函数"""
+    if prefix is None:
+        prefix = RESULTS_DIR / f"profile_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    outputs = profiler.write(prefix)
+    logger.info(f"性能剖析耗时 {profiler.elapsed_seconds:.1f} 秒，结果已保存:")
+    for path in outputs["threads"]:
+        logger.info(f"- {path}")
+    if outputs["merged"] is not None:
+        logger.info(f"- {outputs['merged']}（合并全部线程）")
+        for name, ncalls, tottime, cumtime in top_functions(outputs["merged"]):
+            logger.info(f"  {tottime:8.3f}s 自身 / {cumtime:8.3f}s 累计 / {ncalls} 次  {name}")
+    logger.info(f"- {outputs['speedscope']}（可在 https://www.speedscope.app 打开）")
+    return outputs
+
+
+def execute(args, shutdown, main_started_at):
     # 缓存管理命令
     if args.cache_stats:
         from cache import get_cache_stats
@@ -253,6 +527,14 @@ def main():
 
     # 批量模式
     start_time = time.time()
+    reset_timeline()
+    reset_cache_lookup_stats()
+    get_run_metrics_state().reset()
+    if METRICS_HTTP_PORT:
+        try:
+            start_metrics_server(METRICS_HTTP_PORT, host=METRICS_HTTP_HOST)
+        except OSError as e:
+            logger.error(f"启动运行指标端点失败: {str(e)}")
     logger.info("开始arXiv论文跟踪")
     logger.info(f"配置信息:")
     logger.info(f"- 搜索类别: {', '.join(CATEGORIES)}")
@@ -273,7 +555,40 @@ def main():
     if not papers:
         logger.info("所选时间段没有找到论文。退出。")
         return
+
+    # 在任何分类之前查询已处理索引，跳过已出现在往期报告中的论文
+    already_reported = []
+    if PROCESSED_INDEX_ENABLED and not args.force_reprocess:
+        papers, already_reported = partition_processed_papers(papers, reprocess_new_versions=REPROCESS_NEW_VERSIONS)
+        if already_reported:
+            logger.info(f"跳过 {len(already_reported)} 篇已在往期报告中的论文（使用 --force-reprocess 可重新处理）")
+        if not papers:
+            logger.info("所有论文都已在往期报告中。退出。")
+            # 这些论文已经处理完成，照常推进水位线，下次运行不必再列出同一区间
+            if CRAWL_WATERMARK_ENABLED and not args.date and REPLAY_MODE != "replay":
+                record_crawl_progress(already_reported)
+            return
+
+    if args.plan:
+        from planner import build_run_plan, format_run_plan
+        plan = build_run_plan(papers, thinking_mode=args.thinking, max_pages=max_pages, skipped_papers=len(already_reported))
+        print(format_run_plan(plan))
+        return
     
+    # 从这里开始收到 SIGTERM / SIGINT 时写出部分报告，异步预取阶段同样适用
+    shutdown.install()
+
+    # 用 asyncio 并发完成分类与翻译，线程池处理时直接命中缓存
+    if ASYNC_BATCH_ENABLED:
+        try:
+            from batch import prefetch_paper_results
+            prefetch_paper_results(papers, concurrency=ASYNC_CONCURRENCY, shutdown=shutdown)
+        except Exception as e:
+            logger.error(f"异步预取失败，将由线程池逐篇处理: {str(e)}")
+
+    # 预算的耗时从开始处理论文时计算
+    get_budget_governor().start()
+
     # 处理每篇论文
     priority_analyses = []  # 重点关注论文的完整分析
     secondary_analyses = [] # 了解领域论文的摘要翻译
@@ -283,17 +598,38 @@ def main():
 
     partial_run = False
     completed_papers = 0
+    deadline_reached = False
+
+    # 设置了截止时间时按优先级与预计耗时调度，否则按列表顺序提交
+    scheduler = None
+    if RUN_DEADLINE_MINUTES:
+        scheduler = DeadlineScheduler(
+            papers,
+            deadline_seconds=RUN_DEADLINE_MINUTES * 60,
+            flush_margin_seconds=DEADLINE_FLUSH_MARGIN_SECONDS,
+            thinking_mode=args.thinking,
+            started_at=main_started_at,
+        )
+        logger.info(f"截止时间调度: 距离写出最终报告还有 {scheduler.seconds_until_flush():.0f} 秒")
 
     executor = ThreadPoolExecutor(max_workers=MAX_THREADS)
     pending = {}
     paper_iter = iter(enumerate(papers, 1))
 
     def submit_next_paper():
-        try:
-            index, paper = next(paper_iter)
-        except StopIteration:
+        if shutdown.requested:
             return False
-        future = executor.submit(process_single_paper_task, paper, index, len(papers), args.thinking)
+        if scheduler is not None:
+            task = scheduler.next_task()
+            if task is None:
+                return False
+            index, paper = task.index, task.paper
+        else:
+            try:
+                index, paper = next(paper_iter)
+            except StopIteration:
+                return False
+        future = executor.submit(profile_task(process_single_paper_task), paper, index, len(papers), args.thinking)
         pending[future] = (index, paper)
         return True
 
@@ -303,7 +639,21 @@ def main():
                 break
 
         while pending:
-            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            if shutdown.grace_expired():
+                logger.warning(f"宽限期已到，放弃 {len(pending)} 个进行中的任务并写出最终报告")
+                break
+            if scheduler is not None and scheduler.should_flush():
+                # 剩余任务来不及完成，不再等待，直接写出最终报告
+                deadline_reached = True
+                scheduler.skip_remaining()
+                logger.warning(f"即将到达截止时间，放弃 {len(pending)} 个进行中的任务并写出最终报告")
+                break
+            timeouts = [SHUTDOWN_POLL_SECONDS]
+            if scheduler is not None:
+                timeouts.append(scheduler.seconds_until_flush())
+            if shutdown.requested:
+                timeouts.append(shutdown.seconds_until_grace_end())
+            done, _ = wait(pending, timeout=max(min(timeouts), 0), return_when=FIRST_COMPLETED)
             if not done:
                 continue
 
@@ -319,7 +669,9 @@ def main():
                             secondary_analyses,
                             irrelevant_papers,
                             len(papers),
+                            completed_papers,
                             partial_run=True,
+                            already_reported_papers=len(already_reported),
                         )
                     except Exception as checkpoint_error:
                         logger.error(f"写入检查点失败: {str(checkpoint_error)}")
@@ -330,17 +682,39 @@ def main():
                 submit_next_paper()
     finally:
         if hasattr(executor, "shutdown"):
-            executor.shutdown(wait=True, cancel_futures=True)
+            # 到达截止时间或收到终止信号时不等待进行中的任务
+            executor.shutdown(wait=not (deadline_reached or shutdown.requested), cancel_futures=True)
+    # 放弃了进行中的任务时，线程池的线程还在等待网络响应，需要由脚本入口直接退出进程
+    exit_code = 0 if pending else None
     
     priority_count = len(priority_analyses)
     secondary_count = len(secondary_analyses)
     irrelevant_count = len(irrelevant_papers)
     
     logger.info(f"处理完成 - 重点关注: {priority_count}篇, 了解领域: {secondary_count}篇, 不相关: {irrelevant_count}篇")
+
+    degraded_count = priority_count + secondary_count + irrelevant_count - len(
+        collect_completed_paper_ids(priority_analyses, secondary_analyses, irrelevant_papers)
+    )
+    if degraded_count:
+        # 降级结果下次运行需要重新处理，按未完成的运行对待，不推进抓取水位线
+        logger.warning(f"{degraded_count} 篇论文因 AI 提供商熔断使用了降级结果，本次运行标记为部分完成")
+        partial_run = True
+
+    if scheduler is not None and (scheduler.skipped or deadline_reached):
+        skipped_count = len(scheduler.skipped) + (len(pending) if deadline_reached else 0)
+        logger.warning(f"{skipped_count} 篇论文因截止时间未处理，本次运行标记为部分完成")
+        partial_run = True
+
+    if shutdown.requested:
+        logger.warning(
+            f"运行被终止信号中断，已完成 {completed_papers}/{len(papers)} 篇，本次运行标记为部分完成"
+        )
+        partial_run = True
     
     if not priority_analyses and not secondary_analyses and not irrelevant_papers:
         logger.info("没有找到任何论文，不发送邮件。")
-        return
+        return exit_code
     
     # 提取 PDF 路径列表，用于最后清理
     pdf_paths_to_clean = [data[2] for data in priority_analyses if len(data) > 2 and data[2]]
@@ -349,7 +723,28 @@ def main():
     priority_analyses_clean = [(data[0], data[1], data[3] if len(data) > 3 else {}) for data in priority_analyses]
     
     # 将分析结果写入带时间戳的.md文件
-    run_meta = build_run_meta(len(papers), completed_papers, partial_run)
+    run_meta = build_run_meta(len(papers), completed_papers, partial_run, len(already_reported))
+    if AI_HEDGE_ENABLED:
+        hedge_stats = get_hedge_stats()
+        run_meta["hedge_stats"] = hedge_stats
+        logger.info(
+            f"对冲请求: 发出 {hedge_stats['hedged']} 次 / 共 {hedge_stats['calls']} 次调用 "
+            f"({hedge_stats['hedge_rate']:.1%}), 对冲请求先返回 {hedge_stats['hedge_wins']} 次"
+        )
+    prompt_cache_stats = get_prompt_cache_stats()
+    if prompt_cache_stats["prompt_tokens"]:
+        run_meta["prompt_cache_stats"] = prompt_cache_stats
+        logger.info(
+            f"提示词前缀缓存: 命中 {prompt_cache_stats['cached_prompt_tokens']}/{prompt_cache_stats['prompt_tokens']} "
+            f"输入 token ({prompt_cache_stats['hit_rate']:.1%})"
+        )
+    update_run_metrics(run_meta, priority_analyses, secondary_analyses, irrelevant_papers)
+    budget = run_meta.get("budget")
+    if budget and budget["degradations"]:
+        logger.warning(
+            f"本次运行触发预算降级: {format_budget_degradations(budget)} "
+            f"(tokens={budget['tokens']}, cost={budget['cost']:.4f})"
+        )
     result_file = write_to_conclusion(
         priority_analyses_clean,
         secondary_analyses,
@@ -358,13 +753,36 @@ def main():
     )
     
     # 发送邮件，包含附件
-    email_content = format_email_content(priority_analyses_clean, secondary_analyses, irrelevant_papers, run_meta=run_meta)
-    email_success = send_email(email_content, attachment_path=result_file)
-    
-    if email_success:
-        logger.info("邮件发送完成")
+    if shutdown.requested and not SHUTDOWN_SEND_EMAIL:
+        logger.info("运行被中断且 SHUTDOWN_SEND_EMAIL=off，不发送邮件")
+    elif REPLAY_MODE == "replay":
+        logger.info("回放模式不发送邮件")
     else:
-        logger.warning("邮件发送可能失败，请手动检查")
+        email_content = format_email_content(priority_analyses_clean, secondary_analyses, irrelevant_papers, run_meta=run_meta)
+        email_success = send_email(email_content, attachment_path=result_file)
+
+        if email_success:
+            logger.info("邮件发送完成")
+        else:
+            logger.warning("邮件发送可能失败，请手动检查")
+
+    # 回放的是录制时的流量，不改动日常运行的已处理索引与抓取水位线
+    if REPLAY_MODE == "replay":
+        logger.info("回放模式不更新已处理论文索引与抓取水位线")
+    elif PROCESSED_INDEX_ENABLED:
+        try:
+            record_processed_papers(
+                collect_processed_entries(priority_analyses, secondary_analyses, irrelevant_papers),
+                report_file=result_file,
+            )
+        except Exception as e:
+            logger.error(f"更新已处理论文索引失败: {str(e)}")
+
+    # 报告写出后再推进抓取水位线；指定 --date 的补抓不影响日常增量状态
+    if CRAWL_WATERMARK_ENABLED and not args.date and REPLAY_MODE != "replay":
+        completed_ids = collect_completed_paper_ids(priority_analyses, secondary_analyses, irrelevant_papers)
+        completed_ids.update(paper.get_short_id() for paper in already_reported)
+        record_crawl_progress(papers + already_reported, completed_ids=completed_ids, advance_watermark=not partial_run)
     
     # 所有操作完成后，最后清理 PDF 文件
     if pdf_paths_to_clean:
@@ -372,10 +790,29 @@ def main():
         for pdf_path in pdf_paths_to_clean:
             delete_pdf(pdf_path)
     
+    if RUN_TIMELINE_ENABLED:
+        try:
+            write_run_timeline(result_file)
+        except Exception as e:
+            logger.error(f"写入运行时间线失败: {str(e)}")
+    if METRICS_TEXTFILE:
+        try:
+            logger.info(f"运行指标已保存至 {write_metrics_textfile(METRICS_TEXTFILE)}")
+        except Exception as e:
+            logger.error(f"写入运行指标失败: {str(e)}")
+
+    if REPLAY_MODE != "off":
+        replay_stats = get_replay_stats()
+        logger.info(
+            f"录制/回放（{REPLAY_MODE}）: 录制 {replay_stats['recorded']} 条, "
+            f"回放 {replay_stats['replayed']} 条, 缺少记录 {replay_stats['missing']} 条"
+        )
+
     end_time = time.time()
     duration = end_time - start_time
     logger.info(f"ArXiv论文追踪和分析完成，总耗时: {duration:.2f}秒")
     logger.info(f"结果已保存至 {result_file.absolute()}")
+    return exit_code
 
 
 def fetch_paper_by_id(arxiv_id):
@@ -385,7 +822,7 @@ def fetch_paper_by_id(arxiv_id):
     backoff = 1
     for attempt in range(1, 4):
         try:
-            resp = requests.get(url, timeout=30)
+            resp = http_get("arxiv", url, timeout=30)
             if resp.status_code == 200:
                 feed = feedparser.parse(resp.content)
                 if not feed.entries:
@@ -452,7 +889,6 @@ def analyze_single_paper(arxiv_id, max_pages=10, thinking_mode=None):
 
 def analyze_local_pdf(pdf_path, max_pages=10, thinking_mode=None):
     """直接分析本地 PDF 文件，不依赖 arXiv 元数据"""
-    from pathlib import Path
     from analyzer import analyze_pdf_only
     
     start_time = time.time()
@@ -491,4 +927,8 @@ def analyze_local_pdf(pdf_path, max_pages=10, thinking_mode=None):
 
 
 if __name__ == "__main__":
-    main()
+    exit_code = main()
+    if exit_code is not None:
+        # 报告与邮件已经写出，不再等待仍在进行中的请求线程
+        logging.shutdown()
+        os._exit(exit_code)
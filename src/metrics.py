@@ -0,0 +1,262 @@
+# metrics.py - OpenMetrics 运行指标导出模块
+# 运行结束时把论文数量、模型调用、token 用量、延迟分布、缓存命中率、回退次数等写成 OpenMetrics 文本文件，
+# 可交给 node_exporter 的 textfile collector 采集；长时间运行时也可以在本地 HTTP 端口上实时提供。
+# 指标来源：run_meta 与 analysis_meta（由 main 在每次检查点时更新）、timeline 中 ai_call span 上的 token 用量、cache 的命中统计
+
+import logging
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from cache import get_cache_lookup_stats
+from config import CATEGORIES
+from timeline import get_timeline
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "arxiv_tracker"
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+# 模型调用耗时直方图的桶（秒）
+LATENCY_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+PRIORITY_LABELS = {1: "priority", 2: "secondary", 0: "irrelevant"}
+TOKEN_TYPES = (
+    ("prompt_tokens", "prompt"),
+    ("completion_tokens", "completion"),
+    ("cached_prompt_tokens", "cached_prompt"),
+)
+# analysis_meta 中表示各类回退的字段
+ANALYSIS_FALLBACK_FIELDS = (
+    ("fallback_used", "thinking"),
+    ("structured_output_fallback", "structured_output"),
+    ("speculative_fallback", "speculative"),
+)
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(round(value, 6))
+    return str(value)
+
+
+class OpenMetricsWriter:
+    """按指标族累积样本并输出 OpenMetrics 文本；base_labels 附加到每个样本上"""
+
+    def __init__(self, base_labels=None):
+        self.base_labels = dict(base_labels or {})
+        self._families = {}
+
+    def _family(self, name, metric_type, help_text):
+        full_name = f"{METRIC_PREFIX}_{name}"
+        family = self._families.get(full_name)
+        if family is None:
+            family = self._families[full_name] = {"type": metric_type, "help": help_text, "samples": []}
+        return full_name, family
+
+    def _add(self, family, sample_name, labels, value):
+        merged = {**self.base_labels, **{key: value for key, value in labels.items() if value is not None}}
+        family["samples"].append((sample_name, merged, value))
+
+    def gauge(self, name, help_text, value, **labels):
+        full_name, family = self._family(name, "gauge", help_text)
+        self._add(family, full_name, labels, value)
+
+    def counter(self, name, help_text, value, **labels):
+        full_name, family = self._family(name, "counter", help_text)
+        self._add(family, f"{full_name}_total", labels, value)
+
+    def histogram(self, name, help_text, values, buckets=LATENCY_BUCKETS, **labels):
+        full_name, family = self._family(name, "histogram", help_text)
+        values = list(values)
+        for bound in list(buckets) + [float("inf")]:
+            le = "+Inf" if math.isinf(bound) else _format_value(float(bound))
+            self._add(family, f"{full_name}_bucket", {**labels, "le": le}, sum(1 for value in values if value <= bound))
+        self._add(family, f"{full_name}_count", labels, len(values))
+        self._add(family, f"{full_name}_sum", labels, float(sum(values)))
+
+    def render(self):
+        lines = []
+        for full_name, family in self._families.items():
+            lines.append(f"# TYPE {full_name} {family['type']}")
+            lines.append(f"# HELP {full_name} {family['help']}")
+            for sample_name, labels, value in family["samples"]:
+                label_text = ",".join(f'{key}="{_escape_label_value(val)}"' for key, val in labels.items())
+                lines.append(f"{sample_name}{{{label_text}}} {_format_value(value)}" if label_text else f"{sample_name} {_format_value(value)}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class RunMetricsState:
+    """main 在每次写检查点与最终报告时更新的运行状态，HTTP 端点与最终文本文件都从这里读取"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.run_meta = {}
+            self.classified = {}
+            self.analyzed = {}
+            self.analysis_metas = []
+
+    def update(self, run_meta, classified=None, analyzed=None, analysis_metas=None):
+        with self._lock:
+            self.run_meta = dict(run_meta or {})
+            self.classified = dict(classified or {})
+            self.analyzed = dict(analyzed or {})
+            self.analysis_metas = [dict(meta) for meta in analysis_metas or [] if isinstance(meta, dict)]
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.run_meta), dict(self.classified), dict(self.analyzed), list(self.analysis_metas)
+
+
+_run_state = RunMetricsState()
+_metrics_server = None
+_server_lock = threading.Lock()
+
+
+def get_run_metrics_state():
+    return _run_state
+
+
+def _llm_groups(spans):
+    """按 (provider, model) 聚合 ai_call span"""
+    groups = {}
+    for span in spans:
+        if span.get("stage") != "ai_call":
+            continue
+        key = (span.get("provider") or "unknown", span.get("model") or "unknown")
+        groups.setdefault(key, []).append(span)
+    return groups
+
+
+def render_metrics(state=None, timeline=None, cache_stats=None, now=None):
+    """生成当前运行的 OpenMetrics 文本"""
+    state = state or _run_state
+    timeline = timeline or get_timeline()
+    cache_stats = get_cache_lookup_stats() if cache_stats is None else cache_stats
+    run_meta, classified, analyzed, analysis_metas = state.snapshot()
+    writer = OpenMetricsWriter(base_labels={"category_set": ",".join(CATEGORIES)})
+
+    # 运行状态
+    writer.gauge("run_timestamp_seconds", "指标生成时的 Unix 时间", round(time.time() if now is None else now, 3))
+    writer.gauge("run_duration_seconds", "本次运行已耗时", round(time.monotonic() - timeline.started_at, 3))
+    writer.gauge("partial_run", "本次运行是否部分完成", bool(run_meta.get("partial_run")))
+
+    # 论文数量
+    total_papers = run_meta.get("total_papers") or 0
+    already_reported = run_meta.get("already_reported_papers") or 0
+    writer.gauge("papers_listed", "arXiv 列出的论文数（含往期已报告的）", total_papers + already_reported)
+    writer.gauge("papers_already_reported", "因已在往期报告中而跳过的论文数", already_reported)
+    writer.gauge("papers_completed", "本次运行完成的论文数", run_meta.get("completed_papers") or 0)
+    for priority, label in PRIORITY_LABELS.items():
+        writer.gauge("papers_classified", "已得到结果的论文数（按结果类别）", classified.get(priority, 0), priority=label)
+    for priority, label in PRIORITY_LABELS.items():
+        writer.gauge("papers_analyzed", "真正完成（非降级结果）的论文数", analyzed.get(priority, 0), priority=label)
+
+    # 模型调用
+    groups = _llm_groups(timeline.snapshot())
+    for (provider, model), call_spans in sorted(groups.items()):
+        ok_calls = sum(1 for span in call_spans if span.get("ok"))
+        writer.counter("llm_calls", "模型调用次数", ok_calls, provider=provider, model=model, outcome="success")
+        writer.counter("llm_calls", "模型调用次数", len(call_spans) - ok_calls, provider=provider, model=model, outcome="failure")
+    for (provider, model), call_spans in sorted(groups.items()):
+        retries = sum(max(int(span.get("attempts") or 0) - 1, 0) for span in call_spans)
+        writer.counter("llm_retries", "模型调用的重试次数", retries, provider=provider, model=model)
+    for (provider, model), call_spans in sorted(groups.items()):
+        for field, token_type in TOKEN_TYPES:
+            tokens = sum(int(span.get(field) or 0) for span in call_spans)
+            writer.counter("llm_tokens", "模型调用的 token 用量", tokens, provider=provider, model=model, type=token_type)
+    for (provider, model), call_spans in sorted(groups.items()):
+        writer.histogram(
+            "llm_request_duration_seconds",
+            "单次模型调用的总耗时（含重试）",
+            [span["duration"] for span in call_spans],
+            provider=provider,
+            model=model,
+        )
+
+    # 缓存
+    for cache_type, stats in sorted(cache_stats.items()):
+        writer.counter("cache_lookups", "缓存查询次数", stats.get("hits", 0), cache_type=cache_type, result="hit")
+        writer.counter("cache_lookups", "缓存查询次数", stats.get("misses", 0), cache_type=cache_type, result="miss")
+    for cache_type, stats in sorted(cache_stats.items()):
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        writer.gauge("cache_hit_ratio", "缓存命中率", round(stats.get("hits", 0) / lookups, 4) if lookups else 0.0, cache_type=cache_type)
+
+    # 完整分析
+    writer.counter("analyses", "完整分析次数", sum(1 for meta in analysis_metas if not meta.get("from_cache")), source="model")
+    writer.counter("analyses", "完整分析次数", sum(1 for meta in analysis_metas if meta.get("from_cache")), source="cache")
+    for field, kind in ANALYSIS_FALLBACK_FIELDS:
+        writer.counter("analysis_fallbacks", "完整分析的回退次数", sum(1 for meta in analysis_metas if meta.get(field)), kind=kind)
+    writer.counter("analysis_cleanups", "调用 cleanup 模型修复的分析数", sum(1 for meta in analysis_metas if meta.get("cleanup_applied")))
+
+    budget = run_meta.get("budget")
+    if budget:
+        writer.gauge("budget_consumed_ratio", "运行预算的消耗比例", budget.get("consumed", 0.0))
+        writer.gauge("budget_degradation_level", "已触发的预算降级级别", budget.get("level", 0))
+
+    return writer.render()
+
+
+def write_metrics_textfile(path, content=None):
+    """原子地写出指标文件，避免采集方读到写了一半的内容"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(render_metrics() if content is None else content, encoding="utf-8")
+    tmp_path.replace(path)
+    return path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        try:
+            body = render_metrics().encode("utf-8")
+        except Exception as e:
+            logger.error(f"生成运行指标失败: {str(e)}")
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics: " + format, *args)
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """在后台线程中提供 /metrics，返回实际监听的端口；重复调用时复用已启动的服务"""
+    global _metrics_server
+    with _server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info(f"运行指标端点: http://{host}:{_metrics_server.server_address[1]}/metrics")
+        return _metrics_server.server_address[1]
+
+
+def stop_metrics_server():
+    global _metrics_server
+    with _server_lock:
+        if _metrics_server is not None:
+            _metrics_server.shutdown()
+            _metrics_server.server_close()
+            _metrics_server = None
@@ -0,0 +1,496 @@
+# mock_llm_server.py - 本地 OpenAI 兼容的模拟模型服务
+# 配合 custom 提供商（CUSTOM_API_BASE）使用，返回符合 StructuredPaperAnalysis / StructuredTopicClassification /
+# 翻译 schema 的 JSON，以及普通文本回退格式；可以注入延迟、抖动、429 限流、非法 JSON 与超时，
+# 用于在没有外部服务的情况下对 AIClient 的重试、回退、结构化恢复与并发逻辑做压力测试。
+#
+#   python src/mock_llm_server.py --port 8765 --latency 0.5 --jitter 0.2 --rate-limit 0.05 --malformed 0.05
+#   AI_PROVIDER=custom AI_MODEL=mock CUSTOM_API_BASE=http://127.0.0.1:8765/v1 CUSTOM_API_KEY=mock python src/main.py
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from analyzer import CLASSIFICATION_FALLBACK_PROMPT_PREFIX, SECTION_SPECS
+from translator import ABSTRACT_TRANSLATION_FALLBACK_PROMPT_PREFIX, TITLE_TRANSLATION_FALLBACK_PROMPT_PREFIX
+
+logger = logging.getLogger(__name__)
+
+MOCK_MODEL = "mock"
+# 分类结果 0（不相关）/ 1（重点）/ 2（了解）的默认权重
+DEFAULT_PRIORITY_WEIGHTS = (0.5, 0.2, 0.3)
+MALFORMED_KINDS = ("truncated", "fenced", "trailing_text")
+MOCK_PARAGRAPH = (
+    "本文研究带有非线性项的抛物型方程 $\\partial_t u - \\Delta u = f(u)$ 在 $H^s(\\mathbb{R}^n)$ 中的适定性, "
+    "在 $s > n/2$ 的假设下给出了解的存在唯一性与对初值的连续依赖, 并利用能量估计与 Sobolev 嵌入控制非线性项. "
+)
+_TITLE_PATTERN = re.compile(r"(?:论文标题|英文标题|标题)\s*[:：]\s*(.+)")
+
+
+def _message_text(messages):
+    parts = []
+    for message in messages or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, list):
+            content = "\n".join(str(item.get("text", "")) for item in content if isinstance(item, dict))
+        parts.append(str(content or ""))
+    return "\n".join(parts)
+
+
+def _last_user_text(messages):
+    for message in reversed(messages or []):
+        if isinstance(message, dict) and message.get("role") == "user":
+            return _message_text([message])
+    return ""
+
+
+def find_json_schema(text):
+    """在请求文本中找到 instructor 或 schema 提示嵌入的 JSON schema（含 properties 的对象）"""
+    decoder = json.JSONDecoder()
+    search_from = 0
+    while True:
+        position = text.find('"properties"', search_from)
+        if position < 0:
+            return None
+        brace = text.rfind("{", 0, position)
+        for _ in range(8):
+            if brace < 0:
+                break
+            try:
+                candidate, _ = decoder.raw_decode(text, brace)
+            except ValueError:
+                candidate = None
+            if isinstance(candidate, dict) and isinstance(candidate.get("properties"), dict):
+                return candidate
+            brace = text.rfind("{", 0, brace)
+        search_from = position + 1
+
+
+def _paper_title(text):
+    match = _TITLE_PATTERN.search(text)
+    return match.group(1).strip()[:80] if match else "模拟论文"
+
+
+def _paragraph(section_chars):
+    repeats = max(section_chars // len(MOCK_PARAGRAPH), 1)
+    return (MOCK_PARAGRAPH * repeats).strip()
+
+
+class MockResponder:
+    """
+    根据请求内容生成响应正文；同一请求内容总是得到相同的分类结果，便于对比不同运行
+
+    Args:
+        priority_weights: 分类结果 0 / 1 / 2 的权重
+        section_chars: 分析与摘要翻译每个字段的大致字数
+        seed: 分类结果的随机种子
+    """
+
+    def __init__(self, priority_weights=DEFAULT_PRIORITY_WEIGHTS, section_chars=400, seed=0):
+        self.priority_weights = tuple(priority_weights)
+        self.section_chars = section_chars
+        self.seed = seed
+
+    def _request_rng(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        return random.Random(f"{self.seed}:{digest}")
+
+    def _priority(self, text):
+        return self._request_rng(text).choices((0, 1, 2), weights=self.priority_weights)[0]
+
+    def _value(self, name, spec, text, priority):
+        if "enum" in spec:
+            return spec["enum"][0]
+        if name == "priority":
+            return priority
+        if name == "reason":
+            return "不相关（模拟）" if priority == 0 else "涉及抛物型方程的适定性与能量估计（模拟）"
+        if name == "chinese_title":
+            return f"关于{_paper_title(text)}的研究（模拟）"
+        value_type = spec.get("type")
+        if value_type == "integer":
+            return 0
+        if value_type == "number":
+            return 0.0
+        if value_type == "boolean":
+            return False
+        if value_type == "array":
+            return []
+        if value_type == "object":
+            return {}
+        return _paragraph(self.section_chars)
+
+    def structured_content(self, schema, messages):
+        """按 schema 的 properties 生成 JSON 正文；分类结果只取决于论文内容，不受 schema 提示文本的影响"""
+        user_text = _last_user_text(messages)
+        priority = self._priority(user_text)
+        payload = {
+            name: self._value(name, spec if isinstance(spec, dict) else {}, user_text, priority)
+            for name, spec in schema["properties"].items()
+        }
+        return json.dumps(payload, ensure_ascii=False)
+
+    def text_content(self, messages):
+        """普通文本回退：分类、标题/摘要翻译与 Markdown 分析各自的输出格式"""
+        user_text = _last_user_text(messages)
+        title = _paper_title(user_text)
+        if user_text.startswith(CLASSIFICATION_FALLBACK_PROMPT_PREFIX):
+            priority = self._priority(user_text)
+            return "不相关" if priority == 0 else f"优先级{priority} - 涉及抛物型方程的适定性与能量估计（模拟）"
+        if user_text.startswith(TITLE_TRANSLATION_FALLBACK_PROMPT_PREFIX):
+            return f"**中文标题**: 关于{title}的研究（模拟）"
+        if user_text.startswith(ABSTRACT_TRANSLATION_FALLBACK_PROMPT_PREFIX):
+            return f"**中文标题**: 关于{title}的研究（模拟）\n\n**摘要翻译**: {_paragraph(self.section_chars)}"
+        sections = "\n\n".join(
+            f"### {index}. {heading}\n{_paragraph(self.section_chars)}" for index, (heading, _) in enumerate(SECTION_SPECS, 1)
+        )
+        return f"# 关于{title}的研究（模拟）\n\n## 详细分析\n\n{sections}"
+
+    def content_for(self, body):
+        """返回 (正文, 是否为 JSON 请求)"""
+        messages = body.get("messages") or []
+        text = _message_text(messages)
+        schema = find_json_schema(text)
+        if schema is not None:
+            return self.structured_content(schema, messages), True
+        return self.text_content(messages), False
+
+
+def malform_json(content, kind):
+    """生成三类常见的非法 JSON：截断、Markdown 代码块包裹、JSON 后面跟解释文字"""
+    if kind == "truncated":
+        return content[: max(len(content) // 2, 1)]
+    if kind == "fenced":
+        return f"```json\n{content}\n```"
+    return f"{content}\n\n以上是按要求输出的 JSON。"
+
+
+def estimate_tokens(text):
+    return max(len(text) // 2, 1)
+
+
+def completion_payload(content, model, prompt_tokens):
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def stream_payloads(content, model, prompt_tokens, chunk_chars=40, include_usage=False):
+    """按 OpenAI 流式格式切分正文，最后一个数据块带 finish_reason（以及可选的 usage）"""
+    completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    def chunk(delta, finish_reason=None, usage=None):
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage is not None:
+            payload["usage"] = usage
+        return payload
+
+    chunks = [chunk({"role": "assistant", "content": ""})]
+    for start in range(0, len(content), max(chunk_chars, 1)):
+        chunks.append(chunk({"content": content[start:start + chunk_chars]}))
+    usage = None
+    if include_usage:
+        completion_tokens = estimate_tokens(content)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+    chunks.append(chunk({}, finish_reason="stop", usage=usage))
+    return chunks
+
+
+def error_payload(message, error_type, code):
+    return {"error": {"message": message, "type": error_type, "code": code}}
+
+
+class _TokenBucket:
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class _MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": MOCK_MODEL, "object": "model", "owned_by": "mock"}]})
+        elif path == "/stats":
+            self._send_json(200, self.server.mock.stats())
+        else:
+            self._send_json(404, error_payload("not found", "invalid_request_error", "not_found"))
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        length = int(self.headers.get("Content-Length") or 0)
+        raw_body = self.rfile.read(length) if length else b""
+        if not path.endswith("/chat/completions"):
+            self._send_json(404, error_payload("not found", "invalid_request_error", "not_found"))
+            return
+        try:
+            body = json.loads(raw_body or b"{}")
+        except ValueError:
+            self._send_json(400, error_payload("invalid JSON body", "invalid_request_error", "invalid_json"))
+            return
+        self.server.mock.handle_completion(self, body)
+
+    def log_message(self, format, *args):
+        logger.debug("mock-llm: " + format, *args)
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    # listen 队列需要在绑定端口时就设好，突发的数百个并发连接才不会被重置
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class MockLLMServer:
+    """
+    OpenAI 兼容的 /v1/chat/completions 模拟服务
+
+    每个请求依次判断：超过 rps_limit 或按 rate_limit 概率返回 429；按 timeout 概率挂起 timeout_seconds 秒后断开；
+    否则等待 latency ± jitter 秒，JSON 请求再按 malformed 概率返回非法 JSON。
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=8765,
+        latency=0.2,
+        jitter=0.05,
+        rate_limit=0.0,
+        rps_limit=0.0,
+        malformed=0.0,
+        timeout=0.0,
+        timeout_seconds=600.0,
+        stream_chunk_chars=40,
+        stream_chunk_delay=0.0,
+        retry_after=1,
+        responder=None,
+        seed=0,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.malformed = malformed
+        self.timeout = timeout
+        self.timeout_seconds = timeout_seconds
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_chunk_delay = stream_chunk_delay
+        self.retry_after = retry_after
+        self.responder = responder or MockResponder(seed=seed)
+        self._bucket = _TokenBucket(rps_limit) if rps_limit > 0 else None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stats = {"requests": 0, "ok": 0, "streamed": 0, "rate_limited": 0, "malformed": 0, "timeouts": 0}
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        port = self._httpd.server_address[1] if self._httpd is not None else self.port
+        return f"http://{self.host}:{port}/v1"
+
+    def _count(self, field):
+        with self._lock:
+            self._stats[field] += 1
+
+    def _roll(self, probability):
+        if probability <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < probability
+
+    def _delay(self):
+        with self._lock:
+            offset = self._rng.gauss(0, self.jitter) if self.jitter > 0 else 0.0
+        return max(self.latency + offset, 0.0)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def handle_completion(self, handler, body):
+        self._count("requests")
+        if (self._bucket is not None and not self._bucket.acquire()) or self._roll(self.rate_limit):
+            self._count("rate_limited")
+            handler._send_json(
+                429,
+                error_payload("Rate limit reached for mock model (429 too many requests)", "rate_limit_error", "rate_limit_exceeded"),
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            return
+        if self._roll(self.timeout):
+            # 挂起到客户端超时，之后直接断开连接，不返回响应
+            self._count("timeouts")
+            self._stopping.wait(self.timeout_seconds)
+            handler.close_connection = True
+            return
+
+        content, is_json = self.responder.content_for(body)
+        if is_json and self._roll(self.malformed):
+            self._count("malformed")
+            with self._lock:
+                kind = self._rng.choice(MALFORMED_KINDS)
+            content = malform_json(content, kind)
+        model = body.get("model") or MOCK_MODEL
+        prompt_tokens = estimate_tokens(_message_text(body.get("messages")))
+        self._stopping.wait(self._delay())
+
+        if body.get("stream"):
+            self._count("streamed")
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            handler.send_response(200)
+            handler.send_header("Content-Type", "text/event-stream")
+            handler.send_header("Cache-Control", "no-cache")
+            handler.send_header("Connection", "close")
+            handler.end_headers()
+            handler.close_connection = True
+            try:
+                for payload in stream_payloads(content, model, prompt_tokens, self.stream_chunk_chars, include_usage):
+                    handler.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    handler.wfile.flush()
+                    if self.stream_chunk_delay:
+                        self._stopping.wait(self.stream_chunk_delay)
+                handler.wfile.write(b"data: [DONE]\n\n")
+                handler.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端提前停止读取（结构化 JSON 已完整）
+                return
+        else:
+            handler._send_json(200, completion_payload(content, model, prompt_tokens))
+        self._count("ok")
+
+    def start(self):
+        """在后台线程启动服务，返回 base_url；port=0 时由系统分配端口"""
+        self._httpd = _MockHTTPServer((self.host, self.port), _MockLLMHandler)
+        self._httpd.mock = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-llm-http", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._stopping.set()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _parse_weights(value):
+    weights = tuple(float(part) for part in value.split(","))
+    if len(weights) != 3 or any(weight < 0 for weight in weights) or not sum(weights):
+        raise argparse.ArgumentTypeError("需要三个非负权重，例如 0.5,0.2,0.3")
+    return weights
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地模拟模型服务（配合 AI_PROVIDER=custom 使用）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="每个请求的基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="延迟的正态抖动标准差（秒）")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="随机返回 429 的概率")
+    parser.add_argument("--rps-limit", type=float, default=0.0, help="每秒允许的请求数，超出返回 429，0 表示不限")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 响应的 Retry-After 秒数")
+    parser.add_argument("--malformed", type=float, default=0.0, help="结构化请求返回非法 JSON 的概率")
+    parser.add_argument("--timeout", type=float, default=0.0, help="挂起请求直到客户端超时的概率")
+    parser.add_argument("--timeout-seconds", type=float, default=600.0, help="挂起请求的时长（秒）")
+    parser.add_argument("--priority-weights", type=_parse_weights, default=DEFAULT_PRIORITY_WEIGHTS,
+                        help="分类结果 0,1,2 的权重，默认 0.5,0.2,0.3")
+    parser.add_argument("--section-chars", type=int, default=400, help="分析与摘要翻译每个字段的大致字数")
+    parser.add_argument("--stream-chunk-chars", type=int, default=40, help="流式响应每个数据块的字数")
+    parser.add_argument("--stream-chunk-delay", type=float, default=0.0, help="流式数据块之间的间隔（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    server = MockLLMServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        rps_limit=args.rps_limit,
+        malformed=args.malformed,
+        timeout=args.timeout,
+        timeout_seconds=args.timeout_seconds,
+        stream_chunk_chars=args.stream_chunk_chars,
+        stream_chunk_delay=args.stream_chunk_delay,
+        retry_after=args.retry_after,
+        responder=MockResponder(priority_weights=args.priority_weights, section_chars=args.section_chars, seed=args.seed),
+        seed=args.seed,
+    )
+    base_url = server.start()
+    logger.info(f"模拟模型服务已启动: {base_url}")
+    logger.info(f"使用方式: AI_PROVIDER=custom AI_MODEL={MOCK_MODEL} CUSTOM_API_BASE={base_url} CUSTOM_API_KEY=mock")
+    try:
+        while True:
+            time.sleep(60)
+            logger.info(f"请求统计: {server.stats()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        logger.info(f"已停止，请求统计: {server.stats()}")
+
+
+if __name__ == "__main__":
+    main()
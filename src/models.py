@@ -1,7 +1,8 @@
 # models.py - 数据模型
 
 import datetime
-import requests
+
+from replay import http_get
 
 class SimpleAuthor:
     def __init__(self, name):
@@ -23,7 +24,7 @@ class SimplePaper:
 
     def download_pdf(self, filename):
         pdf_url = self.entry_id.replace('/abs/', '/pdf/') + '.pdf'
-        response = requests.get(pdf_url, stream=True, timeout=30)
+        response = http_get("pdf", pdf_url, stream=True, timeout=30)
         response.raise_for_status()
         with open(filename, 'wb') as f:
             for chunk in response.iter_content(chunk_size=1024 * 64):
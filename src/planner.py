@@ -0,0 +1,347 @@
+# planner.py - 批量运行前的 token / 费用 / 耗时预估模块
+# --plan 模式只读取本地缓存与已下载的 PDF，不调用任何模型：
+# 已缓存的分类结果直接采用，未分类的论文按历史比例折算，每个阶段分别估算输入/输出 token
+
+import logging
+from pathlib import Path
+
+from analyzer import (
+    build_analysis_messages,
+    build_classification_messages,
+    extract_pdf_text,
+    has_cached_analysis,
+)
+from cache import get_cached_classification, get_cached_translation
+from config import (
+    AI_INPUT_PRICE_PER_MTOK,
+    AI_MODEL,
+    AI_OUTPUT_PRICE_PER_MTOK,
+    ANALYSIS_THINKING_BUDGET,
+    ANALYSIS_THINKING_MODE,
+    ASYNC_BATCH_ENABLED,
+    ASYNC_CONCURRENCY,
+    MAX_THREADS,
+    PAPERS_DIR,
+    PRIORITY_ANALYSIS_DELAY,
+    SECONDARY_ANALYSIS_DELAY,
+)
+from tokens import approximate_text_tokens, estimate_message_tokens
+from translator import build_translation_messages
+
+logger = logging.getLogger(__name__)
+
+# 各阶段典型的输出 token 数
+CLASSIFICATION_COMPLETION_TOKENS = 120
+TITLE_TRANSLATION_COMPLETION_TOKENS = 60
+ANALYSIS_COMPLETION_TOKENS = 2500
+THINKING_COMPLETION_TOKENS = 4000
+# 摘要翻译成中文后 token 数大致是英文原文的 1.5 倍
+ABSTRACT_TRANSLATION_RATIO = 1.5
+# 没有本地 PDF 时按每页 token 数估算完整分析的输入
+PDF_PAGE_TOKENS = 900
+# 未分类论文的优先级比例（本批次已缓存的分类不足 MIN_KNOWN_FOR_SHARES 篇时使用）
+DEFAULT_PRIORITY_SHARES = {1: 0.2, 2: 0.3, 0: 0.5}
+MIN_KNOWN_FOR_SHARES = 5
+# 请求耗时模型：固定开销 + 输入处理 + 逐 token 生成
+BASE_LATENCY_SECONDS = 2.0
+PROMPT_TOKENS_PER_SECOND = 4000.0
+COMPLETION_TOKENS_PER_SECOND = 40.0
+# process_single_paper_task 开始时的随机等待 uniform(0, 2) 的均值
+TASK_JITTER_SECONDS = 1.0
+
+STAGES = (
+    ("classification", "分类"),
+    ("analysis", "完整分析"),
+    ("abstract_translation", "摘要翻译"),
+    ("title_translation", "标题翻译"),
+)
+
+
+def estimate_request_seconds(prompt_tokens, completion_tokens):
+    """按固定开销 + 输入/输出吞吐估算单个请求的耗时"""
+    if not prompt_tokens and not completion_tokens:
+        return 0.0
+    return BASE_LATENCY_SECONDS + prompt_tokens / PROMPT_TOKENS_PER_SECOND + completion_tokens / COMPLETION_TOKENS_PER_SECOND
+
+
+class StageEstimate:
+    """一个阶段累计的请求数与 token 数；未分类论文按概率折算，数值可以是小数"""
+
+    def __init__(self):
+        self.calls = 0.0
+        self.cached_calls = 0.0
+        self.prompt_tokens = 0.0
+        self.completion_tokens = 0.0
+
+    def add(self, prompt_tokens, completion_tokens, weight=1.0):
+        self.calls += weight
+        self.prompt_tokens += prompt_tokens * weight
+        self.completion_tokens += completion_tokens * weight
+
+    def add_cached(self, weight=1.0):
+        self.cached_calls += weight
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+
+class RunPlan:
+    """一次批量运行的预估结果"""
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name or AI_MODEL
+        self.papers = []
+        self.stages = {name: StageEstimate() for name, _ in STAGES}
+        self.worst_case = {name: StageEstimate() for name, _ in STAGES}
+        self.expected_priorities = {1: 0.0, 2: 0.0, 0: 0.0}
+        self.classified = 0
+        self.priority_shares = dict(DEFAULT_PRIORITY_SHARES)
+        self.task_seconds = []
+        self.worst_task_seconds = []
+        self.light_seconds = 0.0
+        self.worst_light_seconds = 0.0
+        self.skipped_papers = 0
+
+    @staticmethod
+    def _sum(stages, attr):
+        return sum(getattr(stage, attr) for stage in stages.values())
+
+    @property
+    def prompt_tokens(self):
+        return self._sum(self.stages, "prompt_tokens")
+
+    @property
+    def completion_tokens(self):
+        return self._sum(self.stages, "completion_tokens")
+
+    @property
+    def worst_prompt_tokens(self):
+        return self._sum(self.worst_case, "prompt_tokens")
+
+    @property
+    def worst_completion_tokens(self):
+        return self._sum(self.worst_case, "completion_tokens")
+
+    @staticmethod
+    def estimate_cost(prompt_tokens, completion_tokens):
+        """按配置的单价估算费用（美元）；未配置单价时返回 None"""
+        if not AI_INPUT_PRICE_PER_MTOK and not AI_OUTPUT_PRICE_PER_MTOK:
+            return None
+        return (prompt_tokens * AI_INPUT_PRICE_PER_MTOK + completion_tokens * AI_OUTPUT_PRICE_PER_MTOK) / 1_000_000
+
+    @staticmethod
+    def _wall_seconds(task_seconds, light_seconds):
+        if not task_seconds:
+            return light_seconds
+        threads = max(int(MAX_THREADS or 1), 1)
+        return light_seconds + max(sum(task_seconds) / threads, max(task_seconds))
+
+    @property
+    def wall_seconds(self):
+        return self._wall_seconds(self.task_seconds, self.light_seconds)
+
+    @property
+    def worst_wall_seconds(self):
+        return self._wall_seconds(self.worst_task_seconds, self.worst_light_seconds)
+
+
+def _local_pdf_path(paper, papers_dir):
+    return Path(papers_dir) / f"{paper.get_short_id().replace('/', '_')}.pdf"
+
+
+def _estimate_analysis_prompt(paper, max_pages, papers_dir, model_name):
+    """已下载的 PDF 直接提取文本精确估算，否则按页数估算；返回 (token 数, 来源)"""
+    pdf_path = _local_pdf_path(paper, papers_dir)
+    if pdf_path.exists():
+        try:
+            pdf_content = extract_pdf_text(str(pdf_path), max_pages=max_pages)
+            messages = build_analysis_messages(pdf_content, paper=paper)
+            return estimate_message_tokens(messages, model_name=model_name), "pdf"
+        except Exception as e:
+            logger.warning(f"提取本地 PDF 文本失败，改为按页数估算 {paper.title}: {str(e)}")
+    template_tokens = estimate_message_tokens(build_analysis_messages("", paper=paper), model_name=model_name)
+    pages = max_pages if max_pages else 20
+    return template_tokens + pages * PDF_PAGE_TOKENS, "estimate"
+
+
+def _analysis_completion_tokens(thinking_mode):
+    if thinking_mode:
+        return ANALYSIS_COMPLETION_TOKENS + (ANALYSIS_THINKING_BUDGET or THINKING_COMPLETION_TOKENS)
+    return ANALYSIS_COMPLETION_TOKENS
+
+
+def _analysis_cached(paper, thinking_mode):
+    try:
+        return has_cached_analysis(paper.get_short_id(), thinking_mode=thinking_mode)
+    except Exception as e:
+        # 主模型凭据缺失等情况下无法得到缓存 key，按未缓存估算
+        logger.debug(f"无法检查分析缓存 {paper.title}: {str(e)}")
+        return False
+
+
+def build_run_plan(papers, thinking_mode=None, max_pages=10, papers_dir=PAPERS_DIR, skipped_papers=0):
+    """
+    在不调用模型的前提下估算一批论文各阶段的 token、费用与耗时
+
+    Args:
+        papers: 待处理论文（已经过已处理索引过滤）
+        thinking_mode: 完整分析是否开启深度思考，None 时使用 ANALYSIS_THINKING_MODE
+        skipped_papers: 被已处理索引跳过的论文数，仅用于展示
+    """
+    papers = list(papers)
+    if thinking_mode is None:
+        thinking_mode = bool(ANALYSIS_THINKING_MODE)
+    plan = RunPlan()
+    plan.skipped_papers = skipped_papers
+    model_name = plan.model_name
+
+    cached_priorities = {}
+    for paper in papers:
+        cached = get_cached_classification(paper.get_short_id())
+        if cached is not None:
+            cached_priorities[paper.get_short_id()] = int(cached[0])
+    plan.classified = len(cached_priorities)
+    if len(cached_priorities) >= MIN_KNOWN_FOR_SHARES:
+        plan.priority_shares = {
+            priority: sum(1 for value in cached_priorities.values() if value == priority) / len(cached_priorities)
+            for priority in (1, 2, 0)
+        }
+
+    analysis_completion = _analysis_completion_tokens(thinking_mode)
+    for paper in papers:
+        arxiv_id = paper.get_short_id()
+        abstract = getattr(paper, "summary", "") or ""
+        known_priority = cached_priorities.get(arxiv_id)
+        row = {"arxiv_id": arxiv_id, "title": paper.title, "priority": known_priority, "analysis_source": ""}
+
+        classify_seconds = 0.0
+        if known_priority is None:
+            prompt = estimate_message_tokens(build_classification_messages(paper, abstract), model_name=model_name)
+            for stages in (plan.stages, plan.worst_case):
+                stages["classification"].add(prompt, CLASSIFICATION_COMPLETION_TOKENS)
+            classify_seconds = estimate_request_seconds(prompt, CLASSIFICATION_COMPLETION_TOKENS)
+            shares = plan.priority_shares
+        else:
+            for stages in (plan.stages, plan.worst_case):
+                stages["classification"].add_cached()
+            shares = {priority: float(priority == known_priority) for priority in (1, 2, 0)}
+
+        # 每个优先级分支的请求与耗时；worst case 假设未分类论文全部为重点论文
+        branches = {}
+        if shares.get(1) or known_priority is None:
+            if _analysis_cached(paper, thinking_mode):
+                row["analysis_source"] = "cache"
+                branches[1] = ("analysis", None, 0.0, PRIORITY_ANALYSIS_DELAY)
+            else:
+                prompt, row["analysis_source"] = _estimate_analysis_prompt(paper, max_pages, papers_dir, model_name)
+                branches[1] = (
+                    "analysis",
+                    (prompt, analysis_completion),
+                    estimate_request_seconds(prompt, analysis_completion),
+                    PRIORITY_ANALYSIS_DELAY,
+                )
+        for priority, stage, title_only in ((2, "abstract_translation", False), (0, "title_translation", True)):
+            if not shares.get(priority):
+                continue
+            if get_cached_translation(arxiv_id, title_only=title_only) is not None:
+                branches[priority] = (stage, None, 0.0, SECONDARY_ANALYSIS_DELAY)
+                continue
+            prompt = estimate_message_tokens(build_translation_messages(paper, translate_title_only=title_only), model_name=model_name)
+            if title_only:
+                completion = TITLE_TRANSLATION_COMPLETION_TOKENS
+            else:
+                completion = TITLE_TRANSLATION_COMPLETION_TOKENS + approximate_text_tokens(abstract) * ABSTRACT_TRANSLATION_RATIO
+            branches[priority] = (stage, (prompt, completion), estimate_request_seconds(prompt, completion), SECONDARY_ANALYSIS_DELAY)
+
+        expected_task = 0.0
+        expected_light = classify_seconds
+        for priority, share in shares.items():
+            plan.expected_priorities[priority] += share
+            if not share or priority not in branches:
+                continue
+            stage, tokens, seconds, delay = branches[priority]
+            if tokens is None:
+                plan.stages[stage].add_cached(share)
+            else:
+                plan.stages[stage].add(*tokens, weight=share)
+            expected_task += share * (delay + (seconds if stage == "analysis" or not ASYNC_BATCH_ENABLED else 0.0))
+            if stage != "analysis":
+                expected_light += share * seconds
+
+        worst_priority = 1 if known_priority is None else known_priority
+        stage, tokens, seconds, delay = branches[worst_priority]
+        if tokens is None:
+            plan.worst_case[stage].add_cached()
+        else:
+            plan.worst_case[stage].add(*tokens)
+        worst_task = delay + (seconds if stage == "analysis" or not ASYNC_BATCH_ENABLED else 0.0)
+        worst_light = classify_seconds + (seconds if stage != "analysis" else 0.0)
+
+        # 异步预取开启时，分类与翻译先以 ASYNC_CONCURRENCY 并发完成，线程池中只剩下完整分析
+        if ASYNC_BATCH_ENABLED:
+            plan.light_seconds += expected_light / max(ASYNC_CONCURRENCY, 1)
+            plan.worst_light_seconds += worst_light / max(ASYNC_CONCURRENCY, 1)
+        else:
+            expected_task += classify_seconds
+            worst_task += classify_seconds
+        plan.task_seconds.append(TASK_JITTER_SECONDS + expected_task)
+        plan.worst_task_seconds.append(TASK_JITTER_SECONDS + worst_task)
+        plan.papers.append(row)
+
+    return plan
+
+
+def _pad_label(label, width=4):
+    # 中文标签用全角空格补齐，保证表格列对齐
+    return label + "\u3000" * max(width - len(label), 0)
+
+
+def _format_minutes(seconds):
+    return f"{seconds / 60:.1f} 分钟"
+
+
+def _format_cost(cost):
+    return "未配置单价" if cost is None else f"${cost:.4f}"
+
+
+def format_run_plan(plan: RunPlan) -> str:
+    priority_labels = {1: "重点", 2: "了解", 0: "不相关", None: "待分类"}
+    source_labels = {"cache": "分析已缓存", "pdf": "本地PDF", "estimate": "按页数估算", "": ""}
+    lines = ["📋 运行计划（未调用任何模型）:"]
+    skipped = f"，往期已报告跳过 {plan.skipped_papers} 篇" if plan.skipped_papers else ""
+    lines.append(f"   待处理论文: {len(plan.papers)} 篇{skipped}")
+    for row in plan.papers:
+        source = source_labels.get(row["analysis_source"], "")
+        suffix = f" [{source}]" if source and row["priority"] in (1, None) else ""
+        lines.append(f"     - {row['arxiv_id']} ({priority_labels[row['priority']]}) {row['title']}{suffix}")
+    lines.append(f"   分类结果已缓存: {plan.classified} 篇，待分类: {len(plan.papers) - plan.classified} 篇")
+    shares = plan.priority_shares
+    lines.append(
+        f"   未分类论文按比例折算: 重点 {shares[1]:.0%} / 了解 {shares[2]:.0%} / 不相关 {shares[0]:.0%}"
+    )
+    expected = plan.expected_priorities
+    lines.append(f"   预计重点 / 了解 / 不相关: {expected[1]:.1f} / {expected[2]:.1f} / {expected[0]:.1f} 篇")
+    lines.append(f"   模型: {plan.model_name}")
+    lines.append(f"   {_pad_label('阶段')}    请求数  缓存命中    输入tokens    输出tokens")
+    for name, label in STAGES:
+        stage = plan.stages[name]
+        lines.append(
+            f"   {_pad_label(label)}{stage.calls:>10.1f}{stage.cached_calls:>12.1f}"
+            f"{stage.prompt_tokens:>14,.0f}{stage.completion_tokens:>14,.0f}"
+        )
+    lines.append(
+        f"   合计: 输入 {plan.prompt_tokens:,.0f} / 输出 {plan.completion_tokens:,.0f} tokens，"
+        f"费用 {_format_cost(RunPlan.estimate_cost(plan.prompt_tokens, plan.completion_tokens))}"
+    )
+    concurrency = f"MAX_THREADS={MAX_THREADS}"
+    if ASYNC_BATCH_ENABLED:
+        concurrency += f", ASYNC_CONCURRENCY={ASYNC_CONCURRENCY}"
+    lines.append(f"   预计耗时: {_format_minutes(plan.wall_seconds)} ({concurrency})")
+    lines.append(
+        f"   最坏情况（待分类论文全部为重点论文）: 输入 {plan.worst_prompt_tokens:,.0f} / "
+        f"输出 {plan.worst_completion_tokens:,.0f} tokens，"
+        f"费用 {_format_cost(RunPlan.estimate_cost(plan.worst_prompt_tokens, plan.worst_completion_tokens))}，"
+        f"耗时 {_format_minutes(plan.worst_wall_seconds)}"
+    )
+    return "\n".join(lines)
@@ -0,0 +1,372 @@
+# profiling.py - 按需开启的 CPU 性能剖析模块
+# --profile 时用 cProfile 剖析整次运行或选定阶段（阶段名与 timeline 的 span 一致），每个线程单独一个 Profile；
+# 同时用标准库采样器按固定间隔抓取各线程调用栈，写出可在 speedscope 中打开的火焰图。
+# --profile-cpu 时线程等待网络（模型请求、PDF 下载、arXiv 抓取、发邮件）期间暂停剖析，结果只反映本地 CPU 开销
+
+import contextlib
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+from timeline import NETWORK_WAIT_STAGE, add_span_hook, remove_span_hook
+
+logger = logging.getLogger(__name__)
+
+# 可单独剖析的阶段，与 timeline 中的 span 名称一致
+PROFILE_STAGES = (
+    "arxiv_fetch",
+    "paper_task",
+    "pdf_download",
+    "pdf_extract",
+    "structured_parse",
+    "analysis_parse",
+    "analysis_cleanup",
+    "async_task",
+    "report_write",
+    "email_format",
+    "email_send",
+)
+# 这些阶段主要在等待网络，--profile-cpu 时暂停剖析
+NETWORK_STAGES = frozenset((NETWORK_WAIT_STAGE, "arxiv_fetch", "pdf_download", "email_send"))
+# 采样间隔（秒）与单个调用栈保留的最大深度
+SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 256
+# --profile-cpu 时丢弃停在这些函数上的样本（等待锁、队列、IO 多路复用）
+IDLE_LEAF_FUNCTIONS = frozenset(
+    (
+        ("threading.py", "wait"),
+        ("threading.py", "_wait_for_tstate_lock"),
+        ("queue.py", "get"),
+        ("selectors.py", "select"),
+        ("_base.py", "wait"),
+    )
+)
+
+
+def parse_profile_stages(value):
+    """解析 --profile 的取值：all 表示整次运行，否则为逗号分隔的阶段名；返回 None 或阶段名元组"""
+    if value is None or value.strip().lower() in ("", "all"):
+        return None
+    stages = tuple(dict.fromkeys(item.strip() for item in value.split(",") if item.strip()))
+    unknown = [stage for stage in stages if stage not in PROFILE_STAGES]
+    if unknown:
+        raise ValueError(f"未知的剖析阶段: {', '.join(unknown)}，可选: all, {', '.join(PROFILE_STAGES)}")
+    return stages or None
+
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "thread"
+
+
+class _ThreadProfile:
+    """单个线程的剖析状态；depth 为正且没有暂停时该线程的 cProfile 处于开启状态"""
+
+    def __init__(self, name):
+        self.name = name
+        self.profile = cProfile.Profile()
+        self.depth = 0
+        self.paused = 0
+        self.tracked = False
+        self.enabled = False
+        self.used = False
+
+
+class RunProfiler:
+    """
+    一次运行的剖析器
+
+    stages 为 None 时剖析整次运行：主线程从 start 起、工作线程在 profile_task 包装的任务内开启；
+    否则只在对应阶段的 span 内开启。cpu_only 时在网络等待期间暂停。
+    """
+
+    def __init__(self, stages=None, cpu_only=False, sample_interval=SAMPLE_INTERVAL):
+        self.stages = frozenset(stages) if stages else None
+        self.cpu_only = cpu_only
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._states = []
+        self._active_states = {}
+        self._frames = {}
+        self._frame_list = []
+        self._samples = {}
+        self._stop = threading.Event()
+        self._sampler = None
+        self._profiler_error_logged = False
+        self.started_at = None
+        self.elapsed_seconds = 0.0
+
+    @property
+    def whole_run(self):
+        return self.stages is None
+
+    # ============ 按线程开启/暂停 cProfile ============
+
+    def _state(self):
+        state = getattr(self._local, "state", None)
+        if state is None:
+            thread = threading.current_thread()
+            state = _ThreadProfile(thread.name)
+            self._local.state = state
+            with self._lock:
+                self._states.append(state)
+                self._active_states[thread.ident] = state
+        return state
+
+    def _sync(self, state):
+        should_run = state.depth > 0 and state.paused == 0
+        if should_run and not state.enabled:
+            try:
+                state.profile.enable()
+            except ValueError as e:
+                # 同一线程已有其他剖析器（如调试器）时跳过，不影响运行
+                if not self._profiler_error_logged:
+                    self._profiler_error_logged = True
+                    logger.warning(f"无法在线程 {state.name} 上开启 cProfile: {str(e)}")
+                return
+            state.enabled = True
+            state.used = True
+        elif not should_run and state.enabled:
+            state.profile.disable()
+            state.enabled = False
+
+    @contextlib.contextmanager
+    def active(self):
+        """在当前线程上开启剖析，可以嵌套"""
+        state = self._state()
+        state.tracked = True
+        state.depth += 1
+        self._sync(state)
+        try:
+            yield
+        finally:
+            state.depth -= 1
+            self._sync(state)
+
+    @contextlib.contextmanager
+    def paused(self):
+        """在当前线程上暂停剖析，可以嵌套"""
+        state = self._state()
+        state.paused += 1
+        self._sync(state)
+        try:
+            yield
+        finally:
+            state.paused -= 1
+            self._sync(state)
+
+    def _span_hook(self, stage):
+        if self.cpu_only and stage in NETWORK_STAGES:
+            return self.paused()
+        if self.stages is not None and stage in self.stages:
+            return self.active()
+        return None
+
+    def wrap_task(self, func):
+        """整次运行模式下，在工作线程中剖析整个任务"""
+        if not self.whole_run:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.active():
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    # ============ 调用栈采样 ============
+
+    def _frame_index(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frames.get(key)
+        if index is None:
+            index = self._frames[key] = len(self._frame_list)
+            self._frame_list.append(key)
+        return index
+
+    def _should_sample(self, state):
+        if state is None:
+            # 从未登记的线程（如流式读取、推测式执行线程）只在整次运行模式下采样
+            return self.whole_run
+        if state.paused:
+            return False
+        if state.depth > 0:
+            return True
+        return self.whole_run and not state.tracked
+
+    def _is_idle(self, frame):
+        code = frame.f_code
+        return (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAF_FUNCTIONS
+
+    def _take_sample(self, own_ident, weight):
+        frames = sys._current_frames()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        with self._lock:
+            states = dict(self._active_states)
+        for ident, frame in frames.items():
+            if ident == own_ident or not self._should_sample(states.get(ident)):
+                continue
+            if self.cpu_only and self._is_idle(frame):
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(self._frame_index(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            thread_samples = self._samples.setdefault(names.get(ident, str(ident)), {})
+            key = tuple(stack)
+            thread_samples[key] = thread_samples.get(key, 0.0) + weight
+
+    def _sample_loop(self):
+        own_ident = threading.get_ident()
+        last = time.monotonic()
+        while not self._stop.wait(self.sample_interval):
+            now = time.monotonic()
+            try:
+                self._take_sample(own_ident, now - last)
+            except Exception as e:
+                logger.debug(f"调用栈采样失败: {str(e)}")
+            last = now
+
+    # ============ 启停与输出 ============
+
+    def start(self):
+        self.started_at = time.monotonic()
+        add_span_hook(self._span_hook)
+        if self.whole_run:
+            state = self._state()
+            state.tracked = True
+            state.depth += 1
+            self._sync(state)
+        self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        remove_span_hook(self._span_hook)
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=5)
+        state = getattr(self._local, "state", None)
+        if state is not None:
+            state.depth = 0
+            self._sync(state)
+        self.elapsed_seconds = time.monotonic() - self.started_at if self.started_at is not None else 0.0
+
+    def speedscope(self, name="arxiv_paper_tracker"):
+        """按线程输出 speedscope 的 sampled 格式"""
+        profiles = []
+        for thread_name, samples in sorted(self._samples.items()):
+            stacks = list(samples)
+            weights = [round(samples[stack], 6) for stack in stacks]
+            profiles.append(
+                {
+                    "type": "sampled",
+                    "name": thread_name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": round(sum(weights), 6),
+                    "samples": [list(stack) for stack in stacks],
+                    "weights": weights,
+                }
+            )
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {
+                "frames": [
+                    {"name": func_name, "file": file_name, "line": line}
+                    for func_name, file_name, line in self._frame_list
+                ]
+            },
+            "profiles": profiles,
+            "name": name,
+            "activeProfileIndex": 0,
+            "exporter": "arxiv_paper_tracker profiling",
+        }
+
+    def write(self, prefix):
+        """
+        写出 <prefix>_<线程名>.prof、合并后的 <prefix>.prof 与 <prefix>.speedscope.json
+
+        Returns:
+            {"threads": [Path], "merged": Path 或 None, "speedscope": Path}
+        """
+        prefix = Path(prefix)
+        prefix.parent.mkdir(parents=True, exist_ok=True)
+        current = getattr(self._local, "state", None)
+        with self._lock:
+            states = list(self._states)
+
+        thread_files = []
+        used_names = set()
+        for state in states:
+            if not state.used:
+                continue
+            if state.enabled and state is not current:
+                logger.warning(f"线程 {state.name} 仍在运行，跳过其剖析结果")
+                continue
+            name = _safe_name(state.name)
+            while name in used_names:
+                name += "_"
+            used_names.add(name)
+            path = prefix.with_name(f"{prefix.name}_{name}.prof")
+            state.profile.dump_stats(str(path))
+            thread_files.append(path)
+
+        merged = None
+        if thread_files:
+            merged = prefix.with_name(f"{prefix.name}.prof")
+            pstats.Stats(*(str(path) for path in thread_files)).dump_stats(str(merged))
+
+        speedscope_path = prefix.with_name(f"{prefix.name}.speedscope.json")
+        with open(speedscope_path, "w", encoding="utf-8") as f:
+            json.dump(self.speedscope(name=prefix.name), f)
+        return {"threads": thread_files, "merged": merged, "speedscope": speedscope_path}
+
+
+def top_functions(stats_path, limit=10):
+    """按自身耗时排序返回最耗时的函数：[(函数, 调用次数, 自身耗时, 累计耗时)]"""
+    stats = pstats.Stats(str(stats_path))
+    rows = []
+    for (file_name, line, func_name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append((f"{os.path.basename(file_name)}:{line}({func_name})", ncalls, tottime, cumtime))
+    rows.sort(key=lambda row: -row[2])
+    return rows[:limit]
+
+
+_active_profiler = None
+
+
+def start_profiler(stages=None, cpu_only=False, sample_interval=SAMPLE_INTERVAL):
+    global _active_profiler
+    if _active_profiler is not None:
+        _active_profiler.stop()
+    _active_profiler = RunProfiler(stages=stages, cpu_only=cpu_only, sample_interval=sample_interval).start()
+    return _active_profiler
+
+
+def stop_profiler():
+    """停止当前剖析器并返回它；没有在剖析时返回 None"""
+    global _active_profiler
+    profiler, _active_profiler = _active_profiler, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+def get_active_profiler():
+    return _active_profiler
+
+
+def profile_task(func):
+    """供线程池提交任务时使用；没有在剖析整次运行时原样返回 func"""
+    profiler = _active_profiler
+    return profiler.wrap_task(func) if profiler is not None else func
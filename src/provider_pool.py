@@ -0,0 +1,315 @@
+# provider_pool.py - 多提供商负载均衡模块
+# ProviderPool 提供与 config.AIClient 相同的公开方法，按实时延迟与错误率把请求委托给多个客户端；
+# 由 config.get_ai_client() 在 AI_PROVIDER_POOL 非空时创建
+
+import logging
+import random
+import threading
+import time
+
+from config import (
+    AI_CIRCUIT_BREAKER_ENABLED,
+    AI_POOL_COOLDOWN_SECONDS,
+    AI_POOL_FAILOVER_THRESHOLD,
+    AIClient,
+    get_circuit_breaker,
+)
+from resilience import is_circuit_open_error, root_cause
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderStats:
+    """记录单个提供商/模型的实时延迟与错误率（指数滑动平均）"""
+
+    ALPHA = 0.3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency_ewma = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def record_success(self, latency):
+        with self._lock:
+            self.requests += 1
+            self.consecutive_failures = 0
+            self.error_rate = (1 - self.ALPHA) * self.error_rate
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma = (1 - self.ALPHA) * self.latency_ewma + self.ALPHA * latency
+
+    def record_failure(self, threshold=AI_POOL_FAILOVER_THRESHOLD, cooldown_seconds=AI_POOL_COOLDOWN_SECONDS):
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.error_rate = (1 - self.ALPHA) * self.error_rate + self.ALPHA
+            if self.consecutive_failures >= threshold:
+                self.cooldown_until = time.monotonic() + cooldown_seconds
+                return True
+            return False
+
+    def is_available(self, now=None):
+        return (now if now is not None else time.monotonic()) >= self.cooldown_until
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "latency_ewma": self.latency_ewma,
+                "error_rate": round(self.error_rate, 4),
+                "consecutive_failures": self.consecutive_failures,
+                "requests": self.requests,
+                "failures": self.failures,
+            }
+
+
+def parse_provider_pool_spec(spec):
+    """解析 "provider:model[:weight],..." 为 [(provider, model, weight)]，模型名中允许出现冒号"""
+    entries = []
+    for raw in str(spec or "").split(","):
+        item = raw.strip()
+        if not item:
+            continue
+        provider, _, rest = item.partition(":")
+        model, weight = rest, 1.0
+        head, sep, tail = rest.rpartition(":")
+        if sep:
+            try:
+                weight = float(tail)
+                model = head
+            except ValueError:
+                pass
+        provider, model = provider.strip(), model.strip()
+        if not provider or not model:
+            logger.warning("AI_PROVIDER_POOL 条目格式无效，已忽略: %s", item)
+            continue
+        entries.append((provider, model, max(weight, 0.0)))
+    return entries
+
+
+class ProviderPool:
+    """
+    多提供商负载均衡池
+
+    不继承 AIClient，而是把请求委托给成员客户端，公开方法与 AIClient 一致。
+    按 权重 / (延迟 × (1 + 4 × 错误率)) 加权随机选择成员；成员连续失败达到阈值后冷却一段时间，
+    请求失败时依次切换到其他成员。请求配置（以及由此得到的分析缓存键）始终取第一个成员，
+    保证缓存键不随实际服务的提供商变化，实际服务方记录在 served_provider / served_model 中。
+    """
+
+    # 错误率的惩罚系数：错误率是滑动平均（ALPHA=0.3），一次失败只让它升到 0.3，
+    # 按 (1 + 错误率) 计算得分只下降约 23%；放大 4 倍后一次失败让得分下降约一半，
+    # 连续失败时得分迅速趋近于零，流量在冷却生效前就能转移到健康的成员
+    ERROR_RATE_PENALTY = 4
+
+    def __init__(self, members, failover_threshold=AI_POOL_FAILOVER_THRESHOLD, cooldown_seconds=AI_POOL_COOLDOWN_SECONDS):
+        if not members:
+            raise ValueError("AI 提供商池为空")
+        self.members = [(client, float(weight)) for client, weight in members]
+        self.stats = [ProviderStats() for _ in self.members]
+        self.failover_threshold = failover_threshold
+        self.cooldown_seconds = cooldown_seconds
+
+        primary = self.members[0][0]
+        self.provider = primary.provider
+        self.model = primary.model
+        self.provider_config = primary.provider_config
+        self.thinking_support = primary.thinking_support
+
+    @classmethod
+    def from_spec(cls, spec):
+        members = []
+        for provider, model, weight in parse_provider_pool_spec(spec):
+            if weight <= 0:
+                continue
+            try:
+                members.append((AIClient(provider, model), weight))
+            except Exception as e:
+                logger.warning("AI 提供商池成员 %s/%s 初始化失败，已跳过: %s", provider, model, str(e))
+        if not members:
+            raise ValueError(f"AI_PROVIDER_POOL 中没有可用的提供商: {spec}")
+        logger.info(
+            "AI 提供商池: %s",
+            ", ".join(f"{client.provider}/{client.model}(w={weight:g})" for client, weight in members),
+        )
+        return cls(members)
+
+    def get_analysis_request_config(self, thinking_mode=False):
+        return self.members[0][0].get_analysis_request_config(thinking_mode=thinking_mode)
+
+    def _member_circuit_open(self, index):
+        if not AI_CIRCUIT_BREAKER_ENABLED:
+            return False
+        client, _ = self.members[index]
+        return get_circuit_breaker(client.provider, client.model).is_open()
+
+    def _member_score(self, index):
+        _, weight = self.members[index]
+        snapshot = self.stats[index]
+        # 没有延迟数据的成员按 1 秒估计，保证新成员也能分到请求
+        latency = snapshot.latency_ewma if snapshot.latency_ewma is not None else 1.0
+        return weight / (max(latency, 0.05) * (1 + self.ERROR_RATE_PENALTY * snapshot.error_rate))
+
+    def _member_order(self):
+        """返回本次请求尝试成员的顺序：首个按得分加权随机，其余按得分从高到低"""
+        now = time.monotonic()
+        available = [
+            i for i in range(len(self.members))
+            if self.stats[i].is_available(now) and not self._member_circuit_open(i)
+        ]
+        if not available:
+            # 全部在冷却中时，按冷却结束时间最早的顺序尝试，避免直接失败
+            return sorted(range(len(self.members)), key=lambda i: self.stats[i].cooldown_until)
+
+        scores = {i: self._member_score(i) for i in available}
+        total = sum(scores.values())
+        if total <= 0:
+            first = available[0]
+        else:
+            pick = random.uniform(0, total)
+            first = available[-1]
+            for i in available:
+                pick -= scores[i]
+                if pick <= 0:
+                    first = i
+                    break
+        rest = sorted((i for i in available if i != first), key=lambda i: scores[i], reverse=True)
+        return [first, *rest]
+
+    def _record_failure(self, index, error):
+        client, _ = self.members[index]
+        cooled_down = self.stats[index].record_failure(self.failover_threshold, self.cooldown_seconds)
+        if cooled_down:
+            logger.warning(
+                "AI 提供商池成员 %s/%s 连续失败 %s 次，冷却 %.0fs: %s",
+                client.provider,
+                client.model,
+                self.stats[index].consecutive_failures,
+                self.cooldown_seconds,
+                str(error),
+            )
+        else:
+            logger.warning("AI 提供商池成员 %s/%s 请求失败，将切换到下一个成员: %s", client.provider, client.model, str(error))
+
+    def _should_fail_over(self, client, error):
+        """只有提供商不可用（含熔断）时才切换成员；结构化校验失败、4xx 等请求本身的问题换成员也无济于事"""
+        if is_circuit_open_error(error):
+            return True
+        return client._is_provider_failure(root_cause(error))
+
+    def _tag_pool_result(self, result, failovers):
+        content, usage, response_state = result
+        response_state = {**(response_state or {}), "served_by_pool": True, "pool_failovers": failovers}
+        return content, usage, response_state
+
+    def _do_chat_completion(self, messages, thinking_mode=False, response_model=None, structured=False, **kwargs):
+        last_error = None
+        for failovers, index in enumerate(self._member_order()):
+            client, _ = self.members[index]
+            started = time.monotonic()
+            try:
+                result = client._do_chat_completion(
+                    messages, thinking_mode=thinking_mode, response_model=response_model, structured=structured, **kwargs
+                )
+            except Exception as e:
+                if not self._should_fail_over(client, e):
+                    raise
+                last_error = e
+                self._record_failure(index, e)
+                continue
+            self.stats[index].record_success(time.monotonic() - started)
+            return self._tag_pool_result(result, failovers)
+        raise Exception(f"AI 提供商池中所有成员均调用失败: {str(last_error)}") from last_error
+
+    async def _ado_chat_completion(self, messages, thinking_mode=False, response_model=None, structured=False, **kwargs):
+        last_error = None
+        for failovers, index in enumerate(self._member_order()):
+            client, _ = self.members[index]
+            started = time.monotonic()
+            try:
+                result = await client._ado_chat_completion(
+                    messages, thinking_mode=thinking_mode, response_model=response_model, structured=structured, **kwargs
+                )
+            except Exception as e:
+                if not self._should_fail_over(client, e):
+                    raise
+                last_error = e
+                self._record_failure(index, e)
+                continue
+            self.stats[index].record_success(time.monotonic() - started)
+            return self._tag_pool_result(result, failovers)
+        raise Exception(f"AI 提供商池中所有成员均调用失败: {str(last_error)}") from last_error
+
+    def chat_completion(self, messages, thinking_mode=False, **kwargs):
+        content, _, _ = self._do_chat_completion(messages, thinking_mode=thinking_mode, **kwargs)
+        return content
+
+    def chat_completion_with_usage(self, messages, thinking_mode=False, return_response_state=False, **kwargs):
+        content, usage, response_state = self._do_chat_completion(messages, thinking_mode=thinking_mode, **kwargs)
+        if return_response_state:
+            return content, usage, response_state
+        return content, usage
+
+    def structured_chat_completion_with_usage(
+        self,
+        messages,
+        response_model,
+        thinking_mode=False,
+        return_response_state=False,
+        json_schema_prompt=False,
+        **kwargs,
+    ):
+        result, usage, response_state = self._do_chat_completion(
+            messages,
+            thinking_mode=thinking_mode,
+            response_model=response_model,
+            structured=True,
+            json_schema_prompt=json_schema_prompt,
+            **kwargs,
+        )
+        if return_response_state:
+            return result, usage, response_state
+        return result, usage
+
+    async def achat_completion(self, messages, thinking_mode=False, **kwargs):
+        content, _, _ = await self._ado_chat_completion(messages, thinking_mode=thinking_mode, **kwargs)
+        return content
+
+    async def achat_completion_with_usage(self, messages, thinking_mode=False, return_response_state=False, **kwargs):
+        content, usage, response_state = await self._ado_chat_completion(messages, thinking_mode=thinking_mode, **kwargs)
+        if return_response_state:
+            return content, usage, response_state
+        return content, usage
+
+    async def astructured_chat_completion_with_usage(
+        self,
+        messages,
+        response_model,
+        thinking_mode=False,
+        return_response_state=False,
+        json_schema_prompt=False,
+        **kwargs,
+    ):
+        result, usage, response_state = await self._ado_chat_completion(
+            messages,
+            thinking_mode=thinking_mode,
+            response_model=response_model,
+            structured=True,
+            json_schema_prompt=json_schema_prompt,
+            **kwargs,
+        )
+        if return_response_state:
+            return result, usage, response_state
+        return result, usage
+
+    def get_stats(self):
+        """返回各成员的实时统计，用于日志与报告"""
+        return [
+            {"provider": client.provider, "model": client.model, "weight": weight, **stats.snapshot()}
+            for (client, weight), stats in zip(self.members, self.stats)
+        ]
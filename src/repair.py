@@ -0,0 +1,261 @@
+# repair.py - 分析文本的本地确定性修复模块
+# 字面量转义、控制字符、$$ 不配对、行间公式排版、重复章节标题这类问题都是机械性的，
+# 用一组有序的规则在本地修复，只需要几毫秒 CPU，不必为此调用 cleanup 模型
+
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+CONTROL_CHAR_PATTERN = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+# 字面量 \n / \t / \r：后面紧跟字母时多半是 \nabla、\theta、\rVert、\nRightarrow 这类 LaTeX 命令，不动
+_LITERAL_ESCAPE_PATTERN = re.compile(r"(?<!\\)\\([ntr])(?![A-Za-z])")
+_LITERAL_ESCAPE_REPLACEMENTS = {"n": "\n", "t": " ", "r": ""}
+# 块公式开头的字面量转义；$$\nabla 这类小写 LaTeX 命令不算，$$\nE 这种无法判断的交给 cleanup 模型
+_DISPLAY_MATH_ESCAPE_PATTERN = re.compile(r"\$\$\\([ntr])(?![a-z])")
+# \[ ... \] 与 \( ... \)；排除 LaTeX 换行 \\[2pt] 这类写法
+_BRACKET_DISPLAY_PATTERN = re.compile(r"(?<!\\)\\\[(.+?)(?<!\\)\\\]", re.S)
+_BRACKET_INLINE_PATTERN = re.compile(r"(?<!\\)\\\((.+?)(?<!\\)\\\)", re.S)
+_DISPLAY_MATH_PATTERN = re.compile(r"[ \t]*\$\$\s*(.+?)\s*\$\$[ \t]*", re.S)
+_DISPLAY_BLOCK_PATTERN = re.compile(r"\$\$.*?\$\$", re.S)
+_ESCAPED_DOLLAR_PATTERN = re.compile(r"\\\$")
+_HEADING_PATTERN = re.compile(r"^\s{0,3}(#{1,6})\s*(.*?)\s*#*\s*$")
+
+# heading 匹配函数：输入一行文本，返回 (主章节名或 None, 标题行中附带的正文)
+HeadingMatcher = Callable[[str], Tuple[Optional[str], str]]
+
+
+class RepairReport:
+    """记录每条规则的触发次数"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.elapsed_ms = 0.0
+
+    def add(self, rule_name: str, count: int):
+        if count:
+            self.counts[rule_name] = self.counts.get(rule_name, 0) + count
+
+    def merge(self, other: "RepairReport"):
+        for rule_name, count in other.counts.items():
+            self.add(rule_name, count)
+        self.elapsed_ms += other.elapsed_ms
+        return self
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def fired(self) -> List[str]:
+        return list(self.counts)
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(self.counts)
+
+    def __bool__(self):
+        return bool(self.counts)
+
+    def __repr__(self):
+        return f"RepairReport({self.counts!r})"
+
+
+def format_repair_rules(counts: Dict[str, int]) -> str:
+    """把规则触发次数格式化为 rule=count 列表，用于日志与元数据"""
+    return ", ".join(f"{rule_name}={count}" for rule_name, count in (counts or {}).items())
+
+
+def normalize_block_text(text: str) -> str:
+    normalized = (text or "").replace("\r\n", "\n").replace("\r", "\n")
+    normalized = re.sub(r"\n{3,}", "\n\n", normalized)
+    return normalized.strip()
+
+
+def fix_literal_escapes(text: str):
+    return _LITERAL_ESCAPE_PATTERN.subn(lambda match: _LITERAL_ESCAPE_REPLACEMENTS[match.group(1)], text)
+
+
+def find_display_math_escapes(text: str) -> List[str]:
+    """返回块公式开头出现的字面量转义（如 "$$\\n"），按 \\n、\\t、\\r 的顺序去重"""
+    found = {match.group(1) for match in _DISPLAY_MATH_ESCAPE_PATTERN.finditer(text or "")}
+    return [f"$$\\{letter}" for letter in "ntr" if letter in found]
+
+
+def strip_control_chars(text: str):
+    return CONTROL_CHAR_PATTERN.subn("", text)
+
+
+def convert_bracket_math(text: str):
+    """\\[ ... \\] 改写为 $$ 块公式，\\( ... \\) 改写为 $ 行内公式"""
+    text, display_count = _BRACKET_DISPLAY_PATTERN.subn(lambda match: f"$${match.group(1).strip()}$$", text)
+    text, inline_count = _BRACKET_INLINE_PATTERN.subn(lambda match: f"${match.group(1).strip()}$", text)
+    return text, display_count + inline_count
+
+
+def balance_display_math(text: str):
+    """$$ 个数为奇数时，在未闭合的 $$ 所在段落末尾补上闭合的 $$"""
+    positions = [match.start() for match in re.finditer(r"\$\$", text)]
+    if len(positions) % 2 == 0:
+        return text, 0
+    opener = positions[-1]
+    paragraph_end = text.find("\n\n", opener + 2)
+    if paragraph_end < 0:
+        paragraph_end = len(text)
+    return f"{text[:paragraph_end].rstrip()}\n$${text[paragraph_end:]}", 1
+
+
+def reflow_display_math(text: str):
+    """
+    行首的行间公式统一排成 $$ 独占一行、公式单独成行的形式
+
+    句中的 $$...$$ 保持原样：拆成多行会把前后的文字和标点甩到单独的行上
+    """
+    if text.count("$$") % 2:
+        return text, 0
+    count = 0
+
+    def reflow(match):
+        nonlocal count
+        before = match.string[:match.start()]
+        if before and not before.endswith("\n"):
+            return match.group(0)
+        formula = match.group(1).strip()
+        if match.group(0).strip() != f"$$\n{formula}\n$$" or not _is_own_line(match):
+            count += 1
+        after = match.string[match.end():]
+        suffix = "" if not after or after.startswith("\n") else "\n"
+        return f"$$\n{formula}\n$${suffix}"
+
+    text = _DISPLAY_MATH_PATTERN.sub(reflow, text)
+    return text, count
+
+
+def _is_own_line(match):
+    text = match.string
+    before = text[:match.start()]
+    after = text[match.end():]
+    return (not before or before.endswith("\n")) and (not after or after.startswith("\n"))
+
+
+def has_unbalanced_inline_math(text: str) -> bool:
+    """
+    某个段落中行间公式之外的单个 $ 个数是否为奇数
+
+    "价格是 $5 和 $x$" 这类文字无法判断缺的分隔符该补在哪里，不做修复，只能交给 cleanup 模型
+    """
+    for paragraph in (text or "").split("\n\n"):
+        masked = _DISPLAY_BLOCK_PATTERN.sub("", _ESCAPED_DOLLAR_PATTERN.sub("", paragraph))
+        if not masked.count("$$") and masked.count("$") % 2:
+            return True
+    return False
+
+
+def has_unbalanced_math_braces(text: str) -> bool:
+    """公式中的花括号是否未配对；这类问题无法确定性地修复，只能交给 cleanup 模型"""
+    masked = re.sub(r"\\[{}$]", "", text or "")
+    segments = _DISPLAY_BLOCK_PATTERN.findall(masked)
+    segments += re.findall(r"\$[^$]+\$", _DISPLAY_BLOCK_PATTERN.sub("", masked))
+    for segment in segments:
+        depth = 0
+        for char in segment:
+            if char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth < 0:
+                    return True
+        if depth:
+            return True
+    return False
+
+
+def dedupe_headings(text: str, heading_matcher: Optional[HeadingMatcher] = None):
+    """
+    删除 block 中混入的主章节标题（主章节标题由渲染代码统一生成），
+    并合并连续重复的小标题；标题行中附带的正文保留下来
+    """
+    lines = text.split("\n")
+    kept = []
+    last_heading = None
+    count = 0
+    for line in lines:
+        heading = _HEADING_PATTERN.match(line)
+        if heading is None:
+            kept.append(line)
+            if line.strip():
+                last_heading = None
+            continue
+        if heading_matcher is not None:
+            canonical, inline_content = heading_matcher(line)
+            if canonical is not None:
+                count += 1
+                if inline_content:
+                    kept.append(inline_content)
+                continue
+        heading_key = (len(heading.group(1)), heading.group(2))
+        if heading_key == last_heading:
+            count += 1
+            while kept and not kept[-1].strip():
+                kept.pop()
+            continue
+        last_heading = heading_key
+        kept.append(line)
+    return "\n".join(kept), count
+
+
+class AnalysisRepairEngine:
+    """
+    按固定顺序执行修复规则
+
+    规则是纯函数 text -> (text, 触发次数)，同样的输入总是得到同样的输出，
+    修复结果可以直接写入缓存。
+    """
+
+    def __init__(self, heading_matcher: Optional[HeadingMatcher] = None):
+        self.rules = [
+            ("literal_escape", fix_literal_escapes),
+            ("control_char", strip_control_chars),
+            ("bracket_math", convert_bracket_math),
+            ("display_math_balance", balance_display_math),
+            ("display_math_layout", reflow_display_math),
+            ("duplicate_heading", lambda text: dedupe_headings(text, heading_matcher)),
+        ]
+
+    def repair_text(self, text: str, single_line: bool = False):
+        """
+        修复单个 block 的文本
+
+        Returns:
+            (修复后的文本, RepairReport)
+        """
+        started_at = time.perf_counter()
+        report = RepairReport()
+        repaired = text or ""
+        for rule_name, rule in self.rules:
+            if single_line and rule_name in ("display_math_layout", "duplicate_heading"):
+                continue
+            repaired, count = rule(repaired)
+            report.add(rule_name, count)
+        repaired = " ".join(repaired.split()) if single_line else normalize_block_text(repaired)
+        report.elapsed_ms = (time.perf_counter() - started_at) * 1000
+        return repaired, report
+
+    def repair_blocks(self, blocks, single_line_fields=("chinese_title",)):
+        """
+        修复 pydantic 模型中的全部字符串字段，未触发任何规则时原样返回同一个对象
+
+        Returns:
+            (修复后的模型, RepairReport)
+        """
+        report = RepairReport()
+        updates = {}
+        for field_name in type(blocks).model_fields:
+            original = getattr(blocks, field_name)
+            if not isinstance(original, str):
+                continue
+            repaired, field_report = self.repair_text(original, single_line=field_name in single_line_fields)
+            report.merge(field_report)
+            if field_report and repaired:
+                updates[field_name] = repaired
+        if not updates:
+            return blocks, report
+        return blocks.model_copy(update=updates), report
@@ -0,0 +1,415 @@
+# replay.py - 网络流量录制与回放模块
+# REPLAY_MODE=record 时把 AIClient 的 completion 响应、arXiv 列表/元数据响应与 PDF 按请求哈希存入 REPLAY_DIR；
+# REPLAY_MODE=replay 时直接从夹具返回，并按录制时的耗时或合成的延迟分布等待。
+# 这样批量模式可以在没有网络与 API key 的机器上端到端运行，调度与并发的改动可以在相同输入下对比
+
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import requests
+
+from config import REPLAY_DIR, REPLAY_LATENCY, REPLAY_LATENCY_SCALE, REPLAY_MODE, REPLAY_SEED, ReplayMissError
+from lazy import LazyModule, is_available
+
+litellm = LazyModule("litellm")
+
+logger = logging.getLogger(__name__)
+
+LLM_KIND = "llm"
+# 不参与请求哈希的参数：凭据、地址、超时与流式开关，录制与回放时可以不同
+VOLATILE_REQUEST_KEYS = frozenset(
+    ("api_key", "api_base", "base_url", "timeout", "request_timeout", "stream", "stream_options", "metadata", "num_retries")
+)
+
+
+def request_key(kind, payload):
+    """按请求内容生成稳定的哈希键"""
+    canonical = json.dumps({"kind": kind, "request": payload}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+def completion_request_key(kwargs):
+    return request_key(LLM_KIND, {key: value for key, value in kwargs.items() if key not in VOLATILE_REQUEST_KEYS})
+
+
+def to_jsonable(value):
+    """把 litellm / pydantic 响应对象、SimpleNamespace 等转换为可写入 JSON 的结构"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {str(key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    model_dump = getattr(value, "model_dump", None)
+    if callable(model_dump):
+        try:
+            return to_jsonable(model_dump())
+        except Exception:
+            pass
+    if hasattr(value, "__dict__"):
+        return {key: to_jsonable(item) for key, item in vars(value).items() if not key.startswith("_")}
+    return str(value)
+
+
+def _to_namespace(value):
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _to_namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_to_namespace(item) for item in value]
+    return value
+
+
+def build_model_response(data):
+    """把录制的响应还原为 litellm.ModelResponse，instructor 需要真实的响应对象；litellm 不可用时退回 SimpleNamespace"""
+    if is_available(litellm):
+        try:
+            return litellm.ModelResponse(**data)
+        except Exception as e:
+            logger.debug(f"还原 ModelResponse 失败，改用 SimpleNamespace: {str(e)}")
+    return _to_namespace(data)
+
+
+def _merge_chunks(chunks):
+    """把录制的流式数据块合并成非流式响应的结构"""
+    content, reasoning = [], []
+    usage = model = None
+    for chunk in chunks:
+        usage = chunk.get("usage") or usage
+        model = chunk.get("model") or model
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or choice.get("message") or {}
+            content.append(delta.get("content") or "")
+            reasoning.append(delta.get("reasoning_content") or "")
+    message = {"role": "assistant", "content": "".join(content)}
+    if any(reasoning):
+        message["reasoning_content"] = "".join(reasoning)
+    response = {"choices": [{"index": 0, "message": message, "finish_reason": "stop"}], "model": model}
+    if usage:
+        response["usage"] = usage
+    return response
+
+
+class FixtureStore:
+    """
+    夹具目录：<root>/<kind>/<key>.json 保存元数据与模型响应，二进制响应体（arXiv XML、PDF）另存为 <key>.bin
+
+    latency 为 config._parse_latency_spec 的返回值；合成延迟按 (seed, key, 第几次回放) 取随机数，
+    与线程调度顺序无关，同一组夹具多次回放的延迟完全一致
+    """
+
+    def __init__(self, root, latency=("recorded",), latency_scale=1.0, seed=0):
+        self.root = Path(root)
+        self.latency = tuple(latency)
+        self.latency_scale = latency_scale
+        self.seed = seed
+        self._lock = threading.Lock()
+        self._replay_counts = {}
+        self.stats = {"recorded": 0, "replayed": 0, "missing": 0}
+
+    def _paths(self, kind, key):
+        directory = self.root / kind
+        return directory / f"{key}.json", directory / f"{key}.bin"
+
+    def _count(self, field):
+        with self._lock:
+            self.stats[field] += 1
+
+    def save(self, kind, key, record, body=None):
+        meta_path, body_path = self._paths(kind, key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        if body is not None:
+            tmp_body = body_path.with_name(f".{body_path.name}.{threading.get_ident()}.tmp")
+            tmp_body.write_bytes(body)
+            tmp_body.replace(body_path)
+        record = {"kind": kind, "key": key, "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **record}
+        tmp_meta = meta_path.with_name(f".{meta_path.name}.{threading.get_ident()}.tmp")
+        tmp_meta.write_text(json.dumps(record, ensure_ascii=False), encoding="utf-8")
+        tmp_meta.replace(meta_path)
+        self._count("recorded")
+
+    def load(self, kind, key):
+        meta_path, body_path = self._paths(kind, key)
+        try:
+            record = json.loads(meta_path.read_text(encoding="utf-8"))
+            if body_path.exists():
+                record["body"] = body_path.read_bytes()
+        except FileNotFoundError:
+            self._count("missing")
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取回放夹具失败 {meta_path}: {str(e)}")
+            self._count("missing")
+            return None
+        self._count("replayed")
+        return record
+
+    def latency_for(self, key, recorded_seconds=None):
+        mode = self.latency[0]
+        if mode == "off":
+            return 0.0
+        if mode == "recorded":
+            value = float(recorded_seconds or 0.0)
+        elif mode == "fixed":
+            value = self.latency[1]
+        else:
+            with self._lock:
+                occurrence = self._replay_counts[key] = self._replay_counts.get(key, 0) + 1
+            rng = random.Random(f"{self.seed}:{key}:{occurrence}")
+            value = rng.lognormvariate(math.log(self.latency[1]), self.latency[2])
+        return max(value * self.latency_scale, 0.0)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+_store = None
+_store_lock = threading.Lock()
+_wrapped_fns = {}
+
+
+def get_fixture_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FixtureStore(REPLAY_DIR, latency=REPLAY_LATENCY, latency_scale=REPLAY_LATENCY_SCALE, seed=REPLAY_SEED)
+        return _store
+
+
+def reset_fixture_store():
+    global _store
+    with _store_lock:
+        _store = None
+        _wrapped_fns.clear()
+
+
+def get_replay_stats():
+    return get_fixture_store().snapshot()
+
+
+# ============ HTTP（arXiv 列表、元数据与 PDF） ============
+
+
+class ReplayedResponse:
+    """回放的 HTTP 响应，提供 crawler 与 SimplePaper 用到的 requests.Response 接口"""
+
+    def __init__(self, url, status_code, content=b"", headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = dict(headers or {})
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for start in range(0, len(self.content), max(int(chunk_size or 1), 1)):
+            yield self.content[start:start + chunk_size]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} 回放响应: {self.url}", response=self)
+
+
+def http_get(kind, url, **kwargs):
+    """
+    替代 requests.get；kind 为夹具分类（如 arxiv、pdf），请求哈希只取决于 URL
+
+    record 模式只保存 200 响应；replay 模式缺少记录时返回 404，由调用方按请求失败处理
+    """
+    if REPLAY_MODE == "off":
+        return requests.get(url, **kwargs)
+    store = get_fixture_store()
+    key = request_key(kind, {"url": url})
+    if REPLAY_MODE == "replay":
+        record = store.load(kind, key)
+        if record is None:
+            logger.warning(f"回放缺少 {kind} 记录: {url}")
+            return ReplayedResponse(url, 404)
+        time.sleep(store.latency_for(key, record.get("latency_seconds")))
+        return ReplayedResponse(url, record.get("status_code", 200), record.get("body", b""), record.get("headers"))
+
+    started = time.monotonic()
+    response = requests.get(url, **kwargs)
+    if response.status_code == 200:
+        content = response.content
+        headers = {name: response.headers[name] for name in ("Content-Type",) if name in response.headers}
+        store.save(
+            kind,
+            key,
+            {"url": url, "status_code": 200, "headers": headers, "latency_seconds": round(time.monotonic() - started, 4)},
+            body=content,
+        )
+    return response
+
+
+# ============ 模型调用 ============
+
+
+def _llm_record(kwargs, started, response=None, chunks=None, first_chunk_at=None):
+    record = {"model": kwargs.get("model"), "latency_seconds": round(time.monotonic() - started, 4)}
+    if chunks is not None:
+        record["chunks"] = chunks
+        if first_chunk_at is not None:
+            record["ttft_seconds"] = round(first_chunk_at - started, 4)
+    else:
+        record["response"] = to_jsonable(response)
+    return record
+
+
+def _record_stream(stream, store, key, kwargs, started):
+    chunks = []
+    first_chunk_at = None
+    try:
+        for chunk in stream:
+            if first_chunk_at is None:
+                first_chunk_at = time.monotonic()
+            chunks.append(to_jsonable(chunk))
+            yield chunk
+    finally:
+        close = getattr(stream, "close", None)
+        if callable(close):
+            close()
+        # 结构化 JSON 提前完整时读取会中途停止，此时保存已读取的部分，回放时同样会提前停止
+        if chunks:
+            store.save(LLM_KIND, key, _llm_record(kwargs, started, chunks=chunks, first_chunk_at=first_chunk_at))
+
+
+async def _arecord_stream(stream, store, key, kwargs, started):
+    chunks = []
+    first_chunk_at = None
+    try:
+        async for chunk in stream:
+            if first_chunk_at is None:
+                first_chunk_at = time.monotonic()
+            chunks.append(to_jsonable(chunk))
+            yield chunk
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if callable(aclose):
+            await aclose()
+        if chunks:
+            store.save(LLM_KIND, key, _llm_record(kwargs, started, chunks=chunks, first_chunk_at=first_chunk_at))
+
+
+def _replay_plan(store, key, record):
+    """返回 (数据块列表, 每个数据块之前的等待秒数)；首块按录制时首 token 延迟的占比等待"""
+    chunks = record.get("chunks") or [record["response"]]
+    total = store.latency_for(key, record.get("latency_seconds"))
+    recorded_total = record.get("latency_seconds") or 0.0
+    ttft_share = record.get("ttft_seconds", recorded_total) / recorded_total if recorded_total else 1.0
+    first_wait = total * min(max(ttft_share, 0.0), 1.0)
+    rest = (total - first_wait) / (len(chunks) - 1) if len(chunks) > 1 else 0.0
+    return chunks, [first_wait] + [rest] * (len(chunks) - 1)
+
+
+def _load_llm_record(store, kwargs):
+    key = completion_request_key(kwargs)
+    record = store.load(LLM_KIND, key)
+    if record is None:
+        raise ReplayMissError(f"回放缺少模型响应记录: model={kwargs.get('model')}, key={key}")
+    return key, record
+
+
+def _response_data(record):
+    return record["response"] if "response" in record else _merge_chunks(record["chunks"])
+
+
+def _replay_stream(chunks, waits):
+    # 流式数据块保持 dict 形式，streaming._StreamAccumulator 按属性或键读取
+    for chunk, wait in zip(chunks, waits):
+        time.sleep(wait)
+        yield chunk
+
+
+async def _areplay_stream(chunks, waits):
+    for chunk, wait in zip(chunks, waits):
+        await asyncio.sleep(wait)
+        yield chunk
+
+
+def _recording_completion(completion_fn, store):
+    @functools.wraps(completion_fn)
+    def completion(*args, **kwargs):
+        key = completion_request_key(kwargs)
+        started = time.monotonic()
+        response = completion_fn(*args, **kwargs)
+        if kwargs.get("stream"):
+            return _record_stream(response, store, key, kwargs, started)
+        store.save(LLM_KIND, key, _llm_record(kwargs, started, response=response))
+        return response
+
+    return completion
+
+
+def _arecording_completion(acompletion_fn, store):
+    @functools.wraps(acompletion_fn)
+    async def acompletion(*args, **kwargs):
+        key = completion_request_key(kwargs)
+        started = time.monotonic()
+        response = await acompletion_fn(*args, **kwargs)
+        if kwargs.get("stream"):
+            return _arecord_stream(response, store, key, kwargs, started)
+        store.save(LLM_KIND, key, _llm_record(kwargs, started, response=response))
+        return response
+
+    return acompletion
+
+
+def _replaying_completion(store):
+    def completion(*args, **kwargs):
+        key, record = _load_llm_record(store, kwargs)
+        chunks, waits = _replay_plan(store, key, record)
+        if kwargs.get("stream"):
+            return _replay_stream(chunks, waits)
+        time.sleep(sum(waits))
+        return build_model_response(_response_data(record))
+
+    return completion
+
+
+def _areplaying_completion(store):
+    async def acompletion(*args, **kwargs):
+        key, record = _load_llm_record(store, kwargs)
+        chunks, waits = _replay_plan(store, key, record)
+        if kwargs.get("stream"):
+            return _areplay_stream(chunks, waits)
+        await asyncio.sleep(sum(waits))
+        return build_model_response(_response_data(record))
+
+    return acompletion
+
+
+def wrap_completion_fns(completion_fn, acompletion_fn):
+    """
+    按 REPLAY_MODE 包装 AIClient 的 completion 函数
+
+    同一对原始函数只包装一次，instructor 客户端按 completion 函数复用的缓存仍然有效
+    """
+    if REPLAY_MODE == "off":
+        return completion_fn, acompletion_fn
+    cache_key = (REPLAY_MODE, completion_fn, acompletion_fn)
+    with _store_lock:
+        wrapped = _wrapped_fns.get(cache_key)
+    if wrapped is not None:
+        return wrapped
+    store = get_fixture_store()
+    if REPLAY_MODE == "record":
+        wrapped = (
+            _recording_completion(completion_fn, store),
+            _arecording_completion(acompletion_fn, store) if acompletion_fn is not None else None,
+        )
+    else:
+        wrapped = (_replaying_completion(store), _areplaying_completion(store))
+    with _store_lock:
+        return _wrapped_fns.setdefault(cache_key, wrapped)
@@ -0,0 +1,241 @@
+# resilience.py - AI 请求的容错与尾延迟控制
+# 按提供商/模型共享的熔断器、请求取消信号、对冲请求使用的延迟记录与统计；
+# 阈值等配置由 config.AIClient 传入，本模块不读取环境变量
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时的快速失败异常，调用方应直接走降级输出而不是继续重试"""
+
+
+class RequestCancelledError(Exception):
+    """请求收到取消信号（对冲请求或推测执行中落败的一方），放弃剩余的重试与退避等待"""
+
+
+class CancelToken:
+    """
+    传给 AI 请求的取消信号，接口与 threading.Event 相同（set / is_set / wait）
+
+    指定 parent 时，parent 被设置后本令牌同样视为已取消：对冲请求的两份副本各持有一个子令牌，
+    调用方取消整次请求时两份都会停止重试
+    """
+
+    def __init__(self, parent=None):
+        self._event = threading.Event()
+        self._parent = parent
+
+    def set(self):
+        self._event.set()
+
+    def is_set(self):
+        return self._event.is_set() or (self._parent is not None and self._parent.is_set())
+
+    def wait(self, timeout=None):
+        if self._parent is None:
+            return self._event.wait(timeout)
+        # 同时关注父令牌，按短间隔轮询
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.is_set():
+            remaining = 0.1 if deadline is None else min(0.1, deadline - time.monotonic())
+            if remaining <= 0:
+                return False
+            self._event.wait(remaining)
+        return True
+
+
+class CircuitBreaker:
+    """按提供商/模型共享的熔断器：closed -> open -> half_open -> closed/open"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, cooldown_seconds=60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.open_count = 0
+        self.rejected_calls = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _remaining_cooldown(self, now):
+        return max(self.opened_at + self.cooldown_seconds - now, 0.0)
+
+    def before_call(self):
+        """请求前检查：打开期间直接抛出 CircuitOpenError，冷却结束后只放行一个探测请求"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                remaining = self._remaining_cooldown(now)
+                if remaining > 0:
+                    self.rejected_calls += 1
+                    raise CircuitOpenError(f"{self.name} 已熔断，{remaining:.0f}s 后重新探测")
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                self.rejected_calls += 1
+                raise CircuitOpenError(f"{self.name} 正在半开探测，暂不接受其他请求")
+            self._probe_in_flight = True
+            logger.info("熔断器半开，放行探测请求: %s", self.name)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("熔断器已恢复: %s", self.name)
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.open_count += 1
+                    logger.warning(
+                        "熔断器打开: %s, 连续失败 %s 次, 冷却 %.0fs",
+                        self.name,
+                        self.consecutive_failures,
+                        self.cooldown_seconds,
+                    )
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def is_open(self):
+        with self._lock:
+            return self.state == self.OPEN and self._remaining_cooldown(time.monotonic()) > 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "open_count": self.open_count,
+                "rejected_calls": self.rejected_calls,
+            }
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider, model, failure_threshold=5, cooldown_seconds=60.0):
+    """获取某个提供商/模型的共享熔断器，所有线程与客户端实例共用；阈值与冷却时间只在首次创建时生效"""
+    key = (str(provider or ""), str(model or ""))
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(f"{key[0]}/{key[1]}", failure_threshold, cooldown_seconds)
+            _circuit_breakers[key] = breaker
+        return breaker
+
+
+def get_circuit_breaker_stats():
+    with _circuit_breakers_lock:
+        breakers = list(_circuit_breakers.values())
+    return [breaker.snapshot() for breaker in breakers]
+
+
+def reset_circuit_breakers():
+    with _circuit_breakers_lock:
+        _circuit_breakers.clear()
+
+
+def is_circuit_open_error(error):
+    """判断异常（或其异常链）是否由熔断导致"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, CircuitOpenError):
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def root_cause(error):
+    """沿 raise ... from 的异常链找到最初的异常，用于对包装过的异常分类"""
+    seen = set()
+    while error.__cause__ is not None and id(error) not in seen:
+        seen.add(id(error))
+        error = error.__cause__
+    return error
+
+
+class LatencyTracker:
+    """按 (提供商, 模型, 思考模式, 请求类型) 记录最近若干次成功调用的耗时"""
+
+    def __init__(self, window=50):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, latency):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(latency)
+
+    def percentile(self, key, percentile):
+        with self._lock:
+            samples = sorted(self._samples.get(key) or ())
+        if not samples:
+            return None
+        rank = min(int(round(percentile / 100 * (len(samples) - 1))), len(samples) - 1)
+        return samples[rank]
+
+    def hedge_delay(self, key, percentile=95.0, min_samples=10, min_delay=0.0):
+        """样本足够时返回发出对冲请求前的等待时间（延迟的 percentile 分位数，不低于 min_delay），否则返回 None（不对冲）"""
+        with self._lock:
+            count = len(self._samples.get(key) or ())
+        if count < min_samples:
+            return None
+        return max(self.percentile(key, percentile), min_delay)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+class HedgeStats:
+    """统计对冲请求的发出与胜出次数，衡量额外开销"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def record_call(self, hedged, hedge_won=False):
+        with self._lock:
+            self.calls += 1
+            if hedged:
+                self.hedged += 1
+                if hedge_won:
+                    self.hedge_wins += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "hedge_rate": round(self.hedged / self.calls, 4) if self.calls else 0.0,
+            }
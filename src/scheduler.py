@@ -0,0 +1,168 @@
+# scheduler.py - 截止时间感知的批量调度模块
+# CI 任务到时会被直接终止，按列表顺序提交时排在后面的重点论文最容易丢失；
+# 这里按历史耗时估算每篇论文的处理时间，重点论文与耗时长的任务先提交，
+# 预计无法在截止前完成的任务不再提交，并在截止前留出写报告、发邮件的时间
+
+import logging
+import time
+
+from cache import get_cached_classification
+from config import (
+    AI_MODEL,
+    AI_PROVIDER,
+    AI_PROVIDER_POOL,
+    ANALYSIS_THINKING_MODE,
+    PRIORITY_ANALYSIS_DELAY,
+    SECONDARY_ANALYSIS_DELAY,
+)
+from planner import DEFAULT_PRIORITY_SHARES
+from provider_pool import parse_provider_pool_spec
+from state import load_task_latencies, record_task_duration
+
+logger = logging.getLogger(__name__)
+
+# 没有历史记录时各阶段单篇论文的处理耗时（秒），包含分类与请求间隔
+DEFAULT_STAGE_SECONDS = {
+    "analysis": 90.0 + PRIORITY_ANALYSIS_DELAY,
+    "analysis_thinking": 180.0 + PRIORITY_ANALYSIS_DELAY,
+    "abstract_translation": 10.0 + SECONDARY_ANALYSIS_DELAY,
+    "title_translation": 5.0 + SECONDARY_ANALYSIS_DELAY,
+}
+
+# 提交顺序：已知的重点论文 -> 未分类论文 -> 了解领域 -> 不相关
+_PRIORITY_RANK = {1: 0, None: 1, 2: 2, 0: 3}
+
+
+def analysis_stage(thinking_mode=None):
+    thinking = ANALYSIS_THINKING_MODE if thinking_mode is None else thinking_mode
+    return "analysis_thinking" if thinking else "analysis"
+
+
+def record_task_result(stage, seconds, task_state=None):
+    """
+    记录一次由模型实际完成的任务耗时，按实际服务的提供商/模型（served_provider / served_model）分别统计
+
+    缓存命中、熔断降级与失败的结果反映不了模型耗时，不计入；task_state 为 analysis_meta 或翻译状态
+    """
+    task_state = task_state or {}
+    if stage is None or seconds <= 0:
+        return
+    if task_state.get("from_cache") or task_state.get("circuit_open") or task_state.get("failed"):
+        return
+    provider = task_state.get("served_provider")
+    model = task_state.get("served_model")
+    if not provider or not model:
+        return
+    try:
+        record_task_duration(provider, model, stage, seconds)
+    except Exception as e:
+        logger.debug(f"记录任务耗时失败: {str(e)}")
+
+
+def latency_sources():
+    """估算耗时参考的提供商/模型：配置了提供商池时为全部成员，否则为 AI_PROVIDER/AI_MODEL"""
+    members = [(provider, model) for provider, model, weight in parse_provider_pool_spec(AI_PROVIDER_POOL) if weight > 0]
+    return members or [(AI_PROVIDER, AI_MODEL)]
+
+
+def load_stage_seconds(sources=None):
+    """读取各阶段的历史平均耗时，多个提供商/模型都有记录的阶段取平均值"""
+    samples = {}
+    for provider, model in sources or latency_sources():
+        for stage, seconds in load_task_latencies(provider, model).items():
+            samples.setdefault(stage, []).append(seconds)
+    return {stage: sum(values) / len(values) for stage, values in samples.items()}
+
+
+class ScheduledTask:
+    def __init__(self, index, paper, priority, expected_seconds):
+        self.index = index
+        self.paper = paper
+        self.priority = priority
+        self.expected_seconds = expected_seconds
+
+    @property
+    def sort_key(self):
+        # 同一优先级内预计耗时最长的先提交，剩余时间充裕时先把长任务跑起来
+        return (_PRIORITY_RANK.get(self.priority, 1), -self.expected_seconds, self.index)
+
+
+class DeadlineScheduler:
+    """
+    按截止时间调度论文处理任务
+
+    deadline_seconds 从 started_at 起算；flush_margin_seconds 为截止前预留给最终报告的时间，
+    到达 flush_at 后主循环停止等待剩余任务，直接写出最终报告。
+    """
+
+    def __init__(
+        self,
+        papers,
+        deadline_seconds,
+        flush_margin_seconds=120,
+        thinking_mode=None,
+        started_at=None,
+        stage_seconds=None,
+    ):
+        self.started_at = time.monotonic() if started_at is None else started_at
+        self.deadline_at = self.started_at + deadline_seconds
+        self.flush_at = self.deadline_at - max(flush_margin_seconds, 0)
+        self.thinking_mode = thinking_mode
+        self.stage_seconds = dict(DEFAULT_STAGE_SECONDS)
+        if stage_seconds is None:
+            stage_seconds = load_stage_seconds()
+        self.stage_seconds.update(stage_seconds)
+        self.skipped = []
+        self._queue = sorted(
+            (self._build_task(index, paper) for index, paper in enumerate(papers, 1)),
+            key=lambda task: task.sort_key,
+        )
+
+    def _build_task(self, index, paper):
+        cached = get_cached_classification(paper.get_short_id())
+        priority = cached[0] if cached else None
+        return ScheduledTask(index, paper, priority, self.expected_seconds(priority))
+
+    def expected_seconds(self, priority):
+        """按阶段估算单篇论文的处理耗时；未分类的论文按默认优先级比例加权"""
+        stage_by_priority = {
+            1: analysis_stage(self.thinking_mode),
+            2: "abstract_translation",
+            0: "title_translation",
+        }
+        if priority in stage_by_priority:
+            return self.stage_seconds[stage_by_priority[priority]]
+        return sum(share * self.stage_seconds[stage_by_priority[p]] for p, share in DEFAULT_PRIORITY_SHARES.items())
+
+    @property
+    def pending_count(self):
+        return len(self._queue)
+
+    def seconds_until_flush(self, now=None):
+        return self.flush_at - (time.monotonic() if now is None else now)
+
+    def should_flush(self, now=None):
+        return self.seconds_until_flush(now) <= 0
+
+    def next_task(self, now=None):
+        """
+        返回下一个预计能在 flush_at 之前完成的任务，没有时返回 None
+
+        放不下的任务记入 skipped，不再提交；后面预计耗时更短的任务仍有机会被提交
+        """
+        remaining = self.seconds_until_flush(now)
+        while self._queue:
+            task = self._queue.pop(0)
+            if task.expected_seconds <= remaining:
+                return task
+            logger.warning(
+                f"预计无法在截止时间前完成，跳过: {task.paper.title} "
+                f"(预计 {task.expected_seconds:.0f}s, 剩余 {max(remaining, 0):.0f}s)"
+            )
+            self.skipped.append(task)
+        return None
+
+    def skip_remaining(self):
+        self.skipped.extend(self._queue)
+        self._queue = []
+        return len(self.skipped)
@@ -0,0 +1,419 @@
+# state.py - 运行状态持久化模块
+# 保存需要跨运行保留的状态（抓取水位线、已处理论文等），与可随时清除的 .cache 分开存放
+
+import json
+import logging
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterable, Optional
+
+from config import (
+    CRAWL_WATERMARK_OVERLAP_HOURS,
+    PROCESSED_INDEX_RETENTION_DAYS,
+    STATE_DIR,
+    STRUCTURED_STATS_WINDOW,
+)
+
+logger = logging.getLogger(__name__)
+
+CRAWL_STATE_FILE = "crawl_state.json"
+PROCESSED_INDEX_FILE = "processed_papers.json"
+STRUCTURED_STATS_FILE = "structured_stats.json"
+TASK_LATENCY_FILE = "task_latency.json"
+# 任务耗时按指数滑动平均更新，新样本的权重
+TASK_LATENCY_ALPHA = 0.3
+
+_state_lock = threading.Lock()
+
+
+def _ensure_state_dir() -> Path:
+    """确保状态目录存在"""
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    gitignore = STATE_DIR / ".gitignore"
+    if not gitignore.exists():
+        gitignore.write_text("*\n!.gitignore\n")
+    return STATE_DIR
+
+
+def _read_state_file(name: str) -> dict:
+    path = STATE_DIR / name
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"状态文件读取失败: {path}, 错误: {e}")
+        return {}
+
+
+def _write_state_file(name: str, data: dict) -> bool:
+    """先写临时文件再替换，避免进程中断时留下半截 JSON"""
+    path = _ensure_state_dir() / name
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        tmp_path.replace(path)
+        return True
+    except OSError as e:
+        logger.warning(f"状态文件写入失败: {path}, 错误: {e}")
+        return False
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return _as_utc(datetime.fromisoformat(str(value)))
+    except ValueError:
+        return None
+
+
+# ============ 抓取水位线 ============
+
+def load_crawl_state() -> dict:
+    """读取抓取状态，返回 {"watermark": str|None, "seen_ids": {arxiv_id: published}}"""
+    data = _read_state_file(CRAWL_STATE_FILE)
+    seen_ids = data.get("seen_ids")
+    return {
+        "watermark": data.get("watermark"),
+        "seen_ids": dict(seen_ids) if isinstance(seen_ids, dict) else {},
+        "updated_at": data.get("updated_at"),
+    }
+
+
+def get_crawl_watermark() -> Optional[datetime]:
+    """获取最近一次成功处理的论文提交时间（UTC），没有记录时返回 None"""
+    return _parse_timestamp(load_crawl_state().get("watermark"))
+
+
+def get_seen_paper_ids() -> set:
+    """获取水位线重叠区间内已经处理过的 arXiv ID"""
+    return set(load_crawl_state()["seen_ids"])
+
+
+def record_crawled_papers(
+    papers: Iterable,
+    completed_ids: Optional[Iterable[str]] = None,
+    advance_watermark: bool = True,
+    overlap_hours: int = CRAWL_WATERMARK_OVERLAP_HOURS,
+) -> Optional[datetime]:
+    """
+    记录本次运行处理过的论文，并推进水位线
+
+    Args:
+        papers: 本次抓取到的论文列表
+        completed_ids: 实际处理完成的 arXiv ID，None 表示全部完成
+        advance_watermark: 是否把水位线推进到本批论文的最大提交时间（部分完成的运行不应推进）
+        overlap_hours: 水位线之前保留已见 ID 的时长，用于过滤重叠区间内的重复论文
+
+    Returns:
+        更新后的水位线
+    """
+    papers = list(papers)
+    completed = None if completed_ids is None else set(completed_ids)
+
+    with _state_lock:
+        state = load_crawl_state()
+        seen_ids = state["seen_ids"]
+        watermark = _parse_timestamp(state.get("watermark"))
+
+        newest = None
+        for paper in papers:
+            arxiv_id = paper.get_short_id()
+            published = _as_utc(paper.published)
+            if completed is None or arxiv_id in completed:
+                seen_ids[arxiv_id] = published.isoformat()
+            if newest is None or published > newest:
+                newest = published
+
+        if advance_watermark and newest is not None and (watermark is None or newest > watermark):
+            watermark = newest
+
+        if watermark is not None:
+            # 只保留重叠区间内的 ID，区间之外的论文不会再被列出
+            cutoff = watermark - timedelta(hours=max(overlap_hours, 0) * 2)
+            seen_ids = {
+                arxiv_id: published
+                for arxiv_id, published in seen_ids.items()
+                if (_parse_timestamp(published) or cutoff) >= cutoff
+            }
+
+        _write_state_file(
+            CRAWL_STATE_FILE,
+            {
+                "watermark": watermark.isoformat() if watermark else None,
+                "seen_ids": seen_ids,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            },
+        )
+
+    if watermark is not None:
+        logger.info(f"抓取水位线已更新: {watermark.strftime('%Y-%m-%d %H:%M:%S')} UTC, 重叠区已见论文 {len(seen_ids)} 篇")
+    return watermark
+
+
+# ============ 已处理论文索引 ============
+
+def split_arxiv_version(arxiv_id: str) -> tuple:
+    """把 "2401.12345v2" 拆成 ("2401.12345", 2)，没有版本号时版本为 None"""
+    match = re.match(r"^(.*?)v(\d+)$", str(arxiv_id or "").strip())
+    if match:
+        return match.group(1), int(match.group(2))
+    return str(arxiv_id or "").strip(), None
+
+
+def load_processed_index() -> dict:
+    """读取已处理论文索引，返回 {不含版本号的 arXiv ID: 记录}"""
+    papers = _read_state_file(PROCESSED_INDEX_FILE).get("papers")
+    return dict(papers) if isinstance(papers, dict) else {}
+
+
+def get_processed_paper(arxiv_id: str) -> Optional[dict]:
+    """获取某篇论文在往期报告中的记录"""
+    base_id, _ = split_arxiv_version(arxiv_id)
+    return load_processed_index().get(base_id)
+
+
+def partition_processed_papers(papers: Iterable, reprocess_new_versions: bool = True) -> tuple:
+    """
+    按已处理论文索引把论文分为待处理和已报告两组
+
+    Args:
+        papers: 论文列表
+        reprocess_new_versions: arXiv 出现新版本时是否重新处理
+
+    Returns:
+        (待处理论文列表, 已报告论文列表)
+    """
+    index = load_processed_index()
+    pending, reported = [], []
+    for paper in papers:
+        base_id, version = split_arxiv_version(paper.get_short_id())
+        record = index.get(base_id)
+        if record is None:
+            pending.append(paper)
+            continue
+        recorded_version = record.get("version")
+        is_new_version = version is not None and (recorded_version is None or version > recorded_version)
+        if reprocess_new_versions and is_new_version:
+            logger.info(f"论文出现新版本，将重新处理: {paper.get_short_id()} (已报告 v{recorded_version})")
+            pending.append(paper)
+        else:
+            reported.append(paper)
+    return pending, reported
+
+
+def record_processed_papers(
+    entries: Iterable,
+    report_file=None,
+    retention_days: int = PROCESSED_INDEX_RETENTION_DAYS,
+) -> int:
+    """
+    把写入报告的论文记入已处理索引
+
+    Args:
+        entries: (paper, priority, reason) 元组序列
+        report_file: 论文所在的报告文件
+        retention_days: 记录保留天数，超过的记录会被清理
+
+    Returns:
+        本次记录的论文数量
+    """
+    now = datetime.now(timezone.utc)
+    report_name = Path(report_file).name if report_file else ""
+    count = 0
+
+    with _state_lock:
+        index = load_processed_index()
+        for paper, priority, reason in entries:
+            arxiv_id = paper.get_short_id()
+            base_id, version = split_arxiv_version(arxiv_id)
+            index[base_id] = {
+                "arxiv_id": arxiv_id,
+                "version": version,
+                "priority": priority,
+                "reason": reason or "",
+                "title": " ".join(str(getattr(paper, "title", "")).split()),
+                "report_file": report_name,
+                "timestamp": now.isoformat(),
+            }
+            count += 1
+
+        cutoff = now - timedelta(days=max(retention_days, 1))
+        index = {
+            base_id: record
+            for base_id, record in index.items()
+            if (_parse_timestamp(record.get("timestamp")) or now) >= cutoff
+        }
+        _write_state_file(PROCESSED_INDEX_FILE, {"papers": index, "updated_at": now.isoformat()})
+
+    logger.info(f"已处理论文索引已更新: 新增/更新 {count} 篇, 共 {len(index)} 篇")
+    return count
+
+
+# ============ 结构化输出成功率 ============
+
+def _structured_stats_key(provider: str, model: str) -> str:
+    return f"{provider}/{model}"
+
+
+# 统计只在内存中累计，运行结束时由 flush_structured_stats 写入一次；按 STATE_DIR 区分，切换目录时重新读取
+_structured_stats_cache = {"state_dir": None, "models": {}, "dirty": False}
+
+
+def _structured_stats_locked() -> dict:
+    """返回当前 STATE_DIR 对应的内存统计，调用方需持有 _state_lock"""
+    if _structured_stats_cache["state_dir"] != STATE_DIR:
+        models = _read_state_file(STRUCTURED_STATS_FILE).get("models")
+        _structured_stats_cache.update(
+            {"state_dir": STATE_DIR, "models": dict(models) if isinstance(models, dict) else {}, "dirty": False}
+        )
+    return _structured_stats_cache["models"]
+
+
+def load_structured_stats() -> dict:
+    """读取各提供商/模型的结构化分析统计，返回 {"provider/model": {"attempts", "successes", ...}}"""
+    with _state_lock:
+        return {key: dict(record) for key, record in _structured_stats_locked().items()}
+
+
+def record_structured_outcome(provider: str, model: str, success: bool, window: int = STRUCTURED_STATS_WINDOW) -> dict:
+    """
+    记录一次结构化分析的结果（只更新内存，见 flush_structured_stats）
+
+    计数超过 window 时按比例缩小，使成功率主要反映最近约 window 次调用
+
+    Returns:
+        更新后的统计记录
+    """
+    key = _structured_stats_key(provider, model)
+    now = datetime.now(timezone.utc).isoformat()
+    with _state_lock:
+        models = _structured_stats_locked()
+        record = dict(models.get(key) or {})
+        attempts = float(record.get("attempts", 0)) + 1
+        successes = float(record.get("successes", 0)) + (1 if success else 0)
+        window = max(int(window or 1), 1)
+        if attempts > window:
+            scale = window / attempts
+            attempts, successes = attempts * scale, successes * scale
+        record.update(
+            {
+                "attempts": round(attempts, 4),
+                "successes": round(successes, 4),
+                "success_rate": round(successes / attempts, 4),
+                "updated_at": now,
+            }
+        )
+        models[key] = record
+        _structured_stats_cache["dirty"] = True
+    return dict(record)
+
+
+def flush_structured_stats() -> bool:
+    """把本次运行累计的结构化统计写入 STATE_DIR，没有新记录时不写文件"""
+    with _state_lock:
+        if not _structured_stats_cache["dirty"] or _structured_stats_cache["state_dir"] != STATE_DIR:
+            return False
+        models = _structured_stats_cache["models"]
+        written = _write_state_file(
+            STRUCTURED_STATS_FILE, {"models": models, "updated_at": datetime.now(timezone.utc).isoformat()}
+        )
+        if written:
+            _structured_stats_cache["dirty"] = False
+    if written:
+        logger.info(f"结构化分析统计已保存: {len(models)} 个提供商/模型")
+    return written
+
+
+def get_structured_success_rate(provider: str, model: str) -> tuple:
+    """返回 (成功率, 样本数)，没有记录时为 (None, 0)"""
+    with _state_lock:
+        record = _structured_stats_locked().get(_structured_stats_key(provider, model))
+        record = dict(record) if record else None
+    if not record or not record.get("attempts"):
+        return None, 0
+    attempts = float(record["attempts"])
+    return float(record.get("successes", 0)) / attempts, attempts
+
+
+# ============ 任务耗时 ============
+
+def _task_latency_key(provider: str, model: str, stage: str) -> str:
+    return f"{provider}/{model}/{stage}"
+
+
+_task_latency_cache = {"state_dir": None, "tasks": {}, "dirty": False}
+
+
+def _task_latencies_locked() -> dict:
+    """返回当前 STATE_DIR 对应的内存耗时记录，调用方需持有 _state_lock"""
+    if _task_latency_cache["state_dir"] != STATE_DIR:
+        tasks = _read_state_file(TASK_LATENCY_FILE).get("tasks")
+        _task_latency_cache.update(
+            {"state_dir": STATE_DIR, "tasks": dict(tasks) if isinstance(tasks, dict) else {}, "dirty": False}
+        )
+    return _task_latency_cache["tasks"]
+
+
+def load_task_latencies(provider: str, model: str) -> dict:
+    """返回该提供商/模型下各阶段的历史平均耗时 {stage: seconds}"""
+    prefix = f"{provider}/{model}/"
+    with _state_lock:
+        return {
+            key[len(prefix):]: float(record["seconds"])
+            for key, record in _task_latencies_locked().items()
+            if key.startswith(prefix) and isinstance(record, dict) and record.get("seconds")
+        }
+
+
+def record_task_duration(provider: str, model: str, stage: str, seconds: float, alpha: float = TASK_LATENCY_ALPHA) -> dict:
+    """
+    记录一次论文处理任务的耗时，按指数滑动平均更新（只更新内存，见 flush_task_latencies）
+
+    Returns:
+        更新后的记录
+    """
+    key = _task_latency_key(provider, model, stage)
+    with _state_lock:
+        tasks = _task_latencies_locked()
+        record = dict(tasks.get(key) or {})
+        previous = record.get("seconds")
+        average = float(seconds) if not previous else float(previous) * (1 - alpha) + float(seconds) * alpha
+        record.update(
+            {
+                "seconds": round(average, 3),
+                "samples": int(record.get("samples", 0)) + 1,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+        tasks[key] = record
+        _task_latency_cache["dirty"] = True
+    return dict(record)
+
+
+def flush_task_latencies() -> bool:
+    """把本次运行累计的任务耗时写入 STATE_DIR，没有新记录时不写文件"""
+    with _state_lock:
+        if not _task_latency_cache["dirty"] or _task_latency_cache["state_dir"] != STATE_DIR:
+            return False
+        tasks = _task_latency_cache["tasks"]
+        written = _write_state_file(
+            TASK_LATENCY_FILE, {"tasks": tasks, "updated_at": datetime.now(timezone.utc).isoformat()}
+        )
+        if written:
+            _task_latency_cache["dirty"] = False
+    if written:
+        logger.info(f"任务耗时统计已保存: {len(tasks)} 条记录")
+    return written
@@ -0,0 +1,296 @@
+# streaming.py - 流式响应读取模块
+# 边接收边拼接 completion 的流式数据块，组装成与非流式响应结构相同的对象；
+# 结构化 JSON 一完整就停止读取，两个数据块之间超时视为卡住。超时时间由调用方（config.AIClient）传入
+
+import asyncio
+import queue
+import threading
+import time
+from types import SimpleNamespace
+
+from tokens import estimate_message_tokens, estimate_text_tokens
+
+
+def read_attr_or_key(obj, name, default=None):
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def coerce_text_block(value):
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        parts = []
+        for item in value:
+            text = read_attr_or_key(item, "text")
+            if text:
+                parts.append(str(text))
+                continue
+            content = read_attr_or_key(item, "content")
+            if content:
+                parts.append(str(content))
+                continue
+            parts.append(str(item))
+        return "\n".join(part for part in parts if part).strip()
+    return str(value)
+
+
+class StreamStalledError(TimeoutError):
+    """流式响应在空闲超时内没有收到新的数据块"""
+
+
+class StreamedResponse:
+    """把流式数据块拼成与非流式响应相同的结构，供现有的解析与 response_state 逻辑复用"""
+
+    def __init__(self, content, reasoning_content, usage, model, stream_metrics, generated_text="", generation_seconds=None):
+        message = SimpleNamespace(content=content, reasoning_content=reasoning_content or None)
+        self.choices = [SimpleNamespace(message=message)]
+        self.usage = usage
+        self.model = model
+        self.stream_metrics = stream_metrics
+        self.generated_text = generated_text
+        self.generation_seconds = generation_seconds
+
+    def fill_estimated_usage(self, create_kwargs):
+        """
+        提前停止读取或提供商未返回用量块时，按请求消息与已接收文本估算 token 用量
+
+        用量块位于流的末尾，提前停止后收不到；不估算的话这次调用在预算与缓存统计中记为 0
+        """
+        if self.usage:
+            return self
+        model_name = create_kwargs.get("model")
+        prompt_tokens = estimate_message_tokens(create_kwargs.get("messages"), model_name=model_name)
+        completion_tokens = estimate_text_tokens(self.generated_text, model_name=model_name)
+        self.usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        self.stream_metrics["usage_estimated"] = True
+        self.stream_metrics["tokens_per_second"] = _tokens_per_second(completion_tokens, self.generation_seconds)
+        return self
+
+
+def _tokens_per_second(completion_tokens, generation_seconds):
+    if not completion_tokens or not generation_seconds or generation_seconds <= 0:
+        return None
+    return round(completion_tokens / generation_seconds, 2)
+
+
+class _JsonObjectScanner:
+    """增量扫描流式文本，定位第一个完整的顶层 JSON 对象（跳过字符串内的括号）"""
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self._offset = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        """追加一段文本，第一个顶层对象闭合时返回 True"""
+        if self.end is not None:
+            return True
+        for position, char in enumerate(text, start=self._offset):
+            if self.start is None:
+                if char == "{":
+                    self.start = position
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = position + 1
+                    return True
+        self._offset += len(text)
+        return False
+
+
+class _StreamAccumulator:
+    """累积流式响应的 content / reasoning_content 增量，并记录首 token 延迟与生成速度"""
+
+    def __init__(self, response_model=None):
+        self.started = time.monotonic()
+        self.first_token_at = None
+        self.content_parts = []
+        self.reasoning_parts = []
+        self.usage = None
+        self.model = None
+        self.response_model = response_model
+        self.scanner = _JsonObjectScanner() if response_model is not None else None
+        self.early_candidate = None
+
+    def add(self, chunk):
+        """处理一个数据块，结构化 JSON 已完整且通过校验时返回 True（可以停止读取）"""
+        self.model = read_attr_or_key(chunk, "model") or self.model
+        usage = read_attr_or_key(chunk, "usage")
+        if usage:
+            self.usage = usage
+        choices = read_attr_or_key(chunk, "choices", []) or []
+        if not choices:
+            return False
+        delta = read_attr_or_key(choices[0], "delta") or read_attr_or_key(choices[0], "message")
+        content = coerce_text_block(read_attr_or_key(delta, "content"))
+        reasoning = coerce_text_block(read_attr_or_key(delta, "reasoning_content"))
+        if (content or reasoning) and self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        if reasoning:
+            self.reasoning_parts.append(reasoning)
+        if not content:
+            return False
+        self.content_parts.append(content)
+        if self.scanner is not None and self.scanner.feed(content):
+            return self._try_early_parse()
+        return False
+
+    def _try_early_parse(self):
+        candidate = "".join(self.content_parts)[self.scanner.start:self.scanner.end]
+        self.scanner = None
+        try:
+            self.response_model.model_validate_json(candidate)
+        except Exception:
+            # 第一个对象不合法时读完整个响应，交给常规解析与恢复逻辑处理
+            return False
+        self.early_candidate = candidate
+        return True
+
+    def build(self):
+        finished = time.monotonic()
+        content = self.early_candidate if self.early_candidate is not None else "".join(self.content_parts)
+        generation_seconds = finished - (self.first_token_at or self.started)
+        stream_metrics = {
+            "streamed": True,
+            "ttft_seconds": round(self.first_token_at - self.started, 3) if self.first_token_at else None,
+            "stream_duration_seconds": round(finished - self.started, 3),
+            # 数据块数不等于 token 数；没有用量块时由 fill_estimated_usage 按估算的 token 数补上
+            "tokens_per_second": _tokens_per_second(
+                read_attr_or_key(self.usage, "completion_tokens"), generation_seconds
+            ),
+            "stream_early_stop": self.early_candidate is not None,
+        }
+        reasoning_content = "".join(self.reasoning_parts)
+        generated_text = reasoning_content + "".join(self.content_parts)
+        return StreamedResponse(
+            content,
+            reasoning_content,
+            self.usage,
+            self.model,
+            stream_metrics,
+            generated_text,
+            generation_seconds=generation_seconds,
+        )
+
+
+def _close_stream(stream):
+    """关闭流及其底层连接；litellm 的 CustomStreamWrapper 没有 close，HTTP 连接由 completion_stream 持有"""
+    for target in (stream, getattr(stream, "completion_stream", None)):
+        close = getattr(target, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
+
+
+def consume_stream(stream, first_chunk_timeout, idle_timeout, response_model=None):
+    """
+    在后台线程读取同步流，主线程按间隔超时等待每个数据块
+
+    首个数据块最多等待 first_chunk_timeout 秒（思考模型可能长时间不输出），之后两个数据块之间
+    超过 idle_timeout 秒即抛出 StreamStalledError，交给重试逻辑处理。提前停止或超时时由主线程关闭流，
+    中断后台线程阻塞中的读取，而不是等到下一个数据块到达
+    """
+    chunks = queue.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def pump():
+        try:
+            for chunk in stream:
+                if stop.is_set():
+                    break
+                chunks.put((chunk, None))
+        except Exception as e:
+            chunks.put((None, e))
+        else:
+            chunks.put((finished, None))
+        finally:
+            _close_stream(stream)
+
+    threading.Thread(target=pump, name="ai-stream", daemon=True).start()
+    accumulator = _StreamAccumulator(response_model)
+    timeout = first_chunk_timeout
+    exhausted = False
+    try:
+        while True:
+            try:
+                chunk, error = chunks.get(timeout=timeout)
+            except queue.Empty:
+                raise StreamStalledError(f"流式响应超过 {timeout:.1f}s 没有新的数据块")
+            if error is not None:
+                exhausted = True
+                raise error
+            if chunk is finished:
+                exhausted = True
+                break
+            if accumulator.add(chunk):
+                break
+            timeout = idle_timeout
+    finally:
+        stop.set()
+        if not exhausted:
+            _close_stream(stream)
+    return accumulator.build()
+
+
+async def aconsume_stream(stream, first_chunk_timeout, idle_timeout, response_model=None):
+    """异步版本的 consume_stream，超时时取消等待中的读取"""
+    if not hasattr(stream, "__aiter__"):
+        # 测试替身等同步生成器放到线程里读取，避免阻塞事件循环
+        return await asyncio.to_thread(consume_stream, stream, first_chunk_timeout, idle_timeout, response_model)
+    iterator = stream.__aiter__()
+    accumulator = _StreamAccumulator(response_model)
+    timeout = first_chunk_timeout
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(iterator.__anext__(), timeout=timeout)
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                raise StreamStalledError(f"流式响应超过 {timeout:.1f}s 没有新的数据块")
+            if accumulator.add(chunk):
+                break
+            timeout = idle_timeout
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if callable(aclose):
+            try:
+                await aclose()
+            except Exception:
+                pass
+    return accumulator.build()
+
+
+def stream_kwargs(create_kwargs):
+    """在 completion 参数上打开流式并要求在最后一个数据块返回用量"""
+    return {**create_kwargs, "stream": True, "stream_options": {"include_usage": True}}
@@ -0,0 +1,321 @@
+# timeline.py - 运行时间线与分阶段耗时统计模块
+# 在抓取、PDF 下载/提取、模型调用、cleanup、写报告、发邮件等环节记录耗时片段（span），
+# 运行结束时在报告旁写出 JSON 时间线，并按阶段与提供商给出 p50 / p95 / max。
+# 本模块只依赖标准库，config 等底层模块可以直接导入
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 单次运行保留的 span 上限，防止异常情况下无限增长
+MAX_SPANS = 20000
+
+
+def _percentile(sorted_values, percentile):
+    if not sorted_values:
+        return None
+    rank = min(int(round(percentile / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[rank]
+
+
+def summarize_durations(durations):
+    """返回 {count, total, p50, p95, max}，单位为秒"""
+    values = sorted(durations)
+    if not values:
+        return {"count": 0, "total": 0.0, "p50": None, "p95": None, "max": None}
+    return {
+        "count": len(values),
+        "total": round(sum(values), 3),
+        "p50": round(_percentile(values, 50), 3),
+        "p95": round(_percentile(values, 95), 3),
+        "max": round(values[-1], 3),
+    }
+
+
+class Timeline:
+    """线程安全的 span 收集器，start 为相对运行开始的秒数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.monotonic()
+            self.started_wall = time.time()
+            self.spans = []
+            self.dropped = 0
+
+    def record(self, stage, started_at, duration, **attrs):
+        span = {
+            "stage": stage,
+            "start": round(started_at - self.started_at, 3),
+            "duration": round(max(duration, 0.0), 4),
+            "thread": threading.current_thread().name,
+        }
+        span.update({key: value for key, value in attrs.items() if value is not None})
+        with self._lock:
+            if len(self.spans) >= MAX_SPANS:
+                self.dropped += 1
+                return
+            self.spans.append(span)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.spans)
+
+    def summary(self):
+        """按阶段、以及按 阶段 -> 提供商/模型 汇总耗时"""
+        spans = self.snapshot()
+        by_stage = {}
+        by_provider = {}
+        for span in spans:
+            by_stage.setdefault(span["stage"], []).append(span["duration"])
+            if span.get("provider"):
+                provider_key = f"{span['provider']}/{span.get('model') or '-'}"
+                by_provider.setdefault(span["stage"], {}).setdefault(provider_key, []).append(span["duration"])
+        return {
+            "stages": {stage: summarize_durations(values) for stage, values in by_stage.items()},
+            "providers": {
+                stage: {key: summarize_durations(values) for key, values in providers.items()}
+                for stage, providers in by_provider.items()
+            },
+        }
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start"])
+            dropped = self.dropped
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_wall)),
+            "elapsed_seconds": round(time.monotonic() - self.started_at, 3),
+            "dropped_spans": dropped,
+            "summary": self.summary(),
+            "spans": spans,
+        }
+
+    def write(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return path
+
+
+_timeline = Timeline()
+
+
+def get_timeline():
+    return _timeline
+
+
+def reset_timeline():
+    _timeline.reset()
+
+
+# ============ span 钩子 ============
+# profiling 等模块在 span 开始时按阶段名挂上额外的上下文（如开启/暂停剖析）；
+# 钩子接收阶段名，返回上下文管理器或 None
+
+NETWORK_WAIT_STAGE = "network_wait"
+
+_span_hooks = []
+
+
+def add_span_hook(hook):
+    if hook not in _span_hooks:
+        _span_hooks.append(hook)
+
+
+def remove_span_hook(hook):
+    if hook in _span_hooks:
+        _span_hooks.remove(hook)
+
+
+def _enter_span_hooks(stage, stack):
+    for hook in list(_span_hooks):
+        context = hook(stage)
+        if context is not None:
+            stack.enter_context(context)
+
+
+@contextlib.contextmanager
+def span(stage, **attrs):
+    """
+    记录一段代码的耗时；yield 出的 dict 可以在执行过程中补充属性
+
+    抛出异常时同样记录，并附带 error 字段
+    """
+    extra = dict(attrs)
+    with contextlib.ExitStack() as hooks:
+        if _span_hooks:
+            _enter_span_hooks(stage, hooks)
+        started = time.monotonic()
+        try:
+            yield extra
+        except BaseException as e:
+            extra.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            _timeline.record(stage, started, time.monotonic() - started, **extra)
+
+
+@contextlib.contextmanager
+def network_wait():
+    """标记一段等待网络响应的代码；不记录 span，只通知钩子（--profile-cpu 时暂停剖析）"""
+    if not _span_hooks:
+        yield
+        return
+    with contextlib.ExitStack() as hooks:
+        _enter_span_hooks(NETWORK_WAIT_STAGE, hooks)
+        yield
+
+
+def network_bound(func):
+    """把同步函数的整个调用标记为网络等待，用于交给 instructor 的 completion 函数"""
+    if not callable(func):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with network_wait():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def timed(stage):
+    """把整个函数调用记为一个 span 的装饰器，支持普通函数与协程函数"""
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# ============ 模型调用 ============
+# 一次调用的总耗时拆成两部分：各次 HTTP 尝试的服务时间（ai_service），
+# 以及其余的等待时间（重试退避、熔断检查、排队，记为 ai_queue）
+
+_current_ai_call = contextvars.ContextVar("timeline_ai_call", default=None)
+
+
+class _AICallTimer:
+    def __init__(self, attrs):
+        self.attrs = attrs
+        self.started = time.monotonic()
+        self.service_seconds = 0.0
+        self.attempts = 0
+        self.usage = {}
+
+    def add_attempt(self, started, ok=True):
+        duration = time.monotonic() - started
+        self.service_seconds += duration
+        self.attempts += 1
+        _timeline.record("ai_service", started, duration, ok=ok, **self.attrs)
+
+    def add_usage(self, usage, model=None):
+        for key in ("prompt_tokens", "completion_tokens", "cached_prompt_tokens"):
+            if usage.get(key):
+                self.usage[key] = self.usage.get(key, 0) + int(usage[key])
+        if model:
+            self.attrs["model"] = model
+
+    def finish(self, ok):
+        total = time.monotonic() - self.started
+        _timeline.record(
+            "ai_call", self.started, total, ok=ok, attempts=self.attempts, **self.attrs, **self.usage
+        )
+        _timeline.record("ai_queue", self.started, max(total - self.service_seconds, 0.0), **self.attrs)
+
+
+def record_ai_attempt(started, ok=True):
+    """在调用循环中记录一次 HTTP 尝试，started 为尝试开始时的 time.monotonic()"""
+    timer = _current_ai_call.get()
+    if timer is not None:
+        timer.add_attempt(started, ok=ok)
+
+
+def record_ai_usage(usage, model=None):
+    """把一次成功调用的 token 用量记到当前调用的 ai_call span 上；model 为实际生效的模型名"""
+    timer = _current_ai_call.get()
+    if timer is not None and usage:
+        timer.add_usage(usage, model=model)
+
+
+def _ai_call_attrs(client, kwargs):
+    response_model = kwargs.get("response_model")
+    return {
+        "provider": getattr(client, "provider", None),
+        "model": getattr(client, "model", None),
+        "kind": getattr(response_model, "__name__", "structured") if kwargs.get("structured") else "chat",
+        "thinking": bool(kwargs.get("thinking_mode")),
+    }
+
+
+def timed_ai_call(func):
+    """AIClient 调用循环的装饰器，在当前线程/协程的上下文中登记计时器，供 record_ai_attempt 使用"""
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            timer = _AICallTimer(_ai_call_attrs(self, kwargs))
+            token = _current_ai_call.set(timer)
+            ok = False
+            try:
+                result = await func(self, *args, **kwargs)
+                ok = True
+                return result
+            finally:
+                _current_ai_call.reset(token)
+                timer.finish(ok)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        timer = _AICallTimer(_ai_call_attrs(self, kwargs))
+        token = _current_ai_call.set(timer)
+        ok = False
+        try:
+            result = func(self, *args, **kwargs)
+            ok = True
+            return result
+        finally:
+            _current_ai_call.reset(token)
+            timer.finish(ok)
+
+    return wrapper
+
+
+def format_timeline_summary(summary):
+    """把阶段汇总格式化为日志行"""
+    lines = []
+    for stage, stats in sorted(summary.get("stages", {}).items(), key=lambda item: -item[1]["total"]):
+        lines.append(
+            f"{stage}: {stats['count']} 次, 合计 {stats['total']:.1f}s, "
+            f"p50 {stats['p50']:.2f}s, p95 {stats['p95']:.2f}s, max {stats['max']:.2f}s"
+        )
+    return lines
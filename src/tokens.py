@@ -0,0 +1,106 @@
+# tokens.py - token 估算模块
+# tiktoken 编码器按模型缓存，同一批消息一次性批量编码；
+# 只需要数量级时（预算检查、调度）使用不加载 tiktoken 的近似估算
+
+import functools
+import logging
+import math
+import re
+
+from lazy import LazyModule, is_available
+
+tiktoken = LazyModule("tiktoken")
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_ENCODINGS = ("o200k_base", "cl100k_base")
+ENCODE_BATCH_THREADS = 8
+# 每条消息在 role 与 content 之外的固定开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 中日韩文字与全角标点基本是一个字符一个 token，其余文本按 UTF-8 字节数 / 4 估算
+_CJK_PATTERN = re.compile(r"[　-〿぀-ヿ㐀-䶿一-鿿가-힯＀-￯]")
+
+
+def _normalize_model_name(model_name):
+    return str(model_name or "").strip()
+
+
+@functools.lru_cache(maxsize=64)
+def _load_token_encoder(normalized_model: str):
+    candidates = []
+    if normalized_model:
+        candidates.append(normalized_model)
+        if "/" in normalized_model:
+            candidates.append(normalized_model.rsplit("/", 1)[-1])
+
+    for candidate in candidates:
+        try:
+            return tiktoken.encoding_for_model(candidate)
+        except Exception:
+            continue
+
+    for encoding_name in FALLBACK_ENCODINGS:
+        try:
+            return tiktoken.get_encoding(encoding_name)
+        except Exception:
+            continue
+    # 编码文件下载失败等情况同样缓存结果，本次运行内不再反复重试
+    logger.info("未能加载 tiktoken 编码器，token 数将按近似方式估算: model=%s", normalized_model or "-")
+    return None
+
+
+def get_token_encoder(model_name=None):
+    """返回模型对应的 tiktoken 编码器，按模型名缓存；tiktoken 不可用时返回 None"""
+    if not is_available(tiktoken):
+        return None
+    return _load_token_encoder(_normalize_model_name(model_name))
+
+
+def approximate_text_tokens(text) -> int:
+    """不依赖 tiktoken 的近似估算，误差在数量级以内，适合预算检查"""
+    content = str(text or "")
+    if not content:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(content))
+    if cjk_count == len(content):
+        return cjk_count
+    other_bytes = len(content.encode("utf-8", errors="ignore")) - cjk_count * 3
+    return max(1, cjk_count + math.ceil(max(other_bytes, 0) / 4))
+
+
+def estimate_texts_tokens(texts, model_name=None, approximate=False):
+    """
+    批量估算多段文本的 token 数，一次 encode_ordinary_batch 调用完成编码
+
+    Returns:
+        与 texts 顺序一致的 token 数列表
+    """
+    contents = [str(text or "") for text in texts]
+    encoder = None if approximate else get_token_encoder(model_name=model_name)
+    if encoder is not None:
+        non_empty = [content for content in contents if content]
+        try:
+            encoded = iter(encoder.encode_ordinary_batch(non_empty, num_threads=ENCODE_BATCH_THREADS))
+            return [len(next(encoded)) if content else 0 for content in contents]
+        except Exception as e:
+            logger.debug("批量编码失败，改用近似估算: %s", str(e))
+    return [approximate_text_tokens(content) for content in contents]
+
+
+def estimate_text_tokens(text, model_name=None, approximate=False) -> int:
+    return estimate_texts_tokens([text], model_name=model_name, approximate=approximate)[0]
+
+
+def estimate_message_tokens(messages, model_name=None, approximate=False) -> int:
+    """估算一组对话消息的 token 数，全部 role 与 content 一次性批量编码"""
+    texts = []
+    for message in messages or []:
+        if isinstance(message, dict):
+            texts.append(str(message.get("role") or ""))
+            texts.append(str(message.get("content") or ""))
+        else:
+            texts.append(str(getattr(message, "role", "") or ""))
+            texts.append(str(getattr(message, "content", "") or ""))
+    counts = estimate_texts_tokens(texts, model_name=model_name, approximate=approximate)
+    return sum(counts) + MESSAGE_OVERHEAD_TOKENS * (len(texts) // 2)
@@ -6,9 +6,13 @@ from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 from config import get_ai_client
 from cache import get_cached_translation, cache_translation
+from resilience import is_circuit_open_error
 
 logger = logging.getLogger(__name__)
 
+# 提供商熔断时返回的降级翻译会带上这个标记，不写入缓存，也不计为已完成
+DEGRADED_TRANSLATION_NOTE = "（AI 服务暂不可用，未翻译）"
+
 TRANSLATION_TITLE_REQUIREMENTS = """
 翻译要求：
 1. 翻译对象默认面向偏微分方程与分析理论研究者，而不是面向泛科普读者。
@@ -75,55 +79,38 @@ def _render_abstract_translation(result: StructuredAbstractTranslation):
     )
 
 
-def _build_translation_messages(paper, translate_title_only=False):
-    if translate_title_only:
-        prompt = (
-            "请严格按照给定的结构化 schema 返回翻译结果。\n\n"
-            f"{TRANSLATION_TITLE_REQUIREMENTS}\n\n"
-            "请将以下英文论文标题翻译成中文。\n\n"
-            f"论文标题: {paper.title}\n"
-        )
-    else:
-        prompt = (
-            "请严格按照给定的结构化 schema 返回翻译结果。\n\n"
-            f"{TRANSLATION_TITLE_REQUIREMENTS}\n\n"
-            f"{TRANSLATION_ABSTRACT_REQUIREMENTS}\n\n"
-            "请将以下英文论文标题和摘要翻译成中文。\n\n"
-            f"论文标题: {paper.title}\n"
-            f"摘要: {paper.summary}\n"
-        )
-    return [
-        {"role": "system", "content": "你是一位偏微分方程与分析理论方向的学术翻译专家. 请严格遵守返回 schema. "},
-        {"role": "user", "content": prompt},
-    ]
+# 翻译提示词同样把固定的要求与回答格式放在前面、论文标题和摘要放在最后，
+# 使同类翻译请求共享逐字节相同的前缀，便于提供商的前缀缓存命中
+TITLE_TRANSLATION_PROMPT_PREFIX = (
+    "请严格按照给定的结构化 schema 返回翻译结果。\n\n"
+    f"{TRANSLATION_TITLE_REQUIREMENTS}\n\n"
+    "请将以下英文论文标题翻译成中文。\n\n"
+)
 
+ABSTRACT_TRANSLATION_PROMPT_PREFIX = (
+    "请严格按照给定的结构化 schema 返回翻译结果。\n\n"
+    f"{TRANSLATION_TITLE_REQUIREMENTS}\n\n"
+    f"{TRANSLATION_ABSTRACT_REQUIREMENTS}\n\n"
+    "请将以下英文论文标题和摘要翻译成中文。\n\n"
+)
 
-def _build_translation_fallback_prompt(paper, translate_title_only=False):
-    if translate_title_only:
-        return f"""
+TITLE_TRANSLATION_FALLBACK_PROMPT_PREFIX = f"""
             {TRANSLATION_TITLE_REQUIREMENTS}
 
-            请将以下英文标题翻译成中文：
-            
-            论文标题: {paper.title}
-            
-            请提供：
+            请将下面的英文标题翻译成中文，并提供：
             1. 标题的中文翻译
             
             格式：
             **中文标题**: [翻译后的标题]
+
             """
-    return f"""
+
+ABSTRACT_TRANSLATION_FALLBACK_PROMPT_PREFIX = f"""
             {TRANSLATION_TITLE_REQUIREMENTS}
 
             {TRANSLATION_ABSTRACT_REQUIREMENTS}
 
-            请将以下英文摘要翻译成中文：
-            
-            论文标题: {paper.title}
-            摘要: {paper.summary}
-            
-            请提供：
+            请将下面的英文标题和摘要翻译成中文，并提供：
             1. 标题的中文翻译
             2. 摘要的中文翻译（保持原文的学术表达风格）
             
@@ -131,82 +118,211 @@ def _build_translation_fallback_prompt(paper, translate_title_only=False):
             **中文标题**: [翻译后的标题]
             
             **摘要翻译**: [翻译后的摘要]
+
             """
 
 
-def translate_abstract_with_deepseek(paper, translate_title_only=False, use_cache=True):
-    """使用DeepSeek API翻译论文摘要"""
-    arxiv_id = paper.get_short_id()
+def _format_translation_paper(paper, translate_title_only=False):
+    if translate_title_only:
+        return f"论文标题: {paper.title}\n"
+    return f"论文标题: {paper.title}\n摘要: {paper.summary}\n"
+
+
+def build_translation_messages(paper, translate_title_only=False):
+    """构造标题/摘要翻译请求的消息，运行时与 planner 的 token 预估共用"""
+    prefix = TITLE_TRANSLATION_PROMPT_PREFIX if translate_title_only else ABSTRACT_TRANSLATION_PROMPT_PREFIX
+    prompt = prefix + _format_translation_paper(paper, translate_title_only=translate_title_only)
+    return [
+        {"role": "system", "content": "你是一位偏微分方程与分析理论方向的学术翻译专家. 请严格遵守返回 schema. "},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _build_translation_fallback_prompt(paper, translate_title_only=False):
+    if translate_title_only:
+        prefix = TITLE_TRANSLATION_FALLBACK_PROMPT_PREFIX
+    else:
+        prefix = ABSTRACT_TRANSLATION_FALLBACK_PROMPT_PREFIX
+    return prefix + _format_translation_paper(paper, translate_title_only=translate_title_only)
+
+
+def _build_translation_fallback_messages(paper, translate_title_only=False):
+    prompt = _build_translation_fallback_prompt(paper, translate_title_only=translate_title_only)
+    return [
+        {"role": "system", "content": "你是一位偏微分方程与分析理论方向的学术翻译专家. "},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _get_structured_translation_spec(translate_title_only=False):
+    """返回 (response_model, 渲染函数)"""
+    if translate_title_only:
+        return StructuredTitleTranslation, _render_title_translation
+    return StructuredAbstractTranslation, _render_abstract_translation
+
+
+def _get_cached_translation(paper, translate_title_only=False):
+    cached = get_cached_translation(paper.get_short_id(), title_only=translate_title_only)
+    if cached is not None:
+        cache_type = "标题" if translate_title_only else "摘要"
+        logger.info(f"[缓存命中] {cache_type}翻译: {paper.title}")
+    return cached
+
+
+def _log_translation_start(paper, translate_title_only=False):
+    if translate_title_only:
+        logger.info(f"正在翻译标题: {paper.title}")
+    else:
+        logger.info(f"正在翻译摘要: {paper.title}")
+
+
+def _finish_translation(paper, translation, usage, translate_title_only=False, use_cache=True):
+    # 提取翻译后的标题用于日志
+    translated_title = ""
+    if "**中文标题**:" in translation:
+        for line in translation.split('\n'):
+            if line.startswith("**中文标题**:"):
+                translated_title = line.replace("**中文标题**:", "").strip()
+                break
+
+    log_title = translated_title if translated_title else paper.title
+
+    if translate_title_only:
+        logger.info(f"标题翻译完成: {log_title}")
+    else:
+        logger.info(f"摘要翻译完成: {log_title}")
+
+    if usage:
+        logger.info(
+            "翻译Token用量: 输入=%s (缓存命中=%s), 输出=%s, 总计=%s",
+            usage.get("prompt_tokens", 0),
+            usage.get("cached_prompt_tokens", 0),
+            usage.get("completion_tokens", 0),
+            usage.get("total_tokens", 0),
+        )
+
+    if use_cache:
+        cache_translation(paper.get_short_id(), translation, title_only=translate_title_only)
+    return translation
+
+
+def _build_degraded_translation(paper, translate_title_only=False):
+    """提供商熔断时的降级输出：保留英文标题（和摘要），让报告照常生成"""
+    title_line = f"**中文标题**: {paper.title}{DEGRADED_TRANSLATION_NOTE}"
+    if translate_title_only:
+        return title_line
+    return f"{title_line}\n\n**摘要翻译**: {getattr(paper, 'summary', '')}"
+
+
+def is_degraded_translation(text):
+    return isinstance(text, str) and DEGRADED_TRANSLATION_NOTE in text
+
+
+def _translation_error(paper, error, translate_title_only=False):
+    """返回 (降级或出错占位文本, 翻译状态)"""
+    if is_circuit_open_error(error):
+        logger.warning(f"AI 提供商已熔断，使用降级翻译: {paper.title}")
+        return _build_degraded_translation(paper, translate_title_only=translate_title_only), {"circuit_open": True}
+    if translate_title_only:
+        logger.error(f"翻译标题失败 {paper.title}: {str(error)}")
+    else:
+        logger.error(f"翻译摘要失败 {paper.title}: {str(error)}")
+    return f"**翻译出错**: {str(error)}", {"failed": True}
+
 
+def _translation_result(translation, translation_state, return_state=False):
+    if return_state:
+        return translation, translation_state
+    return translation
+
+
+def _served_state(response_state):
+    """从响应状态中取出实际服务的提供商/模型"""
+    response_state = response_state or {}
+    return {
+        "served_provider": response_state.get("served_provider", ""),
+        "served_model": response_state.get("served_model", ""),
+    }
+
+
+def translate_abstract_with_deepseek(paper, translate_title_only=False, use_cache=True, return_state=False):
+    """
+    使用DeepSeek API翻译论文摘要
+
+    return_state 为 True 时返回 (翻译, 翻译状态)；翻译状态记录是否命中缓存（from_cache）、
+    实际服务的提供商/模型（served_provider / served_model），熔断降级时为 circuit_open，出错时为 failed
+    """
     if use_cache:
-        cached = get_cached_translation(arxiv_id, title_only=translate_title_only)
+        cached = _get_cached_translation(paper, translate_title_only=translate_title_only)
         if cached is not None:
-            cache_type = "标题" if translate_title_only else "摘要"
-            logger.info(f"[缓存命中] {cache_type}翻译: {paper.title}")
-            return cached
+            return _translation_result(cached, {"from_cache": True}, return_state=return_state)
 
     try:
         usage = {}
-        if translate_title_only:
-            logger.info(f"正在翻译标题: {paper.title}")
-        else:
-            logger.info(f"正在翻译摘要: {paper.title}")
+        _log_translation_start(paper, translate_title_only=translate_title_only)
 
         try:
-            messages = _build_translation_messages(paper, translate_title_only=translate_title_only)
-            if translate_title_only:
-                structured, usage = get_ai_client().structured_chat_completion_with_usage(
-                    messages=messages,
-                    response_model=StructuredTitleTranslation,
-                    json_schema_prompt=True,
-                )
-                translation = _render_title_translation(structured)
-            else:
-                structured, usage = get_ai_client().structured_chat_completion_with_usage(
-                    messages=messages,
-                    response_model=StructuredAbstractTranslation,
-                    json_schema_prompt=True,
-                )
-                translation = _render_abstract_translation(structured)
+            messages = build_translation_messages(paper, translate_title_only=translate_title_only)
+            response_model, render = _get_structured_translation_spec(translate_title_only)
+            structured, usage, response_state = get_ai_client().structured_chat_completion_with_usage(
+                messages=messages,
+                response_model=response_model,
+                json_schema_prompt=True,
+                return_response_state=True,
+            )
+            translation = render(structured)
         except Exception as structured_error:
+            if is_circuit_open_error(structured_error):
+                raise
             logger.warning("结构化翻译失败，将回退到普通文本模式: %s", str(structured_error))
-            prompt = _build_translation_fallback_prompt(paper, translate_title_only=translate_title_only)
-            translation = get_ai_client().chat_completion(
-                messages=[
-                    {"role": "system", "content": "你是一位偏微分方程与分析理论方向的学术翻译专家. "},
-                    {"role": "user", "content": prompt},
-                ]
+            translation, _, response_state = get_ai_client().chat_completion_with_usage(
+                messages=_build_translation_fallback_messages(paper, translate_title_only=translate_title_only),
+                return_response_state=True,
             )
 
-        # 提取翻译后的标题用于日志
-        translated_title = ""
-        if "**中文标题**:" in translation:
-            for line in translation.split('\n'):
-                if line.startswith("**中文标题**:"):
-                    translated_title = line.replace("**中文标题**:", "").strip()
-                    break
-
-        log_title = translated_title if translated_title else paper.title
-
-        if translate_title_only:
-            logger.info(f"标题翻译完成: {log_title}")
-        else:
-            logger.info(f"摘要翻译完成: {log_title}")
-
-        if usage:
-            logger.info(
-                "翻译Token用量: 输入=%s, 输出=%s, 总计=%s",
-                usage.get("prompt_tokens", 0),
-                usage.get("completion_tokens", 0),
-                usage.get("total_tokens", 0),
+        translation = _finish_translation(paper, translation, usage, translate_title_only=translate_title_only, use_cache=use_cache)
+        return _translation_result(translation, _served_state(response_state), return_state=return_state)
+    except Exception as e:
+        translation, translation_state = _translation_error(paper, e, translate_title_only=translate_title_only)
+        return _translation_result(translation, translation_state, return_state=return_state)
+
+
+async def atranslate_abstract(paper, translate_title_only=False, use_cache=True, return_state=False):
+    """
+    translate_abstract_with_deepseek 的异步版本，供 batch 模块并发调用
+
+    return_state 为 True 时返回 (翻译, 翻译状态)，见 translate_abstract_with_deepseek
+    """
+    if use_cache:
+        cached = _get_cached_translation(paper, translate_title_only=translate_title_only)
+        if cached is not None:
+            return _translation_result(cached, {"from_cache": True}, return_state=return_state)
+
+    try:
+        usage = {}
+        _log_translation_start(paper, translate_title_only=translate_title_only)
+
+        try:
+            messages = build_translation_messages(paper, translate_title_only=translate_title_only)
+            response_model, render = _get_structured_translation_spec(translate_title_only)
+            structured, usage, response_state = await get_ai_client().astructured_chat_completion_with_usage(
+                messages=messages,
+                response_model=response_model,
+                json_schema_prompt=True,
+                return_response_state=True,
             )
-        
-        if use_cache:
-            cache_translation(arxiv_id, translation, title_only=translate_title_only)
-        return translation
+            translation = render(structured)
+        except Exception as structured_error:
+            if is_circuit_open_error(structured_error):
+                raise
+            logger.warning("结构化翻译失败，将回退到普通文本模式: %s", str(structured_error))
+            translation, _, response_state = await get_ai_client().achat_completion_with_usage(
+                messages=_build_translation_fallback_messages(paper, translate_title_only=translate_title_only),
+                return_response_state=True,
+            )
+
+        translation = _finish_translation(paper, translation, usage, translate_title_only=translate_title_only, use_cache=use_cache)
+        return _translation_result(translation, _served_state(response_state), return_state=return_state)
     except Exception as e:
-        if translate_title_only:
-            logger.error(f"翻译标题失败 {paper.title}: {str(e)}")
-        else:
-            logger.error(f"翻译摘要失败 {paper.title}: {str(e)}")
-        return f"**翻译出错**: {str(e)}"
+        translation, translation_state = _translation_error(paper, e, translate_title_only=translate_title_only)
+        return _translation_result(translation, translation_state, return_state=return_state)
\ No newline at end of file
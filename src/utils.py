@@ -7,15 +7,18 @@ import re
 import time
 from pathlib import Path
 
-from analyzer import extract_analysis_title, render_analysis_body
+from analyzer import parse_analysis
+from budget import format_budget_degradations
 from config import AI_MODEL, RESULTS_DIR
+from repair import format_repair_rules
+from timeline import timed
 from translator import translate_abstract_with_deepseek
 
 logger = logging.getLogger(__name__)
 
 
 def _extract_chinese_title(text: str) -> str:
-    return extract_analysis_title(text, "").strip()
+    return parse_analysis(text).title
 
 
 def _extract_abstract_translation(text: str) -> str:
@@ -45,7 +48,7 @@ def _get_paper_comment(paper) -> str:
 
 
 def _strip_analysis_heading(text: str) -> str:
-    return render_analysis_body(text)
+    return parse_analysis(text).body
 
 
 def _resolve_priority_title(title: str, analysis: str, translation: str) -> str:
@@ -68,6 +71,20 @@ def _analysis_metadata_lines(analysis_meta, ai_model):
         lines.append(f"effective_model: {analysis_meta.get('effective_model')}")
     else:
         lines.append(f"effective_model: {ai_model}")
+    if analysis_meta.get("hedged"):
+        lines.append("hedged: True")
+        lines.append(f"hedge_won: {bool(analysis_meta.get('hedge_won'))}")
+    if analysis_meta.get("streamed"):
+        if analysis_meta.get("ttft_seconds") is not None:
+            lines.append(f"ttft_seconds: {analysis_meta.get('ttft_seconds')}")
+        if analysis_meta.get("tokens_per_second") is not None:
+            lines.append(f"tokens_per_second: {analysis_meta.get('tokens_per_second')}")
+    if analysis_meta.get("speculative_fallback"):
+        lines.append(f"speculative_winner: {analysis_meta.get('speculative_winner')}")
+    if analysis_meta.get("served_by_pool"):
+        lines.append(f"served_by: {analysis_meta.get('served_provider')}/{analysis_meta.get('served_model')}")
+        if analysis_meta.get("pool_failovers"):
+            lines.append(f"pool_failovers: {analysis_meta.get('pool_failovers')}")
     lines.append(f"thinking_applied: {bool(analysis_meta.get('thinking_applied'))}")
     lines.append(f"fallback_used: {bool(analysis_meta.get('fallback_used'))}")
     lines.append(f"reasoning_content_present: {bool(analysis_meta.get('reasoning_content_present'))}")
@@ -84,6 +101,12 @@ def _analysis_metadata_lines(analysis_meta, ai_model):
     lines.append(f"cleanup_fallback_used: {bool(analysis_meta.get('cleanup_fallback_used'))}")
     lines.append(f"cleanup_reasoning_content_present: {bool(analysis_meta.get('cleanup_reasoning_content_present'))}")
     lines.append(f"cleanup_structured_validated: {bool(analysis_meta.get('cleanup_structured_validated'))}")
+    if analysis_meta.get("cleanup_skipped"):
+        lines.append("cleanup_skipped: True")
+    if analysis_meta.get("cleanup_blocks"):
+        lines.append(f"cleanup_blocks: {', '.join(analysis_meta.get('cleanup_blocks'))}")
+    if analysis_meta.get("local_repair_rules"):
+        lines.append(f"local_repairs: {format_repair_rules(analysis_meta.get('local_repair_rules'))}")
     if analysis_meta.get("cleanup_validation_error"):
         lines.append("cleanup_validation_error: |")
         for line in str(analysis_meta.get("cleanup_validation_error")).splitlines():
@@ -110,6 +133,8 @@ def _usage_lines(usage):
     lines.append(f"  total_tokens: {usage.get('total_tokens', 0)}")
     if "reasoning_tokens" in usage:
         lines.append(f"  reasoning_tokens: {usage.get('reasoning_tokens', 0)}")
+    if "cached_prompt_tokens" in usage:
+        lines.append(f"  cached_prompt_tokens: {usage.get('cached_prompt_tokens', 0)}")
     return lines
 
 
@@ -225,6 +250,7 @@ def write_pdf_analysis(
     return md_file
 
 
+@timed("report_write")
 def write_to_conclusion(priority_analyses, secondary_analyses, irrelevant_papers=None, filename: str = None, run_meta=None):
     today = datetime.datetime.now()
     date_str = today.strftime("%Y-%m-%d")
@@ -256,6 +282,23 @@ def write_to_conclusion(priority_analyses, secondary_analyses, irrelevant_papers
                 f.write(f"completed_papers: {run_meta.get('completed_papers')}\n")
             if run_meta.get("skipped_papers") is not None:
                 f.write(f"skipped_papers: {run_meta.get('skipped_papers')}\n")
+            if run_meta.get("already_reported_papers"):
+                f.write(f"already_reported_papers: {run_meta.get('already_reported_papers')}\n")
+            hedge_stats = run_meta.get("hedge_stats")
+            if hedge_stats:
+                f.write(f"hedged_requests: {hedge_stats.get('hedged', 0)}/{hedge_stats.get('calls', 0)}\n")
+                f.write(f"hedge_wins: {hedge_stats.get('hedge_wins', 0)}\n")
+            prompt_cache_stats = run_meta.get("prompt_cache_stats")
+            if prompt_cache_stats and prompt_cache_stats.get("cached_prompt_tokens"):
+                f.write(
+                    f"cached_prompt_tokens: {prompt_cache_stats.get('cached_prompt_tokens')}/"
+                    f"{prompt_cache_stats.get('prompt_tokens')}\n"
+                )
+            budget = run_meta.get("budget")
+            if budget:
+                f.write(f"budget_tokens: {budget.get('tokens', 0)}\n")
+                f.write(f"budget_cost: {budget.get('cost', 0)}\n")
+                f.write(f"budget_degradations: {','.join(event['action'] for event in budget.get('degradations', []))}\n")
         f.write("---\n\n")
         f.write(f"**生成时间**: {today.strftime('%Y年%m月%d日 %H:%M:%S')}\n\n")
         if run_meta:
@@ -267,6 +310,10 @@ def write_to_conclusion(priority_analyses, secondary_analyses, irrelevant_papers
                 f.write(f"**已完成论文数量**: {run_meta.get('completed_papers')}\n\n")
             if run_meta.get("skipped_papers") is not None:
                 f.write(f"**未完成论文数量**: {run_meta.get('skipped_papers')}\n\n")
+            if run_meta.get("already_reported_papers"):
+                f.write(f"**往期已报告论文数量**: {run_meta.get('already_reported_papers')}\n\n")
+            if (run_meta.get("budget") or {}).get("degradations"):
+                f.write(f"**预算降级**: {format_budget_degradations(run_meta['budget'])}\n\n")
         f.write(f"**重点关注论文数量**: {len(priority_analyses)}\n\n")
         f.write(f"**了解领域论文数量**: {len(secondary_analyses)}\n\n")
         if irrelevant_papers:
@@ -357,6 +404,7 @@ def delete_pdf(pdf_path):
         logger.error("删除PDF文件失败 %s: %s", pdf_path, str(e))
 
 
+@timed("pdf_download")
 def download_paper(paper, output_dir):
     output_dir.mkdir(parents=True, exist_ok=True)
     pdf_path = output_dir / f"{paper.get_short_id().replace('/', '_')}.pdf"
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+
+@pytest.fixture(autouse=True)
+def isolated_state_dir(tmp_path, monkeypatch):
+    """批量模式测试会推进抓取水位线，重定向到临时目录以免污染本地 state/"""
+    import state
+
+    monkeypatch.setattr(state, "STATE_DIR", tmp_path / "state")
+
+
+@pytest.fixture(autouse=True)
+def isolated_circuit_breakers():
+    """熔断器按提供商/模型全局共享，每个测试前后清空，避免失败计数串到其他测试"""
+    import config
+
+    config.reset_circuit_breakers()
+    yield
+    config.reset_circuit_breakers()
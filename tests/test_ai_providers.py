@@ -35,5 +35,55 @@ def test_ai_providers():
     assert not failures
 
 
+def _bare_client(completion_fn):
+    from config import AIClient, PROVIDER_CONFIG
+
+    client = AIClient.__new__(AIClient)
+    client.provider = "qwen"
+    client.model = "qwen-plus"
+    client.provider_config = PROVIDER_CONFIG["qwen"]
+    client.thinking_support = client.provider_config["thinking_support"]
+    client.completion_fn = completion_fn
+    return client
+
+
+def test_structured_client_is_reused_per_structured_mode():
+    def fake_completion(**kwargs):
+        return None
+
+    client = _bare_client(fake_completion)
+    other_client = _bare_client(fake_completion)
+
+    json_client = client._get_structured_client({"structured_mode": "json"})
+    assert client._get_structured_client({"structured_mode": "json"}) is json_client
+    assert other_client._get_structured_client({"structured_mode": "json"}) is json_client
+    assert client._get_structured_client({"structured_mode": "tools"}) is not json_client
+
+
+def test_structured_json_instruction_is_built_once_per_model():
+    import config
+    from analyzer import StructuredTopicClassification
+
+    client = _bare_client(None)
+    messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": "hello"}]
+
+    config._structured_json_instruction.cache_clear()
+    with patch.object(
+        StructuredTopicClassification,
+        "model_json_schema",
+        wraps=StructuredTopicClassification.model_json_schema,
+    ) as schema_spy:
+        first = client._build_structured_json_messages(messages, StructuredTopicClassification)
+        second = client._build_structured_json_messages(messages, StructuredTopicClassification)
+
+    assert schema_spy.call_count == 1
+    assert first == second
+    assert first[0]["content"].startswith("sys\n\n")
+    assert '"priority"' in first[0]["content"]
+    assert messages[0]["content"] == "sys"
+
+
 if __name__ == "__main__":
     test_ai_providers()
+    test_structured_client_is_reused_per_structured_mode()
+    test_structured_json_instruction_is_built_once_per_model()
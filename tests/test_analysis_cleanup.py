@@ -146,7 +146,7 @@ def test_analyze_paper_applies_cleanup_blocks_and_aggregates_usage():
     paper = DummyPaper()
     original_result = analyzer.StructuredPaperAnalysis(
         chinese_title="原始标题",
-        research_background="原始背景",
+        research_background="原始背景 $\\frac{a}{b$",
         main_results="原始结果",
         methods_and_tools="原始方法",
         comparison_with_previous_work="原始比较",
@@ -195,9 +195,11 @@ def test_analyze_paper_applies_cleanup_blocks_and_aggregates_usage():
         ):
             analysis, usage, analysis_meta = analyzer.analyze_paper("paper.pdf", paper, use_cache=False, thinking_mode=False)
 
-    assert analysis.startswith("# 清洗后标题")
+    # 只有本地检查未通过的 block 交给 cleanup 模型，其余 block 保持原样
+    assert analysis.startswith("# 原始标题")
     assert "清洗后背景" in analysis
     assert "1. 补齐段落结构。" in analysis
+    assert "原始结果" in analysis
     assert usage["total_tokens"] == 18
     assert analysis_meta["cleanup_requested"] is True
     assert analysis_meta["cleanup_attempted"] is True
@@ -208,28 +210,30 @@ def test_analyze_paper_applies_cleanup_blocks_and_aggregates_usage():
     cleanup_prompt = cleanup_client.calls[0]["messages"][1]["content"]
     assert "论文元数据" in cleanup_prompt
     assert "[research_background]" in cleanup_prompt
+    assert "[main_results]" not in cleanup_prompt
     assert "英文标题: Test Paper" in cleanup_prompt
+    assert analysis_meta["cleanup_blocks"] == ["research_background"]
 
 
 def test_analyze_paper_retries_cleanup_when_output_fails_validation():
     paper = DummyPaper()
     original_result = analyzer.StructuredPaperAnalysis(
         chinese_title="原始标题",
-        research_background="原始背景",
+        research_background="$$E(w)=\\frac{1}{2$$",
         main_results="原始结果",
         methods_and_tools="原始方法",
         comparison_with_previous_work="原始比较",
     )
     invalid_cleanup = analyzer.StructuredPaperAnalysis(
         chinese_title="清洗后标题",
-        research_background="$$\\nE(w)=1\n$$",
+        research_background="$$\\nE(w)=\\frac{1{2}$$",
         main_results="清洗后结果",
         methods_and_tools="清洗后方法",
         comparison_with_previous_work="清洗后比较",
     )
     valid_cleanup = analyzer.StructuredPaperAnalysis(
         chinese_title="清洗后标题",
-        research_background="$$\nE(w)=1\n$$",
+        research_background="$$\nE(w)=\\frac{1}{2}\n$$",
         main_results="清洗后结果",
         methods_and_tools="清洗后方法",
         comparison_with_previous_work="清洗后比较",
@@ -271,14 +275,14 @@ def test_analyze_paper_retries_cleanup_when_output_fails_validation():
         ):
             analysis, usage, analysis_meta = analyzer.analyze_paper("paper.pdf", paper, use_cache=False, thinking_mode=False)
 
-    assert analysis.startswith("# 清洗后标题")
-    assert "$$\nE(w)=1\n$$" in analysis
-    assert "$$\\nE(w)=1\n$$" not in analysis
+    assert analysis.startswith("# 原始标题")
+    assert "$$\nE(w)=\\frac{1}{2}\n$$" in analysis
+    assert "\\frac{1{2}" not in analysis
     assert usage["total_tokens"] == 29
     assert len(cleanup_client.calls) == 2
     retry_prompt = cleanup_client.calls[1]["messages"][1]["content"]
     assert "上一次输出未通过格式校验" in retry_prompt
-    assert "存在非法块公式转义: $$\\n" in retry_prompt
+    assert "[research_background] 公式中的花括号未配对" in retry_prompt
     assert analysis_meta["cleanup_applied"] is True
     assert analysis_meta["cleanup_structured_validated"] is True
 
@@ -287,7 +291,7 @@ def test_analyze_paper_keeps_original_when_cleanup_fails():
     paper = DummyPaper()
     original_result = analyzer.StructuredPaperAnalysis(
         chinese_title="原始标题",
-        research_background="原始背景",
+        research_background="原始背景 $\\frac{1}{2$",
         main_results="原始结果",
         methods_and_tools="原始方法",
         comparison_with_previous_work="原始比较",
@@ -335,3 +339,81 @@ def test_analyze_paper_keeps_original_when_cleanup_fails():
     assert analysis_meta["cleanup_attempted"] is True
     assert analysis_meta["cleanup_applied"] is False
     assert "cleanup unavailable" in analysis_meta["cleanup_error"]
+
+
+def test_clean_analysis_skips_cleanup_model():
+    blocks = analyzer.StructuredPaperAnalysis(
+        chinese_title="原始标题",
+        research_background="原始背景, 其中 $\\nabla u$ 与 $\\theta$ 保持不变.",
+        main_results="原始结果\n$$\nE(w)=1\n$$",
+        methods_and_tools="原始方法",
+        comparison_with_previous_work="原始比较",
+    )
+    cleanup_client = FakeCleanupClient(blocks)
+
+    with patch.object(analyzer, "get_analysis_cleanup_request_config", side_effect=cleanup_enabled_request), patch.object(
+        analyzer, "get_analysis_cleanup_client", return_value=cleanup_client
+    ):
+        cleaned, usage, cleanup_meta = analyzer._apply_analysis_cleanup(blocks, paper=DummyPaper())
+
+    assert cleanup_client.calls == []
+    assert cleaned is blocks
+    assert usage == {}
+    assert cleanup_meta["cleanup_skipped"] is True
+    assert cleanup_meta["cleanup_attempted"] is False
+    # 没有调用 cleanup 模型，cleanup_applied 保持 False
+    assert cleanup_meta["cleanup_applied"] is False
+    assert cleanup_meta["cleanup_local_repairs"] == 0
+
+
+def test_latex_heavy_analysis_skips_cleanup_without_local_repairs():
+    blocks = analyzer.StructuredPaperAnalysis(
+        chinese_title="关于 $\\nabla \\cdot u = 0$ 的研究",
+        research_background="考虑 $\\lVert u \\rVert_{L^2}$ 有界且 $\\tau \\neq 0$ 的情形.",
+        main_results="主要结果:\n$$\n\\nabla u \\nRightarrow \\rho \\nLeftarrow \\theta\n$$\n且 $\\tR \\to 0$.",
+        methods_and_tools="利用\n$$\n\\begin{aligned} \\rVert f \\lVert &\\le 1 \\\\ \\nu &> 0 \\end{aligned}\n$$",
+        comparison_with_previous_work="改进了 $\\tilde{r} \\ne 0$ 时的 $\\mathbb{R}^n$ 估计.",
+    )
+    cleanup_client = FakeCleanupClient(blocks)
+
+    with patch.object(analyzer, "get_analysis_cleanup_request_config", side_effect=cleanup_enabled_request), patch.object(
+        analyzer, "get_analysis_cleanup_client", return_value=cleanup_client
+    ):
+        cleaned, usage, cleanup_meta = analyzer._apply_analysis_cleanup(blocks, paper=DummyPaper())
+
+    assert cleanup_client.calls == []
+    assert cleaned is blocks
+    assert cleanup_meta["cleanup_skipped"] is True
+    assert cleanup_meta["cleanup_local_repairs"] == 0
+    assert analyzer._find_defective_blocks(analyzer.StructuredPaperAnalysis(**{**blocks.model_dump(), "main_results": "$$\\nabla u$$"})) == {}
+
+
+def test_mechanical_issues_are_repaired_locally_without_model_call():
+    blocks = analyzer.StructuredPaperAnalysis(
+        chinese_title="原始标题",
+        research_background="背景\\n第二段\x07",
+        main_results="我们证明\n$$\\n\\nabla u = 0$$\n成立",
+        methods_and_tools="方法",
+        comparison_with_previous_work="比较",
+    )
+    assert analyzer.validate_analysis_markdown(analyzer.render_structured_analysis_markdown(blocks))
+    cleanup_client = FakeCleanupClient(blocks)
+
+    with patch.object(analyzer, "get_analysis_cleanup_request_config", side_effect=cleanup_enabled_request), patch.object(
+        analyzer, "get_analysis_cleanup_client", return_value=cleanup_client
+    ):
+        cleaned, usage, cleanup_meta = analyzer._apply_analysis_cleanup(blocks, paper=DummyPaper())
+
+    assert cleanup_client.calls == []
+    assert cleaned.research_background == "背景\n第二段"
+    assert cleaned.main_results == "我们证明\n$$\n\\nabla u = 0\n$$\n成立"
+    assert cleanup_meta["cleanup_local_repairs"] == 4
+    assert not analyzer.validate_analysis_markdown(analyzer.render_structured_analysis_markdown(cleaned))
+
+
+def test_cleanup_patch_model_only_contains_defective_fields():
+    patch_model = analyzer._cleanup_patch_model(("research_background",))
+
+    assert list(patch_model.model_fields) == ["research_background"]
+    assert analyzer._cleanup_patch_model(("research_background",)) is patch_model
+    assert analyzer._cleanup_patch_model(analyzer.ANALYSIS_BLOCK_FIELDS) is analyzer.StructuredPaperAnalysis
@@ -5,9 +5,11 @@ import sys
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+import analyzer
 from analyzer import (
     StructuredPaperAnalysis,
     extract_analysis_title,
+    parse_analysis,
     render_analysis_body,
     render_structured_analysis_markdown,
     validate_analysis_markdown,
@@ -119,6 +121,60 @@ def test_validate_analysis_markdown_flags_literal_display_math_escapes():
     assert "存在非法块公式转义: $$\\n" in issues
 
 
+def _reference_match_section_heading(line):
+    # 编译前逐个比较别名的实现，用来核对交替正则的匹配优先级
+    candidate = analyzer._clean_heading_candidate(line)
+    if not candidate:
+        return None, ""
+    for canonical, aliases in analyzer.SECTION_SPECS:
+        for alias in aliases:
+            if candidate.startswith(alias):
+                tail = candidate[len(alias):]
+                if not tail:
+                    return canonical, ""
+                if tail[0] in " :：（(":
+                    return canonical, tail.lstrip(" :：").strip()
+    return None, ""
+
+
+def test_compiled_section_matcher_agrees_with_alias_loop():
+    lines = [
+        "### 1. 研究对象和背景",
+        "## 研究背景：二维 Euler 方程",
+        "**主要结果**",
+        "主要定理 (Theorem 1.2)",
+        "主要结果表明",
+        "- 研究方法与关键技术: 能量方法",
+        "3、方法",
+        "方法论",
+        "对比已有工作",
+        "> 背景",
+        "背景噪声",
+        "### 与相关工作比较（简述）",
+        "普通正文",
+        "",
+    ]
+    for line in lines:
+        assert analyzer._match_section_heading(line) == _reference_match_section_heading(line), line
+
+
+def test_parse_analysis_is_memoized_and_shared_by_renderers():
+    sample = "# 标题\n\n## 详细分析\n\n### 1. 研究对象和背景\n背景\n\n### 2. 主要结果\n结果\n"
+    parsed = parse_analysis(sample)
+
+    assert parse_analysis(sample) is parsed
+    assert parsed.title == "标题"
+    assert parsed.title_or("fallback") == "标题"
+    assert parsed.sections["主要定理或主要结果"] == "结果"
+    assert render_analysis_body(sample) is parsed.body
+    assert extract_analysis_title(sample, "fallback") == "标题"
+    assert parse_analysis("没有标题的正文").title_or("fallback") == "fallback"
+
+    # 返回的 sections 是副本，修改它不会影响缓存
+    analyzer.extract_analysis_sections(sample)["研究对象和背景"] = "改动"
+    assert parsed.sections["研究对象和背景"] == "背景"
+
+
 if __name__ == "__main__":
     test_extract_and_render_old_heading_style()
     test_extract_and_render_plain_title_style()
@@ -126,4 +182,6 @@ if __name__ == "__main__":
     test_render_structured_analysis_markdown()
     test_render_structured_analysis_preserves_subparagraphs()
     test_validate_analysis_markdown_flags_literal_display_math_escapes()
+    test_compiled_section_matcher_agrees_with_alias_loop()
+    test_parse_analysis_is_memoized_and_shared_by_renderers()
     print("analysis formatting tests passed")
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import analyzer
+import batch
+import config
+
+
+class DummyPaper:
+    def __init__(self, arxiv_id):
+        self.arxiv_id = arxiv_id
+        self.title = f"Paper {arxiv_id}"
+        self.summary = "abstract"
+
+    def get_short_id(self):
+        return self.arxiv_id
+
+
+def _response(content, model="qwen-plus", reasoning_content=None):
+    usage = SimpleNamespace(prompt_tokens=1, completion_tokens=2, total_tokens=3)
+    message = SimpleNamespace(content=content, reasoning_content=reasoning_content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage, model=model)
+
+
+def _async_client(provider, model, acompletion_fn):
+    client = config.AIClient.__new__(config.AIClient)
+    client.provider = provider
+    client.model = model
+    client.provider_config = config.PROVIDER_CONFIG[provider]
+    client.thinking_support = client.provider_config["thinking_support"]
+    client.completion_fn = None
+    client.acompletion_fn = acompletion_fn
+    return client
+
+
+def test_async_thinking_request_falls_back_to_plain_mode():
+    calls = []
+
+    async def fake_acompletion(**kwargs):
+        calls.append(kwargs)
+        if kwargs.get("extra_body", {}).get("enable_thinking"):
+            raise Exception("enable_thinking is not supported")
+        return _response("analysis result", model=kwargs["model"])
+
+    client = _async_client("qwen", "qwen-turbo", fake_acompletion)
+    content, usage, response_state = asyncio.run(
+        client.achat_completion_with_usage(
+            messages=[{"role": "user", "content": "hello"}],
+            thinking_mode=True,
+            return_response_state=True,
+        )
+    )
+
+    assert content == "analysis result"
+    assert usage["total_tokens"] == 3
+    assert len(calls) == 2
+    assert "extra_body" not in calls[1]
+    assert response_state["fallback_used"] is True
+    assert response_state["thinking_applied"] is False
+
+
+def test_async_structured_json_retries_and_drops_unsupported_response_format():
+    calls = []
+
+    async def fake_acompletion(**kwargs):
+        calls.append(kwargs)
+        if "response_format" in kwargs:
+            raise Exception("unsupported parameter: response_format")
+        if len(calls) == 2:
+            return _response('{"priority":2}')
+        return _response('{"priority":1,"reason":"Strichartz估计"}')
+
+    client = _async_client("qwen", "qwen-plus", fake_acompletion)
+    with patch.object(config.asyncio, "sleep", AsyncMock()) as mocked_sleep:
+        result, usage, response_state = asyncio.run(
+            client.astructured_chat_completion_with_usage(
+                messages=[{"role": "user", "content": "hello"}],
+                response_model=analyzer.StructuredTopicClassification,
+                json_schema_prompt=True,
+                return_response_state=True,
+            )
+        )
+
+    assert result.priority == 1
+    assert len(calls) == 4
+    assert mocked_sleep.await_count == 1
+    assert "schema" in calls[0]["messages"][0]["content"]
+    assert response_state["structured_output_mode"] == "json_schema_prompt"
+
+
+def test_async_structured_recovers_json_from_error_message():
+    async def fake_acompletion(**kwargs):
+        raise Exception("ValidationError: content='{\"priority\": 2, \"reason\": \"散射\"}'")
+
+    client = _async_client("qwen", "qwen-plus", fake_acompletion)
+    result, usage = asyncio.run(
+        client.astructured_chat_completion_with_usage(
+            messages=[{"role": "user", "content": "hello"}],
+            response_model=analyzer.StructuredTopicClassification,
+            json_schema_prompt=True,
+        )
+    )
+
+    assert result.priority == 2
+    assert usage == {}
+
+
+def test_async_client_without_acompletion_runs_sync_function_in_thread():
+    client = _async_client("qwen", "qwen-plus", None)
+    client.completion_fn = lambda **kwargs: _response("sync result")
+
+    content = asyncio.run(client.achat_completion(messages=[{"role": "user", "content": "hello"}]))
+
+    assert content == "sync result"
+
+
+def test_gather_bounded_limits_in_flight_requests_and_keeps_order():
+    in_flight = 0
+    peak = 0
+
+    async def worker(item):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if item == 3:
+            raise RuntimeError("boom")
+        return item * 10
+
+    results = batch.run_async_batch(range(20), worker, concurrency=4)
+
+    assert peak == 4
+    assert results[:3] == [0, 10, 20]
+    assert results[3] is None
+    assert results[19] == 190
+
+
+def test_prefetch_translates_according_to_priority():
+    priorities = {"a": (1, "重点"), "b": (2, "了解"), "c": (0, "不相关")}
+    translations = []
+
+    async def fake_classify(paper):
+        return priorities[paper.get_short_id()]
+
+    async def fake_translate(paper, translate_title_only=False):
+        translations.append((paper.get_short_id(), translate_title_only))
+        return "**中文标题**: 标题"
+
+    papers = [DummyPaper("a"), DummyPaper("b"), DummyPaper("c")]
+    with patch.object(batch, "acheck_topic_relevance", side_effect=fake_classify), patch.object(
+        batch, "atranslate_abstract", side_effect=fake_translate
+    ):
+        prefetched = batch.prefetch_paper_results(papers, concurrency=2)
+
+    assert prefetched == priorities
+    assert sorted(translations) == [("b", False), ("c", True)]
+
+
+def test_prefetch_stops_admission_and_cancels_in_flight_after_shutdown():
+    shutdown = SimpleNamespace(requested=False, aborted=False)
+    shutdown.grace_expired = lambda: shutdown.aborted
+    started = []
+
+    async def fake_classify(paper):
+        started.append(paper.get_short_id())
+        if paper.get_short_id() == "a":
+            shutdown.requested = True
+            return 0, "不相关"
+        shutdown.aborted = True
+        await asyncio.sleep(5)
+        return 1, "重点"
+
+    papers = [DummyPaper("a"), DummyPaper("b"), DummyPaper("c"), DummyPaper("d")]
+    with patch.object(batch, "acheck_topic_relevance", side_effect=fake_classify), patch.object(
+        batch, "atranslate_abstract", new=AsyncMock(return_value="**中文标题**: 标题")
+    ):
+        prefetched = batch.prefetch_paper_results(papers, concurrency=1, shutdown=shutdown)
+    assert prefetched == {"a": (0, "不相关")}
+    assert started == ["a"]
+
+    shutdown = SimpleNamespace(requested=False, aborted=False)
+    shutdown.grace_expired = lambda: shutdown.aborted
+    started.clear()
+    papers = [DummyPaper("b"), DummyPaper("c")]
+    with patch.object(batch, "acheck_topic_relevance", side_effect=fake_classify):
+        prefetched = batch.prefetch_paper_results(papers, concurrency=2, shutdown=shutdown)
+    # 宽限期结束时在途的请求被取消，不等待 5 秒
+    assert prefetched == {}
+    assert started == ["b", "c"]
+
+
+if __name__ == "__main__":
+    test_async_thinking_request_falls_back_to_plain_mode()
+    test_async_structured_json_retries_and_drops_unsupported_response_format()
+    test_async_structured_recovers_json_from_error_message()
+    test_async_client_without_acompletion_runs_sync_function_in_thread()
+    test_gather_bounded_limits_in_flight_requests_and_keeps_order()
+    test_prefetch_translates_according_to_priority()
+    test_prefetch_stops_admission_and_cancels_in_flight_after_shutdown()
+    print("async batch tests passed")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT / "src"))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+import crawler
+import run_benchmarks
+import synthetic
+from replay import ReplayedResponse
+
+
+def test_synthetic_feed_is_parsed_inside_the_submission_window():
+    feed = synthetic.build_atom_feed(40, "2026-04-01", categories=("math.AP", "math.FA"), start_index=101)
+
+    response = ReplayedResponse("synthetic", 200, feed)
+    with patch.object(crawler, "http_get", return_value=response):
+        papers = crawler.get_recent_papers(["math.AP"], max_results=40, target_date="2026-04-01")
+
+    assert len(papers) == 40
+    assert papers[0].get_short_id() == "2603.00101v1"
+    assert papers[0].categories[0] == "math.AP"
+    assert papers[0].comment.endswith("pages")
+    assert synthetic.build_atom_feed(40, "2026-04-01", start_index=101) == synthetic.build_atom_feed(
+        40, "2026-04-01", start_index=101
+    )
+
+
+def test_pdf_corpus_follows_profiles(tmp_path):
+    from analyzer import extract_pdf_text
+
+    profiles = {"sparse": {"pages": 2, "chars_per_page": 600}, "dense": {"pages": 3, "chars_per_page": 4000}}
+
+    corpus = synthetic.write_pdf_corpus(tmp_path, profiles=profiles, files_per_profile=2)
+
+    assert [name for name, _ in corpus] == ["sparse", "dense", "sparse", "dense"]
+    sparse_text = extract_pdf_text(corpus[0][1], max_pages=None)
+    dense_text = extract_pdf_text(corpus[1][1], max_pages=None)
+    assert sparse_text.count("=== 第") == 2
+    assert dense_text.count("=== 第") == 3
+    assert len(dense_text) > 5 * len(sparse_text)
+
+
+def test_compare_results_flags_regressions():
+    def result(seconds):
+        return {"runs": [{"papers": 50, "stages": {"analysis": {"wall_seconds": seconds}, "extract_pdf_text": {"wall_seconds": 1.0}}}]}
+
+    rows = run_benchmarks.compare_results(result(2.0), result(2.5), threshold=0.1)
+
+    by_stage = {row["stage"]: row for row in rows}
+    assert by_stage["analysis"]["ratio"] == 1.25
+    assert by_stage["analysis"]["regression"] is True
+    assert by_stage["extract_pdf_text"]["regression"] is False
+    assert "⚠" in run_benchmarks.format_comparison(rows)
+
+
+def test_benchmark_runs_end_to_end_against_mock_llm(tmp_path):
+    output = tmp_path / "benchmark.json"
+    env = {key: value for key, value in os.environ.items() if not key.startswith(("AI_", "CUSTOM_API"))}
+
+    completed = subprocess.run(
+        [
+            sys.executable,
+            str(REPO_ROOT / "benchmarks" / "run_benchmarks.py"),
+            "--sizes", "4",
+            "--pdf-per-profile", "1",
+            "--repeat", "1",
+            "--latency", "0",
+            "--jitter", "0",
+            "--workdir", str(tmp_path / "work"),
+            "--output", str(output),
+        ],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+
+    assert completed.returncode == 0, completed.stderr[-2000:]
+    result = json.loads(output.read_text(encoding="utf-8"))
+    (run,) = result["runs"]
+    assert run["papers"] == 4
+    assert set(run["stages"]) == {"get_recent_papers", "extract_pdf_text", "analysis", "write_to_conclusion", "format_email_content"}
+    analysis = run["stages"]["analysis"]
+    assert analysis["priority"] + analysis["secondary"] + analysis["irrelevant"] == 4
+    assert analysis["failed"] == 0
+    assert run["mock_llm"]["requests"] >= 4
+    # 报告与状态文件只写入工作目录
+    assert list((tmp_path / "work" / "results").glob("benchmark_4.md"))
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_synthetic_feed_is_parsed_inside_the_submission_window()
+    test_compare_results_flags_regressions()
+    for test in (test_pdf_corpus_follows_profiles, test_benchmark_runs_end_to_end_against_mock_llm):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("benchmark tests passed")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+import datetime
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import budget
+import config
+import emailer
+import main
+import utils
+
+
+class DummyAuthor:
+    def __init__(self, name):
+        self.name = name
+
+
+class DummyPaper:
+    def __init__(self, arxiv_id="2604.00001"):
+        self.arxiv_id = arxiv_id
+        self.title = f"Paper {arxiv_id}"
+        self.summary = "We prove global regularity."
+        self.authors = [DummyAuthor("Tester")]
+        self.categories = ["math.AP"]
+        self.entry_id = f"https://arxiv.org/abs/{arxiv_id}"
+        self.published = datetime.datetime(2026, 4, 1)
+
+    def get_short_id(self):
+        return self.arxiv_id
+
+
+def _governor(**kwargs):
+    kwargs.setdefault("thresholds", (0.5, 0.7, 0.85, 0.95))
+    kwargs.setdefault("reduced_max_pages", config.BUDGET_REDUCED_MAX_PAGES)
+    return budget.BudgetGovernor(**kwargs)
+
+
+def test_governor_is_disabled_without_budget():
+    governor = _governor()
+    governor.record({"prompt_tokens": 10**9, "completion_tokens": 10**9})
+
+    assert not governor.enabled
+    assert governor.level == 0
+    assert governor.effective_thinking_mode(True) is True
+    assert governor.effective_max_pages(10) == 10
+
+
+def test_token_budget_degrades_progressively():
+    governor = _governor(token_budget=1000)
+    governor.record({"prompt_tokens": 400, "completion_tokens": 150})
+    assert governor.effective_thinking_mode(True) is False
+    assert not governor.is_active("disable_cleanup")
+
+    governor.record({"prompt_tokens": 200, "completion_tokens": 0})
+    assert governor.is_active("disable_cleanup")
+    assert not governor.is_active("reduce_pages")
+
+    # 一次调用越过多个阈值时逐级记录
+    governor.record({"prompt_tokens": 100, "total_tokens": 300})
+    assert governor.level == 4
+    assert governor.effective_max_pages(10) == config.BUDGET_REDUCED_MAX_PAGES
+    assert governor.effective_max_pages(3) == 3
+
+    snapshot = governor.snapshot()
+    assert [event["action"] for event in snapshot["degradations"]] == [
+        "disable_thinking",
+        "disable_cleanup",
+        "reduce_pages",
+        "abstract_only",
+    ]
+    assert snapshot["degradations"][0]["tokens"] == 550
+    assert snapshot["tokens"] == 1050
+
+
+def test_cost_and_time_budgets_use_the_highest_fraction():
+    governor = _governor(token_budget=10**9, cost_budget=1.0, input_price_per_mtok=1.0, output_price_per_mtok=4.0)
+    governor.record({"prompt_tokens": 200_000, "completion_tokens": 100_000})
+    assert governor.snapshot()["cost"] == 0.6
+    assert governor.level == 1
+
+    governor = _governor(time_budget_seconds=100)
+    governor.start(now=0.0)
+    assert governor.consumed_fraction(now=72.0) == 0.72
+    assert governor._update_level(now=72.0) == 2
+
+
+def test_cleanup_is_skipped_once_budget_disables_it():
+    governor = _governor(token_budget=100)
+    governor.record({"prompt_tokens": 80})
+    with patch.object(config, "_budget_governor", governor), patch.object(
+        config, "get_analysis_cleanup_client", return_value=object()
+    ) as mocked_client:
+        cleanup_config = config.get_analysis_cleanup_request_config()
+
+    assert cleanup_config["cleanup_requested"] is False
+    mocked_client.assert_not_called()
+
+
+def test_priority_paper_uses_reduced_settings_then_abstract_only(tmp_path):
+    governor = _governor(token_budget=100)
+    governor.record({"prompt_tokens": 90})
+    paper = DummyPaper()
+
+    with patch.object(main, "get_budget_governor", return_value=governor), patch.object(main.time, "sleep"), patch.object(
+        main, "check_topic_relevance", return_value=(1, "重点")
+    ), patch.object(main, "download_paper", return_value=str(tmp_path / "a.pdf")), patch.object(
+        main, "analyze_paper", return_value=("分析", None, {})
+    ) as mocked_analyze:
+        result = main.process_single_paper_task(paper, 1, 1, thinking_mode=True)
+
+    assert result[0] == 1
+    assert mocked_analyze.call_args.kwargs["thinking_mode"] is False
+    assert mocked_analyze.call_args.kwargs["max_pages"] == config.BUDGET_REDUCED_MAX_PAGES
+
+    governor.record({"prompt_tokens": 10})
+    with patch.object(main, "get_budget_governor", return_value=governor), patch.object(main.time, "sleep"), patch.object(
+        main, "check_topic_relevance", return_value=(1, "重点")
+    ), patch.object(main, "download_paper") as mocked_download, patch.object(
+        main, "translate_abstract_with_deepseek", return_value=("**标题**: 译文", {"from_cache": True})
+    ):
+        result = main.process_single_paper_task(paper, 1, 1, thinking_mode=True)
+
+    assert result == (2, (paper, "**标题**: 译文"))
+    mocked_download.assert_not_called()
+    assert governor.snapshot()["downgraded_papers"] == 1
+
+
+def test_degradations_are_written_to_report_and_email(tmp_path):
+    governor = _governor(token_budget=100)
+    governor.record({"prompt_tokens": 75})
+    with patch.object(main, "get_budget_governor", return_value=governor):
+        run_meta = main.build_run_meta(3, 3, False)
+
+    assert [event["action"] for event in run_meta["budget"]["degradations"]] == ["disable_thinking", "disable_cleanup"]
+
+    with patch.object(utils, "RESULTS_DIR", tmp_path), patch.object(
+        utils, "translate_abstract_with_deepseek", return_value="译文"
+    ):
+        report = utils.write_to_conclusion([], [(DummyPaper(), "译文")], [], run_meta=run_meta)
+    text = open(report, encoding="utf-8").read()
+    assert "budget_degradations: disable_thinking,disable_cleanup" in text
+    assert "**预算降级**: 关闭深度思考 (75%) → 关闭 cleanup (75%)" in text
+
+    email = emailer.format_email_content([], [(DummyPaper(), "译文")], [], run_meta=run_meta)
+    assert "**预算降级**: 关闭深度思考 (75%) → 关闭 cleanup (75%)" in email
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_governor_is_disabled_without_budget()
+    test_token_budget_degrades_progressively()
+    test_cost_and_time_budgets_use_the_highest_fraction()
+    test_cleanup_is_skipped_once_budget_disables_it()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_priority_paper_uses_reduced_settings_then_abstract_only(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_degradations_are_written_to_report_and_email(Path(tmp))
+    print("budget governor tests passed")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import analyzer
+import config
+import main
+import translator
+
+
+class DummyPaper:
+    def __init__(self, arxiv_id="2605.00001v1"):
+        self.arxiv_id = arxiv_id
+        self.title = "Outage paper"
+        self.summary = "English abstract"
+
+    def get_short_id(self):
+        return self.arxiv_id
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _client(completion_fn):
+    client = config.AIClient.__new__(config.AIClient)
+    client.provider = "deepseek"
+    client.model = "deepseek-v4-flash"
+    client.provider_config = config.PROVIDER_CONFIG["deepseek"]
+    client.thinking_support = client.provider_config["thinking_support"]
+    client.completion_fn = completion_fn
+    return client
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_cooldown():
+    clock = FakeClock()
+    breaker = config.CircuitBreaker("deepseek/deepseek-v4-flash", failure_threshold=2, cooldown_seconds=30)
+
+    with patch.object(config.time, "monotonic", clock):
+        breaker.before_call()
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+        assert breaker.is_open()
+        with pytest.raises(config.CircuitOpenError):
+            breaker.before_call()
+
+        clock.now += 31
+        breaker.before_call()  # 半开探测
+        with pytest.raises(config.CircuitOpenError):
+            breaker.before_call()  # 探测进行中，其他请求快速失败
+        breaker.record_failure()
+        assert breaker.is_open()
+
+        clock.now += 31
+        breaker.before_call()
+        breaker.record_success()
+
+    assert breaker.snapshot()["state"] == config.CircuitBreaker.CLOSED
+    assert breaker.snapshot()["open_count"] == 2
+
+
+def test_open_circuit_stops_retries_and_fails_fast():
+    calls = []
+
+    def failing_completion(**kwargs):
+        calls.append(kwargs)
+        raise Exception("503 service unavailable")
+
+    client = _client(failing_completion)
+    with patch.object(config, "AI_CIRCUIT_BREAKER_ENABLED", True), patch.object(
+        config, "get_circuit_breaker", return_value=config.CircuitBreaker("deepseek", failure_threshold=2)
+    ), patch.object(config.time, "sleep"):
+        with pytest.raises(config.CircuitOpenError):
+            client.chat_completion(messages=[{"role": "user", "content": "hello"}])
+        assert len(calls) == 2
+
+        with pytest.raises(config.CircuitOpenError):
+            client.chat_completion(messages=[{"role": "user", "content": "hello"}])
+        assert len(calls) == 2
+
+
+def test_invalid_structured_output_does_not_trip_breaker():
+    def invalid_json_completion(**kwargs):
+        message = SimpleNamespace(content='{"priority": 2}', reasoning_content=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None, model=kwargs["model"])
+
+    client = _client(invalid_json_completion)
+    breaker = config.CircuitBreaker("deepseek", failure_threshold=1)
+    with patch.object(config, "AI_CIRCUIT_BREAKER_ENABLED", True), patch.object(
+        config, "get_circuit_breaker", return_value=breaker
+    ), patch.object(config.time, "sleep"):
+        with pytest.raises(Exception):
+            client.structured_chat_completion_with_usage(
+                messages=[{"role": "user", "content": "hello"}],
+                response_model=analyzer.StructuredTopicClassification,
+                json_schema_prompt=True,
+            )
+
+    assert not breaker.is_open()
+
+
+def test_translation_degrades_to_original_text_when_circuit_is_open():
+    class OpenCircuitClient:
+        def structured_chat_completion_with_usage(self, **kwargs):
+            raise config.CircuitOpenError("deepseek 已熔断")
+
+        def chat_completion_with_usage(self, **kwargs):
+            raise AssertionError("熔断时不应再走文本回退")
+
+    paper = DummyPaper()
+    with patch.object(translator, "get_ai_client", return_value=OpenCircuitClient()), patch.object(
+        translator, "get_cached_translation", return_value=None
+    ), patch.object(translator, "cache_translation") as mocked_cache:
+        translation = translator.translate_abstract_with_deepseek(paper)
+
+    assert translator.is_degraded_translation(translation)
+    assert "**摘要翻译**: English abstract" in translation
+    mocked_cache.assert_not_called()
+
+
+def test_degraded_results_are_reported_but_not_marked_processed():
+    paper = DummyPaper()
+    degraded = translator._build_degraded_translation(paper, translate_title_only=True)
+    priority_analyses, secondary_analyses, irrelevant_papers = [], [], []
+
+    completed = main.record_paper_result(
+        (0, (paper, "检查出错", degraded)), priority_analyses, secondary_analyses, irrelevant_papers
+    )
+
+    assert completed is False
+    assert irrelevant_papers == [(paper, "检查出错", degraded)]
+    assert main.collect_processed_entries(priority_analyses, secondary_analyses, irrelevant_papers) == []
+    assert main.collect_completed_paper_ids(priority_analyses, secondary_analyses, irrelevant_papers) == set()
+
+
+if __name__ == "__main__":
+    test_breaker_opens_after_threshold_and_half_opens_after_cooldown()
+    test_open_circuit_stops_retries_and_fails_fast()
+    test_invalid_structured_output_does_not_trip_breaker()
+    test_translation_degrades_to_original_text_when_circuit_is_open()
+    test_degraded_results_are_reported_but_not_marked_processed()
+    print("circuit breaker tests passed")
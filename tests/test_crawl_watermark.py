@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import datetime
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import Mock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import crawler
+import state
+
+
+UTC = datetime.timezone.utc
+
+ATOM = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">
+  <entry>
+    <id>http://arxiv.org/abs/2605.00001v1</id>
+    <updated>2026-05-20T15:00:00Z</updated>
+    <published>2026-05-20T15:00:00Z</published>
+    <title>Already seen</title>
+    <summary>Listed again because of the overlap.</summary>
+    <author><name>Alice</name></author>
+    <category term="math.AP" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>
+  <entry>
+    <id>http://arxiv.org/abs/2605.00002v1</id>
+    <updated>2026-05-21T09:00:00Z</updated>
+    <published>2026-05-21T09:00:00Z</published>
+    <title>New paper</title>
+    <summary>Submitted after the watermark.</summary>
+    <author><name>Bob</name></author>
+    <category term="math.AP" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>
+</feed>
+"""
+
+
+class DummyPaper:
+    def __init__(self, arxiv_id, published):
+        self.arxiv_id = arxiv_id
+        self.published = published
+
+    def get_short_id(self):
+        return self.arxiv_id
+
+
+def test_record_crawled_papers_advances_watermark_and_prunes_seen_ids():
+    with TemporaryDirectory() as tmpdir, patch.object(state, "STATE_DIR", Path(tmpdir)):
+        state.record_crawled_papers(
+            [DummyPaper("old.1v1", datetime.datetime(2026, 5, 1, 12, tzinfo=UTC))],
+            overlap_hours=6,
+        )
+        watermark = state.record_crawled_papers(
+            [
+                DummyPaper("new.1v1", datetime.datetime(2026, 5, 20, 15, tzinfo=UTC)),
+                DummyPaper("new.2v1", datetime.datetime(2026, 5, 20, 17, tzinfo=UTC)),
+            ],
+            completed_ids={"new.1v1"},
+            overlap_hours=6,
+        )
+
+        assert watermark == datetime.datetime(2026, 5, 20, 17, tzinfo=UTC)
+        assert state.get_crawl_watermark() == watermark
+        assert state.get_seen_paper_ids() == {"new.1v1"}
+
+
+def test_partial_run_keeps_previous_watermark():
+    with TemporaryDirectory() as tmpdir, patch.object(state, "STATE_DIR", Path(tmpdir)):
+        first = state.record_crawled_papers([DummyPaper("a.1v1", datetime.datetime(2026, 5, 20, 15))])
+        second = state.record_crawled_papers(
+            [DummyPaper("b.1v1", datetime.datetime(2026, 5, 21, 15))],
+            advance_watermark=False,
+        )
+
+        assert first == second == datetime.datetime(2026, 5, 20, 15, tzinfo=UTC)
+        assert state.get_seen_paper_ids() == {"a.1v1", "b.1v1"}
+
+
+def test_get_recent_papers_lists_only_papers_after_watermark():
+    watermark = datetime.datetime(2026, 5, 20, 18, tzinfo=UTC)
+    now = datetime.datetime(2026, 5, 21, 12, tzinfo=UTC)  # Thursday
+
+    with patch.object(crawler, "_utc_now", return_value=now), patch.object(
+        crawler, "CRAWL_WATERMARK_ENABLED", True
+    ), patch.object(crawler, "CRAWL_WATERMARK_OVERLAP_HOURS", 6), patch.object(
+        crawler, "get_crawl_watermark", return_value=watermark
+    ), patch.object(
+        crawler, "get_seen_paper_ids", return_value={"2605.00001v1"}
+    ), patch.object(
+        crawler, "_fetch_arxiv_response", return_value=Mock(content=ATOM)
+    ) as mocked_fetch:
+        papers = crawler.get_recent_papers(["math.AP"], max_results=100)
+
+    url = mocked_fetch.call_args.args[0]
+    assert "submittedDate:[202605201200 TO 202605211200]" in url
+    assert "sortOrder=ascending" in url
+    assert [paper.title for paper in papers] == ["New paper"]
+
+
+def test_get_recent_papers_without_watermark_uses_weekday_window():
+    now = datetime.datetime(2026, 5, 21, 12, tzinfo=UTC)  # Thursday
+
+    with patch.object(crawler, "_utc_now", return_value=now), patch.object(
+        crawler, "CRAWL_WATERMARK_ENABLED", True
+    ), patch.object(crawler, "SEARCH_DAYS", 1), patch.object(
+        crawler, "get_crawl_watermark", return_value=None
+    ), patch.object(
+        crawler, "_fetch_arxiv_response", return_value=Mock(content=ATOM)
+    ) as mocked_fetch:
+        papers = crawler.get_recent_papers(["math.AP"], max_results=100)
+
+    url = mocked_fetch.call_args.args[0]
+    assert "submittedDate:[202605191800 TO 202605201800]" in url
+    assert "sortOrder" not in url
+    assert [paper.title for paper in papers] == ["Already seen"]
+
+
+if __name__ == "__main__":
+    test_record_crawled_papers_advances_watermark_and_prunes_seen_ids()
+    test_partial_run_keeps_previous_watermark()
+    test_get_recent_papers_lists_only_papers_after_watermark()
+    test_get_recent_papers_without_watermark_uses_weekday_window()
+    print("crawl watermark tests passed")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+import datetime
+import itertools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import config
+import main
+import scheduler
+import state
+
+
+class DummyAuthor:
+    def __init__(self, name):
+        self.name = name
+
+
+class DummyPaper:
+    def __init__(self, title):
+        self.title = title
+        self.authors = [DummyAuthor("Tester")]
+        self.summary = "abstract"
+        self.categories = ["math.AP"]
+        self.entry_id = f"https://arxiv.org/abs/{title}"
+        self.published = datetime.datetime(2026, 5, 5)
+
+    def get_short_id(self):
+        return self.title
+
+
+STAGE_SECONDS = {
+    "analysis": 90.0,
+    "analysis_thinking": 200.0,
+    "abstract_translation": 10.0,
+    "title_translation": 5.0,
+}
+
+
+def _scheduler(papers, classifications, deadline_seconds=1000, **kwargs):
+    with patch.object(scheduler, "get_cached_classification", side_effect=lambda arxiv_id: classifications.get(arxiv_id)):
+        return scheduler.DeadlineScheduler(
+            papers,
+            deadline_seconds=deadline_seconds,
+            flush_margin_seconds=0,
+            started_at=0.0,
+            stage_seconds=STAGE_SECONDS,
+            **kwargs,
+        )
+
+
+def test_priority_papers_are_submitted_first():
+    papers = [DummyPaper(name) for name in ("irrelevant", "secondary", "unknown", "priority")]
+    classifications = {"irrelevant": (0, ""), "secondary": (2, ""), "priority": (1, "")}
+
+    plan = _scheduler(papers, classifications, thinking_mode=True)
+    order = []
+    while True:
+        task = plan.next_task(now=0.0)
+        if task is None:
+            break
+        order.append((task.paper.title, task.index))
+
+    assert order == [("priority", 4), ("unknown", 3), ("secondary", 2), ("irrelevant", 1)]
+    assert plan.expected_seconds(1) == 200.0
+    expected_unknown = sum(
+        share * STAGE_SECONDS[stage]
+        for share, stage in zip(
+            (scheduler.DEFAULT_PRIORITY_SHARES[1], scheduler.DEFAULT_PRIORITY_SHARES[2], scheduler.DEFAULT_PRIORITY_SHARES[0]),
+            ("analysis_thinking", "abstract_translation", "title_translation"),
+        )
+    )
+    assert plan.expected_seconds(None) == expected_unknown
+
+
+def test_tasks_that_cannot_finish_are_skipped_but_shorter_ones_still_run():
+    papers = [DummyPaper("p1"), DummyPaper("p2"), DummyPaper("s1")]
+    classifications = {"p1": (1, ""), "p2": (1, ""), "s1": (2, "")}
+    plan = _scheduler(papers, classifications, deadline_seconds=100, thinking_mode=False)
+
+    assert plan.next_task(now=0.0).paper.title == "p1"
+    # 50 秒后只剩 50 秒，放不下第二篇完整分析，但摘要翻译仍可提交
+    assert plan.next_task(now=50.0).paper.title == "s1"
+    assert [task.paper.title for task in plan.skipped] == ["p2"]
+    assert plan.next_task(now=50.0) is None
+    assert plan.should_flush(now=100.0)
+
+
+def test_task_durations_are_persisted_as_moving_average():
+    state.record_task_duration("qwen", "qwen-turbo", "analysis", 100.0)
+    record = state.record_task_duration("qwen", "qwen-turbo", "analysis", 200.0)
+    state.record_task_duration("qwen", "qwen-turbo", "title_translation", 4.0)
+    state.record_task_duration("deepseek", "deepseek-chat", "analysis", 30.0)
+
+    assert record["samples"] == 2
+    assert state.load_task_latencies("qwen", "qwen-turbo") == {"analysis": 130.0, "title_translation": 4.0}
+    # 运行期间只更新内存，结束时统一写入一次
+    assert not (Path(state.STATE_DIR) / state.TASK_LATENCY_FILE).exists()
+    assert state.flush_task_latencies() is True
+    assert state.flush_task_latencies() is False
+    saved = json.loads((Path(state.STATE_DIR) / state.TASK_LATENCY_FILE).read_text(encoding="utf-8"))
+    assert saved["tasks"]["qwen/qwen-turbo/analysis"]["seconds"] == 130.0
+
+    served = {"served_provider": "deepseek", "served_model": "deepseek-chat"}
+    scheduler.record_task_result("analysis", 50.0, served)
+    # 缓存命中、熔断降级、失败以及没有实际服务方的结果都不计入
+    scheduler.record_task_result("analysis", 500.0, {**served, "from_cache": True})
+    scheduler.record_task_result("analysis", 500.0, {**served, "circuit_open": True})
+    scheduler.record_task_result("analysis", 500.0, {**served, "failed": True})
+    scheduler.record_task_result("analysis", 500.0, {})
+    with patch.object(scheduler, "AI_PROVIDER", "deepseek"), patch.object(scheduler, "AI_MODEL", "deepseek-chat"):
+        plan = scheduler.DeadlineScheduler([], deadline_seconds=60)
+    assert plan.stage_seconds["analysis"] == 36.0
+    assert plan.stage_seconds["title_translation"] == scheduler.DEFAULT_STAGE_SECONDS["title_translation"]
+
+    # 提供商池按全部成员的历史记录取平均
+    with patch.object(scheduler, "AI_PROVIDER_POOL", "qwen:qwen-turbo,deepseek:deepseek-chat:2"):
+        plan = scheduler.DeadlineScheduler([], deadline_seconds=60)
+    assert plan.stage_seconds["analysis"] == 83.0
+    assert plan.stage_seconds["title_translation"] == 4.0
+
+
+def test_task_durations_use_served_provider_and_skip_cache_hits():
+    paper = DummyPaper("p1")
+    served = {"served_provider": "deepseek", "served_model": "deepseek-chat"}
+    clock = itertools.count(0.0, 12.0)
+
+    with patch.object(main.time, "monotonic", side_effect=lambda: next(clock)), patch.object(
+        main.time, "sleep"
+    ), patch.object(main, "check_topic_relevance", return_value=(2, "")), patch.object(
+        main, "translate_abstract_with_deepseek", return_value=("**中文标题**: 标题", served)
+    ):
+        main.process_single_paper_task(paper, 1, 1)
+    with patch.object(main.time, "sleep"), patch.object(main, "check_topic_relevance", return_value=(0, "")), patch.object(
+        main, "translate_abstract_with_deepseek", return_value=("**中文标题**: 标题", {"from_cache": True})
+    ):
+        main.process_single_paper_task(paper, 1, 1)
+    with patch.object(main.time, "sleep"), patch.object(main, "check_topic_relevance", return_value=(1, "")), patch.object(
+        main, "download_paper", return_value="p1.pdf"
+    ), patch.object(main, "analyze_paper", return_value=("**分析出错**: timeout", {}, served)):
+        main.process_single_paper_task(paper, 1, 1, thinking_mode=False)
+
+    assert state.load_task_latencies("deepseek", "deepseek-chat") == {"abstract_translation": 12.0}
+    assert state.load_task_latencies(config.AI_PROVIDER, config.AI_MODEL) == {}
+
+
+def test_batch_flushes_final_report_before_deadline():
+    papers = [DummyPaper("fast"), DummyPaper("slow")]
+    final_meta = []
+
+    def fake_process(paper, index, total, thinking_mode=None):
+        if paper.title == "slow":
+            time.sleep(1.5)
+        return 0, (paper, "reason", "**中文标题**: title")
+
+    def fake_write(priority, secondary, irrelevant, filename=None, run_meta=None):
+        if filename is None and run_meta:
+            final_meta.append(run_meta.copy())
+        return Path(tmpdir) / "daily.md"
+
+    fast_stages = {stage: 0.01 for stage in scheduler.DEFAULT_STAGE_SECONDS}
+    with TemporaryDirectory() as tmpdir:
+        with patch.object(sys, "argv", ["main.py"]), patch.object(main, "configure_logging"), patch.object(
+            main, "get_recent_papers", return_value=papers
+        ), patch.object(main, "process_single_paper_task", side_effect=fake_process), patch.object(
+            main, "write_to_conclusion", side_effect=fake_write
+        ), patch.object(main, "format_email_content", return_value="email"), patch.object(
+            main, "send_email", return_value=True
+        ), patch.object(main, "MAX_THREADS", 2), patch.object(main, "RUN_DEADLINE_MINUTES", 0.5 / 60), patch.object(
+            main, "DEADLINE_FLUSH_MARGIN_SECONDS", 0
+        ), patch.object(scheduler, "DEFAULT_STAGE_SECONDS", fast_stages):
+            started = time.monotonic()
+            exit_code = main.main()
+            elapsed = time.monotonic() - started
+
+    assert elapsed < 1.4
+    # 放弃的任务仍占着线程池线程，返回退出码让脚本入口直接退出而不是等待线程结束
+    assert exit_code == 0
+    assert final_meta[-1]["completed_papers"] == 1
+    assert final_meta[-1]["partial_run"] is True
+
+
+if __name__ == "__main__":
+    test_priority_papers_are_submitted_first()
+    test_tasks_that_cannot_finish_are_skipped_but_shorter_ones_still_run()
+    print("deadline scheduler tests passed")
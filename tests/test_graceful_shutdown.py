@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import datetime
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import main
+
+
+class DummyAuthor:
+    def __init__(self, name):
+        self.name = name
+
+
+class DummyPaper:
+    def __init__(self, title):
+        self.title = title
+        self.authors = [DummyAuthor("Tester")]
+        self.summary = "abstract"
+        self.categories = ["math.AP"]
+        self.entry_id = f"https://arxiv.org/abs/{title}"
+        self.published = datetime.datetime(2026, 5, 5)
+
+    def get_short_id(self):
+        return self.title
+
+
+def _run_batch(papers, fake_process, tmpdir, max_threads=1, grace_seconds=30, send_email=True):
+    final_meta = []
+
+    def fake_write(priority, secondary, irrelevant, filename=None, run_meta=None):
+        if filename is None and run_meta:
+            final_meta.append(run_meta.copy())
+        return Path(tmpdir) / "daily.md"
+
+    with patch.object(sys, "argv", ["main.py"]), patch.object(main, "configure_logging"), patch.object(
+        main, "get_recent_papers", return_value=papers
+    ), patch.object(main, "process_single_paper_task", side_effect=fake_process), patch.object(
+        main, "write_to_conclusion", side_effect=fake_write
+    ), patch.object(main, "format_email_content", return_value="email"), patch.object(
+        main, "send_email", return_value=True
+    ) as mocked_send, patch.object(main, "MAX_THREADS", max_threads), patch.object(
+        main, "SHUTDOWN_GRACE_SECONDS", grace_seconds
+    ), patch.object(main, "SHUTDOWN_SEND_EMAIL", send_email), patch.object(main, "SHUTDOWN_POLL_SECONDS", 0.05):
+        exit_code = main.main()
+    return exit_code, final_meta, mocked_send
+
+
+def test_second_signal_ends_grace_period():
+    shutdown = main.GracefulShutdown(grace_seconds=30)
+    assert shutdown.exit_code is None
+    assert not shutdown.grace_expired()
+
+    shutdown.handle(signal.SIGTERM)
+    assert shutdown.requested
+    assert shutdown.exit_code == 128 + signal.SIGTERM
+    assert not shutdown.grace_expired()
+
+    shutdown.handle(signal.SIGTERM)
+    assert shutdown.grace_expired()
+
+
+def test_signal_stops_admission_and_writes_partial_report():
+    papers = [DummyPaper("first"), DummyPaper("second"), DummyPaper("third")]
+    processed = []
+
+    def fake_process(paper, index, total, thinking_mode=None):
+        processed.append(paper.title)
+        if paper.title == "first":
+            os.kill(os.getpid(), signal.SIGINT)
+        return 0, (paper, "reason", "**中文标题**: title")
+
+    with TemporaryDirectory() as tmpdir:
+        exit_code, final_meta, mocked_send = _run_batch(papers, fake_process, tmpdir)
+
+    assert processed == ["first"]
+    assert exit_code == 128 + signal.SIGINT
+    assert final_meta[-1]["completed_papers"] == 1
+    assert final_meta[-1]["skipped_papers"] == 2
+    assert final_meta[-1]["partial_run"] is True
+    mocked_send.assert_called_once()
+    # 处理函数在运行结束后恢复
+    assert signal.getsignal(signal.SIGINT) is signal.default_int_handler
+
+
+def test_grace_period_bounds_wait_for_in_flight_work():
+    papers = [DummyPaper("fast"), DummyPaper("slow")]
+
+    def fake_process(paper, index, total, thinking_mode=None):
+        if paper.title == "slow":
+            time.sleep(2)
+        else:
+            time.sleep(0.1)
+            os.kill(os.getpid(), signal.SIGINT)
+        return 0, (paper, "reason", "**中文标题**: title")
+
+    with TemporaryDirectory() as tmpdir:
+        started = time.monotonic()
+        exit_code, final_meta, mocked_send = _run_batch(
+            papers, fake_process, tmpdir, max_threads=2, grace_seconds=0.3, send_email=False
+        )
+        elapsed = time.monotonic() - started
+
+    assert exit_code == 128 + signal.SIGINT
+    assert elapsed < 1.5
+    assert final_meta[-1]["completed_papers"] == 1
+    assert final_meta[-1]["partial_run"] is True
+    mocked_send.assert_not_called()
+
+
+def test_signal_during_async_prefetch_is_handled():
+    import batch
+
+    prefetch_calls = []
+
+    def fake_prefetch(papers, concurrency=None, shutdown=None):
+        os.kill(os.getpid(), signal.SIGTERM)
+        prefetch_calls.append(shutdown.requested)
+        return {}
+
+    def fake_process(paper, index, total, thinking_mode=None):
+        raise AssertionError("收到终止信号后不应再提交论文")
+
+    with TemporaryDirectory() as tmpdir, patch.object(main, "ASYNC_BATCH_ENABLED", True), patch.object(
+        batch, "prefetch_paper_results", side_effect=fake_prefetch
+    ):
+        exit_code, _, mocked_send = _run_batch([DummyPaper("first")], fake_process, tmpdir)
+
+    assert prefetch_calls == [True]
+    assert exit_code == 128 + signal.SIGTERM
+    mocked_send.assert_not_called()
+    assert signal.getsignal(signal.SIGTERM) is signal.SIG_DFL
+
+
+if __name__ == "__main__":
+    test_second_signal_ends_grace_period()
+    test_signal_stops_admission_and_writes_partial_report()
+    test_grace_period_bounds_wait_for_in_flight_work()
+    test_signal_during_async_prefetch_is_handled()
+    print("graceful shutdown tests passed")
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import config
+
+
+def _response(content, model):
+    usage = SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2)
+    message = SimpleNamespace(content=content, reasoning_content=None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage, model=model)
+
+
+def _client(provider, model, completion_fn):
+    client = config.AIClient.__new__(config.AIClient)
+    client.provider = provider
+    client.model = model
+    client.provider_config = config.PROVIDER_CONFIG[provider]
+    client.thinking_support = client.provider_config["thinking_support"]
+    client.completion_fn = completion_fn
+    client.acompletion_fn = None
+    return client
+
+
+def _hedge_env(tracker, stats, hedge_client=None):
+    return (
+        patch.object(config, "AI_HEDGE_ENABLED", True),
+        patch.object(config, "_latency_tracker", tracker),
+        patch.object(config, "_hedge_stats", stats),
+        patch.object(config, "get_hedge_client", return_value=hedge_client),
+    )
+
+
+def test_latency_tracker_requires_samples_and_uses_percentile():
+    tracker = config.LatencyTracker(window=10)
+    key = ("qwen", "qwen-plus", False, "chat")
+    for latency in range(1, 5):
+        tracker.record(key, float(latency))
+    assert tracker.hedge_delay(key, min_samples=5) is None
+
+    for latency in range(5, 11):
+        tracker.record(key, float(latency))
+    assert tracker.percentile(key, 90) == 9.0
+    assert tracker.hedge_delay(key, percentile=90, min_samples=5, min_delay=0) == 9.0
+    assert tracker.hedge_delay(key, percentile=50, min_samples=5, min_delay=20) == 20
+
+
+def test_slow_primary_is_hedged_to_secondary_provider():
+    release = threading.Event()
+
+    def slow_completion(**kwargs):
+        release.wait(5)
+        return _response("slow", kwargs["model"])
+
+    def fast_completion(**kwargs):
+        return _response("fast", kwargs["model"])
+
+    primary = _client("qwen", "qwen-plus", slow_completion)
+    secondary = _client("deepseek", "deepseek-v4-flash", fast_completion)
+    tracker = config.LatencyTracker()
+    stats = config.HedgeStats()
+    key = primary._latency_key(False, None, False)
+    for _ in range(3):
+        tracker.record(key, 0.05)
+
+    patches = _hedge_env(tracker, stats, hedge_client=secondary)
+    with patches[0], patches[1], patches[2], patches[3], patch.object(config, "AI_HEDGE_MIN_SAMPLES", 3), patch.object(
+        config, "AI_HEDGE_MIN_DELAY_SECONDS", 0.05
+    ):
+        started = time.monotonic()
+        content, usage, response_state = primary.chat_completion_with_usage(
+            messages=[{"role": "user", "content": "hello"}],
+            return_response_state=True,
+        )
+        elapsed = time.monotonic() - started
+    release.set()
+
+    assert content == "fast"
+    assert elapsed < 2
+    assert response_state["hedged"] is True
+    assert response_state["hedge_won"] is True
+    assert response_state["served_provider"] == "deepseek"
+    assert stats.snapshot() == {"calls": 1, "hedged": 1, "hedge_wins": 1, "hedge_rate": 1.0}
+
+
+def test_fast_primary_is_not_hedged_and_records_latency():
+    calls = []
+
+    def completion(**kwargs):
+        calls.append(kwargs["model"])
+        return _response("ok", kwargs["model"])
+
+    client = _client("qwen", "qwen-plus", completion)
+    tracker = config.LatencyTracker()
+    stats = config.HedgeStats()
+    key = client._latency_key(False, None, False)
+    for _ in range(3):
+        tracker.record(key, 1.0)
+
+    patches = _hedge_env(tracker, stats)
+    with patches[0], patches[1], patches[2], patches[3], patch.object(config, "AI_HEDGE_MIN_SAMPLES", 3):
+        assert client.chat_completion(messages=[{"role": "user", "content": "hello"}]) == "ok"
+
+    assert calls == ["qwen-plus"]
+    assert stats.snapshot()["hedged"] == 0
+    assert stats.snapshot()["calls"] == 1
+
+
+def test_async_hedge_cancels_slow_primary():
+    cancelled = []
+
+    async def acompletion(**kwargs):
+        if not cancelled and kwargs["messages"][0]["content"] == "hello" and not acompletion.started:
+            acompletion.started = True
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        return _response("hedge", kwargs["model"])
+
+    acompletion.started = False
+    client = _client("qwen", "qwen-plus", None)
+    client.acompletion_fn = acompletion
+    tracker = config.LatencyTracker()
+    stats = config.HedgeStats()
+    key = client._latency_key(False, None, False)
+    for _ in range(3):
+        tracker.record(key, 0.05)
+
+    async def run():
+        result = await client.achat_completion_with_usage(
+            messages=[{"role": "user", "content": "hello"}],
+            return_response_state=True,
+        )
+        await asyncio.sleep(0)
+        return result
+
+    patches = _hedge_env(tracker, stats)
+    with patches[0], patches[1], patches[2], patches[3], patch.object(config, "AI_HEDGE_MIN_SAMPLES", 3), patch.object(
+        config, "AI_HEDGE_MIN_DELAY_SECONDS", 0.05
+    ):
+        content, _, response_state = asyncio.run(run())
+
+    assert content == "hedge"
+    assert response_state["hedge_won"] is True
+    assert cancelled == [True]
+    assert stats.snapshot()["hedge_wins"] == 1
+    # 被取消的慢请求按已等待的时间计入
+    assert len(tracker._samples[key]) == 5
+    assert tracker.percentile(key, 100) >= 0.05
+
+
+def test_losing_copy_stops_retrying_and_its_latency_is_recorded():
+    primary_calls = []
+    finished = threading.Event()
+
+    def flaky_completion(**kwargs):
+        primary_calls.append(time.monotonic())
+        time.sleep(0.3)
+        raise Exception("503 service unavailable")
+
+    def slow_completion(**kwargs):
+        time.sleep(0.3)
+        finished.set()
+        return _response("slow", kwargs["model"])
+
+    def fast_completion(**kwargs):
+        return _response("fast", kwargs["model"])
+
+    secondary = _client("deepseek", "deepseek-v4-flash", fast_completion)
+    tracker = config.LatencyTracker()
+    stats = config.HedgeStats()
+
+    patches = _hedge_env(tracker, stats, hedge_client=secondary)
+    with patches[0], patches[1], patches[2], patches[3], patch.object(config, "AI_HEDGE_MIN_SAMPLES", 3), patch.object(
+        config, "AI_HEDGE_MIN_DELAY_SECONDS", 0.05
+    ), patch.object(config, "AI_MAX_RETRIES", 3), patch.object(config.random, "uniform", return_value=-0.9):
+        # 退避缩短到 0.1 秒：没有取消信号时，落败的一方会在 0.4 秒左右发起第二次请求
+        # 落败的一方第一次请求失败后，退避等待被取消信号打断，不再发起第二次请求
+        flaky = _client("qwen", "qwen-plus", flaky_completion)
+        key = flaky._latency_key(False, None, False)
+        for _ in range(3):
+            tracker.record(key, 0.05)
+        assert flaky.chat_completion(messages=[{"role": "user", "content": "hello"}]) == "fast"
+        time.sleep(0.6)
+        assert len(primary_calls) == 1
+
+        # 落败的一方在后台完成后，按自身耗时计入延迟
+        slow = _client("qwen", "qwen-max", slow_completion)
+        slow_key = slow._latency_key(False, None, False)
+        for _ in range(3):
+            tracker.record(slow_key, 0.05)
+        assert slow.chat_completion(messages=[{"role": "user", "content": "hello"}]) == "fast"
+        assert finished.wait(2)
+        time.sleep(0.05)
+
+    assert tracker.percentile(slow_key, 100) >= 0.3
+    assert tracker.percentile(secondary._latency_key(False, None, False), 0) < 0.3
+
+
+
+def test_hedging_can_be_disabled_per_call_and_caller_cancel_stops_retries():
+    calls = []
+
+    def slow_completion(**kwargs):
+        calls.append(kwargs["model"])
+        time.sleep(0.2)
+        return _response("slow", kwargs["model"])
+
+    primary = _client("qwen", "qwen-plus", slow_completion)
+    secondary = _client("deepseek", "deepseek-v4-flash", slow_completion)
+    tracker = config.LatencyTracker()
+    stats = config.HedgeStats()
+    for _ in range(3):
+        tracker.record(primary._latency_key(False, None, False), 0.05)
+
+    patches = _hedge_env(tracker, stats, hedge_client=secondary)
+    with patches[0], patches[1], patches[2], patches[3], patch.object(config, "AI_HEDGE_MIN_SAMPLES", 3), patch.object(
+        config, "AI_HEDGE_MIN_DELAY_SECONDS", 0.05
+    ):
+        content = primary.chat_completion(messages=[{"role": "user", "content": "hello"}], hedge=False)
+
+        cancel_token = config.CancelToken()
+        cancel_token.set()
+        try:
+            primary.chat_completion(messages=[{"role": "user", "content": "hello"}], cancel_event=cancel_token)
+        except config.RequestCancelledError:
+            pass
+        else:
+            raise AssertionError("已取消的请求不应再发起")
+
+    assert content == "slow"
+    # 第一次调用没有对冲；第二次调用的两份副本都继承调用方的取消信号，没有发出任何请求
+    assert calls == ["qwen-plus"]
+    assert stats.snapshot()["hedged"] == 0
+    assert not primary._is_provider_failure(config.RequestCancelledError("cancelled"))
+
+
+def test_child_cancel_token_follows_its_parent():
+    parent = config.CancelToken()
+    child = config.CancelToken(parent)
+    assert not child.wait(0.01)
+
+    threading.Timer(0.05, parent.set).start()
+    assert child.wait(2)
+    assert child.is_set()
+
+
+if __name__ == "__main__":
+    test_latency_tracker_requires_samples_and_uses_percentile()
+    test_slow_primary_is_hedged_to_secondary_provider()
+    test_fast_primary_is_not_hedged_and_records_latency()
+    test_async_hedge_cancels_slow_primary()
+    test_losing_copy_stops_retrying_and_its_latency_is_recorded()
+    test_hedging_can_be_disabled_per_call_and_caller_cancel_stops_retries()
+    test_child_cancel_token_follows_its_parent()
+    print("hedged request tests passed")
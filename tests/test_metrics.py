@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+import datetime
+import os
+import sys
+import urllib.request
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import cache
+import main
+import metrics
+import timeline
+
+
+class DummyAuthor:
+    def __init__(self, name):
+        self.name = name
+
+
+class DummyPaper:
+    def __init__(self, arxiv_id):
+        self.arxiv_id = arxiv_id
+        self.title = f"Paper {arxiv_id}"
+        self.summary = "abstract"
+        self.authors = [DummyAuthor("Tester")]
+        self.categories = ["math.AP"]
+        self.entry_id = f"https://arxiv.org/abs/{arxiv_id}"
+        self.published = datetime.datetime(2026, 5, 5)
+
+    def get_short_id(self):
+        return self.arxiv_id
+
+
+def _sample_lines(text, name):
+    return [line for line in text.splitlines() if line.startswith(name)]
+
+
+def test_writer_renders_openmetrics_families():
+    writer = metrics.OpenMetricsWriter(base_labels={"category_set": "math.AP"})
+    writer.counter("llm_calls", "calls", 3, provider="qwen", model='a"b')
+    writer.histogram("llm_request_duration_seconds", "latency", [0.2, 1.5, 400.0], buckets=(1.0, 10.0), provider="qwen")
+    writer.gauge("partial_run", "partial", True)
+
+    text = writer.render()
+
+    assert text.endswith("# EOF\n")
+    assert "# TYPE arxiv_tracker_llm_calls counter" in text
+    assert 'arxiv_tracker_llm_calls_total{category_set="math.AP",provider="qwen",model="a\\"b"} 3' in text
+    assert _sample_lines(text, "arxiv_tracker_llm_request_duration_seconds_bucket") == [
+        'arxiv_tracker_llm_request_duration_seconds_bucket{category_set="math.AP",provider="qwen",le="1.0"} 1',
+        'arxiv_tracker_llm_request_duration_seconds_bucket{category_set="math.AP",provider="qwen",le="10.0"} 2',
+        'arxiv_tracker_llm_request_duration_seconds_bucket{category_set="math.AP",provider="qwen",le="+Inf"} 3',
+    ]
+    assert 'arxiv_tracker_llm_request_duration_seconds_count{category_set="math.AP",provider="qwen"} 3' in text
+    assert 'arxiv_tracker_partial_run{category_set="math.AP"} 1' in text
+
+
+def test_render_metrics_combines_run_meta_spans_and_cache_stats():
+    recorder = timeline.Timeline()
+    start = recorder.started_at
+    recorder.record("ai_call", start, 3.0, provider="qwen", model="qwen-plus", ok=True, attempts=1, prompt_tokens=100, completion_tokens=20)
+    recorder.record("ai_call", start, 12.0, provider="qwen", model="qwen-plus", ok=True, attempts=3, prompt_tokens=50, cached_prompt_tokens=40)
+    recorder.record("ai_call", start, 1.0, provider="deepseek", model="deepseek-chat", ok=False, attempts=2)
+    recorder.record("pdf_extract", start, 0.3)
+
+    state = metrics.RunMetricsState()
+    state.update(
+        {"total_papers": 5, "completed_papers": 4, "partial_run": True, "already_reported_papers": 2},
+        classified={1: 2, 2: 2, 0: 1},
+        analyzed={1: 2, 2: 1, 0: 1},
+        analysis_metas=[{"fallback_used": True, "cleanup_applied": True}, {"from_cache": True}],
+    )
+    cache_stats = {"classification": {"hits": 3, "misses": 1}, "analysis": {"hits": 0, "misses": 0}}
+
+    with patch.object(metrics, "CATEGORIES", ["math.AP", "math.CA"]):
+        text = metrics.render_metrics(state=state, timeline=recorder, cache_stats=cache_stats, now=1000.0)
+
+    label = 'category_set="math.AP,math.CA"'
+    assert f"arxiv_tracker_partial_run{{{label}}} 1" in text
+    assert f"arxiv_tracker_papers_listed{{{label}}} 7" in text
+    assert f'arxiv_tracker_papers_analyzed{{{label},priority="secondary"}} 1' in text
+    assert f'arxiv_tracker_llm_calls_total{{{label},provider="qwen",model="qwen-plus",outcome="success"}} 2' in text
+    assert f'arxiv_tracker_llm_calls_total{{{label},provider="deepseek",model="deepseek-chat",outcome="failure"}} 1' in text
+    assert f'arxiv_tracker_llm_retries_total{{{label},provider="qwen",model="qwen-plus"}} 2' in text
+    assert f'arxiv_tracker_llm_tokens_total{{{label},provider="qwen",model="qwen-plus",type="prompt"}} 150' in text
+    assert f'arxiv_tracker_llm_tokens_total{{{label},provider="qwen",model="qwen-plus",type="cached_prompt"}} 40' in text
+    assert f'arxiv_tracker_llm_request_duration_seconds_bucket{{{label},provider="qwen",model="qwen-plus",le="5.0"}} 1' in text
+    assert f'arxiv_tracker_llm_request_duration_seconds_sum{{{label},provider="qwen",model="qwen-plus"}} 15.0' in text
+    assert f'arxiv_tracker_cache_hit_ratio{{{label},cache_type="classification"}} 0.75' in text
+    assert f'arxiv_tracker_cache_hit_ratio{{{label},cache_type="analysis"}} 0.0' in text
+    assert f'arxiv_tracker_analysis_fallbacks_total{{{label},kind="thinking"}} 1' in text
+    assert f'arxiv_tracker_analyses_total{{{label},source="cache"}} 1' in text
+    assert f"arxiv_tracker_analysis_cleanups_total{{{label}}} 1" in text
+    assert f"arxiv_tracker_run_timestamp_seconds{{{label}}} 1000.0" in text
+
+
+def test_cache_lookups_are_counted_per_type(tmp_path):
+    cache.reset_cache_lookup_stats()
+    with patch.object(cache, "CACHE_DIR", tmp_path):
+        assert cache.get_cached_classification("2605.00001") is None
+        cache.cache_classification("2605.00001", 1, "重点")
+        assert cache.get_cached_classification("2605.00001") == (1, "重点")
+        assert cache.get_cached_translation("2605.00001") is None
+
+    assert cache.get_cache_lookup_stats() == {
+        "classification": {"hits": 1, "misses": 1},
+        "translation": {"hits": 0, "misses": 1},
+    }
+    cache.reset_cache_lookup_stats()
+
+
+def test_checkpoint_updates_metrics_and_textfile_is_written(tmp_path):
+    papers = [DummyPaper("a"), DummyPaper("b"), DummyPaper("c")]
+    priority = [(papers[0], "分析", None, {"structured_output_fallback": True})]
+    secondary = [(papers[1], "译文")]
+    irrelevant = [(papers[2], "原因", "**中文标题**: 标题")]
+
+    with patch.object(main, "write_to_conclusion", return_value=tmp_path / "checkpoint.md") as mocked_write:
+        main.write_batch_checkpoint(priority, secondary, irrelevant, total_papers=4, completed_papers=2)
+
+    # 完成数由主循环传入（降级结果不计入），不按报告条目数重新计算
+    assert mocked_write.call_args.kwargs["run_meta"]["completed_papers"] == 2
+
+    path = metrics.write_metrics_textfile(tmp_path / "textfile" / "arxiv_tracker.prom")
+    text = path.read_text(encoding="utf-8")
+    assert 'arxiv_tracker_papers_classified{category_set="' in text
+    assert 'priority="priority"} 1' in text
+    assert 'arxiv_tracker_papers_completed{category_set="' in text
+    assert 'kind="structured_output"} 1' in text
+    assert 'arxiv_tracker_partial_run{category_set="' in text
+    assert not list((tmp_path / "textfile").glob(".*.tmp"))
+    metrics.get_run_metrics_state().reset()
+
+
+def test_metrics_endpoint_serves_current_state():
+    port = metrics.start_metrics_server(0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+            content_type = response.headers["Content-Type"]
+    finally:
+        metrics.stop_metrics_server()
+
+    assert content_type.startswith("application/openmetrics-text")
+    assert "arxiv_tracker_partial_run" in body
+    assert body.endswith("# EOF\n")
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_writer_renders_openmetrics_families()
+    test_render_metrics_combines_run_meta_spans_and_cache_stats()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_cache_lookups_are_counted_per_type(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        test_checkpoint_updates_metrics_and_textfile_is_written(Path(tmp))
+    test_metrics_endpoint_serves_current_state()
+    print("metrics tests passed")
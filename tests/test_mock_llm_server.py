@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import config
+import mock_llm_server
+from analyzer import CLASSIFICATION_FALLBACK_PROMPT_PREFIX, StructuredPaperAnalysis, StructuredTopicClassification, parse_analysis
+from translator import StructuredAbstractTranslation, StructuredTitleTranslation
+
+
+def _schema_messages(response_model, paper_text="论文标题: Heat flow on manifolds\n摘要: We study the heat flow.\n"):
+    return [
+        {"role": "system", "content": config._structured_json_instruction(response_model)},
+        {"role": "user", "content": paper_text},
+    ]
+
+
+def _post(base_url, body, timeout=5):
+    request = urllib.request.Request(
+        f"{base_url}/chat/completions",
+        data=json.dumps(body).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    return urllib.request.urlopen(request, timeout=timeout)
+
+
+def _client(base_url):
+    litellm = pytest.importorskip("litellm")
+    client = config.AIClient.__new__(config.AIClient)
+    client.provider = "custom"
+    client.model = mock_llm_server.MOCK_MODEL
+    client.provider_config = {**config.PROVIDER_CONFIG["custom"], "base_url": base_url, "api_key": "mock"}
+    client.thinking_support = client.provider_config["thinking_support"]
+    client.completion_fn = litellm.completion
+    client.acompletion_fn = litellm.acompletion
+    return client
+
+
+@pytest.mark.parametrize(
+    "response_model",
+    [StructuredPaperAnalysis, StructuredTopicClassification, StructuredTitleTranslation, StructuredAbstractTranslation],
+)
+def test_structured_responses_validate_against_schema(response_model):
+    responder = mock_llm_server.MockResponder(section_chars=120)
+
+    content, is_json = responder.content_for({"messages": _schema_messages(response_model)})
+
+    assert is_json
+    result = response_model.model_validate_json(content)
+    if hasattr(result, "chinese_title"):
+        assert "Heat flow on manifolds" in result.chinese_title
+
+
+def test_priority_is_deterministic_and_follows_weights():
+    responder = mock_llm_server.MockResponder(priority_weights=(0, 1, 0), seed=3)
+    messages = _schema_messages(StructuredTopicClassification)
+
+    first, _ = responder.content_for({"messages": messages})
+    second, _ = responder.content_for({"messages": messages})
+
+    assert first == second
+    assert json.loads(first)["priority"] == 1
+
+
+def test_text_fallbacks_match_parsers():
+    responder = mock_llm_server.MockResponder(priority_weights=(0, 0, 1))
+
+    classification, is_json = responder.content_for(
+        {"messages": [{"role": "user", "content": CLASSIFICATION_FALLBACK_PROMPT_PREFIX + "论文标题: X\n"}]}
+    )
+    analysis, _ = responder.content_for({"messages": [{"role": "user", "content": "请分析论文标题: X"}]})
+
+    assert not is_json
+    assert classification.startswith("优先级2")
+    parsed = parse_analysis(analysis)
+    assert parsed.title == "关于X的研究（模拟）"
+    assert all(parsed.sections.values())
+
+
+def test_fault_injection_over_http():
+    body = {"model": "mock", "messages": _schema_messages(StructuredTopicClassification)}
+
+    with mock_llm_server.MockLLMServer(port=0, latency=0, jitter=0, rate_limit=1.0, retry_after=3) as server:
+        with pytest.raises(urllib.error.HTTPError) as excinfo:
+            _post(server.base_url, body)
+        assert excinfo.value.code == 429
+        assert excinfo.value.headers["Retry-After"] == "3"
+
+    with mock_llm_server.MockLLMServer(port=0, latency=0, jitter=0, malformed=1.0) as server:
+        payload = json.loads(_post(server.base_url, body).read())
+        content = payload["choices"][0]["message"]["content"]
+        with pytest.raises(ValueError):
+            json.loads(content)
+        assert server.stats()["malformed"] == 1
+
+    with mock_llm_server.MockLLMServer(port=0, latency=0, jitter=0, timeout=1.0, timeout_seconds=2) as server:
+        started = time.monotonic()
+        with pytest.raises(OSError):
+            _post(server.base_url, body, timeout=0.3)
+        assert time.monotonic() - started < 1.5
+        assert server.stats()["timeouts"] == 1
+
+
+def test_rps_limit_rejects_burst():
+    body = {"model": "mock", "messages": [{"role": "user", "content": "hi"}]}
+    statuses = []
+    with mock_llm_server.MockLLMServer(port=0, latency=0, jitter=0, rps_limit=2) as server:
+        for _ in range(4):
+            try:
+                statuses.append(_post(server.base_url, body).status)
+            except urllib.error.HTTPError as e:
+                statuses.append(e.code)
+    assert statuses.count(200) == 2
+    assert statuses.count(429) == 2
+
+
+def test_ai_client_structured_and_streaming_calls_through_custom_provider():
+    with mock_llm_server.MockLLMServer(port=0, latency=0.01, jitter=0, stream_chunk_chars=7) as server:
+        client = _client(server.base_url)
+        result, usage = client.structured_chat_completion_with_usage(
+            messages=_schema_messages(StructuredPaperAnalysis), response_model=StructuredPaperAnalysis
+        )
+        assert result.chinese_title == "关于Heat flow on manifolds的研究（模拟）"
+        assert usage["completion_tokens"] > 0
+
+        with patch.object(config, "AI_STREAMING_ENABLED", True):
+            content = client.chat_completion(messages=[{"role": "user", "content": "请分析论文标题: Y"}])
+        assert content.startswith("# 关于Y的研究（模拟）")
+        assert server.stats()["streamed"] == 1
+
+
+if __name__ == "__main__":
+    for model in (StructuredPaperAnalysis, StructuredTopicClassification, StructuredTitleTranslation, StructuredAbstractTranslation):
+        test_structured_responses_validate_against_schema(model)
+    test_priority_is_deterministic_and_follows_weights()
+    test_text_fallbacks_match_parsers()
+    test_fault_injection_over_http()
+    test_rps_limit_rejects_burst()
+    test_ai_client_structured_and_streaming_calls_through_custom_provider()
+    print("mock llm server tests passed")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import datetime
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import main
+import planner
+import tokens
+
+
+class DummyAuthor:
+    def __init__(self, name):
+        self.name = name
+
+
+class DummyPaper:
+    def __init__(self, arxiv_id, summary="We prove global well-posedness for the Navier-Stokes equations."):
+        self.arxiv_id = arxiv_id
+        self.title = f"Paper {arxiv_id}"
+        self.summary = summary
+        self.authors = [DummyAuthor("Tester")]
+        self.categories = ["math.AP"]
+        self.entry_id = f"https://arxiv.org/abs/{arxiv_id}"
+        self.published = datetime.datetime(2026, 4, 1)
+
+    def get_short_id(self):
+        return self.arxiv_id
+
+
+def _approximate(messages, model_name=None):
+    return tokens.estimate_message_tokens(messages, approximate=True)
+
+
+def _build(papers, classifications, tmp_path, cached_analyses=(), cached_translations=(), **kwargs):
+    with patch.object(planner, "get_cached_classification", side_effect=lambda arxiv_id: classifications.get(arxiv_id)), patch.object(
+        planner, "get_cached_translation", side_effect=lambda arxiv_id, title_only=False: "译文" if arxiv_id in cached_translations else None
+    ), patch.object(
+        planner, "has_cached_analysis", side_effect=lambda arxiv_id, thinking_mode=None: arxiv_id in cached_analyses
+    ), patch.object(planner, "estimate_message_tokens", side_effect=_approximate):
+        return planner.build_run_plan(papers, papers_dir=tmp_path, **kwargs)
+
+
+def test_plan_uses_cached_classifications_and_skips_cached_work(tmp_path):
+    papers = [DummyPaper("a"), DummyPaper("b"), DummyPaper("c"), DummyPaper("d")]
+    classifications = {"a": (1, "重点"), "b": (1, "重点"), "c": (2, "了解"), "d": (0, "不相关")}
+
+    plan = _build(papers, classifications, tmp_path, cached_analyses={"b"}, cached_translations={"d"}, thinking_mode=False)
+
+    assert plan.classified == 4
+    assert plan.stages["classification"].calls == 0
+    assert plan.stages["classification"].cached_calls == 4
+    assert plan.stages["analysis"].calls == 1
+    assert plan.stages["analysis"].cached_calls == 1
+    assert plan.stages["analysis"].completion_tokens == planner.ANALYSIS_COMPLETION_TOKENS
+    assert plan.stages["abstract_translation"].calls == 1
+    assert plan.stages["title_translation"].cached_calls == 1
+    assert plan.expected_priorities == {1: 2.0, 2: 1.0, 0: 1.0}
+    # 全部论文都已分类时，最坏情况与预计一致
+    assert plan.worst_prompt_tokens == plan.prompt_tokens
+    assert [row["analysis_source"] for row in plan.papers[:2]] == ["estimate", "cache"]
+
+
+def test_plan_weights_unclassified_papers_and_reports_worst_case(tmp_path):
+    papers = [DummyPaper("x"), DummyPaper("y")]
+
+    plan = _build(papers, {}, tmp_path, thinking_mode=True, max_pages=5)
+
+    assert plan.stages["classification"].calls == 2
+    assert plan.expected_priorities[1] == 2 * planner.DEFAULT_PRIORITY_SHARES[1]
+    assert plan.stages["analysis"].calls == 2 * planner.DEFAULT_PRIORITY_SHARES[1]
+    assert plan.worst_case["analysis"].calls == 2
+    assert plan.worst_completion_tokens > plan.completion_tokens
+    assert plan.worst_wall_seconds >= plan.wall_seconds > 0
+    # 深度思考模式下输出 token 包含思考预算
+    per_analysis = plan.worst_case["analysis"].completion_tokens / 2
+    assert per_analysis > planner.ANALYSIS_COMPLETION_TOKENS
+
+
+def test_plan_reads_downloaded_pdf_for_analysis_prompt(tmp_path):
+    (tmp_path / "a.pdf").write_bytes(b"%PDF")
+    papers = [DummyPaper("a")]
+
+    with patch.object(planner, "extract_pdf_text", return_value="=== 第1页 ===\n" + "estimate " * 100) as mocked_extract:
+        plan = _build(papers, {"a": (1, "重点")}, tmp_path, thinking_mode=False, max_pages=3)
+
+    mocked_extract.assert_called_once_with(str(tmp_path / "a.pdf"), max_pages=3)
+    assert plan.papers[0]["analysis_source"] == "pdf"
+    assert plan.stages["analysis"].prompt_tokens < 3 * planner.PDF_PAGE_TOKENS
+
+
+def test_plan_cost_uses_configured_prices():
+    with patch.object(planner, "AI_INPUT_PRICE_PER_MTOK", 0.0), patch.object(planner, "AI_OUTPUT_PRICE_PER_MTOK", 0.0):
+        assert planner.RunPlan.estimate_cost(1000, 1000) is None
+    with patch.object(planner, "AI_INPUT_PRICE_PER_MTOK", 1.0), patch.object(planner, "AI_OUTPUT_PRICE_PER_MTOK", 2.0):
+        assert planner.RunPlan.estimate_cost(1_000_000, 500_000) == 2.0
+
+
+def test_main_plan_mode_prints_plan_without_processing(tmp_path, capsys):
+    papers = [DummyPaper("a")]
+    with patch.object(sys, "argv", ["main.py", "--plan"]), patch.object(main, "configure_logging"), patch.object(
+        main, "get_recent_papers", return_value=papers
+    ), patch.object(main, "PROCESSED_INDEX_ENABLED", False), patch.object(
+        main, "process_single_paper_task"
+    ) as mocked_task, patch.object(planner, "PAPERS_DIR", tmp_path), patch.object(
+        planner, "get_cached_classification", return_value=(2, "了解")
+    ), patch.object(planner, "get_cached_translation", return_value=None), patch.object(
+        planner, "estimate_message_tokens", side_effect=_approximate
+    ):
+        main.main()
+
+    assert mocked_task.call_count == 0
+    output = capsys.readouterr().out
+    assert "运行计划" in output
+    assert "摘要翻译" in output
+    assert "预计耗时" in output
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import datetime
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import main
+import state
+
+
+class DummyAuthor:
+    def __init__(self, name):
+        self.name = name
+
+
+class DummyPaper:
+    def __init__(self, arxiv_id, title=None):
+        self.arxiv_id = arxiv_id
+        self.title = title or arxiv_id
+        self.authors = [DummyAuthor("Tester")]
+        self.summary = "abstract"
+        self.categories = ["math.AP"]
+        self.entry_id = f"https://arxiv.org/abs/{arxiv_id}"
+        self.published = datetime.datetime(2026, 5, 5, tzinfo=datetime.timezone.utc)
+
+    def get_short_id(self):
+        return self.arxiv_id
+
+
+def test_split_arxiv_version():
+    assert state.split_arxiv_version("2401.12345v3") == ("2401.12345", 3)
+    assert state.split_arxiv_version("2401.12345") == ("2401.12345", None)
+
+
+def test_partition_skips_same_version_and_reprocesses_new_version():
+    state.record_processed_papers(
+        [(DummyPaper("2605.00001v1"), 1, ""), (DummyPaper("2605.00002v1"), 0, "不相关")],
+        report_file=Path("results/arxiv_analysis_2026-05-05.md"),
+    )
+
+    papers = [DummyPaper("2605.00001v1"), DummyPaper("2605.00002v2"), DummyPaper("2605.00003v1")]
+    pending, reported = state.partition_processed_papers(papers, reprocess_new_versions=True)
+    assert [p.get_short_id() for p in pending] == ["2605.00002v2", "2605.00003v1"]
+    assert [p.get_short_id() for p in reported] == ["2605.00001v1"]
+
+    pending, reported = state.partition_processed_papers(papers, reprocess_new_versions=False)
+    assert [p.get_short_id() for p in pending] == ["2605.00003v1"]
+
+    record = state.get_processed_paper("2605.00002v9")
+    assert record["priority"] == 0
+    assert record["report_file"] == "arxiv_analysis_2026-05-05.md"
+
+
+def _run_batch(papers, argv):
+    processed = []
+    final_meta = []
+
+    def fake_process(paper, index, total, thinking_mode=None):
+        processed.append(paper.get_short_id())
+        return 0, (paper, "reason", "**中文标题**: title")
+
+    def fake_write(priority, secondary, irrelevant, filename=None, run_meta=None):
+        if filename is None:
+            final_meta.append(run_meta)
+        return Path(tmpdir) / "daily.md"
+
+    with TemporaryDirectory() as tmpdir:
+        with patch.object(sys, "argv", argv), patch.object(main, "configure_logging"), patch.object(
+            main, "get_recent_papers", return_value=papers
+        ), patch.object(main, "process_single_paper_task", side_effect=fake_process), patch.object(
+            main, "write_to_conclusion", side_effect=fake_write
+        ), patch.object(
+            main, "format_email_content", return_value="email"
+        ), patch.object(
+            main, "send_email", return_value=True
+        ), patch.object(
+            main, "PROCESSED_INDEX_ENABLED", True
+        ):
+            main.main()
+    return processed, final_meta
+
+
+def test_batch_mode_skips_papers_from_previous_reports():
+    first, _ = _run_batch([DummyPaper("2605.00001v1")], ["main.py"])
+    second, final_meta = _run_batch([DummyPaper("2605.00001v1"), DummyPaper("2605.00002v1")], ["main.py"])
+
+    assert first == ["2605.00001v1"]
+    assert second == ["2605.00002v1"]
+    assert final_meta[-1]["total_papers"] == 1
+    assert final_meta[-1]["already_reported_papers"] == 1
+
+
+def test_force_reprocess_ignores_index():
+    _run_batch([DummyPaper("2605.00001v1")], ["main.py"])
+    processed, _ = _run_batch([DummyPaper("2605.00001v1")], ["main.py", "--force-reprocess"])
+
+    assert processed == ["2605.00001v1"]
+
+
+def test_all_reported_run_still_advances_watermark():
+    paper = DummyPaper("2605.00001v1")
+    state.record_processed_papers([(paper, 0, "不相关")], report_file=Path("results/arxiv_analysis_2026-05-05.md"))
+
+    processed, final_meta = _run_batch([paper], ["main.py"])
+
+    assert processed == []
+    assert final_meta == []
+    assert state.get_crawl_watermark() == paper.published
+    assert "2605.00001v1" in state.get_seen_paper_ids()
+
+
+def test_replay_run_leaves_processed_index_and_watermark_untouched():
+    with patch.object(main, "REPLAY_MODE", "replay"):
+        processed, _ = _run_batch([DummyPaper("2605.00001v1")], ["main.py"])
+
+    assert processed == ["2605.00001v1"]
+    assert state.load_processed_index() == {}
+    assert state.get_crawl_watermark() is None
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import pstats
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import main
+import profiling
+import timeline
+
+
+def _busy_inside_stage(seconds=0.15):
+    deadline = time.monotonic() + seconds
+    total = 0
+    while time.monotonic() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def _busy_outside_stage(seconds=0.15):
+    deadline = time.monotonic() + seconds
+    total = 0
+    while time.monotonic() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def _slow_network_call():
+    time.sleep(0.1)
+
+
+def _profiled_functions(stats_path):
+    return {func_name for (_, _, func_name) in pstats.Stats(str(stats_path)).stats}
+
+
+def _speedscope_functions(path):
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    frames = data["shared"]["frames"]
+    names = set()
+    for profile in data["profiles"]:
+        assert profile["type"] == "sampled"
+        assert len(profile["samples"]) == len(profile["weights"])
+        for stack in profile["samples"]:
+            names.update(frames[index]["name"] for index in stack)
+    return names
+
+
+def test_parse_profile_stages():
+    assert profiling.parse_profile_stages("all") is None
+    assert profiling.parse_profile_stages(None) is None
+    assert profiling.parse_profile_stages("pdf_extract, report_write,pdf_extract") == ("pdf_extract", "report_write")
+    with pytest.raises(ValueError, match="未知的剖析阶段"):
+        profiling.parse_profile_stages("pdf_extract,rendering")
+
+
+def test_stage_mode_only_profiles_selected_spans(tmp_path):
+    profiler = profiling.start_profiler(stages=("pdf_extract",))
+    try:
+        _busy_outside_stage()
+        with timeline.span("pdf_extract"):
+            _busy_inside_stage()
+        with timeline.span("report_write"):
+            _busy_outside_stage(0.05)
+    finally:
+        assert profiling.stop_profiler() is profiler
+
+    outputs = profiler.write(tmp_path / "profile_test")
+
+    functions = _profiled_functions(outputs["merged"])
+    assert "_busy_inside_stage" in functions
+    assert "_busy_outside_stage" not in functions
+    sampled = _speedscope_functions(outputs["speedscope"])
+    assert "_busy_inside_stage" in sampled
+    assert "_busy_outside_stage" not in sampled
+    assert profiling.get_active_profiler() is None
+
+
+def test_whole_run_writes_one_profile_per_worker_thread(tmp_path):
+    profiler = profiling.start_profiler()
+    try:
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="paper-worker") as executor:
+            futures = [executor.submit(profiling.profile_task(_busy_inside_stage), 0.05) for _ in range(4)]
+            for future in futures:
+                future.result()
+    finally:
+        profiling.stop_profiler()
+
+    outputs = profiler.write(tmp_path / "profile_run")
+
+    names = sorted(path.name for path in outputs["threads"])
+    assert "profile_run_MainThread.prof" in names
+    assert sum(1 for name in names if name.startswith("profile_run_paper-worker")) == 2
+    for path in outputs["threads"]:
+        if "paper-worker" in path.name:
+            assert "_busy_inside_stage" in _profiled_functions(path)
+    assert "_busy_inside_stage" in _profiled_functions(outputs["merged"])
+
+
+def test_cpu_only_pauses_during_network_waits(tmp_path):
+    def fetch_and_parse():
+        with timeline.network_wait():
+            _slow_network_call()
+        return _busy_inside_stage(0.05)
+
+    profiler = profiling.start_profiler(cpu_only=True)
+    try:
+        fetch_and_parse()
+    finally:
+        profiling.stop_profiler()
+
+    outputs = profiler.write(tmp_path / "profile_cpu")
+
+    functions = _profiled_functions(outputs["merged"])
+    assert "_busy_inside_stage" in functions
+    assert "_slow_network_call" not in functions
+    assert "_slow_network_call" not in _speedscope_functions(outputs["speedscope"])
+
+
+def test_profile_flag_writes_results_for_single_pdf(tmp_path):
+    def fake_analyze_local_pdf(pdf_path, max_pages=10, thinking_mode=None):
+        with timeline.span("pdf_extract"):
+            _busy_inside_stage(0.05)
+
+    with patch.object(sys, "argv", ["main.py", "--pdf", "paper.pdf", "--profile", "pdf_extract"]), patch.object(
+        main, "configure_logging"
+    ), patch.object(main, "analyze_local_pdf", side_effect=fake_analyze_local_pdf), patch.object(
+        main, "RESULTS_DIR", tmp_path
+    ):
+        main.main()
+
+    assert len(list(tmp_path.glob("profile_*_MainThread.prof"))) == 1
+    (merged,) = [path for path in tmp_path.glob("profile_*.prof") if "MainThread" not in path.name]
+    assert "_busy_inside_stage" in _profiled_functions(merged)
+    assert len(list(tmp_path.glob("profile_*.speedscope.json"))) == 1
+    assert profiling.get_active_profiler() is None
+
+
+def test_unknown_profile_stage_is_rejected():
+    with patch.object(sys, "argv", ["main.py", "--profile", "nonsense"]), patch.object(main, "configure_logging"):
+        with pytest.raises(SystemExit):
+            main.main()
+    assert profiling.get_active_profiler() is None
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    test_parse_profile_stages()
+    for test in (
+        test_stage_mode_only_profiles_selected_spans,
+        test_whole_run_writes_one_profile_per_worker_thread,
+        test_cpu_only_pauses_during_network_waits,
+        test_profile_flag_writes_results_for_single_pdf,
+    ):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    test_unknown_profile_stage_is_rejected()
+    print("profiling tests passed")
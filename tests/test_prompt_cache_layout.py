@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import analyzer
+import config
+import translator
+
+
+class DummyAuthor:
+    def __init__(self, name):
+        self.name = name
+
+
+class DummyPaper:
+    def __init__(self, arxiv_id, title, summary):
+        self.arxiv_id = arxiv_id
+        self.title = title
+        self.summary = summary
+        self.authors = [DummyAuthor(f"Author {arxiv_id}")]
+        self.categories = ["math.AP"]
+
+    def get_short_id(self):
+        return self.arxiv_id
+
+
+def _common_prefix_length(first, second):
+    length = 0
+    for left, right in zip(first, second):
+        if left != right:
+            break
+        length += 1
+    return length
+
+
+def _serialize(messages):
+    return "".join(f"{message['role']}:{message['content']}" for message in messages)
+
+
+PAPERS = [
+    DummyPaper("2605.00001", "Global regularity for Navier-Stokes", "We prove regularity."),
+    DummyPaper("2605.00002", "Scattering for NLS", "We prove scattering for $iu_t + \\Delta u = |u|^2u$."),
+]
+
+
+def test_classification_prompts_share_static_prefix_and_end_with_paper():
+    builders = [
+        lambda paper: analyzer.build_classification_messages(paper, paper.summary),
+        lambda paper: analyzer._build_classification_fallback_messages(paper, paper.summary),
+    ]
+    for build in builders:
+        first, second = (_serialize(build(paper)) for paper in PAPERS)
+        shared = _common_prefix_length(first, second)
+
+        # 主题列表等固定内容全部位于共享前缀中，论文内容只出现在前缀之后
+        assert "重点关注领域（优先级1）" in first[:shared]
+        assert config.PRIORITY_TOPICS[0] in first[:shared]
+        assert PAPERS[0].title not in first[:shared]
+        assert first[:shared].rstrip().endswith("论文标题:")
+        assert first.rstrip().endswith("类别: math.AP")
+
+
+def test_translation_prompts_share_static_prefix_and_end_with_paper():
+    for translate_title_only in (True, False):
+        for build in (translator.build_translation_messages, translator._build_translation_fallback_messages):
+            first, second = (
+                _serialize(build(paper, translate_title_only=translate_title_only)) for paper in PAPERS
+            )
+            shared = _common_prefix_length(first, second)
+
+            assert "翻译要求" in first[:shared]
+            assert "格式" in first[:shared] or "schema" in first[:shared]
+            assert PAPERS[0].title not in first[:shared]
+            expected_tail = PAPERS[0].title if translate_title_only else PAPERS[0].summary
+            assert first.rstrip().endswith(expected_tail)
+
+
+def test_usage_reports_cached_prompt_tokens_from_provider_formats():
+    client = config.AIClient.__new__(config.AIClient)
+
+    openai_usage = SimpleNamespace(
+        prompt_tokens=1200,
+        completion_tokens=50,
+        total_tokens=1250,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=1024),
+    )
+    deepseek_usage = {"prompt_tokens": 900, "completion_tokens": 10, "total_tokens": 910, "prompt_cache_hit_tokens": 768}
+    plain_usage = SimpleNamespace(prompt_tokens=10, completion_tokens=1, total_tokens=11)
+
+    assert client._usage_to_dict(openai_usage)["cached_prompt_tokens"] == 1024
+    assert client._usage_to_dict(deepseek_usage)["cached_prompt_tokens"] == 768
+    assert "cached_prompt_tokens" not in client._usage_to_dict(plain_usage)
+
+
+def test_prompt_cache_stats_accumulate_hit_rate():
+    stats = config.PromptCacheStats()
+    stats.record({"prompt_tokens": 1000, "cached_prompt_tokens": 800})
+    stats.record({"prompt_tokens": 1000})
+    stats.record({})
+
+    assert stats.snapshot() == {
+        "requests": 2,
+        "prompt_tokens": 2000,
+        "cached_prompt_tokens": 800,
+        "hit_rate": 0.4,
+    }
+
+
+if __name__ == "__main__":
+    test_classification_prompts_share_static_prefix_and_end_with_paper()
+    test_translation_prompts_share_static_prefix_and_end_with_paper()
+    test_usage_reports_cached_prompt_tokens_from_provider_formats()
+    test_prompt_cache_stats_accumulate_hit_rate()
+    print("prompt cache layout tests passed")
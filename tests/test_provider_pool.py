@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import analyzer
+import cache
+import config
+import provider_pool
+import utils
+
+
+def _response(content, model):
+    usage = SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2)
+    message = SimpleNamespace(content=content, reasoning_content=None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage, model=model)
+
+
+def _member(provider, model, completion_fn):
+    client = config.AIClient.__new__(config.AIClient)
+    client.provider = provider
+    client.model = model
+    client.provider_config = config.PROVIDER_CONFIG[provider]
+    client.thinking_support = client.provider_config["thinking_support"]
+    client.completion_fn = completion_fn
+    client.acompletion_fn = None
+    return client
+
+
+def _failing(**kwargs):
+    raise Exception("quota exhausted")
+
+
+def test_parse_provider_pool_spec_supports_weights_and_colons_in_model():
+    entries = provider_pool.parse_provider_pool_spec("deepseek:deepseek-v4-flash:2, openrouter:qwen/qwen3:free ,glm:")
+    assert entries == [
+        ("deepseek", "deepseek-v4-flash", 2.0),
+        ("openrouter", "qwen/qwen3:free", 1.0),
+    ]
+
+
+def test_pool_fails_over_and_records_served_provider():
+    calls = []
+
+    def glm_completion(**kwargs):
+        calls.append(kwargs["model"])
+        return _response("ok", kwargs["model"])
+
+    pool = provider_pool.ProviderPool(
+        [(_member("deepseek", "deepseek-v4-flash", _failing), 10.0), (_member("glm", "glm-4-flash", glm_completion), 1.0)],
+        failover_threshold=1,
+        cooldown_seconds=60,
+    )
+
+    with patch.object(provider_pool.random, "uniform", return_value=0.0), patch.object(config.time, "sleep"):
+        content, usage, response_state = pool.chat_completion_with_usage(
+            messages=[{"role": "user", "content": "hello"}],
+            return_response_state=True,
+        )
+
+    assert content == "ok"
+    assert calls == ["glm-4-flash"]
+    assert response_state["served_provider"] == "glm"
+    assert response_state["served_model"] == "glm-4-flash"
+    assert response_state["pool_failovers"] == 1
+    assert not pool.stats[0].is_available()
+
+    # 第一个成员冷却期间直接使用其他成员
+    with patch.object(provider_pool.random, "uniform", return_value=0.0):
+        content = asyncio.run(pool.achat_completion(messages=[{"role": "user", "content": "again"}]))
+    assert content == "ok"
+    assert calls == ["glm-4-flash", "glm-4-flash"]
+
+
+def test_pool_prefers_faster_members():
+    pool = provider_pool.ProviderPool(
+        [(_member("deepseek", "deepseek-v4-flash", None), 1.0), (_member("glm", "glm-4-flash", None), 1.0)]
+    )
+    pool.stats[0].record_success(8.0)
+    pool.stats[1].record_success(1.0)
+
+    assert pool._member_score(1) > pool._member_score(0)
+    with patch.object(provider_pool.random, "uniform", side_effect=lambda a, b: b * 0.5):
+        assert pool._member_order() == [1, 0]
+
+
+def test_provider_pool_is_still_importable_from_config():
+    assert config.ProviderPool is provider_pool.ProviderPool
+    assert config.parse_provider_pool_spec is provider_pool.parse_provider_pool_spec
+
+
+def test_pool_keeps_analysis_cache_key_of_primary_member():
+    primary = _member("deepseek", "deepseek-v4-flash", None)
+    pool = provider_pool.ProviderPool([(primary, 1.0), (_member("glm", "glm-4-flash", None), 1.0)])
+
+    primary_state = primary.get_analysis_request_config(thinking_mode=False)
+    pool_state = pool.get_analysis_request_config(thinking_mode=False)
+
+    assert cache.build_analysis_cache_key("2605.00001", pool_state) == cache.build_analysis_cache_key(
+        "2605.00001", primary_state
+    )
+
+
+def test_analysis_metadata_reports_pool_served_provider():
+    meta = analyzer._finalize_analysis_meta(
+        {
+            "provider": "deepseek",
+            "effective_model": "deepseek-v4-flash",
+            "served_provider": "glm",
+            "served_model": "glm-4-flash",
+            "served_by_pool": True,
+            "pool_failovers": 1,
+        },
+        structured_validated=True,
+        structured_fallback=False,
+    )
+
+    lines = utils._analysis_metadata_lines(meta, "deepseek-v4-flash")
+    assert "served_by: glm/glm-4-flash" in lines
+    assert "pool_failovers: 1" in lines
+
+
+class BadRequestError(Exception):
+    status_code = 400
+
+
+def test_pool_does_not_fail_over_on_request_errors():
+    calls = []
+
+    def bad_request(**kwargs):
+        calls.append(kwargs["model"])
+        raise BadRequestError("invalid parameter: max_tokens")
+
+    def glm_completion(**kwargs):
+        calls.append(kwargs["model"])
+        return _response("ok", kwargs["model"])
+
+    pool = provider_pool.ProviderPool(
+        [(_member("deepseek", "deepseek-v4-flash", bad_request), 10.0), (_member("glm", "glm-4-flash", glm_completion), 1.0)],
+        failover_threshold=1,
+    )
+
+    with patch.object(provider_pool.random, "uniform", return_value=0.0), patch.object(config.time, "sleep"):
+        try:
+            pool.chat_completion(messages=[{"role": "user", "content": "hello"}])
+        except Exception as e:
+            assert isinstance(provider_pool.root_cause(e), BadRequestError)
+        else:
+            raise AssertionError("请求本身的错误应直接抛出")
+
+    # 换成员也无济于事的错误不切换、不计入成员失败
+    assert set(calls) == {"deepseek-v4-flash"}
+    assert pool.stats[0].failures == 0
+    assert pool.stats[0].is_available()
+
+
+if __name__ == "__main__":
+    test_provider_pool_is_still_importable_from_config()
+    test_parse_provider_pool_spec_supports_weights_and_colons_in_model()
+    test_pool_fails_over_and_records_served_provider()
+    test_pool_does_not_fail_over_on_request_errors()
+    test_pool_prefers_faster_members()
+    test_pool_keeps_analysis_cache_key_of_primary_member()
+    test_analysis_metadata_reports_pool_served_provider()
+    print("provider pool tests passed")
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import analyzer
+import cache
+import repair
+import utils
+
+
+def _engine():
+    return repair.AnalysisRepairEngine(heading_matcher=analyzer._match_section_heading)
+
+
+def test_literal_escapes_are_fixed_but_latex_commands_survive():
+    text, report = _engine().repair_text("第一段\\n第二段, 其中 $\\nabla u$ 与 $\\theta\\rho$ 保持不变\\t.")
+
+    assert text == "第一段\n第二段, 其中 $\\nabla u$ 与 $\\theta\\rho$ 保持不变 ."
+    assert report.to_dict() == {"literal_escape": 2}
+
+
+def test_latex_commands_with_uppercase_letters_are_not_treated_as_escapes():
+    source = "范数 $\\lVert u \\rVert_{L^2}$, 推出 $A \\nRightarrow B$, $a \\neq b$, 以及 $\\tR$."
+    text, report = _engine().repair_text(source)
+
+    assert text == source
+    assert not report
+
+
+def test_display_math_is_balanced_and_reflowed():
+    text, report = _engine().repair_text("能量估计如下.\n$$E(w) \\le C$$ 成立.\n\n$$\\|u\\|_{H^1} \\lesssim 1\n\n下一段")
+
+    assert text == "能量估计如下.\n$$\nE(w) \\le C\n$$\n成立.\n\n$$\n\\|u\\|_{H^1} \\lesssim 1\n$$\n\n下一段"
+    assert report.counts["display_math_balance"] == 1
+    assert report.counts["display_math_layout"] == 2
+
+
+def test_display_math_in_running_prose_is_left_inline():
+    source = "Let $$ x^2 $$ and $$y$$."
+    text, report = _engine().repair_text(source)
+
+    assert text == source
+    assert not report
+
+
+def test_bracket_math_is_converted_and_unclosed_inline_math_is_left_alone():
+    text, report = _engine().repair_text("由 \\(u_t = \\Delta u\\) 得到\n\\[E(t) \\le E(0)\\] 以及 $s > 1。")
+
+    assert text == "由 $u_t = \\Delta u$ 得到\n$$\nE(t) \\le E(0)\n$$\n以及 $s > 1。"
+    assert report.fired == ["bracket_math", "display_math_layout"]
+
+
+def test_odd_dollar_count_is_reported_instead_of_guessed():
+    source = "价格是 $5 和 $x$ 的情形。"
+    text, report = _engine().repair_text(source)
+
+    assert text == source
+    assert not report
+    assert repair.has_unbalanced_inline_math(source)
+    assert not repair.has_unbalanced_inline_math("价格是 \\$5 和 $x$ 的情形, $$a$$ 成立。")
+    assert analyzer._analysis_block_issues(source) == ["行内公式分隔符 $ 未配对"]
+
+
+def test_latex_line_break_is_not_treated_as_bracket_math():
+    source = "$$\n\\begin{aligned} a &= b \\\\[2pt] c &= d \\end{aligned}\n$$"
+    text, report = _engine().repair_text(source)
+
+    assert text == source
+    assert not report
+
+
+def test_duplicate_headings_are_removed():
+    text, report = _engine().repair_text(
+        "### 2. 主要定理或主要结果\n#### 定理 1\n\n#### 定理 1\n在 $s>1$ 时整体适定.\n### 主要结果：散射成立"
+    )
+
+    assert text == "#### 定理 1\n在 $s>1$ 时整体适定.\n散射成立"
+    assert report.counts["duplicate_heading"] == 3
+
+
+def test_repair_blocks_returns_same_object_when_clean_and_reports_rules():
+    blocks = analyzer.StructuredPaperAnalysis(
+        chinese_title="标题",
+        research_background="背景 $\\frac{1}{2}$",
+        main_results="结果",
+        methods_and_tools="方法",
+        comparison_with_previous_work="比较",
+    )
+    repaired, report = _engine().repair_blocks(blocks)
+    assert repaired is blocks
+    assert report.total == 0
+
+    dirty = blocks.model_copy(update={"main_results": "结果\x07\\n$$E=1$$"})
+    repaired, report = _engine().repair_blocks(dirty)
+    assert repaired.main_results == "结果\n$$\nE=1\n$$"
+    assert report.to_dict() == {"literal_escape": 1, "control_char": 1, "display_math_layout": 1}
+    assert report.elapsed_ms >= 0
+
+
+def test_unbalanced_braces_are_left_for_cleanup_model():
+    assert repair.has_unbalanced_math_braces("其中 $\\frac{1}{2$ 成立")
+    assert not repair.has_unbalanced_math_braces("集合 $\\{x: |x|<1\\}$ 与 $$\\frac{1}{2}$$")
+    assert analyzer._analysis_block_issues("$$\\frac{1{2}$$") == ["公式中的花括号未配对"]
+
+
+def test_metadata_lists_local_repair_rules():
+    lines = utils._analysis_metadata_lines(
+        {"cleanup_local_repairs": 3, "local_repair_rules": {"literal_escape": 2, "control_char": 1}},
+        "deepseek-chat",
+    )
+    assert "local_repairs: literal_escape=2, control_char=1" in lines
+
+
+def test_analysis_cache_key_depends_on_local_repair():
+    state = {"provider": "deepseek", "effective_model": "deepseek-chat", "cleanup_requested": False}
+    repaired_key = cache.build_analysis_cache_key("test.12345", {**state, "local_repair_enabled": True})
+    raw_key = cache.build_analysis_cache_key("test.12345", {**state, "local_repair_enabled": False})
+    assert repaired_key != raw_key
+
+    client = MagicMock()
+    client.get_analysis_request_config.return_value = dict(state)
+    with patch.object(analyzer, "get_ai_client", return_value=client), patch.object(
+        analyzer, "get_analysis_cleanup_request_config", return_value={}
+    ), patch.object(analyzer, "ANALYSIS_LOCAL_REPAIR_ENABLED", False):
+        request_state = analyzer.build_analysis_request_state(thinking_mode=False)
+    assert request_state["local_repair_enabled"] is False
+
+
+if __name__ == "__main__":
+    test_literal_escapes_are_fixed_but_latex_commands_survive()
+    test_latex_commands_with_uppercase_letters_are_not_treated_as_escapes()
+    test_display_math_is_balanced_and_reflowed()
+    test_display_math_in_running_prose_is_left_inline()
+    test_bracket_math_is_converted_and_unclosed_inline_math_is_left_alone()
+    test_odd_dollar_count_is_reported_instead_of_guessed()
+    test_latex_line_break_is_not_treated_as_bracket_math()
+    test_duplicate_headings_are_removed()
+    test_repair_blocks_returns_same_object_when_clean_and_reports_rules()
+    test_unbalanced_braces_are_left_for_cleanup_model()
+    test_metadata_lists_local_repair_rules()
+    test_analysis_cache_key_depends_on_local_repair()
+    print("repair tests passed")
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import sys
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import config
+import models
+import replay
+
+
+def _response(content, model):
+    usage = SimpleNamespace(prompt_tokens=3, completion_tokens=2, total_tokens=5)
+    message = SimpleNamespace(content=content, reasoning_content=None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage, model=model)
+
+
+def _client(completion_fn, acompletion_fn=None):
+    client = config.AIClient.__new__(config.AIClient)
+    client.provider = "qwen"
+    client.model = "qwen-plus"
+    client.provider_config = config.PROVIDER_CONFIG["qwen"]
+    client.thinking_support = client.provider_config["thinking_support"]
+    client.completion_fn, client.acompletion_fn = replay.wrap_completion_fns(completion_fn, acompletion_fn)
+    return client
+
+
+@contextmanager
+def _replay_mode(mode, fixture_dir, latency=("off",)):
+    replay.reset_fixture_store()
+    with patch.object(replay, "REPLAY_MODE", mode), patch.object(replay, "REPLAY_DIR", fixture_dir), patch.object(
+        replay, "REPLAY_LATENCY", latency
+    ), patch.object(config, "AI_HEDGE_ENABLED", False), patch.object(config, "AI_CIRCUIT_BREAKER_ENABLED", False):
+        try:
+            yield replay.get_fixture_store()
+        finally:
+            replay.reset_fixture_store()
+
+
+def _fail_if_called(**kwargs):
+    raise AssertionError("回放模式不应访问网络")
+
+
+def test_parse_latency_spec():
+    assert config._parse_latency_spec("recorded") == ("recorded",)
+    assert config._parse_latency_spec("") == ("recorded",)
+    assert config._parse_latency_spec("off") == ("off",)
+    assert config._parse_latency_spec("fixed:0.5") == ("fixed", 0.5)
+    assert config._parse_latency_spec("lognormal:1.2,0.4") == ("lognormal", 1.2, 0.4)
+    assert config._parse_latency_spec("lognormal:abc") == ("recorded",)
+    assert config._parse_replay_mode("Replay") == "replay"
+    assert config._parse_replay_mode("sometimes") == "off"
+
+
+def test_synthetic_latency_is_deterministic_per_key(tmp_path):
+    first = replay.FixtureStore(tmp_path, latency=("lognormal", 1.0, 0.5), latency_scale=2.0, seed=7)
+    second = replay.FixtureStore(tmp_path, latency=("lognormal", 1.0, 0.5), latency_scale=2.0, seed=7)
+
+    # 不同键的调用顺序不影响同一个键的延迟序列
+    first_values = [first.latency_for("a"), first.latency_for("b"), first.latency_for("a")]
+    second_values = [second.latency_for("b"), second.latency_for("a"), second.latency_for("a")]
+    assert first_values[0] == second_values[1]
+    assert first_values[2] == second_values[2]
+    assert first_values[1] == second_values[0]
+    assert first_values[0] != first_values[2]
+
+    recorded = replay.FixtureStore(tmp_path, latency=("recorded",), latency_scale=0.5)
+    assert recorded.latency_for("a", 0.4) == pytest.approx(0.2)
+    assert replay.FixtureStore(tmp_path, latency=("fixed", 0.3)).latency_for("a", 9.0) == 0.3
+
+
+def test_replay_plan_spreads_recorded_latency_over_chunks(tmp_path):
+    store = replay.FixtureStore(tmp_path)
+    record = {"latency_seconds": 0.2, "ttft_seconds": 0.05, "chunks": [{}, {}, {}]}
+
+    chunks, waits = replay._replay_plan(store, "key", record)
+
+    assert len(chunks) == 3
+    assert waits == pytest.approx([0.05, 0.075, 0.075])
+
+
+def test_llm_completion_is_recorded_and_replayed_without_network(tmp_path):
+    calls = []
+
+    def live_completion(**kwargs):
+        calls.append(kwargs)
+        return _response("第一次录制的回答", kwargs["model"])
+
+    messages = [{"role": "user", "content": "hello"}]
+    with _replay_mode("record", tmp_path) as store:
+        content = _client(live_completion).chat_completion(messages=messages)
+        assert store.snapshot()["recorded"] == 1
+    assert content == "第一次录制的回答"
+    assert len(list((tmp_path / "llm").glob("*.json"))) == 1
+
+    with _replay_mode("replay", tmp_path) as store:
+        client = _client(_fail_if_called)
+        assert client.chat_completion(messages=messages) == "第一次录制的回答"
+        _, usage = client.chat_completion_with_usage(messages=messages)
+        assert usage["prompt_tokens"] == 3
+
+        # 缺少记录时不重试、不等待退避
+        started = time.monotonic()
+        with pytest.raises(config.ReplayMissError):
+            client.chat_completion(messages=[{"role": "user", "content": "never recorded"}])
+        assert time.monotonic() - started < 1.0
+        assert store.snapshot() == {"recorded": 0, "replayed": 2, "missing": 1}
+    assert len(calls) == 1
+
+
+def test_streamed_recording_replays_with_and_without_streaming(tmp_path):
+    def live_stream(**kwargs):
+        assert kwargs["stream"] is True
+        for text in ("流式", "回答"):
+            yield {"choices": [{"delta": {"content": text}}], "model": kwargs["model"]}
+        yield {"choices": [], "usage": {"prompt_tokens": 4, "completion_tokens": 2, "total_tokens": 6}}
+
+    messages = [{"role": "user", "content": "stream please"}]
+    with _replay_mode("record", tmp_path), patch.object(config, "AI_STREAMING_ENABLED", True):
+        assert _client(live_stream).chat_completion(messages=messages) == "流式回答"
+
+    with _replay_mode("replay", tmp_path), patch.object(config, "AI_STREAMING_ENABLED", True):
+        assert _client(_fail_if_called).chat_completion(messages=messages) == "流式回答"
+
+    with _replay_mode("replay", tmp_path), patch.object(config, "AI_STREAMING_ENABLED", False):
+        content, usage = _client(_fail_if_called).chat_completion_with_usage(messages=messages)
+    assert content == "流式回答"
+    assert usage["prompt_tokens"] == 4
+
+
+def test_async_completion_replay(tmp_path):
+    async def live_acompletion(**kwargs):
+        return _response("异步回答", kwargs["model"])
+
+    kwargs = {"model": "qwen/qwen-plus", "messages": [{"role": "user", "content": "async"}], "api_key": "secret"}
+    with _replay_mode("record", tmp_path):
+        _, acompletion = replay.wrap_completion_fns(_fail_if_called, live_acompletion)
+        asyncio.run(acompletion(**kwargs))
+
+    with _replay_mode("replay", tmp_path, latency=("fixed", 0.05)):
+        _, acompletion = replay.wrap_completion_fns(None, None)
+        started = time.monotonic()
+        # 凭据不参与请求哈希
+        response = asyncio.run(acompletion(**{**kwargs, "api_key": "other"}))
+        assert time.monotonic() - started >= 0.05
+    assert response.choices[0].message.content == "异步回答"
+
+
+def test_arxiv_and_pdf_responses_are_recorded_and_replayed(tmp_path):
+    feed = b"<feed><entry>listing</entry></feed>"
+    pdf_bytes = b"%PDF-1.4 fake pdf"
+
+    def live_get(url, **kwargs):
+        body = pdf_bytes if url.endswith(".pdf") else feed
+        return SimpleNamespace(status_code=200, content=body, headers={"Content-Type": "application/xml"})
+
+    listing_url = "https://export.arxiv.org/api/query?id_list=2605.00001"
+    with _replay_mode("record", tmp_path), patch.object(replay.requests, "get", side_effect=live_get):
+        replay.http_get("arxiv", listing_url, timeout=30)
+        replay.http_get("pdf", "https://arxiv.org/pdf/2605.00001v1.pdf", stream=True, timeout=30)
+
+    paper = models.SimplePaper.__new__(models.SimplePaper)
+    paper.entry_id = "https://arxiv.org/abs/2605.00001v1"
+    with _replay_mode("replay", tmp_path), patch.object(replay.requests, "get", side_effect=AssertionError("network")):
+        response = replay.http_get("arxiv", listing_url, timeout=5)
+        assert response.status_code == 200
+        assert response.content == feed
+        assert response.headers["Content-Type"] == "application/xml"
+        paper.download_pdf(str(tmp_path / "paper.pdf"))
+        missing = replay.http_get("arxiv", "https://export.arxiv.org/api/query?id_list=missing")
+    assert (tmp_path / "paper.pdf").read_bytes() == pdf_bytes
+    assert missing.status_code == 404
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_parse_latency_spec()
+    for test in (
+        test_synthetic_latency_is_deterministic_per_key,
+        test_replay_plan_spreads_recorded_latency_over_chunks,
+        test_llm_completion_is_recorded_and_replayed_without_network,
+        test_streamed_recording_replays_with_and_without_streaming,
+        test_async_completion_replay,
+        test_arxiv_and_pdf_responses_are_recorded_and_replayed,
+    ):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    print("replay tests passed")
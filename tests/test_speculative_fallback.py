@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+import datetime
+import os
+import sys
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import analyzer
+import config
+import state
+
+FALLBACK_MARKDOWN = "# 测试标题\n\n## 详细分析\n\n### 1. 研究对象和背景\n背景\n\n### 2. 主要定理或主要结果\n结果"
+
+
+class DummyAuthor:
+    def __init__(self, name):
+        self.name = name
+
+
+class DummyPaper:
+    def __init__(self, title="Test Paper"):
+        self.title = title
+        self.authors = [DummyAuthor("Tester")]
+        self.summary = "abstract"
+        self.categories = ["math.AP"]
+        self.entry_id = "https://arxiv.org/abs/test.12345"
+        self.published = datetime.datetime(2026, 4, 1)
+
+    def get_short_id(self):
+        return "test.12345"
+
+
+def request_config(thinking_mode=False):
+    return {
+        "provider": "glm",
+        "effective_model": "glm-4-flash",
+        "thinking_requested": False,
+        "thinking_applied": False,
+        "thinking_budget": None,
+        "thinking_effort": None,
+        "structured_mode": "json",
+    }
+
+
+def cleanup_disabled_request():
+    return {"cleanup_requested": False, "cleanup_attempted": False, "cleanup_applied": False}
+
+
+def _seed_structured_outcomes(successes, failures):
+    for _ in range(successes):
+        state.record_structured_outcome("glm", "glm-4-flash", success=True)
+    for _ in range(failures):
+        state.record_structured_outcome("glm", "glm-4-flash", success=False)
+
+
+def test_structured_success_rate_is_persisted_and_windowed():
+    assert state.get_structured_success_rate("glm", "glm-4-flash") == (None, 0)
+
+    _seed_structured_outcomes(successes=3, failures=1)
+    rate, samples = state.get_structured_success_rate("glm", "glm-4-flash")
+    assert rate == 0.75
+    assert samples == 4
+
+    for _ in range(10):
+        state.record_structured_outcome("glm", "glm-4-flash", success=False, window=4)
+    rate, samples = state.get_structured_success_rate("glm", "glm-4-flash")
+    assert samples == 4
+    assert rate < 0.1
+
+
+def test_structured_stats_are_written_once_when_flushed():
+    _seed_structured_outcomes(successes=2, failures=1)
+    stats_path = state.STATE_DIR / state.STRUCTURED_STATS_FILE
+
+    assert not stats_path.exists()
+    assert state.flush_structured_stats() is True
+    assert state._read_state_file(state.STRUCTURED_STATS_FILE)["models"]["glm/glm-4-flash"]["attempts"] == 3
+    # 没有新记录时不再写文件
+    assert state.flush_structured_stats() is False
+
+
+def test_speculation_only_for_providers_with_poor_structured_history():
+    with patch.object(analyzer, "SPECULATIVE_FALLBACK_ENABLED", True), patch.object(
+        analyzer, "SPECULATIVE_FALLBACK_MIN_SAMPLES", 4
+    ):
+        assert not analyzer._should_speculate(request_config())
+        _seed_structured_outcomes(successes=1, failures=3)
+        assert analyzer._should_speculate(request_config())
+
+    with patch.object(analyzer, "SPECULATIVE_FALLBACK_ENABLED", False):
+        assert not analyzer._should_speculate(request_config())
+
+
+def test_slow_structured_analysis_loses_to_speculative_fallback():
+    paper = DummyPaper()
+    release = threading.Event()
+
+    def slow_structured(**kwargs):
+        release.wait(5)
+        raise Exception("instructor retries exhausted")
+
+    def fallback_completion(messages, thinking_mode=False, return_response_state=False, **kwargs):
+        return FALLBACK_MARKDOWN, {"total_tokens": 6}, {**request_config(), "fallback_used": False}
+
+    mock_client = MagicMock()
+    mock_client.get_analysis_request_config.side_effect = request_config
+    mock_client.structured_chat_completion_with_usage.side_effect = slow_structured
+    mock_client.chat_completion_with_usage.side_effect = fallback_completion
+
+    _seed_structured_outcomes(successes=1, failures=9)
+    with patch.object(analyzer, "extract_pdf_text", return_value="pdf text"), patch.object(
+        analyzer, "get_analysis_cleanup_request_config", side_effect=cleanup_disabled_request
+    ), patch.object(analyzer, "get_ai_client", return_value=mock_client), patch.object(
+        analyzer, "SPECULATIVE_FALLBACK_ENABLED", True
+    ), patch.object(analyzer, "SPECULATIVE_FALLBACK_DELAY_SECONDS", 0.05):
+        started = time.monotonic()
+        analysis, usage, analysis_meta = analyzer.analyze_paper("paper.pdf", paper, use_cache=False)
+        elapsed = time.monotonic() - started
+    release.set()
+
+    assert elapsed < 2
+    assert analysis.startswith("# 测试标题")
+    assert usage == {"total_tokens": 6}
+    assert analysis_meta["speculative_fallback"] is True
+    assert analysis_meta["speculative_winner"] == "fallback"
+    assert analysis_meta["structured_output_mode"] == "prompt_fallback"
+
+
+def test_losing_structured_branch_is_cancelled_and_not_counted():
+    paper = DummyPaper()
+    structured_calls = []
+    structured_finished = threading.Event()
+
+    def slow_structured(**kwargs):
+        structured_calls.append(kwargs)
+        try:
+            # 真实客户端在下一次尝试前检查取消信号并抛出 RequestCancelledError
+            kwargs["cancel_event"].wait(5)
+            raise config.RequestCancelledError("glm/glm-4-flash 的请求已取消")
+        finally:
+            structured_finished.set()
+
+    def fallback_completion(messages, thinking_mode=False, return_response_state=False, **kwargs):
+        return FALLBACK_MARKDOWN, {"total_tokens": 6}, {**request_config(), "fallback_used": False}
+
+    mock_client = MagicMock()
+    mock_client.get_analysis_request_config.side_effect = request_config
+    mock_client.structured_chat_completion_with_usage.side_effect = slow_structured
+    mock_client.chat_completion_with_usage.side_effect = fallback_completion
+
+    _seed_structured_outcomes(successes=1, failures=9)
+    with patch.object(analyzer, "extract_pdf_text", return_value="pdf text"), patch.object(
+        analyzer, "get_analysis_cleanup_request_config", side_effect=cleanup_disabled_request
+    ), patch.object(analyzer, "get_ai_client", return_value=mock_client), patch.object(
+        analyzer, "SPECULATIVE_FALLBACK_ENABLED", True
+    ), patch.object(analyzer, "SPECULATIVE_FALLBACK_DELAY_SECONDS", 0.05):
+        _, _, analysis_meta = analyzer.analyze_paper("paper.pdf", paper, use_cache=False)
+        assert structured_finished.wait(2)
+
+    assert analysis_meta["speculative_winner"] == "fallback"
+    assert structured_calls[0]["hedge"] is False
+    assert structured_calls[0]["cancel_event"].is_set()
+    fallback_kwargs = mock_client.chat_completion_with_usage.call_args.kwargs
+    assert fallback_kwargs["hedge"] is False
+    assert not fallback_kwargs["cancel_event"].is_set()
+    # 被取消的结构化请求不计入失败
+    assert state.get_structured_success_rate("glm", "glm-4-flash") == (0.1, 10)
+
+
+def test_fast_structured_result_skips_fallback():
+    blocks = MagicMock()
+    calls = []
+
+    def structured_attempt(messages, thinking_mode, request_state, **request_kwargs):
+        calls.append(request_kwargs)
+        return blocks, "# 结构化", {"total_tokens": 3}, {"structured_output_validated": True}
+
+    run_fallback = MagicMock()
+    with patch.object(analyzer, "_structured_analysis_attempt", side_effect=structured_attempt):
+        result = analyzer._run_speculative_analysis([], False, request_config(), run_fallback, delay=1)
+
+    assert result[1] == "# 结构化"
+    run_fallback.assert_not_called()
+    # 推测执行的请求不再对冲，每篇论文同时在途的请求不超过两个
+    assert calls[0]["hedge"] is False
+    assert isinstance(calls[0]["cancel_event"], config.CancelToken)
+
+
+def test_speculation_raises_when_both_paths_fail():
+    def structured_attempt(messages, thinking_mode, request_state, **request_kwargs):
+        time.sleep(0.1)
+        raise ValueError("invalid json")
+
+    def run_fallback(structured_error="", **request_kwargs):
+        raise RuntimeError("fallback failed")
+
+    with patch.object(analyzer, "_structured_analysis_attempt", side_effect=structured_attempt):
+        try:
+            analyzer._run_speculative_analysis([], False, request_config(), run_fallback, delay=0.01)
+        except analyzer.SpeculativeAnalysisError as e:
+            assert "invalid json" in str(e)
+            assert "fallback failed" in str(e)
+        else:
+            raise AssertionError("两路都失败时应抛出 SpeculativeAnalysisError")
+
+
+if __name__ == "__main__":
+    test_structured_success_rate_is_persisted_and_windowed()
+    test_structured_stats_are_written_once_when_flushed()
+    test_speculation_only_for_providers_with_poor_structured_history()
+    test_slow_structured_analysis_loses_to_speculative_fallback()
+    test_losing_structured_branch_is_cancelled_and_not_counted()
+    test_fast_structured_result_skips_fallback()
+    test_speculation_raises_when_both_paths_fail()
+    print("speculative fallback tests passed")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, SRC_DIR)
+
+from lazy import LazyModule, is_available
+
+HEAVY_MODULES = ("litellm", "instructor", "openai", "fitz", "pdfplumber", "tiktoken")
+
+# 导入 main 的累计耗时上限（微秒），留足余量避免在慢机器上误报，仍能发现重新引入 litellm 这类数秒级回退
+IMPORT_BUDGET_US = int(os.getenv("STARTUP_IMPORT_BUDGET_US", "1500000"))
+
+
+def _run_python(code, cwd, *flags):
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+
+
+def _parse_importtime(stderr):
+    """解析 python -X importtime 输出，返回 {模块名: 累计耗时(微秒)}"""
+    report = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        report[parts[2].strip()] = int(parts[1].strip())
+    return report
+
+
+def test_import_main_skips_heavy_dependencies():
+    with TemporaryDirectory() as tmpdir:
+        result = _run_python("import main", tmpdir, "-X", "importtime")
+
+    assert result.returncode == 0, result.stderr[-2000:]
+    report = _parse_importtime(result.stderr)
+    slowest = sorted(report.items(), key=lambda item: item[1], reverse=True)[:10]
+
+    assert "main" in report
+    assert not [name for name in report if name.split(".")[0] in HEAVY_MODULES], slowest
+    assert report["main"] < IMPORT_BUDGET_US, f"import main 耗时 {report['main']}us, 最慢模块: {slowest}"
+
+
+def test_cache_stats_command_does_not_load_ai_or_pdf_libraries():
+    code = (
+        "import sys\n"
+        "sys.argv = ['main.py', '--cache-stats']\n"
+        "import main\n"
+        "main.main()\n"
+        f"print('LOADED=' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    with TemporaryDirectory() as tmpdir:
+        result = _run_python(code, tmpdir)
+
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert "LOADED=\n" in result.stdout or result.stdout.rstrip().endswith("LOADED=")
+
+
+def test_lazy_module_imports_on_first_use_and_forwards_patches():
+    module = LazyModule("json")
+    assert "未加载" in repr(module)
+    assert module.dumps({"a": 1}) == '{"a": 1}'
+
+    original = module.dumps
+    module.dumps = lambda value: "patched"
+    try:
+        import json
+
+        assert json.dumps({}) == "patched"
+    finally:
+        module.dumps = original
+
+    assert is_available(module)
+    assert not is_available(LazyModule("module_that_does_not_exist_for_tracker"))
+    assert not is_available(None)
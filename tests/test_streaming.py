@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import analyzer
+import config
+import streaming
+import utils
+
+
+def _chunk(content=None, reasoning_content=None, usage=None, model="qwen-plus"):
+    delta = SimpleNamespace(content=content, reasoning_content=reasoning_content)
+    choices = [SimpleNamespace(delta=delta)] if content is not None or reasoning_content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage, model=model)
+
+
+def _client(completion_fn, acompletion_fn=None):
+    client = config.AIClient.__new__(config.AIClient)
+    client.provider = "qwen"
+    client.model = "qwen-plus"
+    client.provider_config = config.PROVIDER_CONFIG["qwen"]
+    client.thinking_support = client.provider_config["thinking_support"]
+    client.completion_fn = completion_fn
+    client.acompletion_fn = acompletion_fn
+    return client
+
+
+def test_json_scanner_ignores_braces_inside_strings():
+    scanner = streaming._JsonObjectScanner()
+    assert not scanner.feed('```json\n{"reason": "集合 {x')
+    assert not scanner.feed(' \\"}\\" ", "nested": {"a": 1}')
+    assert scanner.feed('}\n```')
+    text = '```json\n{"reason": "集合 {x \\"}\\" ", "nested": {"a": 1}}\n```'
+    assert text[scanner.start:scanner.end] == '{"reason": "集合 {x \\"}\\" ", "nested": {"a": 1}}'
+
+
+def test_streamed_chat_accumulates_deltas_and_reports_metrics():
+    calls = []
+
+    def fake_completion(**kwargs):
+        calls.append(kwargs)
+        usage = SimpleNamespace(prompt_tokens=5, completion_tokens=4, total_tokens=9)
+        return iter([
+            _chunk(reasoning_content="先想"),
+            _chunk(content="分析"),
+            _chunk(content="结果"),
+            _chunk(usage=usage),
+        ])
+
+    client = _client(fake_completion)
+    with patch.object(config, "AI_STREAMING_ENABLED", True):
+        content, usage, response_state = client.chat_completion_with_usage(
+            messages=[{"role": "user", "content": "hello"}],
+            return_response_state=True,
+        )
+
+    assert content == "分析结果"
+    assert usage["total_tokens"] == 9
+    assert calls[0]["stream"] is True
+    assert calls[0]["stream_options"] == {"include_usage": True}
+    assert response_state["streamed"] is True
+    assert response_state["reasoning_content_present"] is True
+    assert response_state["ttft_seconds"] is not None
+    assert response_state["tokens_per_second"] > 0
+    assert response_state["stream_early_stop"] is False
+
+
+def test_structured_stream_stops_once_json_object_is_complete():
+    release = threading.Event()
+
+    def chunks():
+        for piece in ['{"priority": 1, ', '"reason": "色散', '估计"}']:
+            yield _chunk(content=piece)
+        # 模型在 JSON 之后还在输出多余内容，不应等待它结束
+        release.wait(5)
+        yield _chunk(content="\n以上是分类结果")
+
+    client = _client(lambda **kwargs: chunks())
+    with patch.object(config, "AI_STREAMING_ENABLED", True):
+        started = time.monotonic()
+        result, usage, response_state = client.structured_chat_completion_with_usage(
+            messages=[{"role": "user", "content": "hello"}],
+            response_model=analyzer.StructuredTopicClassification,
+            json_schema_prompt=True,
+            return_response_state=True,
+        )
+        elapsed = time.monotonic() - started
+    release.set()
+
+    assert result.priority == 1
+    assert result.reason == "色散估计"
+    assert elapsed < 2
+    assert response_state["stream_early_stop"] is True
+    assert response_state["structured_output_mode"] == "json_schema_prompt"
+
+
+def test_early_stop_estimates_usage_missing_from_the_stream():
+    release = threading.Event()
+    recorded = []
+
+    def chunks():
+        yield _chunk(content='{"priority": 1, "reason": "色散估计"}')
+        # 用量块在流的末尾，提前停止后收不到
+        release.wait(5)
+        yield _chunk(usage=SimpleNamespace(prompt_tokens=50, completion_tokens=20, total_tokens=70))
+
+    client = _client(lambda **kwargs: chunks())
+    with patch.object(config, "AI_STREAMING_ENABLED", True), patch.object(
+        config._budget_governor, "record", side_effect=recorded.append
+    ):
+        result, usage, response_state = client.structured_chat_completion_with_usage(
+            messages=[{"role": "user", "content": "请判断这篇论文的主题"}],
+            response_model=analyzer.StructuredTopicClassification,
+            json_schema_prompt=True,
+            return_response_state=True,
+        )
+    release.set()
+
+    assert response_state["stream_early_stop"] is True
+    assert response_state["usage_estimated"] is True
+    # 生成速度按估算的 token 数计算，而不是数据块数
+    assert response_state["tokens_per_second"] is not None
+    assert usage["prompt_tokens"] > 0
+    assert usage["completion_tokens"] > 0
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
+    assert recorded == [usage]
+
+
+def test_streaming_keeps_instructor_for_structured_requests_without_schema_prompt():
+    calls = []
+
+    class RecordingStructuredClient:
+        def create_with_completion(self, **kwargs):
+            calls.append(kwargs)
+            usage = SimpleNamespace(prompt_tokens=3, completion_tokens=2, total_tokens=5)
+            raw_response = SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content="{}", reasoning_content=None))],
+                usage=usage,
+                model=kwargs["model"],
+            )
+            return analyzer.StructuredTopicClassification(priority=1, reason="色散估计"), raw_response
+
+    client = _client(lambda **kwargs: iter(()))
+    with patch.object(config, "AI_STREAMING_ENABLED", True), patch.object(
+        client, "_get_structured_client", return_value=RecordingStructuredClient()
+    ):
+        result, usage, response_state = client.structured_chat_completion_with_usage(
+            messages=[{"role": "user", "content": "hello"}],
+            response_model=analyzer.StructuredTopicClassification,
+            return_response_state=True,
+        )
+
+    assert result.priority == 1
+    assert usage["total_tokens"] == 5
+    assert "stream" not in calls[0]
+    assert response_state["structured_output_mode"] != "json_schema_prompt"
+    assert "streamed" not in response_state
+
+
+def test_stalled_stream_is_retried_after_idle_timeout():
+    release = threading.Event()
+    attempts = []
+
+    def stalled():
+        yield _chunk(content="部分")
+        release.wait(5)
+        yield _chunk(content="太晚了")
+
+    def fake_completion(**kwargs):
+        attempts.append(kwargs)
+        if len(attempts) == 1:
+            return stalled()
+        return iter([_chunk(content="完整回答")])
+
+    client = _client(fake_completion)
+    with patch.object(config, "AI_STREAMING_ENABLED", True), patch.object(
+        config, "AI_STREAM_IDLE_TIMEOUT", 0.05
+    ), patch.object(config.time, "sleep"):
+        content = client.chat_completion(messages=[{"role": "user", "content": "hello"}])
+    release.set()
+
+    assert content == "完整回答"
+    assert len(attempts) == 2
+
+
+def test_stalled_stream_is_closed_by_the_consumer():
+    class BlockingStream:
+        """模拟阻塞在网络读取上的流：只有 close() 才能让读取提前返回"""
+
+        def __init__(self):
+            self.closed = threading.Event()
+
+        def __iter__(self):
+            yield _chunk(content="部分")
+            self.closed.wait(5)
+
+        def close(self):
+            self.closed.set()
+
+    stream = BlockingStream()
+    started = time.monotonic()
+    try:
+        streaming.consume_stream(stream, first_chunk_timeout=1, idle_timeout=0.05)
+    except streaming.StreamStalledError:
+        pass
+    else:
+        raise AssertionError("应当因数据块间隔超时而失败")
+
+    assert stream.closed.is_set()
+    assert time.monotonic() - started < 1
+
+
+def test_usage_free_stream_does_not_report_chunk_rate_as_token_rate():
+    response = streaming.consume_stream(iter([_chunk(content="分析"), _chunk(content="结果")]), 1, 1)
+
+    assert response.stream_metrics["tokens_per_second"] is None
+    response.generation_seconds = 2.0
+    response.fill_estimated_usage({"model": "qwen-plus", "messages": [{"role": "user", "content": "hello"}]})
+    assert response.stream_metrics["tokens_per_second"] == round(response.usage["completion_tokens"] / 2.0, 2)
+
+
+def test_async_stream_times_out_between_chunks():
+    async def stalled_stream():
+        yield _chunk(content="部分")
+        await asyncio.sleep(5)
+        yield _chunk(content="太晚了")
+
+    try:
+        asyncio.run(streaming.aconsume_stream(stalled_stream(), first_chunk_timeout=1, idle_timeout=0.05))
+    except streaming.StreamStalledError:
+        pass
+    else:
+        raise AssertionError("应当因数据块间隔超时而失败")
+
+
+def test_analysis_metadata_reports_stream_metrics():
+    lines = utils._analysis_metadata_lines(
+        {"provider": "qwen", "effective_model": "qwen-plus", "streamed": True, "ttft_seconds": 1.2, "tokens_per_second": 35.5},
+        "qwen-plus",
+    )
+
+    assert "ttft_seconds: 1.2" in lines
+    assert "tokens_per_second: 35.5" in lines
+
+
+if __name__ == "__main__":
+    test_json_scanner_ignores_braces_inside_strings()
+    test_streamed_chat_accumulates_deltas_and_reports_metrics()
+    test_structured_stream_stops_once_json_object_is_complete()
+    test_early_stop_estimates_usage_missing_from_the_stream()
+    test_streaming_keeps_instructor_for_structured_requests_without_schema_prompt()
+    test_stalled_stream_is_retried_after_idle_timeout()
+    test_stalled_stream_is_closed_by_the_consumer()
+    test_usage_free_stream_does_not_report_chunk_rate_as_token_rate()
+    test_async_stream_times_out_between_chunks()
+    test_analysis_metadata_reports_stream_metrics()
+    print("streaming tests passed")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import batch
+import config
+import main
+import timeline
+
+
+def _response(content, model):
+    usage = SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2)
+    message = SimpleNamespace(content=content, reasoning_content=None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage, model=model)
+
+
+def _client(provider, model, completion_fn):
+    client = config.AIClient.__new__(config.AIClient)
+    client.provider = provider
+    client.model = model
+    client.provider_config = config.PROVIDER_CONFIG[provider]
+    client.thinking_support = client.provider_config["thinking_support"]
+    client.completion_fn = completion_fn
+    client.acompletion_fn = None
+    return client
+
+
+def _spans(stage):
+    return [span for span in timeline.get_timeline().spans if span["stage"] == stage]
+
+
+def test_summary_reports_percentiles_per_stage_and_provider():
+    recorder = timeline.Timeline()
+    for duration in range(1, 21):
+        recorder.record("ai_call", recorder.started_at, float(duration), provider="qwen", model="qwen-plus")
+    recorder.record("ai_call", recorder.started_at, 100.0, provider="deepseek", model="deepseek-chat")
+    recorder.record("pdf_extract", recorder.started_at, 0.5)
+
+    summary = recorder.summary()
+
+    assert summary["stages"]["ai_call"]["count"] == 21
+    assert summary["stages"]["ai_call"]["max"] == 100.0
+    assert summary["providers"]["ai_call"]["qwen/qwen-plus"] == {
+        "count": 20,
+        "total": 210.0,
+        "p50": 11.0,
+        "p95": 19.0,
+        "max": 20.0,
+    }
+    assert "pdf_extract" not in summary["providers"]
+    assert summary["stages"]["pdf_extract"]["p95"] == 0.5
+
+
+def test_span_and_timed_record_errors():
+    timeline.reset_timeline()
+
+    @timeline.timed("pdf_download")
+    def failing_download():
+        raise OSError("network down")
+
+    with pytest.raises(OSError):
+        failing_download()
+    with timeline.span("report_write", report="daily.md") as attrs:
+        attrs["papers"] = 3
+
+    assert _spans("pdf_download")[0]["error"] == "OSError"
+    report_span = _spans("report_write")[0]
+    assert report_span["report"] == "daily.md"
+    assert report_span["papers"] == 3
+    assert "error" not in report_span
+
+
+def test_ai_call_separates_service_time_from_retry_wait():
+    timeline.reset_timeline()
+    calls = {"count": 0}
+    real_sleep = time.sleep
+
+    def flaky_completion(**kwargs):
+        calls["count"] += 1
+        if calls["count"] == 1:
+            raise Exception("429 too many requests")
+        real_sleep(0.02)
+        return _response("ok", kwargs["model"])
+
+    client = _client("qwen", "qwen-plus", flaky_completion)
+    with patch.object(config, "AI_HEDGE_ENABLED", False), patch.object(config, "AI_CIRCUIT_BREAKER_ENABLED", False), patch.object(
+        config.time, "sleep", side_effect=lambda seconds: real_sleep(0.1)
+    ):
+        content = client.chat_completion(messages=[{"role": "user", "content": "hello"}])
+
+    assert content == "ok"
+    service = _spans("ai_service")
+    assert [span["ok"] for span in service] == [False, True]
+    assert service[1]["duration"] >= 0.02
+    (call,) = _spans("ai_call")
+    assert call["attempts"] == 2
+    assert call["provider"] == "qwen"
+    assert call["kind"] == "chat"
+    (queue,) = _spans("ai_queue")
+    assert queue["duration"] >= 0.1
+    assert call["duration"] == pytest.approx(queue["duration"] + sum(span["duration"] for span in service), abs=0.01)
+
+
+def test_async_batch_records_queue_wait():
+    timeline.reset_timeline()
+
+    async def worker(item):
+        await asyncio.sleep(0.05)
+        return item
+
+    assert batch.run_async_batch([1, 2], worker, concurrency=1) == [1, 2]
+
+    queue_waits = sorted(span["duration"] for span in _spans("async_queue"))
+    assert len(queue_waits) == 2
+    assert queue_waits[1] >= 0.04
+    assert len(_spans("async_task")) == 2
+
+
+def test_run_timeline_is_written_next_to_report(tmp_path):
+    timeline.reset_timeline()
+    with timeline.span("arxiv_fetch"):
+        pass
+    report = tmp_path / "arxiv_analysis_20260501_080000.md"
+
+    timeline_path = main.write_run_timeline(report)
+
+    assert timeline_path == tmp_path / "arxiv_analysis_20260501_080000_timeline.json"
+    data = json.loads(timeline_path.read_text(encoding="utf-8"))
+    assert data["summary"]["stages"]["arxiv_fetch"]["count"] == 1
+    assert data["spans"][0]["stage"] == "arxiv_fetch"
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+
+    test_summary_reports_percentiles_per_stage_and_provider()
+    test_span_and_timed_record_errors()
+    test_ai_call_separates_service_time_from_retry_wait()
+    test_async_batch_records_queue_wait()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_run_timeline_is_written_next_to_report(Path(tmp))
+    print("timeline tests passed")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import tokens
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.batch_calls = []
+
+    def encode_ordinary_batch(self, texts, num_threads=8):
+        self.batch_calls.append(list(texts))
+        return [text.split() for text in texts]
+
+
+class FakeTiktoken:
+    def __init__(self, encoder=None, known_models=()):
+        self.encoder = encoder or FakeEncoder()
+        self.known_models = set(known_models)
+        self.model_lookups = []
+        self.encoding_lookups = []
+
+    def encoding_for_model(self, model_name):
+        self.model_lookups.append(model_name)
+        if model_name not in self.known_models:
+            raise KeyError(model_name)
+        return self.encoder
+
+    def get_encoding(self, encoding_name):
+        self.encoding_lookups.append(encoding_name)
+        return self.encoder
+
+
+def _patched(fake):
+    tokens._load_token_encoder.cache_clear()
+    return patch.object(tokens, "tiktoken", fake)
+
+
+def test_encoder_lookup_is_cached_per_model():
+    fake = FakeTiktoken(known_models={"gpt-4o"})
+    with _patched(fake):
+        for _ in range(5):
+            assert tokens.estimate_text_tokens("a b c", model_name="openai/gpt-4o") == 3
+            assert tokens.estimate_text_tokens("a b", model_name="deepseek-chat") == 2
+    tokens._load_token_encoder.cache_clear()
+
+    assert fake.model_lookups == ["openai/gpt-4o", "gpt-4o", "deepseek-chat"]
+    assert fake.encoding_lookups == ["o200k_base"]
+
+
+def test_failed_encoder_load_is_cached_and_falls_back_to_approximation():
+    fake = FakeTiktoken()
+    fake.get_encoding = lambda name: fake.encoding_lookups.append(name) or (_ for _ in ()).throw(OSError("offline"))
+    with _patched(fake):
+        first = tokens.estimate_text_tokens("abcdefgh", model_name="m")
+        second = tokens.estimate_text_tokens("abcdefgh", model_name="m")
+    tokens._load_token_encoder.cache_clear()
+
+    assert first == second == 2
+    assert fake.encoding_lookups == ["o200k_base", "cl100k_base"]
+
+
+def test_message_estimate_encodes_all_messages_in_one_batch():
+    fake = FakeTiktoken()
+    messages = [
+        {"role": "system", "content": "you are helpful"},
+        {"role": "user", "content": ""},
+        {"role": "user", "content": "one two"},
+    ]
+    with _patched(fake):
+        total = tokens.estimate_message_tokens(messages, model_name="unknown-model")
+    tokens._load_token_encoder.cache_clear()
+
+    # role 各 1 个 token，内容 3 + 0 + 2 个，外加每条消息 4 个 token 的固定开销
+    assert total == 3 + 3 + 2 + 3 * tokens.MESSAGE_OVERHEAD_TOKENS
+    assert fake.encoder.batch_calls == [["system", "you are helpful", "user", "user", "one two"]]
+
+
+def test_approximate_mode_is_cjk_aware_and_skips_tiktoken():
+    assert tokens.approximate_text_tokens("") == 0
+    assert tokens.approximate_text_tokens("偏微分方程的整体正则性") == 11
+    assert tokens.approximate_text_tokens("a" * 40) == 10
+    assert tokens.approximate_text_tokens("证明 global regularity") == 2 + 5
+
+    fake = FakeTiktoken()
+    with _patched(fake):
+        assert tokens.estimate_message_tokens([{"role": "user", "content": "全局适定"}], approximate=True) == 1 + 4 + 4
+    tokens._load_token_encoder.cache_clear()
+    assert fake.model_lookups == []
+    assert fake.encoding_lookups == []
+
+
+if __name__ == "__main__":
+    test_encoder_lookup_is_cached_per_model()
+    test_failed_encoder_load_is_cached_and_falls_back_to_approximation()
+    test_message_estimate_encodes_all_messages_in_one_batch()
+    test_approximate_mode_is_cjk_aware_and_skips_tiktoken()
+    print("token estimation tests passed")
@@ -30,7 +30,11 @@ def test_translate_title_uses_structured_result():
     structured = translator.StructuredTitleTranslation(chinese_title="测试标题")
 
     mock_client = MagicMock()
-    mock_client.structured_chat_completion_with_usage.return_value = (structured, {})
+    mock_client.structured_chat_completion_with_usage.return_value = (
+        structured,
+        {},
+        {"served_provider": "qwen", "served_model": "qwen-turbo"},
+    )
     with patch("translator.get_cached_translation", return_value=None), patch("translator.cache_translation"), patch(
         "translator.get_ai_client", return_value=mock_client,
     ):
@@ -40,13 +44,41 @@ def test_translate_title_uses_structured_result():
     assert mock_client.structured_chat_completion_with_usage.call_args.kwargs["json_schema_prompt"] is True
 
 
+def test_translation_state_reports_cache_hits_and_served_provider():
+    paper = DummyPaper()
+    structured = translator.StructuredTitleTranslation(chinese_title="测试标题")
+
+    mock_client = MagicMock()
+    mock_client.structured_chat_completion_with_usage.return_value = (
+        structured,
+        {},
+        {"served_provider": "deepseek", "served_model": "deepseek-chat"},
+    )
+    with patch("translator.get_cached_translation", return_value=None), patch("translator.cache_translation"), patch(
+        "translator.get_ai_client", return_value=mock_client,
+    ):
+        result, state = translator.translate_abstract_with_deepseek(paper, translate_title_only=True, return_state=True)
+
+    assert result == "**中文标题**: 测试标题"
+    assert state == {"served_provider": "deepseek", "served_model": "deepseek-chat"}
+
+    with patch("translator.get_cached_translation", return_value="**中文标题**: 缓存"), patch(
+        "translator.get_ai_client"
+    ) as mocked_client:
+        result, state = translator.translate_abstract_with_deepseek(paper, translate_title_only=True, return_state=True)
+
+    assert result == "**中文标题**: 缓存"
+    assert state == {"from_cache": True}
+    mocked_client.assert_not_called()
+
+
 def test_translate_abstract_falls_back_to_text_mode():
     paper = DummyPaper()
     fallback = "**中文标题**: 测试标题\n\n**摘要翻译**: 我们证明了一个定理。"
 
     mock_client = MagicMock()
     mock_client.structured_chat_completion_with_usage.side_effect = Exception("json schema unsupported")
-    mock_client.chat_completion.return_value = fallback
+    mock_client.chat_completion_with_usage.return_value = (fallback, {}, {})
     with patch("translator.get_cached_translation", return_value=None), patch("translator.cache_translation"), patch(
         "translator.get_ai_client", return_value=mock_client,
     ):
@@ -59,7 +91,7 @@ def test_translation_prompts_require_verbatim_formula_preservation():
     paper = DummyPaper(title="On $L^p$ bounds for $\\partial_t u + \\Delta u = 0$")
     paper.summary = "We prove $\\|u(t)\\|_{L^2} \\le C \\|u_0\\|_{L^2}$ and $u_t + \\Delta u = 0$."
 
-    structured_messages = translator._build_translation_messages(paper, translate_title_only=False)
+    structured_messages = translator.build_translation_messages(paper, translate_title_only=False)
     fallback_prompt = translator._build_translation_fallback_prompt(paper, translate_title_only=False)
 
     structured_prompt = "\n".join(message["content"] for message in structured_messages)
@@ -73,6 +105,7 @@ def test_translation_prompts_require_verbatim_formula_preservation():
 
 if __name__ == "__main__":
     test_translate_title_uses_structured_result()
+    test_translation_state_reports_cache_hits_and_served_provider()
     test_translate_abstract_falls_back_to_text_mode()
     test_translation_prompts_require_verbatim_formula_preservation()
     print("translation structure tests passed")